@@ -1,7 +1,7 @@
 """ main entry point for the program commands
 """
 import click
-from cli import (cmd_pipeline, cmd_config)
+from cli import (cmd_pipeline, cmd_config, cmd_daemon, cmd_artifact, cmd_gc)
 
 
 @click.group(invoke_without_command=True)
@@ -15,3 +15,6 @@ def cid(ctx):
 
 cid.add_command(cmd_pipeline.pipeline)
 cid.add_command(cmd_config.config)
+cid.add_command(cmd_daemon.daemon)
+cid.add_command(cmd_artifact.artifact)
+cid.add_command(cmd_gc.gc)
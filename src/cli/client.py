@@ -0,0 +1,22 @@
+""" entry point of the cid command. cid pipeline run and cid pipeline report are
+forwarded to the cid daemon when it is running, without loading the controller
+and its dependencies. Every other command, or all commands when the daemon is not
+running, are executed in this process.
+"""
+import sys
+from util.daemon import (DaemonClient)
+import util.constant as c
+
+
+def main():
+    """ run the cid command
+    """
+    args = sys.argv[1:]
+    priority = c.DAEMON_COMMANDS.get(tuple(args[:2]))
+    if priority is not None and '--help' not in args:
+        client = DaemonClient()
+        if client.connect():
+            sys.exit(client.execute(args, priority))
+    # pylint: disable=import-outside-toplevel
+    from cli.__main__ import cid
+    cid()  # pylint: disable=no-value-for-parameter
@@ -0,0 +1,63 @@
+"""
+Module providing CLI commands for artifact actions.
+"""
+
+import sys
+import click
+from util.common_utils import (get_logger)
+from controller.controller import (Controller)
+logger = get_logger('cli.cmd_artifact')
+
+
+@click.group()
+def artifact():
+    """All commands related to the artifacts of the pipeline runs"""
+
+
+@artifact.command()
+@click.pass_context
+@click.option('--pipeline', 'pipeline_name', required=True,
+              help='pipeline name of the run')
+@click.option('--run', 'run_number', required=True, type=click.IntRange(min=1),
+              help='run number of the pipeline')
+@click.option('--job', 'job_name', required=True, help='job name to get the artifacts')
+@click.option('-r', '--repo', 'repo', default=None, help='repository url or \
+local directory path')
+@click.option('-b', '--branch', 'branch', default=None, help='repository branch name')
+@click.option('-o', '--output', 'dest_dir', default='.', show_default=True,
+              type=click.Path(file_okay=False, writable=True),
+              help='directory to write the artifacts to')
+def get(ctx, pipeline_name: str, run_number: int, job_name: str, repo: str, branch: str,
+        dest_dir: str):
+    """ Download the artifacts of a job for a pipeline run. Files are written under
+    their path in the output directory, each file is checked against its hash.
+
+    Example of basic usage:
+      cid artifact get --pipeline PIPELINE_NAME --run RUN --job JOB | download
+      the artifacts of JOB in run RUN to the current directory. \f
+
+    Args:
+        ctx (Context): click context
+        pipeline_name (str): pipeline name of the run
+        run_number (int): run number of the pipeline
+        job_name (str): job name to get the artifacts
+        repo (str, optional): repository url or local directory path.
+        Default to the current or previously set repository.
+        branch (str, optional): branch name of the repository.
+        dest_dir (str, optional): directory to write the artifacts to. Default to
+        the current directory.
+    """
+    controller = ctx.find_object(Controller) or Controller()
+    status, message, repo_details = controller.handle_repo(repo_url=repo, branch=branch)
+    if not status:
+        click.secho(message, fg='red')
+        sys.exit(2)
+
+    status, message = controller.get_artifacts(repo_details, pipeline_name, run_number,
+                                               job_name, dest_dir)
+    logger.debug("artifact get status: %s, ", status)
+    if status:
+        click.secho(message, fg='green')
+    else:
+        click.secho(message, fg='red')
+        sys.exit(1)
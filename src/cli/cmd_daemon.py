@@ -0,0 +1,184 @@
+""" All related commands for the cid daemon
+"""
+# pylint: disable=logging-fstring-interpolation
+import functools
+import sys
+import threading
+import click
+from docker.errors import DockerException
+from util.common_utils import (get_int_setting, get_logger)
+from util.daemon import (DaemonClient, DaemonRequest, DaemonServer, SocketStream)
+from util.db_mongo import (MongoAdapter)
+from util.docker_client import (DockerClientRegistry)
+from util.request_context import (request_context)
+from controller.controller import (Controller)
+import util.constant as c
+
+logger = get_logger('cli.cmd_daemon')
+
+SOCKET_HELP = "path of the unix socket. if not specified, use the CICD_DAEMON_SOCKET \
+environment variable or ~/.cicd/cid.sock"
+GC_INTERVAL_HELP = "seconds between the removal of the containers and volumes left by \
+crashed runs, 0 to disable. if not specified, use the CICD_GC_INTERVAL environment \
+variable or 0"
+WORKERS_HELP = "number of commands run concurrently, a report is always run at once \
+by a worker of its own"
+
+
+@click.group()
+def daemon():
+    """All commands related to the cid daemon. While the daemon is running,
+    cid pipeline run and cid pipeline report are executed by the daemon."""
+
+
+@daemon.command()
+@click.pass_context
+@click.option('--socket', 'socket_path', default=None, help=SOCKET_HELP)
+@click.option('--gc-interval', 'gc_interval', default=None, type=click.IntRange(min=0),
+              help=GC_INTERVAL_HELP)
+@click.option('--workers', default=c.DEFAULT_DAEMON_WORKERS, type=click.IntRange(min=1),
+              show_default=True, help=WORKERS_HELP)
+def start(ctx, socket_path: str, gc_interval: int, workers: int):
+    """ Start the daemon in the foreground. The daemon keep the connections to
+    the database and docker open, and run the submitted commands concurrently
+    from a priority queue shared by all users. Stop with Ctrl+C or cid daemon stop. \f
+
+    Args:
+        ctx (Context): click context
+        socket_path (str): path of the unix socket
+        gc_interval (int): seconds between the garbage collection of the run
+            resources, 0 to disable
+        workers (int): number of commands run concurrently
+    """
+    try:
+        docker_client = DockerClientRegistry.get_client()
+    except DockerException as de:
+        click.secho(f"docker service not available, each run will connect on its own. {de}",
+                    fg='yellow')
+        docker_client = None
+    controller = Controller(mongo_ds=MongoAdapter(shared_client=True),
+                            docker_client=docker_client, interactive=False)
+    server = DaemonServer(
+        functools.partial(_execute_request, ctx.find_root().command, controller),
+        socket_path, workers)
+    click.secho(f"cid daemon listening on {server.socket_path}", fg='green')
+    gc_stop = _start_gc_sweep(controller, gc_interval)
+    try:
+        server.serve_forever()
+    except RuntimeError as re:
+        click.secho(str(re), fg='red')
+        sys.exit(1)
+    except KeyboardInterrupt:
+        click.echo("cid daemon stopped")
+    finally:
+        gc_stop.set()
+
+
+@daemon.command()
+@click.option('--socket', 'socket_path', default=None, help=SOCKET_HELP)
+def stop(socket_path: str):
+    """ Stop the daemon after the running commands, waiting commands are rejected. \f
+
+    Args:
+        socket_path (str): path of the unix socket
+    """
+    client = DaemonClient(socket_path)
+    if not client.connect():
+        click.secho(f"cid daemon is not running on {client.socket_path}", fg='red')
+        sys.exit(1)
+    for answer in client.request({'command': c.DAEMON_CMD_STOP}):
+        click.echo(answer.get(c.DAEMON_MSG_OUT, ""), nl=False)
+
+
+@daemon.command()
+@click.option('--socket', 'socket_path', default=None, help=SOCKET_HELP)
+def status(socket_path: str):
+    """ Show the running commands and the waiting commands of the daemon. \f
+
+    Args:
+        socket_path (str): path of the unix socket
+    """
+    client = DaemonClient(socket_path)
+    if not client.connect():
+        click.secho(f"cid daemon is not running on {client.socket_path}", fg='red')
+        sys.exit(1)
+    answer = next(client.request({'command': c.DAEMON_CMD_STATUS}), {})
+    click.secho(f"cid daemon running on {client.socket_path}", fg='green')
+    running = answer.get('running', [])
+    click.echo(f"running: {len(running)}")
+    for request in running:
+        click.echo(f"  - {_describe(request)}")
+    queued = answer.get('queued', [])
+    click.echo(f"queued: {len(queued)}")
+    for position, request in enumerate(queued, start=1):
+        click.echo(f"  {position}. {_describe(request)}")
+
+
+def _describe(request: dict) -> str:
+    """ format a request from the daemon status
+
+    Args:
+        request (dict): user, cwd and args of the request
+
+    Returns:
+        str: one line description
+    """
+    return f"cid {' '.join(request['args'])} (user:{request['user']} dir:{request['cwd']})"
+
+
+def _start_gc_sweep(controller: Controller, interval: int = None) -> threading.Event:
+    """ start the background garbage collection of the run resources
+
+    Args:
+        controller (Controller): controller shared by all requests
+        interval (int, optional): seconds between the sweeps, 0 to disable.
+            Defaults to None, which use the CICD_GC_INTERVAL env value.
+
+    Returns:
+        threading.Event: set to stop the sweeps
+    """
+    stop_event = threading.Event()
+    if interval is None:
+        interval = get_int_setting(c.ENV_GC_INTERVAL, 0, minimum=0, log_tool=logger)
+    if interval <= 0:
+        return stop_event
+
+    def sweep():
+        while not stop_event.wait(interval):
+            status, message = controller.gc()
+            logger.info(f"gc status: {status}, {message}")
+
+    threading.Thread(target=sweep, daemon=True, name="gc-sweep").start()
+    return stop_event
+
+
+def _execute_request(command: click.Command, controller: Controller,
+                     request: DaemonRequest, out: SocketStream, err: SocketStream) -> int:
+    """ execute a forwarded command in the daemon, from the directory of the client
+    and with the output sent back to the client. Requests are executed concurrently,
+    each with a controller of its own sharing the connections of the daemon controller
+
+    Args:
+        command (click.Command): root cid command
+        controller (Controller): daemon controller, holding the shared connections
+        request (DaemonRequest): request to execute
+        out (SocketStream): stdout of the request
+        err (SocketStream): stderr of the request
+
+    Returns:
+        int: exit code of the command
+    """
+    request_controller = Controller(mongo_ds=controller.mongo_ds,
+                                    docker_client=controller.docker_client,
+                                    interactive=False)
+    # runs of this request are cancelled when the client disconnect
+    request_controller.cancel_event = request.cancel_event
+    try:
+        with request_context(request.cwd, out, err):
+            command.main(args=request.args, prog_name='cid', obj=request_controller,
+                         color=request.color)
+    except SystemExit as se:
+        if se.code is None or isinstance(se.code, int):
+            return se.code or 0
+        return 1
+    return 0
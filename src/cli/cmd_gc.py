@@ -0,0 +1,35 @@
+"""
+Module providing the CLI command for the garbage collection of the run resources.
+"""
+
+import sys
+import click
+from util.common_utils import (get_logger)
+from controller.controller import (Controller)
+logger = get_logger('cli.cmd_gc')
+
+
+@click.command()
+@click.pass_context
+@click.option('--dry-run', 'dry_run', is_flag=True, default=False,
+              help='list the stale containers and volumes without removing them')
+def gc(ctx, dry_run: bool):
+    """ Remove the containers and volumes left by pipeline runs that are finished
+    or whose process died, e.g. after a crash. The volumes of failed runs are kept
+    until their retention deadline so the runs can be resumed.
+
+    Example of basic usage:
+      cid gc --dry-run | list the containers and volumes to remove. \f
+
+    Args:
+        ctx (Context): click context
+        dry_run (bool): only list the resources to remove
+    """
+    controller = ctx.find_object(Controller) or Controller()
+    status, message = controller.gc(dry_run=dry_run)
+    logger.debug("gc status: %s, ", status)
+    if status:
+        click.secho(message, fg='green')
+    else:
+        click.secho(message, fg='red')
+        sys.exit(1)
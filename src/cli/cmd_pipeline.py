@@ -9,6 +9,7 @@ import click
 from pydantic import ValidationError
 from util.common_utils import (get_logger, ConfigOverride)
 from util.model import (PipelineHist)
+from util.request_context import (get_cwd, resolve_path)
 from controller.controller import (Controller)
 import util.constant as c
 logger = get_logger('cli.cmd_pipeline')
@@ -35,8 +36,26 @@ process', is_flag=True)
               help='print validated config in yaml format for dry run', is_flag=True)
 @click.option('--override', 'overrides', multiple=True,
               help="Override configuration in 'key=value' format")
+@click.option('--max-concurrency', 'max_concurrency', default=None, type=click.IntRange(min=1),
+              help='maximum number of jobs to run concurrently. \
+if not specified, use global max_concurrency in the config file (default 1)')
+@click.option('--all', 'run_all', is_flag=True,
+              help='run all pipelines in .cicd-pipelines concurrently')
+@click.option('--job-slots', 'job_slots', default=None, type=click.IntRange(min=1),
+              help='maximum number of jobs to run concurrently across all pipelines \
+with --all. if not specified, use the number of cpus')
+@click.option('--no-cache', 'no_cache', is_flag=True,
+              help='run all jobs without using the job cache')
+@click.option('--resume', 'resume_run', default=None, type=click.IntRange(min=1),
+              help='resume the given run number from its first stage not successful, \
+reusing the successful stages and their workspace')
+@click.option('--pull', 'pull_policy', default=c.DEFAULT_PULL_POLICY,
+              type=click.Choice(c.PULL_POLICIES), show_default=True,
+              help='when to pull the job images, all images are pulled concurrently \
+at the start of the run')
 def run(ctx, file_path: str, pipeline_name: str, repo: str, branch: str, commit: str, local: bool,
-        dry_run: bool, yaml_output: bool, overrides):
+        dry_run: bool, yaml_output: bool, overrides, max_concurrency: int, run_all: bool,
+        job_slots: int, no_cache: bool, resume_run: int, pull_policy: str):
     """ Run pipeline given the configuration file. Base command is cid pipeline run, this will
     run the pipeline specified in .cicd-pipelines/pipelines.yml for current repository or 
     previously set repository. 
@@ -57,6 +76,17 @@ def run(ctx, file_path: str, pipeline_name: str, repo: str, branch: str, commit:
         dry_run (bool, optional): If True, plan the pipeline without creating. Default False.
         yaml_output (bool, optional): If True, print output in yaml format. Default False.
         overrides (any, optional): override key/value of the config file for this run only.
+        max_concurrency (int, optional): maximum number of jobs to run concurrently.
+        Default to None, which use the config file value.
+        run_all (bool, optional): If True, run all pipelines concurrently. Default False.
+        job_slots (int, optional): maximum number of jobs to run concurrently across
+        all pipelines, only used with run_all. Default to None, which use the number of cpus.
+        no_cache (bool, optional): If True, run all jobs without using the job cache.
+        Default False.
+        resume_run (int, optional): run number to resume from its first stage not
+        successful. Default to None.
+        pull_policy (str, optional): always, missing or never pull the job images.
+        Default to missing.
     """
     source_pipeline = ctx.get_parameter_source("pipeline_name")
     filepath_pipeline = ctx.get_parameter_source("file_path")
@@ -69,6 +99,18 @@ def run(ctx, file_path: str, pipeline_name: str, repo: str, branch: str, commit:
             click.secho(message, fg='red')
             sys.exit(2)
 
+    # --all run every pipeline, cannot be combined with --file or --pipeline
+    if run_all and (source_pipeline != click.core.ParameterSource.DEFAULT or
+                    filepath_pipeline != click.core.ParameterSource.DEFAULT):
+        click.secho("cid: invalid flag. --all can't be used with --file or --pipeline.",
+                    fg='red')
+        sys.exit(2)
+
+    # --resume target a single pipeline run
+    if run_all and resume_run is not None:
+        click.secho("cid: invalid flag. --all can't be used with --resume.", fg='red')
+        sys.exit(2)
+
     # Check and ensure the custom file_path is valid
     if filepath_pipeline != click.core.ParameterSource.DEFAULT:
         # Ensure valid yaml file
@@ -79,11 +121,11 @@ def run(ctx, file_path: str, pipeline_name: str, repo: str, branch: str, commit:
             sys.exit(2)
 
         ori_file_path = file_path
-        if not os.path.isfile(file_path):
+        if not os.path.isfile(resolve_path(file_path)):
             # assume it will be in .cicd-pipelines folder
             file_path = os.path.join(
-                os.getcwd(), c.DEFAULT_CONFIG_DIR, file_path)
-        if not os.path.isfile(file_path):
+                get_cwd(), c.DEFAULT_CONFIG_DIR, file_path)
+        if not os.path.isfile(resolve_path(file_path)):
             click.echo(f"Invalid config_file_path: {ori_file_path}")
             sys.exit(2)
 
@@ -98,7 +140,8 @@ def run(ctx, file_path: str, pipeline_name: str, repo: str, branch: str, commit:
         # empty override will be an empty tuple.
         overrides = None
 
-    controller = Controller()
+    # the daemon provide its controller with shared connections
+    controller = ctx.find_object(Controller) or Controller()
     status, message, repo_details = controller.handle_repo(
         repo_url=repo,
         branch=branch,
@@ -109,14 +152,30 @@ def run(ctx, file_path: str, pipeline_name: str, repo: str, branch: str, commit:
         sys.exit(2)
     click.secho(message, fg='green')
 
-    status, message = controller.run_pipeline(
-        config_file=file_path,
-        pipeline_name=pipeline_name,
-        dry_run=dry_run,
-        git_details=repo_details,
-        local=local,
-        yaml_output=yaml_output,
-        override_configs=overrides)
+    if run_all:
+        status, message = controller.run_all_pipelines(
+            git_details=repo_details,
+            dry_run=dry_run,
+            local=local,
+            yaml_output=yaml_output,
+            override_configs=overrides,
+            max_concurrency=max_concurrency,
+            job_slots=job_slots,
+            no_cache=no_cache,
+            pull_policy=pull_policy)
+    else:
+        status, message = controller.run_pipeline(
+            config_file=file_path,
+            pipeline_name=pipeline_name,
+            dry_run=dry_run,
+            git_details=repo_details,
+            local=local,
+            yaml_output=yaml_output,
+            override_configs=overrides,
+            max_concurrency=max_concurrency,
+            no_cache=no_cache,
+            resume_run=resume_run,
+            pull_policy=pull_policy)
 
     logger.debug("pipeline run status: %s, ", status)
     if status:
@@ -127,6 +186,7 @@ def run(ctx, file_path: str, pipeline_name: str, repo: str, branch: str, commit:
 
 
 @pipeline.command()
+@click.pass_context
 @click.option('-r', '--repo', 'repo_url', default=None, help='url of the repository \
 git@ if clone using ssh or https://')
 @click.option('--local', 'local', help='retrieve local pipeline history', is_flag=True)
@@ -136,7 +196,7 @@ git@ if clone using ssh or https://')
 default stages options: [build, test, doc, deploy]')
 @click.option('--job', 'job', default=None, help="job name to view report")
 @click.option('-r', '--run', 'run_number', default=None, help='run number to get the report')
-def report(repo_url: str, local: bool, pipeline_name: str, stage: str,
+def report(ctx, repo_url: str, local: bool, pipeline_name: str, stage: str,
            job: str, run_number: int):
     """Report pipeline provides user to retrieve the pipeline history.
     if --repo is not specified, it will default to the current repo\f
@@ -148,6 +208,7 @@ def report(repo_url: str, local: bool, pipeline_name: str, stage: str,
       history of the run # given the PIPELINE_NAME and RUN number.
 
     Args:
+        ctx (Context): click context
         repo_url (str): repository url to display the report
         local (bool): (current version) everything runs locally
         pipeline_name (str): pipeline name to get the report
@@ -155,7 +216,7 @@ def report(repo_url: str, local: bool, pipeline_name: str, stage: str,
         job (str): filter by job name for the report
         run_number (int): the run number to view the specific run report.
     """
-    ctrl = Controller()
+    ctrl = ctx.find_object(Controller) or Controller()
     pipeline_model = {}
     pipeline_model[c.FIELD_PIPELINE_NAME] = pipeline_name
 
@@ -6,23 +6,35 @@
 from datetime import datetime
 import copy
 import os
+import threading
 import time
+from concurrent.futures import (ThreadPoolExecutor)
 from pathlib import Path
 
 import click
+from botocore.exceptions import ClientError
 from docker.errors import DockerException
+from git import GitCommandError
 from pydantic import ValidationError
 from ruamel.yaml import YAMLError
 import util.constant as c
 from util.container import (DockerManager)
+from util.db_artifact import (ArtifactStore)
+from util.dep_cache import (DependencyCache)
+from util.docker_client import (DockerClientRegistry)
 from util.model import (JobLog, SessionDetail, PipelineConfig,
                         ValidatedStage, PipelineInfo, PipelineHist)
 from util.common_utils import (
-    get_logger, ConfigOverride, DryRun, PipelineReport)
+    get_logger, match_changes, ConfigOverride, DryRun, PipelineReport)
 from util.repo_manager import (RepoManager)
+from util.request_context import (get_context, inherit_context, resolve_path)
+from util.resource_gc import (ResourceCollector)
 from util.db_mongo import (MongoAdapter)
 from util.yaml_parser import YamlParser
 from util.config_tools import (ConfigChecker)
+from util.job_cache import (JobCache)
+from util.scheduler import (JobScheduler)
+from util.setup_image import (SetupImageCache)
 
 # pylint: disable=logging-fstring-interpolation
 # pylint: disable=logging-not-lazy
@@ -31,12 +43,25 @@ from util.config_tools import (ConfigChecker)
 class Controller:
     """Controller class that integrates the CLI with the other class components"""
 
-    def __init__(self):
+    def __init__(self, mongo_ds: MongoAdapter = None, docker_client=None,
+                 interactive: bool = True):
         """Initialize the controller class
+
+        Args:
+            mongo_ds (MongoAdapter, optional): adapter to the database, the daemon supply
+                one with a shared connection. Defaults to None, which create a new one.
+            docker_client (docker.DockerClient, optional): docker client shared by all
+                runs. Defaults to None, each run create its own client.
+            interactive (bool, optional): whether the user can be prompted, False in
+                the daemon which has no terminal. Defaults to True.
         """
         self.repo_manager = RepoManager()
-        self.mongo_ds = MongoAdapter()
+        self.mongo_ds = mongo_ds if mongo_ds is not None else MongoAdapter()
         self.config_checker = ConfigChecker()
+        self.docker_client = docker_client
+        # set by the daemon for each request, cancel the runs when its client is gone
+        self.cancel_event = None
+        self.interactive = interactive
         self.logger = get_logger('cli.controller')
 
     def handle_repo(self, repo_url: str = None,
@@ -112,7 +137,7 @@ class Controller:
             return False, message, None
 
         if not is_remote:
-            repo_url = str(Path(repo_url).resolve())
+            repo_url = str(Path(resolve_path(repo_url)).resolve())
 
         time_log = datetime.now().strftime(c.DATETIME_FORMAT)
         user_id = os.getlogin()
@@ -298,13 +323,17 @@ class Controller:
     def validate_n_save_configs(self,
                                 directory: str,
                                 saving: bool = True,
-                                session_data: SessionDetail = None) -> dict:
+                                session_data: SessionDetail = None,
+                                override_configs: dict = None) -> dict:
         """ Set Up repo, validate config, and save the config into datastore
 
         Args:
             directory (str): valid directory containing pipeline configuration
             saving (optional, bool): whether to save the result to db.
             Default to True
+            session_data (SessionDetail, optional): repository details to save under.
+            override_configs (dict, optional): override applied to every pipeline
+            before validation. Defaults to None.
 
         Raises:
             FileNotFoundError: if the directory does not exist
@@ -319,6 +348,9 @@ class Controller:
 
         # Loop through each items
         for pipeline_name, values in pipeline_configs.items():
+            if override_configs:
+                values.pipeline_config = ConfigOverride.apply_overrides(
+                    values.pipeline_config, override_configs)
             response = self.config_checker.validate_config(
                 pipeline_name, values.pipeline_config, values.pipeline_file_name, True)
             results[pipeline_name] = response
@@ -538,8 +570,9 @@ class Controller:
 
     def run_pipeline(self, config_file: str, pipeline_name: str, git_details: SessionDetail,
                      dry_run: bool = False, local: bool = False, yaml_output: bool = False,
-                     override_configs: dict = None
-                     ) -> tuple[bool, str]:
+                     override_configs: dict = None, max_concurrency: int = None,
+                     no_cache: bool = False, resume_run: int = None,
+                     pull_policy: str = c.DEFAULT_PULL_POLICY) -> tuple[bool, str]:
         """Executes the job by coordinating the repository, runner, artifact store, and logger.
 
         Args:
@@ -551,6 +584,15 @@ class Controller:
                 By default set to false.
             yaml_output (bool): set output format to yaml
             override_configs: to override required configs
+            max_concurrency (int, optional): maximum number of jobs to run
+                concurrently, take precedence over the global max_concurrency
+                config. Defaults to None.
+            no_cache (bool, optional): force execution of all jobs without using
+                the job cache. Defaults to False.
+            resume_run (int, optional): run number of an earlier run to resume from its
+                first stage not successful. Defaults to None.
+            pull_policy (str, optional): when to pull the job images, one of
+                PULL_POLICIES. Defaults to DEFAULT_PULL_POLICY.
 
         Returns:
             tuple[bool, str]:
@@ -584,7 +626,9 @@ class Controller:
         try:
             pipeline_config = PipelineConfig.model_validate(config_dict)
             status, run_msg = self._actual_pipeline_run(
-                git_details, pipeline_config, local)
+                git_details, pipeline_config, local, max_concurrency,
+                cancel_event=self.cancel_event, no_cache=no_cache, resume_run=resume_run,
+                pull_policy=pull_policy)
             message += run_msg
         except ValidationError as ve:
             status = False
@@ -601,10 +645,116 @@ class Controller:
             message += "\nPipeline runs successfully. "
         return (status, message)
 
+    def run_all_pipelines(self, git_details: SessionDetail,
+                          dry_run: bool = False, local: bool = False,
+                          yaml_output: bool = False, override_configs: dict = None,
+                          max_concurrency: int = None, job_slots: int = None,
+                          no_cache: bool = False,
+                          pull_policy: str = c.DEFAULT_PULL_POLICY) -> tuple[bool, str]:
+        """ Run all pipelines in the .cicd-pipelines directory of the repository.
+        The configurations are validated and saved in one pass, nothing is run if any
+        of them is invalid. The pipelines are then run concurrently, each with its own
+        docker volume and job record, while sharing a global limit of running jobs.
+
+        Args:
+            git_details (SessionDetail): details of the git repository where to use.
+            dry_run (bool, optional): simulate the pipelines order of execution.
+                Defaults to False.
+            local (bool, optional): True = run pipeline locally, False = run pipeline
+                remotely. Defaults to False.
+            yaml_output (bool, optional): set dry run output format to yaml.
+                Defaults to False.
+            override_configs (dict, optional): override applied to every pipeline.
+                Defaults to None.
+            max_concurrency (int, optional): maximum number of jobs to run concurrently
+                within each pipeline. Defaults to None, which use the config value.
+            job_slots (int, optional): maximum number of jobs to run concurrently across
+                all pipelines. Defaults to None, which use the number of cpus.
+            no_cache (bool, optional): force execution of all jobs without using
+                the job cache. Defaults to False.
+            pull_policy (str, optional): when to pull the job images, one of
+                PULL_POLICIES. Defaults to DEFAULT_PULL_POLICY.
+
+        Returns:
+            tuple[bool, str]:
+                bool: status, True only if all pipelines run successfully
+                str: message
+        """
+        try:
+            results = self.validate_n_save_configs(
+                c.DEFAULT_CONFIG_DIR, True, git_details, override_configs)
+        except (FileNotFoundError, ValueError) as e:
+            return False, str(e)
+        if not results:
+            return False, f"No pipeline configuration found in {c.DEFAULT_CONFIG_DIR}"
+        error_msg = ""
+        for pipeline_name, response in results.items():
+            if not response.valid:
+                error_msg += f"pipeline:{pipeline_name} {response.error_msg}\n"
+        # Early return if any validation fail
+        if error_msg:
+            return False, error_msg.strip()
+
+        configs = {pipeline_name: response.pipeline_config
+                   for pipeline_name, response in results.items()}
+        if dry_run:
+            status = True
+            message = ""
+            for pipeline_name, pipeline_config in configs.items():
+                dry_status, dry_run_msg = self.dry_run(
+                    pipeline_config.model_dump(by_alias=True), yaml_output)
+                status = status and dry_status
+                message += f"pipeline:{pipeline_name}\n{dry_run_msg}\n"
+            return status, message
+
+        job_slots = threading.BoundedSemaphore(job_slots or os.cpu_count() or 1)
+        cancel_event = self.cancel_event or threading.Event()
+        status = True
+        message = ""
+        with ThreadPoolExecutor(max_workers=len(configs),
+                                thread_name_prefix="pipeline",
+                                initializer=inherit_context,
+                                initargs=(get_context(),)) as executor:
+            futures = {
+                pipeline_name: executor.submit(
+                    self._actual_pipeline_run, git_details, pipeline_config, local,
+                    max_concurrency, job_slots, cancel_event, no_cache,
+                    pull_policy=pull_policy)
+                for pipeline_name, pipeline_config in configs.items()
+            }
+            try:
+                for pipeline_name, future in futures.items():
+                    try:
+                        run_status, run_msg = future.result()
+                    except DockerException as de:
+                        run_status = False
+                        run_msg = f"Error with docker service. error is {str(de)}"
+                        self.logger.warning(run_msg)
+                    status = status and run_status
+                    run_msg = run_msg if run_msg else "Pipeline runs fail"
+                    message += f"pipeline:{pipeline_name} {run_msg}\n"
+            except KeyboardInterrupt:
+                # Let every pipeline wrap up its record and volume before exit
+                cancel_event.set()
+                executor.shutdown(wait=True)
+                raise
+
+        if not status:
+            message += '\nPipeline runs fail'
+        else:
+            message += "\nPipeline runs successfully. "
+        return status, message
+
     def _actual_pipeline_run(self,
                              repo_data: SessionDetail,
                              pipeline_config: PipelineConfig,
-                             local: bool = False) -> tuple[bool, str]:
+                             local: bool = False,
+                             max_concurrency: int = None,
+                             job_slots: threading.Semaphore = None,
+                             cancel_event: threading.Event = None,
+                             no_cache: bool = False,
+                             resume_run: int = None,
+                             pull_policy: str = c.DEFAULT_PULL_POLICY) -> tuple[bool, str]:
         """ method to actually run the pipeline
 
         Args:
@@ -612,6 +762,19 @@ class Controller:
             pipeline_config (PipelineConfig): validated pipeline_configuration
             local (bool, optional): flag indicate if run to be local(True) or remote(False).
                 Defaults to False.
+            max_concurrency (int, optional): maximum number of jobs to run
+                concurrently. Defaults to None, which use the global config value.
+            job_slots (threading.Semaphore, optional): job slots shared by pipelines
+                running concurrently. Defaults to None.
+            cancel_event (threading.Event, optional): event to cancel the run from
+                another thread. Defaults to None.
+            no_cache (bool, optional): force execution of all jobs without using
+                the job cache. Defaults to False.
+            resume_run (int, optional): run number of an earlier run to resume. The
+                successful stages before its first stage not successful are reused
+                together with its workspace volume. Defaults to None.
+            pull_policy (str, optional): when to pull the job images, one of
+                PULL_POLICIES. Defaults to DEFAULT_PULL_POLICY.
 
         Raises:
             ValueError: If target pipeline already running
@@ -652,94 +815,156 @@ class Controller:
             error_msg += "Please Stop Before Proceed"
             return False, error_msg
 
+        # Initialize Docker Manager, a resumed run continue in the original workspace
+        docker_manager = DockerManager(
+            client=self.docker_client,
+            repo=repo_data.repo_name,
+            branch=repo_data.branch,
+            pipeline=pipeline_config.global_.pipeline_name,
+            run=str(len(his_obj.job_run_history) + 1),
+            job_cache=None if no_cache else JobCache(),
+            dep_cache=DependencyCache(),
+            setup_images=SetupImageCache(),
+            pipeline_timeout=pipeline_config.global_.timeout,
+            log_buffer_size=pipeline_config.global_.log_buffer_size,
+            log_dir=str(Path.home().joinpath(c.DEFAULT_LOG_DIR)),
+            log_handler=self._echo_job_line,
+            legacy_status_check=pipeline_config.global_.legacy_status_check,
+            executor=pipeline_config.global_.executor,
+            pull_policy=pull_policy
+        )
+        # Pre-flight: get all job images concurrently in the background, jobs wait
+        # for their image before they start
+        docker_manager.pull_images([docker_manager.get_image_name(job_config)
+                                    for job_config in pipeline_config.jobs.values()])
+        docker_manager.remove_expired_vols(self.mongo_ds.get_run_job)
+
+        # Step 1b: If resume, find the stages that can be reused from the original run
+        resumed_from = None
+        reused_logs = []
+        workspace_run = None
+        if resume_run is not None:
+            status, error_msg, resumed_from, reused_logs, workspace_run = \
+                self._prepare_resume(his_obj, pipeline_config, resume_run, docker_manager)
+            if not status:
+                return False, error_msg
+
+        # Step 1c: claim the pipeline before its workspace and run record are
+        # created. If update unsuccessful, prompt user. Without a terminal the run is
+        # not started, as declining the prompt
+        update_success = self.mongo_ds.update_pipeline_info(
+            repo_data.repo_name,
+            repo_data.repo_url,
+            repo_data.branch,
+            pipeline_config.global_.pipeline_name,
+            {c.FIELD_RUNNING: True}
+        )
+        if not update_success:
+            if not self.interactive:
+                return False, "Cannot update into db"
+            click.confirm(
+                'Cannot update into db, do you want to continue?', abort=True)
+
+        if docker_manager.docker_vol is None:
+            # Step 1d: copy the repository at the session commit into the workspace,
+            # a resumed run continue in the workspace of the original run if available
+            status, error_msg = self._seed_workspace(docker_manager, repo_data,
+                                                     pipeline_config)
+            if not status:
+                docker_manager.remove_vol()
+                self.mongo_ds.update_pipeline_info(
+                    repo_data.repo_name,
+                    repo_data.repo_url,
+                    repo_data.branch,
+                    pipeline_config.global_.pipeline_name,
+                    {c.FIELD_RUNNING: False}
+                )
+                return False, error_msg
+
         # Step 2: Insert new job record
         job_id = self.mongo_ds.insert_job(
             his_obj,
             pipeline_config.model_dump(by_alias=True)
         )
+        if resumed_from is not None:
+            resume_updates = {c.FIELD_RESUMED_FROM: resumed_from}
+            # a later resume of this run continue in the same workspace
+            if workspace_run is not None:
+                resume_updates[c.FIELD_WORKSPACE_RUN] = workspace_run
+            self.mongo_ds.update_job(job_id, resume_updates)
+            for stage_log in reused_logs:
+                self.mongo_ds.update_job_logs(
+                    job_id,
+                    stage_log[c.FIELD_STAGE_NAME],
+                    stage_log[c.FIELD_STAGE_STATUS],
+                    stage_log[c.FIELD_JOBS],
+                    stage_time={
+                        c.FIELD_START_TIME: stage_log[c.FIELD_START_TIME],
+                        c.FIELD_COMPLETION_TIME: stage_log[c.FIELD_COMPLETION_TIME]
+                    }
+                )
+                click.secho(f"Stage:{stage_log[c.FIELD_STAGE_NAME]} reused from "
+                            f"run {resume_run}\n", fg="green")
+        run_config = self._trim_pipeline_config(
+            pipeline_config, [stage_log[c.FIELD_STAGE_NAME] for stage_log in reused_logs])
 
         his_obj.job_run_history.append(job_id)
         run_number = len(his_obj.job_run_history)
-        updates = {
-            c.FIELD_JOB_RUN_HISTORY: his_obj.job_run_history,
-            c.FIELD_RUNNING: True,
-        }
         update_success = self.mongo_ds.update_pipeline_info(
             repo_data.repo_name,
             repo_data.repo_url,
             repo_data.branch,
             pipeline_config.global_.pipeline_name,
-            updates
+            {c.FIELD_JOB_RUN_HISTORY: his_obj.job_run_history}
         )
-        # if update unsuccessful, prompt user.
+        # the run record is finalized by the wrap up whatever happen from here
         if not update_success:
-            click.confirm(
-                'Cannot update into db, do you want to continue?', abort=True)
+            click.secho(
+                "Failed to update pipeline run history, please do manual update\n", fg="red")
+
+        if max_concurrency is None:
+            max_concurrency = pipeline_config.global_.max_concurrency
+        skip_jobs = self._get_unchanged_jobs(run_config,
+                                             his_obj.last_success_commit_hash)
 
         pipeline_status = c.STATUS_PENDING
         try:
-            # Initialize Docker Manager
-            docker_manager = DockerManager(
-                repo=repo_data.repo_name,
-                branch=repo_data.branch,
-                pipeline=pipeline_config.global_.pipeline_name,
-                run=str(len(his_obj.job_run_history))
-            )
-            # Step 3: Iterate through all stages, for each jobs
+            # Step 3: in dag mode, run all jobs through the pipeline wide job graph,
+            # otherwise iterate through all stages, for each jobs
             early_break = False
-            for stage_name, stage_config in pipeline_config.stages.items():
+            stages = run_config.stages.items()
+            if run_config.global_.dag_mode and run_config.job_graph is not None:
+                pipeline_status = self._run_pipeline_graph(
+                    docker_manager, job_id, run_config, max_concurrency,
+                    job_slots, cancel_event, skip_jobs)
+                stages = []
+            for stage_name, stage_config in stages:
                 stage_status = c.STATUS_PENDING
                 stage_config = ValidatedStage.model_validate(stage_config)
                 job_logs = {}
                 stage_start_time = time.asctime()
                 try:
-                    # run the job, get the record, update job history
-                    for job_group in stage_config.job_groups:
-                        for job_name in job_group:
-                            job_config = pipeline_config.jobs[job_name]
-                            try:
-                                click.secho(
-                                    f"Stage:{stage_name} Job:{
-                                        job_name} - Streaming Job Logs",
-                                    fg='green')
-                                job_log = docker_manager.run_job(
-                                    job_name, job_config)
-                                click.echo(job_log.job_logs)
-                                job_logs[job_name] = job_log.model_dump()
-                                # single fail job will switch the stage status to fail
-                                if job_log.job_status == c.STATUS_FAILED:
-                                    stage_status = c.STATUS_FAILED
-                                    click.secho(
-                                        f"Job:{job_name} failed\n", fg="red")
-                                    # Early break
-                                    if job_config[c.JOB_SUBKEY_ALLOW] is False:
-                                        early_break = True
-                                        break
-                                else:
-                                    click.secho(
-                                        f"Job:{job_name} success\n", fg="green")
-                            except KeyboardInterrupt:
-                                # Only create a job_log if current job not yet saved
-                                if job_name not in job_logs:
-                                    job_log_info = copy.deepcopy(job_config)
-                                    job_log_info[c.REPORT_KEY_JOBNAME] = job_name
-                                    job_log_info[c.REPORT_KEY_START] = time.asctime(
-                                    )
-                                    job_log = JobLog.model_validate(
-                                        job_log_info)
-                                    job_log.job_status = c.STATUS_CANCELLED
-                                    job_log.completion_time = time.asctime()
-                                    job_logs[job_name] = job_log.model_dump()
-                                if stage_status != c.STATUS_FAILED:
-                                    stage_status = c.STATUS_CANCELLED
-                                raise
-                            # If early break, skip next job group execution
-                            if early_break:
-                                break
+                    if stage_config.snapshot:
+                        self._snapshot_stage(docker_manager, stage_name, stage_config,
+                                             run_config.jobs)
+                    # run the jobs, get the record, update job history
+                    stage_status, early_break = self._run_stage(
+                        docker_manager, stage_name, stage_config,
+                        run_config.jobs, job_logs, max_concurrency,
+                        job_slots, cancel_event, skip_jobs)
+                except KeyboardInterrupt:
+                    # Fail status take precedence over cancelled
+                    stage_status = c.STATUS_CANCELLED
+                    for job_log in job_logs.values():
+                        if job_log[c.FIELD_JOB_STATUS] in (c.STATUS_FAILED, c.STATUS_TIMEOUT):
+                            stage_status = c.STATUS_FAILED
+                    raise
+                else:
                     # If we reach this step, if stage status still pending, update to success
                     if stage_status == c.STATUS_PENDING:
                         stage_status = c.STATUS_SUCCESS
                 finally:
+                    docker_manager.drop_snapshot()
                     # Ensure job logs always updated regardless exception thrown
                     self.mongo_ds.update_job_logs(
                         job_id,
@@ -761,6 +986,9 @@ class Controller:
                             pipeline_status = c.STATUS_CANCELLED
                         click.secho(
                             f"Stage:{stage_name} cancelled\n", fg="yellow")
+                    elif stage_status == c.STATUS_SKIPPED:
+                        click.secho(
+                            f"Stage:{stage_name} skipped\n", fg="yellow")
                     else:
                         click.secho(
                             f"Stage:{stage_name} success\n", fg="green")
@@ -770,16 +998,34 @@ class Controller:
             # if stage status still pending, update to success
             if pipeline_status == c.STATUS_PENDING:
                 pipeline_status = c.STATUS_SUCCESS
+        except KeyboardInterrupt:
+            if pipeline_status == c.STATUS_PENDING:
+                pipeline_status = c.STATUS_CANCELLED
+            raise
         finally:
             # Ensure always Wrap up and return
             run_update = {
                 c.FIELD_STATUS: pipeline_status,
-                c.FIELD_COMPLETION_TIME: time.asctime()
+                c.FIELD_COMPLETION_TIME: time.asctime(),
+                c.FIELD_IMAGE_PULLS: self._report_image_pulls(docker_manager)
             }
+            # the workspace of an unsuccessful run is kept until the deadline, the
+            # earlier run of a resumed run own the workspace it continued in
+            retain = pipeline_status != c.STATUS_SUCCESS
+            if retain:
+                run_update[c.FIELD_RETAIN_UNTIL] = int(time.time()) + \
+                    docker_manager.vol_retention
+                if workspace_run is not None:
+                    self.mongo_ds.update_job(
+                        his_obj.job_run_history[workspace_run - 1],
+                        {c.FIELD_RETAIN_UNTIL: run_update[c.FIELD_RETAIN_UNTIL]})
             self.mongo_ds.update_job(job_id, run_update)
             final_updates = {
                 c.FIELD_RUNNING: False
             }
+            # base commit for the changes filter of next run
+            if pipeline_status == c.STATUS_SUCCESS:
+                final_updates[c.FIELD_LAST_SUCCESS_COMMIT_HASH] = repo_data.commit_hash
             update_success = self.mongo_ds.update_pipeline_info(
                 repo_data.repo_name,
                 repo_data.repo_url,
@@ -790,11 +1036,443 @@ class Controller:
             if not update_success:
                 click.secho(
                     "Failed to update pipeline status, please do manual update\n", fg="red")
-            docker_manager.remove_vol()
+            # keep the workspace of unsuccessful run so it can be resumed
+            docker_manager.remove_vol(retain=retain)
+            docker_manager.evict_dep_cache()
+            docker_manager.evict_setup_images()
         pipeline_pass = pipeline_status == c.STATUS_SUCCESS
         run_msg = f"run_number:{run_number}" if pipeline_pass else ""
         return pipeline_pass, run_msg
 
+    def _run_stage(self,
+                   docker_manager: DockerManager,
+                   stage_name: str,
+                   stage_config: ValidatedStage,
+                   jobs: dict,
+                   job_logs: dict,
+                   max_concurrency: int = c.DEFAULT_MAX_CONCURRENCY,
+                   job_slots: threading.Semaphore = None,
+                   cancel_event: threading.Event = None,
+                   skip_jobs: dict = None) -> tuple[str, bool]:
+        """ run all jobs of a single stage with the JobScheduler. A job is started as
+        soon as the jobs it needs are finished, up to max_concurrency jobs at a time.
+        Dependants of a failed job that does not allow failure are skipped.
+
+        Args:
+            docker_manager (DockerManager): docker manager for current pipeline run
+            stage_name (str): name of the stage
+            stage_config (ValidatedStage): validated stage configuration
+            jobs (dict): validated jobs configuration of the pipeline
+            job_logs (dict): dictionary of job_name:job_log to be filled. Will be modified
+                in-place so records are available even if the stage is interrupted
+            max_concurrency (int, optional): maximum number of jobs to run
+                concurrently. Defaults to DEFAULT_MAX_CONCURRENCY.
+            job_slots (threading.Semaphore, optional): job slots shared by pipelines
+                running concurrently. Defaults to None.
+            cancel_event (threading.Event, optional): event to cancel the run from
+                another thread. Defaults to None.
+            skip_jobs (dict, optional): jobs to skip without running, with the reason
+                as value. Defaults to None.
+
+        Returns:
+            tuple[str, bool]: first item is the stage status, second item indicate
+                if the remaining stages should be skipped (early break)
+        """
+        stage_status = c.STATUS_PENDING
+        scheduler = JobScheduler(
+            stage_config.job_graph,
+            max_concurrency=max_concurrency,
+            job_order=[job for group in stage_config.job_groups for job in group],
+            job_slots=job_slots,
+            cancel_event=cancel_event
+        )
+
+        def run_job(job_name: str) -> JobLog:
+            if skip_jobs and job_name in skip_jobs:
+                return self._placeholder_job_log(
+                    job_name, jobs[job_name], c.STATUS_SKIPPED, skip_jobs[job_name])
+            click.secho(f"Stage:{stage_name} Job:{job_name} - Streaming Job Logs",
+                        fg='green')
+            return docker_manager.run_job(job_name, jobs[job_name])
+
+        def on_complete(job_name: str, job_log: JobLog):
+            job_logs[job_name] = job_log.model_dump()
+            if job_log.job_status == c.STATUS_FAILED:
+                click.secho(f"Job:{job_name} failed\n", fg="red")
+            elif job_log.job_status == c.STATUS_TIMEOUT:
+                click.secho(f"Job:{job_name} timeout\n", fg="red")
+            elif job_log.job_status == c.STATUS_SKIPPED:
+                click.secho(f"Job:{job_name} skipped, {job_log.job_logs}\n", fg="yellow")
+            elif job_log.cache_status == c.CACHE_HIT:
+                click.secho(f"Job:{job_name} success (cached)\n", fg="green")
+            else:
+                click.secho(f"Job:{job_name} success\n", fg="green")
+
+        try:
+            scheduler.run(run_job, on_complete)
+        except KeyboardInterrupt:
+            for job_name, job_log in self._stop_unfinished_jobs(
+                    docker_manager, scheduler, jobs).items():
+                job_logs[job_name] = job_log.model_dump()
+            raise
+
+        for job_name in scheduler.skipped:
+            click.secho(f"Job:{job_name} skipped\n", fg="yellow")
+            job_logs[job_name] = self._placeholder_job_log(
+                job_name, jobs[job_name], c.STATUS_SKIPPED).model_dump()
+        # single fail or timeout job will switch the stage status to fail
+        for job_log in scheduler.results.values():
+            if job_log.job_status in (c.STATUS_FAILED, c.STATUS_TIMEOUT):
+                stage_status = c.STATUS_FAILED
+        if all(job_log[c.FIELD_JOB_STATUS] == c.STATUS_SKIPPED for job_log in job_logs.values()):
+            stage_status = c.STATUS_SKIPPED
+        return stage_status, scheduler.early_break
+
+    def _run_pipeline_graph(self,
+                            docker_manager: DockerManager,
+                            job_id: str,
+                            pipeline_config: PipelineConfig,
+                            max_concurrency: int = c.DEFAULT_MAX_CONCURRENCY,
+                            job_slots: threading.Semaphore = None,
+                            cancel_event: threading.Event = None,
+                            skip_jobs: dict = None) -> str:
+        """ run all jobs of the pipeline with a single JobScheduler over the pipeline
+        wide job graph (dag mode). A job is started as soon as the jobs it needs are
+        finished, regardless of the stage boundaries. Job logs are still recorded
+        per stage, the stage time span from its first job start to its last job end.
+
+        Args:
+            docker_manager (DockerManager): docker manager for current pipeline run
+            job_id (str): id of the job record in database
+            pipeline_config (PipelineConfig): validated pipeline configuration
+            max_concurrency (int, optional): maximum number of jobs to run
+                concurrently. Defaults to DEFAULT_MAX_CONCURRENCY.
+            job_slots (threading.Semaphore, optional): job slots shared by pipelines
+                running concurrently. Defaults to None.
+            cancel_event (threading.Event, optional): event to cancel the run from
+                another thread. Defaults to None.
+            skip_jobs (dict, optional): jobs to skip without running, with the reason
+                as value. Defaults to None.
+
+        Returns:
+            str: pipeline status
+        """
+        jobs = pipeline_config.jobs
+        stage_logs = {stage_name: {} for stage_name in pipeline_config.stages}
+        stage_times = {}
+        job_order = []
+        for stage_config in pipeline_config.stages.values():
+            stage_config = ValidatedStage.model_validate(stage_config)
+            job_order.extend(job for group in stage_config.job_groups for job in group)
+        scheduler = JobScheduler(
+            pipeline_config.job_graph,
+            max_concurrency=max_concurrency,
+            job_order=job_order,
+            job_slots=job_slots,
+            cancel_event=cancel_event
+        )
+
+        def run_job(job_name: str) -> JobLog:
+            stage_name = jobs[job_name][c.JOB_SUBKEY_STAGE]
+            stage_times.setdefault(stage_name, {c.FIELD_START_TIME: time.asctime()})
+            if skip_jobs and job_name in skip_jobs:
+                return self._placeholder_job_log(
+                    job_name, jobs[job_name], c.STATUS_SKIPPED, skip_jobs[job_name])
+            click.secho(f"Stage:{stage_name} Job:{job_name} - Streaming Job Logs",
+                        fg='green')
+            return docker_manager.run_job(job_name, jobs[job_name])
+
+        def on_complete(job_name: str, job_log: JobLog):
+            stage_name = jobs[job_name][c.JOB_SUBKEY_STAGE]
+            stage_logs[stage_name][job_name] = job_log.model_dump()
+            stage_times[stage_name][c.FIELD_COMPLETION_TIME] = time.asctime()
+            if job_log.job_status == c.STATUS_FAILED:
+                click.secho(f"Job:{job_name} failed\n", fg="red")
+            elif job_log.job_status == c.STATUS_TIMEOUT:
+                click.secho(f"Job:{job_name} timeout\n", fg="red")
+            elif job_log.job_status == c.STATUS_SKIPPED:
+                click.secho(f"Job:{job_name} skipped, {job_log.job_logs}\n", fg="yellow")
+            elif job_log.cache_status == c.CACHE_HIT:
+                click.secho(f"Job:{job_name} success (cached)\n", fg="green")
+            else:
+                click.secho(f"Job:{job_name} success\n", fg="green")
+
+        pipeline_status = c.STATUS_PENDING
+        unfinished = {}
+        try:
+            scheduler.run(run_job, on_complete)
+        except KeyboardInterrupt:
+            unfinished = self._stop_unfinished_jobs(docker_manager, scheduler, jobs)
+            raise
+        finally:
+            for job_name in scheduler.skipped:
+                click.secho(f"Job:{job_name} skipped\n", fg="yellow")
+                unfinished[job_name] = self._placeholder_job_log(
+                    job_name, jobs[job_name], c.STATUS_SKIPPED)
+            for job_name, job_log in unfinished.items():
+                stage_name = jobs[job_name][c.JOB_SUBKEY_STAGE]
+                stage_logs[stage_name][job_name] = job_log.model_dump()
+            # Ensure job logs always updated regardless exception thrown
+            for stage_name, job_logs in stage_logs.items():
+                if not job_logs:
+                    continue
+                statuses = [job_log[c.FIELD_JOB_STATUS] for job_log in job_logs.values()]
+                stage_time = stage_times.get(stage_name, {c.FIELD_START_TIME: time.asctime()})
+                stage_time.setdefault(c.FIELD_COMPLETION_TIME, time.asctime())
+                # Fail status take precedence over cancelled
+                if c.STATUS_FAILED in statuses or c.STATUS_TIMEOUT in statuses:
+                    stage_status = c.STATUS_FAILED
+                    pipeline_status = c.STATUS_FAILED
+                    click.secho(f"Stage:{stage_name} failed\n", fg="red")
+                elif c.STATUS_CANCELLED in statuses:
+                    stage_status = c.STATUS_CANCELLED
+                    click.secho(f"Stage:{stage_name} cancelled\n", fg="yellow")
+                elif all(status == c.STATUS_SKIPPED for status in statuses):
+                    stage_status = c.STATUS_SKIPPED
+                    click.secho(f"Stage:{stage_name} skipped\n", fg="yellow")
+                else:
+                    stage_status = c.STATUS_SUCCESS
+                    click.secho(f"Stage:{stage_name} success\n", fg="green")
+                self.mongo_ds.update_job_logs(
+                    job_id, stage_name, stage_status, job_logs, stage_time=stage_time)
+        return pipeline_status
+
+    def _prepare_resume(self, his_obj: PipelineInfo, pipeline_config: PipelineConfig,
+                        resume_run: int, docker_manager: DockerManager
+                        ) -> tuple[bool, str, str | None, list, int | None]:
+        """ load the original run to resume, and find the leading stages with
+        success status that can be reused. The workspace is the volume of the
+        original run, or of the run it resumed in turn, recorded in workspace_run.
+
+        Args:
+            his_obj (PipelineInfo): pipeline history
+            pipeline_config (PipelineConfig): validated pipeline configuration
+            resume_run (int): run number to resume
+            docker_manager (DockerManager): docker manager of the new run, attached to
+                the workspace if it is still available
+
+        Returns:
+            tuple[bool, str, str | None, list, int | None]: first item indicate if the
+                run can be resumed, second item is the error message if any, third
+                item is the id of the original run, forth item is the stage logs to
+                reuse, fifth item is the run owning the workspace attached, None if
+                the workspace is no longer available
+        """
+        if resume_run < 1 or resume_run > len(his_obj.job_run_history):
+            return False, f"Run {resume_run} not found for pipeline {his_obj.pipeline_name}", \
+                None, [], None
+        original_id = his_obj.job_run_history[resume_run - 1]
+        original_run = self.mongo_ds.get_job(original_id)
+        if not original_run:
+            return False, f"Fail to retrieve run {resume_run}", None, [], None
+        original_commit = original_run.get(c.FIELD_GIT_COMMIT_HASH)
+        if original_commit != his_obj.last_commit_hash:
+            error_msg = f"Run {resume_run} was run on commit {original_commit}, "
+            error_msg += f"cannot resume on commit {his_obj.last_commit_hash}"
+            return False, error_msg, None, [], None
+
+        stage_logs = {stage_log[c.FIELD_STAGE_NAME]: stage_log
+                      for stage_log in original_run.get(c.FIELD_LOGS, [])}
+        reused_logs = []
+        for stage_name in pipeline_config.stages:
+            stage_log = stage_logs.get(stage_name)
+            if stage_log is None or stage_log[c.FIELD_STAGE_STATUS] != c.STATUS_SUCCESS:
+                break
+            reused_logs.append(stage_log)
+        if len(reused_logs) == len(pipeline_config.stages):
+            return False, f"All stages of run {resume_run} succeeded, nothing to resume", \
+                None, [], None
+        workspace_run = original_run.get(c.FIELD_WORKSPACE_RUN) or resume_run
+        if docker_manager.attach_vol(str(workspace_run)):
+            # the workspace is retained again from the start of the resumed run, so it
+            # is not expired while the run use it
+            self.mongo_ds.update_job(his_obj.job_run_history[workspace_run - 1], {
+                c.FIELD_RETAIN_UNTIL: int(time.time()) + docker_manager.vol_retention})
+        elif reused_logs:
+            error_msg = f"Workspace of run {resume_run} is no longer available, cannot resume"
+            return False, error_msg, None, [], None
+        else:
+            workspace_run = None
+        return True, "", str(original_id), reused_logs, workspace_run
+
+    def _trim_pipeline_config(self, pipeline_config: PipelineConfig,
+                              reused_stages: list) -> PipelineConfig:
+        """ remove the reused stages and their jobs from the stages and pipeline
+        wide job graph, the jobs that need them consider them finished.
+
+        Args:
+            pipeline_config (PipelineConfig): validated pipeline configuration
+            reused_stages (list): name of the stages to remove
+
+        Returns:
+            PipelineConfig: pipeline configuration with remaining stages to run
+        """
+        if not reused_stages:
+            return pipeline_config
+        run_config = pipeline_config.model_copy(deep=True)
+        reused_jobs = set()
+        for stage_name in reused_stages:
+            reused_jobs.update(run_config.stages.pop(stage_name)[c.KEY_JOB_GRAPH].keys())
+        if run_config.job_graph is not None:
+            run_config.job_graph = {
+                job: [required_by for required_by in required_by_list
+                      if required_by not in reused_jobs]
+                for job, required_by_list in run_config.job_graph.items()
+                if job not in reused_jobs
+            }
+        return run_config
+
+    def _get_unchanged_jobs(self, pipeline_config: PipelineConfig, base_commit: str) -> dict:
+        """ find the jobs to skip because none of the paths in the changes of the job,
+        or of its stage, were touched since the base commit.
+
+        Args:
+            pipeline_config (PipelineConfig): validated pipeline configuration
+            base_commit (str): commit of the last successful run
+
+        Returns:
+            dict: job_name as key and reason to skip as value. Empty if no changes
+                defined, or no base commit to compare with.
+        """
+        stages = pipeline_config.stages
+        jobs = pipeline_config.jobs
+        if not any(c.KEY_CHANGES in config for config in list(stages.values()) +
+                   list(jobs.values())):
+            return {}
+        changed_files = self.repo_manager.get_changed_files(base_commit)
+        if changed_files is None:
+            click.echo("No previous successful run to compare changes with, run all jobs")
+            return {}
+        skip_jobs = {}
+        for stage_name, stage_config in stages.items():
+            stage_changes = stage_config.get(c.KEY_CHANGES)
+            stage_changed = stage_changes is None or match_changes(changed_files, stage_changes)
+            for job_name in stage_config[c.KEY_JOB_GRAPH]:
+                job_changes = jobs[job_name].get(c.KEY_CHANGES)
+                if not stage_changed:
+                    skip_jobs[job_name] = f"no changes in stage {stage_name} paths"
+                elif job_changes is not None and not match_changes(changed_files, job_changes):
+                    skip_jobs[job_name] = "no changes in job paths"
+        for job_name, reason in skip_jobs.items():
+            skip_jobs[job_name] = f"{reason} since commit {base_commit}"
+        return skip_jobs
+
+    def _stop_unfinished_jobs(self, docker_manager: DockerManager,
+                              scheduler: JobScheduler, jobs: dict) -> dict:
+        """ jobs started but not completed are cancelled, stop their containers
+
+        Args:
+            docker_manager (DockerManager): docker manager for current pipeline run
+            scheduler (JobScheduler): the interrupted scheduler
+            jobs (dict): validated jobs configuration of the pipeline
+
+        Returns:
+            dict: dictionary of job_name:JobLog for the cancelled jobs
+        """
+        cancelled = {}
+        for job_name in scheduler.started:
+            if job_name in scheduler.results:
+                continue
+            cancelled[job_name] = self._placeholder_job_log(
+                job_name, jobs[job_name], c.STATUS_CANCELLED)
+            try:
+                docker_manager.stop_job(job_name)
+            except DockerException as de:
+                self.logger.warning(f"Fail to stop job {job_name}, error is {de}")
+        return cancelled
+
+    def _placeholder_job_log(self, job_name: str, job_config: dict, status: str,
+                             message: str = c.DEFAULT_STR) -> JobLog:
+        """ create the job log for a job that did not run to completion,
+        e.g. cancelled by the user or skipped due to failed dependency
+
+        Args:
+            job_name (str): name of the job
+            job_config (dict): validated job configuration
+            status (str): status of the job
+            message (str, optional): message stored as the job logs. Defaults to empty.
+
+        Returns:
+            JobLog: job log with given status
+        """
+        job_log_info = copy.deepcopy(job_config)
+        job_log_info[c.REPORT_KEY_JOBNAME] = job_name
+        job_log_info[c.REPORT_KEY_START] = time.asctime()
+        job_log = JobLog.model_validate(job_log_info)
+        job_log.job_status = status
+        job_log.job_logs = message
+        job_log.completion_time = time.asctime()
+        return job_log
+
+    def _seed_workspace(self, docker_manager: DockerManager,
+                        repo_data: SessionDetail,
+                        pipeline_config: PipelineConfig) -> tuple[bool, str]:
+        """ stream the files of the session commit into the workspace volume,
+        once per run before the first job
+
+        Args:
+            docker_manager (DockerManager): docker manager of the pipeline run
+            repo_data (SessionDetail): information of the repo, with the commit to use
+            pipeline_config (PipelineConfig): validated pipeline_configuration
+
+        Returns:
+            tuple[bool, str]: first flag indicate if the workspace is seeded,
+                second str is the error message if fail
+        """
+        docker_img = docker_manager.get_image_name(next(iter(pipeline_config.jobs.values())))
+        archive = self.repo_manager.stream_archive(repo_data.commit_hash)
+        try:
+            status, error_msg = docker_manager.seed_vol(archive, docker_img)
+        except GitCommandError as ge:
+            self.logger.warning("git archive failed for commit %s: %s",
+                                repo_data.commit_hash, ge)
+            status, error_msg = False, f"Fail to archive commit {repo_data.commit_hash}"
+        return status, error_msg
+
+    def _snapshot_stage(self, docker_manager: DockerManager, stage_name: str,
+                        stage_config: ValidatedStage, jobs: dict) -> None:
+        """ take a snapshot of the workspace so each job of the stage start from
+        the same tree, the jobs run in the shared workspace if it fails
+
+        Args:
+            docker_manager (DockerManager): docker manager of the pipeline run
+            stage_name (str): name of the stage
+            stage_config (ValidatedStage): validated stage configuration
+            jobs (dict): jobs configuration of the run
+        """
+        first_job = next(iter(stage_config.job_graph))
+        status, error_msg = docker_manager.snapshot_vol(
+            docker_manager.get_image_name(jobs[first_job]))
+        if not status:
+            click.secho(f"Stage:{stage_name} snapshot failed, jobs run in the shared "
+                        f"workspace. {error_msg}", fg="yellow")
+
+    def _report_image_pulls(self, docker_manager: DockerManager) -> list[dict]:
+        """ print the time spent getting each image, separately from the jobs
+
+        Args:
+            docker_manager (DockerManager): docker manager of the pipeline run
+
+        Returns:
+            list[dict]: image pull records to save with the run
+        """
+        image_pulls = docker_manager.get_image_pulls()
+        for image_pull in image_pulls:
+            click.secho(f"Image:{image_pull.image} {image_pull.status} in "
+                        f"{image_pull.duration:.1f}s",
+                        fg="red" if image_pull.status == c.STATUS_FAILED else "green")
+        return [image_pull.model_dump() for image_pull in image_pulls]
+
+    def _echo_job_line(self, job_name: str, line: str) -> None:
+        """ print a line of a running job output, prefixed by the job name as
+        jobs can run concurrently
+
+        Args:
+            job_name (str): name of the job
+            line (str): line of output
+        """
+        click.echo(f"[{job_name}] {line}")
+
     def dry_run(self, config_dict: dict, is_yaml_output: bool) -> tuple[bool, str]:
         """dry run methods responsible for the `--dry-run` method for pipelines.
         The function will retrieve any pipeline history from database, then validate
@@ -880,3 +1558,90 @@ class Controller:
             return is_success, err_msg
         is_success = True
         return is_success, output_msg
+
+    def get_artifacts(self, repo_data: SessionDetail, pipeline_name: str, run_number: int,
+                      job_name: str, dest_dir: str) -> tuple[bool, str]:
+        """ download the artifacts of a job run, using the manifest recorded in the
+        job log of the run and the bucket of the configuration used by the run
+
+        Args:
+            repo_data (SessionDetail): information required to identify the repo record
+            pipeline_name (str): name of the pipeline
+            run_number (int): run number of the pipeline
+            job_name (str): name of the job
+            dest_dir (str): directory to write the artifacts to
+
+        Returns:
+            tuple[bool, str]: first item indicate if the download succeeded, second
+                item is the result or error message
+        """
+        pipeline_history = self.mongo_ds.get_pipeline_history(
+            repo_data.repo_name, repo_data.repo_url, repo_data.branch, pipeline_name)
+        job_run_history = pipeline_history.get(c.FIELD_JOB_RUN_HISTORY) or []
+        if run_number < 1 or run_number > len(job_run_history):
+            return False, f"Run {run_number} not found for pipeline {pipeline_name}"
+        run = self.mongo_ds.get_job(job_run_history[run_number - 1])
+        if not run:
+            return False, f"Fail to retrieve run {run_number}"
+
+        job_log = next((stage_log[c.FIELD_JOBS][job_name]
+                        for stage_log in run.get(c.FIELD_LOGS, [])
+                        if job_name in (stage_log.get(c.FIELD_JOBS) or {})), None)
+        if job_log is None:
+            return False, f"Job {job_name} not found in run {run_number}"
+        manifest_key = job_log.get(c.FIELD_ARTIFACT_MANIFEST)
+        if not manifest_key:
+            return False, f"No artifacts stored for job {job_name} in run {run_number}"
+        # matrix jobs use the upload path of their parent job
+        config_used = run.get(c.FIELD_PIPELINE_CONFIG_USED, {})
+        job_config = config_used.get(c.KEY_JOBS, {}).get(
+            job_log.get(c.FIELD_MATRIX_PARENT) or job_name, {})
+        bucket = job_config.get(c.KEY_ARTIFACT_PATH) or \
+            config_used.get(c.KEY_GLOBAL, {}).get(c.KEY_ARTIFACT_PATH)
+
+        start = time.monotonic()
+        try:
+            store = ArtifactStore(bucket_name=bucket)
+            manifest = store.get_manifest(manifest_key)
+            if manifest is None:
+                return False, f"Fail to read the manifest s3://{bucket}/{manifest_key}"
+            size = store.download(manifest, dest_dir)
+        except (ClientError, OSError, ValueError) as e:
+            self.logger.warning(f"Fail to download artifacts of {job_name}, error is {e}")
+            return False, f"Fail to download artifacts of {job_name}, error is {e}"
+        duration = time.monotonic() - start
+        mib = 1024 * 1024
+        rate = size / mib / duration if duration > 0 else 0.0
+        return True, (f"Artifacts of {job_name} downloaded to {dest_dir}: "
+                      f"{len(manifest.files)} files ({size / mib:.1f} MiB), "
+                      f"in {duration:.1f}s, {rate:.1f} MiB/s")
+
+    def gc(self, dry_run: bool = False) -> tuple[bool, str]:
+        """ remove the containers and volumes left by the pipeline runs that are
+        finished in the jobs history or whose process died, e.g. after a crash.
+        The volumes of failed runs are kept until their retention deadline.
+
+        Args:
+            dry_run (bool, optional): only list the resources to remove.
+                Defaults to False.
+
+        Returns:
+            tuple[bool, str]: first item indicate if all the stale resources were
+                removed, second item is the result or error message
+        """
+        try:
+            client = self.docker_client or DockerClientRegistry.get_client()
+        except DockerException as de:
+            return False, f"docker service not available, {de}"
+        report = ResourceCollector(client, self.mongo_ds.get_run_job,
+                                   self.logger).collect(dry_run=dry_run)
+        action = "to remove" if dry_run else "removed"
+        lines = [f"Stale runs: {len(report.stale_runs)}"]
+        lines.extend(f"  {run_name}" for run_name in report.stale_runs)
+        lines.append(f"Containers {action}: {len(report.containers)}")
+        lines.extend(f"  {name}" for name in report.containers)
+        lines.append(f"Volumes {action}: {len(report.volumes)}")
+        lines.extend(f"  {name}" for name in report.volumes)
+        lines.append(f"Resources kept: {report.kept}")
+        lines.extend(report.errors)
+        return not report.errors, "\n".join(lines)
@@ -0,0 +1,198 @@
+""" artifact_stream module provide the helpers to move the artifacts of a job from the
+docker engine to the object store as a stream: the tar chunks of get_archive are
+read file by file while they arrive, to hash the files or write them to one or
+more sinks, e.g. a multipart upload, without temporary files.
+"""
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+from typing import BinaryIO, Iterable, Iterator
+import util.constant as c
+from util.common_utils import (get_logger)
+from util.model import (ArtifactFile)
+
+logger = get_logger("util.artifact_stream")
+
+
+class ChunkReader(io.RawIOBase):
+    """ Read only file object over an iterator of bytes chunks, so a chunked
+    response can be read by tarfile in stream mode
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        """ Initialize the ChunkReader
+
+        Args:
+            chunks (Iterable[bytes]): chunks to read, in order
+        """
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """ fill the buffer with the next bytes, reading the next chunk when
+        the current one is consumed
+
+        Args:
+            buffer (memoryview): buffer to fill
+
+        Returns:
+            int: number of bytes read, 0 at the end of the stream
+        """
+        while not self._buffer:
+            try:
+                self._buffer = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+class TeeWriter:
+    """ Write only, non seekable file object writing to several sinks, counting
+    the bytes written
+    """
+
+    def __init__(self, sinks: list[BinaryIO]) -> None:
+        """ Initialize the TeeWriter
+
+        Args:
+            sinks (list[BinaryIO]): file objects to write to
+        """
+        self.sinks = sinks
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        """ write the data to all the sinks
+
+        Args:
+            data (bytes): data to write
+
+        Returns:
+            int: number of bytes written
+        """
+        for sink in self.sinks:
+            sink.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        """ flush all the sinks
+        """
+        for sink in self.sinks:
+            sink.flush()
+
+
+class HashWriter:
+    """ Write only file object updating a hash with the data written
+    """
+
+    def __init__(self, digest) -> None:
+        """ Initialize the HashWriter
+
+        Args:
+            digest (hashlib._Hash): hash to update
+        """
+        self.digest = digest
+
+    def write(self, data: bytes) -> int:
+        """ update the hash
+
+        Args:
+            data (bytes): data written
+
+        Returns:
+            int: number of bytes written
+        """
+        self.digest.update(data)
+        return len(data)
+
+    def flush(self) -> None:
+        """ nothing to flush
+        """
+
+
+def iter_tar_files(chunks: Iterable[bytes]) -> Iterator[tuple[tarfile.TarInfo, BinaryIO]]:
+    """ read a tar stream and yield its regular files, other members like
+    directories and links are left out
+
+    Args:
+        chunks (Iterable[bytes]): chunks of the tar archive
+
+    Yields:
+        tuple[tarfile.TarInfo, BinaryIO]: the member and its content, which must be
+            read before the next member
+    """
+    with tarfile.open(fileobj=ChunkReader(chunks), mode='r|') as tar:
+        for member in tar:
+            if not member.isfile():
+                logger.debug("artifact member %s is not a file, left out", member.name)
+                continue
+            yield member, tar.extractfile(member)
+
+
+def hash_tar(chunks: Iterable[bytes], extract_dir: str = None) -> list[ArtifactFile]:
+    """ compute the sha256 of the files of a tar stream, reading ARCHIVE_CHUNK_SIZE
+    bytes at a time
+
+    Args:
+        chunks (Iterable[bytes]): chunks of the tar archive
+        extract_dir (str, optional): directory to also extract the files to.
+            Defaults to None, not extracted.
+
+    Returns:
+        list[ArtifactFile]: path, hash, size and mode of each file
+
+    Raises:
+        tarfile.TarError: if the tar archive is invalid, or a path is outside of
+            extract_dir
+        OSError: if the extract failed
+    """
+    files = []
+    for member, source in iter_tar_files(chunks):
+        digest = hashlib.sha256()
+        sinks = [HashWriter(digest)]
+        local = None
+        if extract_dir is not None:
+            # reject absolute paths and paths outside of the directory
+            member = tarfile.data_filter(member, extract_dir)
+            target = os.path.join(extract_dir, member.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            local = open(target, 'wb')  # pylint: disable=consider-using-with
+            sinks.append(local)
+        try:
+            shutil.copyfileobj(source, TeeWriter(sinks), c.ARCHIVE_CHUNK_SIZE)
+        finally:
+            if local is not None:
+                local.close()
+        files.append(ArtifactFile(path=member.name, sha256=digest.hexdigest(),
+                                  size=member.size, mode=member.mode & 0o777))
+    return files
+
+
+def format_throughput(name: str, files: int, uploaded: int, size: int,
+                      duration: float) -> str:
+    """ format the result of an artifact upload for the job log
+
+    Args:
+        name (str): name of the manifest
+        files (int): number of files in the artifacts
+        uploaded (int): number of files uploaded, the others were already stored
+        size (int): bytes uploaded
+        duration (float): seconds spent
+
+    Returns:
+        str: message for the job log
+    """
+    mib = 1024 * 1024
+    rate = size / mib / duration if duration > 0 else 0.0
+    return (f"Artifacts uploaded to {name}: {files} files, {uploaded} uploaded "
+            f"({size / mib:.1f} MiB), {files - uploaded} already stored, "
+            f"in {duration:.1f}s, {rate:.1f} MiB/s")
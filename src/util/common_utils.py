@@ -4,6 +4,7 @@ Provide the common utility functions used by all other modules
 import os
 import re
 import collections
+import fnmatch
 import logging
 import yaml
 from dotenv import dotenv_values
@@ -66,6 +67,52 @@ def get_env() -> dict:
     return config
 
 
+def get_int_setting(key: str, default: int, minimum: int = 1,
+                    log_tool: logging.Logger = None) -> int:
+    """Read an integer setting from the env values, e.g. a size or a number of threads.
+
+    Args:
+        key (str): env key
+        default (int): value if not set, invalid or below minimum
+        minimum (int, optional): smallest valid value. Defaults to 1.
+        log_tool (logging.Logger, optional): log tool to warn of an invalid value.
+            Defaults to the logger of this module.
+
+    Returns:
+        int: the setting value
+    """
+    try:
+        value = int(get_env().get(key) or default)
+    except ValueError:
+        (log_tool or logging.getLogger("util.common_utils")).warning(
+            "Invalid value for %s, using %s", key, default)
+        return default
+    return value if value >= minimum else default
+
+
+def match_changes(changed_files: list[str], patterns: list[str]) -> bool:
+    """Check if any of the changed files match any of the path glob patterns.
+    Pattern use fnmatch syntax where * also matches across directories, and a
+    pattern ending with / matches everything under that directory.
+
+    Args:
+        changed_files (list[str]): paths changed, relative to the repository root
+        patterns (list[str]): path glob patterns
+
+    Returns:
+        bool: True if any changed file matches
+    """
+    for pattern in patterns:
+        if pattern.startswith('./'):
+            pattern = pattern[2:]
+        if pattern.endswith('/'):
+            pattern += '*'
+        for changed_file in changed_files:
+            if fnmatch.fnmatchcase(changed_file, pattern):
+                return True
+    return False
+
+
 class UnionFind:
     """ UnionFind Class to Find Separated Group of Related Nodes(jobs)
     """
@@ -313,7 +360,12 @@ class MongoHelper:
 
     @staticmethod
     def _transform_logs(job_name: str = None) -> dict:
-        """Transforms the logs to handle job filtering dynamically."""
+        """Transforms the logs to handle job filtering dynamically. Filtering on a
+        matrix job name keep all of its variants."""
+        job_cond = {"$or": [
+            {"$eq": ["$$job.k", job_name]},
+            {"$eq": [f"$$job.v.{c.FIELD_MATRIX_PARENT}", job_name]},
+        ]}
         return {
             "$map": {
                 "input": f"$job_details_list.{c.FIELD_LOGS}", "as": "log",
@@ -325,14 +377,14 @@ class MongoHelper:
                             "then": {
                                 "$filter": {
                                     "input": f"$$log.{c.FIELD_JOBS}", "as": "job",
-                                    "cond": {"$eq": ["$$job.k", job_name]}
+                                    "cond": job_cond
                                 }
                             } if job_name else f"$$log.{c.FIELD_JOBS}",
                             "else": {
                                 "$filter": {
                                     "input": {"$objectToArray": f"$$log.{c.FIELD_JOBS}"},
                                     "as": "job",
-                                    "cond": {"$eq": ["$$job.k", job_name]}
+                                    "cond": job_cond
                                 }
                             } if job_name else {"$objectToArray": f"$$log.{c.FIELD_JOBS}"},
                         }
@@ -384,6 +436,12 @@ class MongoHelper:
                                     c.FIELD_JOB_ALLOW_FAILURE: f"$$job.v.{c.FIELD_JOB_ALLOW_FAILURE}",
                                     c.FIELD_START_TIME: f"$$job.v.{c.FIELD_START_TIME}",
                                     c.FIELD_COMPLETION_TIME: f"$$job.v.{c.FIELD_COMPLETION_TIME}",
+                                    c.FIELD_MATRIX: f"$$job.v.{c.FIELD_MATRIX}",
+                                    c.FIELD_MATRIX_PARENT: f"$$job.v.{c.FIELD_MATRIX_PARENT}",
+                                    c.FIELD_FAILURE_REASON:
+                                        f"$$job.v.{c.FIELD_FAILURE_REASON}",
+                                    c.FIELD_RESOURCE_METRICS:
+                                        f"$$job.v.{c.FIELD_RESOURCE_METRICS}",
                                 },
                             }
                         },
@@ -686,6 +744,7 @@ class PipelineReport:
 
     def print_job_summary(self) -> str:
         """Generate a detailed summary of individual jobs in the pipeline.
+        The variants of a matrix job are grouped under the matrix job name.
 
         Returns:
             str: A formatted string summarizing the jobs in each stage of the pipelines.
@@ -693,7 +752,12 @@ class PipelineReport:
         output_msg = ""
         for pipeline in self.pipeline_data:
             for log in pipeline.get(c.FIELD_LOGS, []):
+                # group the matrix variants under their parent job
+                job_groups = {}
                 for job in log.get(c.FIELD_JOBS, []):
+                    group_name = job.get(c.FIELD_MATRIX_PARENT) or job[c.FIELD_JOB_NAME]
+                    job_groups.setdefault(group_name, []).append(job)
+                for group_name, jobs in job_groups.items():
                     output_msg += f"Pipeline Name: {\
                         pipeline[c.FIELD_PIPELINE_NAME]}\n"
                     output_msg += f"Branch Name: {pipeline[c.FIELD_BRANCH]}\n"
@@ -702,12 +766,48 @@ class PipelineReport:
                     output_msg += f"Git Commit Hash: {\
                         pipeline[c.FIELD_GIT_COMMIT_HASH]}\n"
                     output_msg += f"Stage Name: {log[c.FIELD_STAGE_NAME]}\n"
-                    output_msg += f"Job Name: {job[c.FIELD_JOB_NAME]}\n"
-                    output_msg += f"Job Status: {job[c.FIELD_JOB_STATUS]}\n"
-                    output_msg += f"Allows Failure: {\
-                        job[c.FIELD_JOB_ALLOW_FAILURE]}\n"
-                    output_msg += f"Start Time: {job[c.FIELD_START_TIME]}\n"
-                    output_msg += f"Completion Time: {\
-                        job[c.FIELD_COMPLETION_TIME]}\n\n"
+                    output_msg += f"Job Name: {group_name}\n"
+                    if not jobs[0].get(c.FIELD_MATRIX_PARENT):
+                        output_msg += self._format_job(jobs[0]) + "\n"
+                        continue
+                    output_msg += "Matrix Variants:\n"
+                    for job in jobs:
+                        matrix = job.get(c.FIELD_MATRIX) or {}
+                        output_msg += f"  Variant: {job[c.FIELD_JOB_NAME]} ("
+                        output_msg += ", ".join(f"{key}={value}" for key, value in matrix.items())
+                        output_msg += ")\n"
+                        output_msg += self._format_job(job, indent="  ") + "\n"
+
+        return output_msg
 
+    def _format_job(self, job: dict, indent: str = "") -> str:
+        """Format the status, times, failure reason and resource usage of a job.
+
+        Args:
+            job (dict): job details
+            indent (str, optional): prefix of each line. Defaults to "".
+
+        Returns:
+            str: formatted job details
+        """
+        output_msg = f"{indent}Job Status: {job[c.FIELD_JOB_STATUS]}\n"
+        output_msg += f"{indent}Allows Failure: {job[c.FIELD_JOB_ALLOW_FAILURE]}\n"
+        output_msg += f"{indent}Start Time: {job[c.FIELD_START_TIME]}\n"
+        output_msg += f"{indent}Completion Time: {job[c.FIELD_COMPLETION_TIME]}\n"
+        if job.get(c.FIELD_FAILURE_REASON):
+            output_msg += f"{indent}Failure Reason: {job[c.FIELD_FAILURE_REASON]}\n"
+        metrics = job.get(c.FIELD_RESOURCE_METRICS)
+        if metrics:
+            mib = 1024 * 1024
+            cpu, memory = metrics['cpu_percent'], metrics['memory_bytes']
+            output_msg += (f"{indent}CPU (%): min {cpu['min']:.1f}, avg {cpu['avg']:.1f}, "
+                           f"peak {cpu['peak']:.1f}\n")
+            output_msg += (f"{indent}Memory (MiB): min {memory['min'] / mib:.1f}, "
+                           f"avg {memory['avg'] / mib:.1f}, peak {memory['peak'] / mib:.1f}\n")
+            output_msg += (f"{indent}Block I/O (MiB): read {metrics['block_read_bytes'] / mib:.1f}, "
+                           f"write {metrics['block_write_bytes'] / mib:.1f}\n")
+            output_msg += (f"{indent}Network (MiB): rx {metrics['net_rx_bytes'] / mib:.1f}, "
+                           f"tx {metrics['net_tx_bytes'] / mib:.1f}\n")
+            output_msg += (f"{indent}Resource Samples: {metrics['samples']} every "
+                           f"{metrics['interval']:g}s, overhead {metrics['overhead']:.2f}s\n")
         return output_msg
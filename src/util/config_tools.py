@@ -2,6 +2,9 @@
 validate and process the content of pipeline_configuration 
 """
 import collections
+import copy
+import itertools
+import re
 import util.constant as c
 from util.model import (ValidationResult)
 from util.common_utils import (get_logger, UnionFind, TopoSort)
@@ -55,6 +58,13 @@ class ConfigChecker:
         result_flag = True
         result_error_msg = ""
         processed_pipeline_config = {}
+        # Expand the matrix jobs, each variant is then validated as an ordinary job
+        matrix_flag, matrix_error, pipeline_config = self._expand_matrix_jobs(
+                pipeline_config,
+                error_lc
+            )
+        if not matrix_flag:
+            return ValidationResult(valid=False, error_msg=matrix_error, pipeline_config={})
         # First check global section
         global_flag, global_error = self._check_global_section(
                 pipeline_config,
@@ -83,6 +93,110 @@ class ConfigChecker:
             )
         return validation_res
 
+    def _expand_matrix_jobs(self, pipeline_config: dict,
+                            error_lc: bool = False) -> tuple[bool, str, dict]:
+        """ expand each job with a matrix key into one job per combination of the
+        matrix values, named after the job and the values. References to
+        ${{ matrix.<key> }} in the job are replaced by the values of the variant,
+        and needs on the job are replaced by needs on all of its variants.
+        Jobs already expanded (with matrix_parent) are kept as is.
+
+        Args:
+            pipeline_config (dict): given pipeline_config
+            error_lc (bool, optional): boolean flag indicate if lines and columns
+                information available for error tracking, Defaults to False
+
+        Returns:
+            tuple[bool, str, dict]: first variable is a boolean indicator if the check
+            passed, second variable is the str of the error message combined, third
+            variable is the pipeline_config with the variants in place of the matrix
+            jobs, the given pipeline_config itself if there is no matrix job.
+        """
+        jobs_section = pipeline_config.get(c.KEY_JOBS)
+        if not isinstance(jobs_section, dict) or not any(
+                isinstance(config, dict) and c.JOB_SUBKEY_MATRIX in config
+                and c.JOB_SUBKEY_MATRIX_PARENT not in config
+                for config in jobs_section.values()):
+            return (True, "", pipeline_config)
+        result_flag = True
+        result_error_msg = ""
+        expanded_config = copy.deepcopy(pipeline_config)
+        expanded_jobs = {}
+        variants = {}
+        for job, config in expanded_config[c.KEY_JOBS].items():
+            if not isinstance(config, dict) or c.JOB_SUBKEY_MATRIX not in config or \
+                    c.JOB_SUBKEY_MATRIX_PARENT in config:
+                expanded_jobs[job] = config
+                continue
+            err_prefix = ""
+            if error_lc and hasattr(config, 'lc'):
+                err_prefix = f"{self.file_name}:{config.lc.line}:{config.lc.col} "
+            err_prefix += f"{c.KEY_JOBS}:{job} "
+            matrix = config.pop(c.JOB_SUBKEY_MATRIX)
+            if not isinstance(matrix, dict) or not matrix or not all(
+                    re.fullmatch(r'\w+', str(key)) and isinstance(values, list) and values
+                    for key, values in matrix.items()):
+                result_flag = False
+                result_error_msg += err_prefix + f"{c.JOB_SUBKEY_MATRIX} must map each "
+                result_error_msg += "variable name to a non-empty list of values\n"
+                continue
+            variants[job] = []
+            for values in itertools.product(*matrix.values()):
+                combination = {str(key): str(value) for key, value in zip(matrix, values)}
+                variant = job + '-' + '-'.join(
+                    re.sub(r'[^A-Za-z0-9_-]', '_', value) for value in combination.values())
+                variant_config = copy.deepcopy(config)
+                unknown_keys = self._substitute_matrix(variant_config, combination)
+                if unknown_keys:
+                    result_flag = False
+                    result_error_msg += err_prefix + "undefined matrix variable "
+                    result_error_msg += f"{', '.join(sorted(unknown_keys))}\n"
+                if variant in expanded_jobs or variant in jobs_section:
+                    result_flag = False
+                    result_error_msg += err_prefix + f"matrix job name {variant} is not unique\n"
+                variant_config[c.JOB_SUBKEY_MATRIX] = combination
+                variant_config[c.JOB_SUBKEY_MATRIX_PARENT] = job
+                expanded_jobs[variant] = variant_config
+                variants[job].append(variant)
+        # a job needing a matrix job needs all of its variants
+        for config in expanded_jobs.values():
+            needs = config.get(c.JOB_SUBKEY_NEEDS) if isinstance(config, dict) else None
+            if isinstance(needs, list) and any(need in variants for need in needs):
+                expanded_needs = []
+                for need in needs:
+                    expanded_needs.extend(variants.get(need, [need]))
+                needs.clear()
+                needs.extend(expanded_needs)
+        expanded_config[c.KEY_JOBS] = expanded_jobs
+        return (result_flag, result_error_msg, expanded_config)
+
+    def _substitute_matrix(self, config: dict | list, combination: dict) -> set:
+        """ replace the ${{ matrix.<key> }} references in all string values of
+        the job configuration, in-place
+
+        Args:
+            config (dict | list): job configuration or one of its nested values
+            combination (dict): matrix values of the variant
+
+        Returns:
+            set: referenced keys not defined in the matrix
+        """
+        unknown_keys = set()
+
+        def replace(match: re.Match) -> str:
+            if match.group(1) not in combination:
+                unknown_keys.add(match.group(1))
+                return match.group(0)
+            return combination[match.group(1)]
+
+        items = config.items() if isinstance(config, dict) else enumerate(config)
+        for key, value in list(items):
+            if isinstance(value, str):
+                config[key] = re.sub(c.REGEX_MATRIX_REF, replace, value)
+            elif isinstance(value, (dict, list)):
+                unknown_keys.update(self._substitute_matrix(value, combination))
+        return unknown_keys
+
     def _check_individual_config(self, sub_key: str,
                                  config_dict: dict,
                                  res_dict: dict,
@@ -133,7 +247,7 @@ class ConfigChecker:
             try:
                 element = config_dict[sub_key]
                 res_dict[sub_key] = expected_type(element)
-            except ValueError:
+            except (ValueError, TypeError):
                 result_flag = False
                 if error_lc:
                     if element is not None and hasattr(element, 'lc'):
@@ -211,6 +325,42 @@ class ConfigChecker:
                 result_flag = result_flag and flag
                 result_error_msg += error
 
+            # Check optional execution keys, only recorded when defined so the
+            # model defaults apply otherwise
+            sub_key_list = [c.KEY_MAX_CONCURRENCY, c.KEY_DAG_MODE, c.KEY_TIMEOUT,
+                            c.KEY_LOG_BUFFER_SIZE, c.KEY_LEGACY_STATUS, c.KEY_EXECUTOR]
+            expected_type = [int, bool, int, int, bool, str]
+            for sub_key, etype in zip(sub_key_list, expected_type):
+                if sub_key not in global_config:
+                    continue
+                flag, error = self._check_individual_config(
+                            sub_key=sub_key,
+                            config_dict=global_config,
+                            res_dict=processed_section,
+                            expected_type=etype,
+                            error_prefix=error_prefix,
+                            error_lc=error_lc
+                        )
+                result_flag = result_flag and flag
+                result_error_msg += error
+            if result_flag and processed_section.get(c.KEY_MAX_CONCURRENCY, 1) < 1:
+                result_flag = False
+                result_error_msg += error_prefix
+                result_error_msg += f"{c.KEY_MAX_CONCURRENCY} must be at least 1\n"
+            if result_flag and processed_section.get(c.KEY_TIMEOUT, 1) < 1:
+                result_flag = False
+                result_error_msg += error_prefix
+                result_error_msg += f"{c.KEY_TIMEOUT} must be at least 1 second\n"
+            if result_flag and processed_section.get(c.KEY_LOG_BUFFER_SIZE, 1) < 1:
+                result_flag = False
+                result_error_msg += error_prefix
+                result_error_msg += f"{c.KEY_LOG_BUFFER_SIZE} must be at least 1\n"
+            if result_flag and \
+                    processed_section.get(c.KEY_EXECUTOR, c.EXECUTOR_CONTAINER) not in c.EXECUTORS:
+                result_flag = False
+                result_error_msg += error_prefix
+                result_error_msg += f"{c.KEY_EXECUTOR} must be one of {c.EXECUTORS}\n"
+
             # Prepare to return
             processed_config[sec_key] = processed_section
             return (result_flag, result_error_msg)
@@ -252,10 +402,17 @@ class ConfigChecker:
             result_flag = result_flag and flag
             result_error_msg += error
 
+            # Each stage entry is either the stage name, or a mapping with
+            # the stage name and optional changes and snapshot
+            flag, error, stage_list, stage_options = self._check_stage_entries(
+                processed_section[c.KEY_STAGES], error_lc)
+            result_flag = result_flag and flag
+            result_error_msg += error
+
             # Check for duplicate stage name
             if result_flag and c.KEY_STAGES in pipeline_config:
                 stage_set = set()
-                for stage in pipeline_config[c.KEY_STAGES]:
+                for stage in stage_list:
                     if stage in stage_set:
                         err_msg = ""
                         if error_lc and hasattr(pipeline_config[c.KEY_STAGES], 'lc'):
@@ -267,7 +424,6 @@ class ConfigChecker:
 
             # Next check, assign jobs to stages, validate each stages have at least one job
             # and each job are assigned to a valid stages
-            stage_list = processed_section[c.KEY_STAGES]
             jobs_section = pipeline_config[c.KEY_JOBS]
             flag, error, processed_stages = self._check_stages_jobs_relationship(
                     stage_list,
@@ -278,13 +434,25 @@ class ConfigChecker:
             result_error_msg += error
 
             # Next check, for each stage, verify the dependencies are correct
-            for stage, job_list in processed_stages.items():
+            # in dag mode, jobs can also depends on jobs from earlier stages
+            dag_mode = processed_config.get(c.KEY_GLOBAL, {}).get(c.KEY_DAG_MODE, False)
+            stage_job_lists = list(processed_stages.items())
+            upstream_jobs = set()
+            for stage, job_list in stage_job_lists:
                 flag, error, dependency_dict = self._check_jobs_dependencies(
-                    stage, job_list, jobs_section, error_lc)
+                    stage, job_list, jobs_section, error_lc,
+                    upstream_jobs if dag_mode else None)
                 result_flag = result_flag and flag
                 result_error_msg += error
                 processed_stages[stage] = dependency_dict
-
+                upstream_jobs.update(job_list)
+
+            if dag_mode and result_flag:
+                processed_config[c.KEY_JOB_GRAPH] = self._build_pipeline_graph(
+                    stage_job_lists, jobs_section)
+            for stage, options in stage_options.items():
+                if stage in processed_stages:
+                    processed_stages[stage].update(options)
             processed_config[c.KEY_STAGES] = processed_stages
             return (result_flag, result_error_msg)
 
@@ -294,6 +462,62 @@ class ConfigChecker:
             self.logger.warning(err_msg)
             return (False, "Parsing stage section, unexpected error occur")
 
+    def _check_stage_entries(self, stage_entries: list,
+                             error_lc: bool = False) -> tuple[bool, str, list, dict]:
+        """ check the entries of the stages list, an entry can be a stage name,
+        or a mapping with the stage name, the optional changes (list of path glob)
+        and the optional snapshot flag
+
+        Args:
+            stage_entries (list): entries of the stages list
+            error_lc (bool, optional): boolean flag indicate if lines and columns
+                information available for error tracking, Defaults to False
+
+        Returns:
+            tuple[bool, str, list, dict]: first indicate if the check passed,
+            second is the error message, third is the list of stage names,
+            forth is the dictionary of stage name and its optional keys defined
+        """
+        result_flag = True
+        result_error_msg = ""
+        stage_list = []
+        stage_options = {}
+        for entry in stage_entries:
+            if not isinstance(entry, dict):
+                stage_list.append(entry)
+                continue
+            error_prefix = "Error in section:stages "
+            flag, error = self._check_individual_config(
+                sub_key=c.KEY_STAGE_NAME,
+                config_dict=entry,
+                res_dict={},
+                error_prefix=error_prefix,
+                error_lc=error_lc
+            )
+            if not flag:
+                result_flag = False
+                result_error_msg += error
+                continue
+            stage_name = entry[c.KEY_STAGE_NAME]
+            stage_list.append(stage_name)
+            options = {}
+            for sub_key, etype in [(c.KEY_CHANGES, list), (c.KEY_SNAPSHOT, bool)]:
+                if sub_key not in entry:
+                    continue
+                flag, error = self._check_individual_config(
+                    sub_key=sub_key,
+                    config_dict=entry,
+                    res_dict=options,
+                    expected_type=etype,
+                    error_prefix=error_prefix + f"stage:{stage_name} ",
+                    error_lc=error_lc
+                )
+                result_flag = result_flag and flag
+                result_error_msg += error
+            if options:
+                stage_options[stage_name] = options
+        return (result_flag, result_error_msg, stage_list, stage_options)
+
     def _check_stages_jobs_relationship(
         self,
         stage_list: list[str],
@@ -362,9 +586,11 @@ class ConfigChecker:
     def _check_jobs_dependencies(self, stage_name:str,
                                  job_list: list|set,
                                  jobs_dict: dict,
-                                 error_lc: bool = False) -> tuple[bool, str, dict]:
+                                 error_lc: bool = False,
+                                 upstream_jobs: set = None) -> tuple[bool, str, dict]:
         """ check dependencies for the jobs within the same stage. 
-            no jobs should depends on jobs not defined in current stage
+            no jobs should depends on jobs not defined in current stage,
+            unless upstream_jobs is given (dag mode)
             no cycle allowed for the group of jobs
 
         Args:
@@ -374,6 +600,8 @@ class ConfigChecker:
                 will have lc property if passed directly from yaml
             error_lc (bool, optional): boolean flag indicate if lines and columns
                 information available for error tracking, Defaults to False
+            upstream_jobs (set, optional): jobs of earlier stages that can be needed
+                by jobs in this stage. Defaults to None, no cross stage dependency allowed.
 
         Returns:
             tuple[bool, str, dict]: tuple of three return value
@@ -418,12 +646,18 @@ class ConfigChecker:
                         result_error_msg += err
                         continue
                     if need not in adjacency_list:
+                        # cross stage dependency is handled by the pipeline graph
+                        if upstream_jobs is not None and need in upstream_jobs:
+                            continue
                         result_flag = False
                         err = ""
                         if error_lc and hasattr(job_needs, 'lc'):
                             err = f"{self.file_name}:{job_needs.lc.line}:{job_needs.lc.col} "
                         err += f"Error in stage:{stage_name}-Job:{job} depends on "
-                        err += f"job:{need} outside of this stage\n"
+                        if upstream_jobs is None:
+                            err += f"job:{need} outside of this stage\n"
+                        else:
+                            err += f"job:{need} not defined in this or earlier stages\n"
                         result_error_msg += err
                         continue
                     adjacency_list[need].append(job)
@@ -447,6 +681,35 @@ class ConfigChecker:
                     {}
                 )
 
+    def _build_pipeline_graph(self, stage_job_lists: list, jobs_dict: dict) -> dict:
+        """ build the pipeline wide dependency graph used in dag mode. A job that
+        defines needs depends only on the jobs listed, which can be in the same or
+        earlier stages. A job without needs key depends on all jobs of the previous
+        stage, so the stage barrier still applies unless a job opts in.
+
+        Args:
+            stage_job_lists (list): list of (stage, job_list) tuples in stage order
+            jobs_dict (dict): dictionary of jobs(key) and jobs config(value)
+
+        Returns:
+            dict: adjacency list of all jobs, key is required by the jobs in the value
+        """
+        pipeline_graph = {}
+        for _, job_list in stage_job_lists:
+            for job in sorted(job_list):
+                pipeline_graph[job] = []
+        previous_jobs = []
+        for _, job_list in stage_job_lists:
+            for job in sorted(job_list):
+                if c.JOB_SUBKEY_NEEDS in jobs_dict[job]:
+                    job_needs = jobs_dict[job][c.JOB_SUBKEY_NEEDS]
+                else:
+                    job_needs = previous_jobs
+                for need in job_needs:
+                    pipeline_graph[need].append(job)
+            previous_jobs = sorted(job_list)
+        return pipeline_graph
+
     def _group_n_sort(
             self,
             stage_name:str,
@@ -620,6 +883,47 @@ class ConfigChecker:
                     result_flag = result_flag and flag
                     result_error_msg += error
                     processed_job[c.JOB_SUBKEY_ARTIFACT] = artifact_config
+                # Check inputs, changes and setup, optional, only recorded when defined
+                for sub_key in [c.JOB_SUBKEY_INPUTS, c.KEY_CHANGES, c.JOB_SUBKEY_SETUP]:
+                    if sub_key not in config:
+                        continue
+                    flag, error = self._check_individual_config(
+                        sub_key=sub_key,
+                        config_dict=config,
+                        res_dict=processed_job,
+                        expected_type=list,
+                        error_prefix=job_error_prefix,
+                        error_lc=error_lc
+                    )
+                    result_flag = result_flag and flag
+                    result_error_msg += error
+                # Check dependency cache, optional, only recorded when defined
+                if c.JOB_SUBKEY_CACHE in config:
+                    flag, error = self._check_cache_config(
+                        config, processed_job, job_error_prefix, error_lc)
+                    result_flag = result_flag and flag
+                    result_error_msg += error
+                # Check timeout in seconds, optional, only recorded when defined
+                if c.KEY_TIMEOUT in config:
+                    flag, error = self._check_individual_config(
+                        sub_key=c.KEY_TIMEOUT,
+                        config_dict=config,
+                        res_dict=processed_job,
+                        expected_type=int,
+                        error_prefix=job_error_prefix,
+                        error_lc=error_lc
+                    )
+                    if flag and processed_job[c.KEY_TIMEOUT] < 1:
+                        flag = False
+                        error = job_error_prefix + f"{c.KEY_TIMEOUT} must be at least 1 second\n"
+                    result_flag = result_flag and flag
+                    result_error_msg += error
+                # Matrix variant, values and parent job are set by _expand_matrix_jobs
+                if c.JOB_SUBKEY_MATRIX_PARENT in config and \
+                        isinstance(config.get(c.JOB_SUBKEY_MATRIX), dict):
+                    processed_job[c.JOB_SUBKEY_MATRIX] = dict(config[c.JOB_SUBKEY_MATRIX])
+                    processed_job[c.JOB_SUBKEY_MATRIX_PARENT] = str(
+                        config[c.JOB_SUBKEY_MATRIX_PARENT])
                 # Update processed job info
                 processed_section[job] = processed_job
             if result_flag:
@@ -631,3 +935,62 @@ class ConfigChecker:
             self.logger.warning(f"Error in parsing job sections, exception msg is {e}\n"
                                 )
             return (False, "Parsing jobs section, unexpected error occur")
+
+    def _check_cache_config(self, config: dict, processed_job: dict,
+                            job_error_prefix: str,
+                            error_lc: bool = False) -> tuple[bool, str]:
+        """ check the dependency cache section of a job, with the key template and
+        the paths to cache, and optionally the prefixes of the keys to restore from
+
+        Args:
+            config (dict): given job config
+            processed_job (dict): processed job config. Will be modified in-place
+            job_error_prefix (str): prefix for error message
+            error_lc (bool, optional): boolean flag indicate if lines and columns
+                information available for error tracking, Defaults to False
+
+        Returns:
+            tuple[bool, str]: first variable is a boolean indicator if the check passed,
+            second variable is the str of the error message combined.
+        """
+        cache_dict = config[c.JOB_SUBKEY_CACHE]
+        if not isinstance(cache_dict, dict):
+            err = ""
+            if error_lc and hasattr(config, 'lc'):
+                err = f"{self.file_name}:{config.lc.line}:{config.lc.col} "
+            return False, err + job_error_prefix + \
+                f"{c.JOB_SUBKEY_CACHE} must define {c.CACHE_SUBKEY_KEY} and " \
+                f"{c.CACHE_SUBKEY_PATHS}\n"
+        result_flag = True
+        result_error_msg = ""
+        cache_config = {}
+        for sub_key, etype in [(c.CACHE_SUBKEY_KEY, str), (c.CACHE_SUBKEY_PATHS, list)]:
+            flag, error = self._check_individual_config(
+                sub_key=sub_key,
+                config_dict=cache_dict,
+                res_dict=cache_config,
+                expected_type=etype,
+                error_prefix=job_error_prefix,
+                error_lc=error_lc
+            )
+            result_flag = result_flag and flag
+            result_error_msg += error
+        if result_flag and (not cache_config[c.CACHE_SUBKEY_KEY].strip() or
+                            not cache_config[c.CACHE_SUBKEY_PATHS]):
+            result_flag = False
+            result_error_msg += job_error_prefix + \
+                f"{c.JOB_SUBKEY_CACHE} {c.CACHE_SUBKEY_KEY} and {c.CACHE_SUBKEY_PATHS} " \
+                "must not be empty\n"
+        if c.CACHE_SUBKEY_RESTORE_KEYS in cache_dict:
+            flag, error = self._check_individual_config(
+                sub_key=c.CACHE_SUBKEY_RESTORE_KEYS,
+                config_dict=cache_dict,
+                res_dict=cache_config,
+                expected_type=list,
+                error_prefix=job_error_prefix,
+                error_lc=error_lc
+            )
+            result_flag = result_flag and flag
+            result_error_msg += error
+        processed_job[c.JOB_SUBKEY_CACHE] = cache_config
+        return result_flag, result_error_msg
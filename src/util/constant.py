@@ -28,6 +28,7 @@ FIELD_JOB_RUN_HISTORY = 'job_run_history'
 FIELD_ACTIVE = 'active'
 FIELD_RUNNING = 'running'
 FIELD_LAST_COMMIT_HASH = 'last_commit_hash'
+FIELD_LAST_SUCCESS_COMMIT_HASH = 'last_success_commit_hash'
 
 # Fields for `jobs_history` Table
 FIELD_RUN_NUMBER = 'run_number'
@@ -44,6 +45,16 @@ FIELD_JOB_NAME = 'job_name'
 FIELD_JOB_STATUS = 'job_status'
 FIELD_JOB_ALLOW_FAILURE = 'allow_failure'
 FIELD_JOB_LOGS = 'job_logs'
+FIELD_RESUMED_FROM = 'resumed_from'
+FIELD_RETAIN_UNTIL = 'retain_until'
+FIELD_WORKSPACE_RUN = 'workspace_run'
+FIELD_IMAGE_PULLS = 'image_pulls'
+FIELD_CACHE_STATUS = 'cache_status'
+FIELD_FAILURE_REASON = 'failure_reason'
+FIELD_RESOURCE_METRICS = 'resource_metrics'
+FIELD_MATRIX = 'matrix'
+FIELD_MATRIX_PARENT = 'matrix_parent'
+FIELD_ARTIFACT_MANIFEST = 'artifact_manifest'
 
 # Job and Stage Statuses
 STATUS_PENDING = 'pending'
@@ -51,6 +62,29 @@ STATUS_COMPLETE = 'complete'
 STATUS_SUCCESS = 'success'
 STATUS_FAILED = 'failed'
 STATUS_CANCELLED = 'cancelled'
+STATUS_SKIPPED = 'skipped'
+STATUS_TIMEOUT = 'timeout'
+
+# Job Cache Statuses
+CACHE_HIT = 'hit'
+CACHE_MISS = 'miss'
+# dependency cache volume restored from the nearest key
+CACHE_RESTORED = 'restored'
+# failure reason of a job whose container was killed for out of memory
+FAILURE_OOM = 'oom'
+
+# Image pull policies and statuses
+PULL_ALWAYS = 'always'
+PULL_MISSING = 'missing'
+PULL_NEVER = 'never'
+PULL_POLICIES = [PULL_ALWAYS, PULL_MISSING, PULL_NEVER]
+PULL_PULLED = 'pulled'
+PULL_PRESENT = 'present'
+
+# Job executors
+EXECUTOR_CONTAINER = 'container'
+EXECUTOR_EXEC = 'exec'
+EXECUTORS = [EXECUTOR_CONTAINER, EXECUTOR_EXEC]
 
 # Pipeline Configurations
 DEFAULT_DOCKER_REGISTRY = 'dockerhub'
@@ -64,13 +98,30 @@ KEY_DOCKER = 'docker'
 KEY_DOCKER_REG = 'registry'
 KEY_DOCKER_IMG = 'image'
 KEY_ARTIFACT_PATH = 'artifact_upload_path'
+KEY_MAX_CONCURRENCY = 'max_concurrency'
+KEY_DAG_MODE = 'dag_mode'
 KEY_JOB_GRAPH = 'job_graph'
 KEY_JOB_ORDER = 'job_groups'
+KEY_STAGE_NAME = 'name'
+KEY_CHANGES = 'changes'
+KEY_SNAPSHOT = 'snapshot'
+KEY_TIMEOUT = 'timeout'
+KEY_LOG_BUFFER_SIZE = 'log_buffer_size'
+KEY_LEGACY_STATUS = 'legacy_status_check'
+KEY_EXECUTOR = 'executor'
 JOB_SUBKEY_STAGE = 'stage'
 JOB_SUBKEY_ALLOW = 'allow_failure'
 JOB_SUBKEY_NEEDS = 'needs'
 JOB_SUBKEY_SCRIPTS = 'scripts'
 JOB_SUBKEY_ARTIFACT = 'artifacts'
+JOB_SUBKEY_INPUTS = 'inputs'
+JOB_SUBKEY_MATRIX = 'matrix'
+JOB_SUBKEY_MATRIX_PARENT = 'matrix_parent'
+JOB_SUBKEY_CACHE = 'cache'
+JOB_SUBKEY_SETUP = 'setup'
+CACHE_SUBKEY_KEY = 'key'
+CACHE_SUBKEY_PATHS = 'paths'
+CACHE_SUBKEY_RESTORE_KEYS = 'restore_keys'
 ARTIFACT_SUBKEY_ONSUCCESS = 'on_success_only'
 ARTIFACT_SUBKEY_PATH = 'paths'
 RETURN_KEY_VALID = 'valid'
@@ -95,4 +146,120 @@ DEFAULT_STR = ""
 DEFAULT_LIST = []
 DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 DEFAULT_DOCKER_DIR = '/app'
+DEFAULT_MAX_CONCURRENCY = 1
+DEFAULT_CACHE_DIR = '.cicd-cache'
+ENV_CACHE_BUCKET = 'CICD_CACHE_BUCKET'
+DEFAULT_VOL_RETENTION = 24 * 60 * 60
+DEFAULT_PULL_POLICY = PULL_MISSING
+DEFAULT_PULL_WORKERS = 4
+# command keeping the warm containers of the exec executor running
+POOL_CONTAINER_COMMAND = ['tail', '-f', '/dev/null']
+# environment variable marking the processes of a job of the exec executor, a
+# stopped job has its processes killed, TERM then KILL after the grace seconds,
+# without stopping the warm container shared with the other jobs
+EXEC_JOB_ENV = 'CID_EXEC_JOB'
+EXEC_STOP_GRACE = 2
+EXEC_KILL_SCRIPT = (
+    'signal_job() { for proc in /proc/[0-9]*; do '
+    'tr "\\0" "\\n" 2>/dev/null < "$proc/environ" | grep -qxF "$1" '
+    '&& kill -s "$2" "${proc#/proc/}" 2>/dev/null; done; }; '
+    'signal_job "$1" TERM; sleep "$2"; signal_job "$1" KILL')
+# workspace seeding and stage snapshots
+SEED_CONTAINER_SUFFIX = '-seed'
+SNAPSHOT_VOL_SUFFIX = '-snapshot'
+COPY_CONTAINER_SUFFIX = '-copy'
+COPY_SRC_DIR = '/cid-src'
+COPY_DST_DIR = '/cid-dst'
+COPY_VOL_COMMAND = f"cp -a {COPY_SRC_DIR}/. {COPY_DST_DIR}/"
+ARCHIVE_CHUNK_SIZE = 64 * 1024
+# s3 transfers, size of the parts of the multipart upload (5 MiB minimum for s3)
+S3_PART_SIZE = 8 * 1024 * 1024
+S3_MIN_PART_SIZE_MB = 5
+DEFAULT_S3_THREADS = 4
+DEFAULT_S3_POOL_SIZE = 10
+ENV_S3_PART_SIZE = 'CICD_S3_PART_SIZE_MB'
+ENV_S3_THREADS = 'CICD_S3_THREADS'
+# artifacts are stored as blobs named by content hash, listed by a manifest per job
+ARTIFACT_BLOB_PREFIX = 'blobs/sha256/'
+ARTIFACT_MANIFEST_FILE = 'manifest.json'
+# hex digits of the sha256 shared by the blobs checked with one listing
+ARTIFACT_LIST_PREFIX_LEN = 2
+# labels of the containers and volumes of a run: the run name, to receive the docker
+# events of its job containers, the run identity to reconcile with the jobs history,
+# and the process owning the run as <hostname>:<pid>
+LABEL_RUN = 'cicd.run'
+LABEL_REPO = 'cicd.repo'
+LABEL_BRANCH = 'cicd.branch'
+LABEL_PIPELINE = 'cicd.pipeline'
+LABEL_RUN_NUMBER = 'cicd.run_number'
+LABEL_OWNER = 'cicd.owner'
+# garbage collection of the resources left by crashed runs, removed concurrently in
+# batches, and seconds between the background sweeps of the daemon
+GC_BATCH_SIZE = 20
+GC_WORKERS = 4
+ENV_GC_INTERVAL = 'CICD_GC_INTERVAL'
+EVENT_DIE = 'die'
+EVENT_OOM = 'oom'
 REGEX_SHELL_ERR = r'(sh:\s?)(\d+)(:)'
+# markers written on stderr by the job script around each command
+COMMAND_MARKER = '::cid-command::'
+COMMAND_RC_VAR = 'CID_COMMAND_RC'
+REGEX_COMMAND_MARKER = r'::cid-command::(start|end):(\d+)(?::(\d+))?'
+# job log streaming, characters of log kept in memory per job and full logs location
+DEFAULT_LOG_BUFFER_SIZE = 1024 * 1024
+DEFAULT_LOG_DIR = '.cicd-logs'
+LOG_STDOUT = 'stdout'
+LOG_STDERR = 'stderr'
+# reference to a matrix value in a job, e.g. ${{ matrix.python }}
+REGEX_MATRIX_REF = r'\$\{\{\s*matrix\.(\w+)\s*\}\}'
+MATRIX_ENV_PREFIX = 'MATRIX_'
+# dependency cache volumes living across runs, the key template can reference the
+# hash of repository files, e.g. pip-${{ hashFiles('poetry.lock') }}
+REGEX_HASH_FILES_REF = r'\$\{\{\s*hashFiles\(([^)]*)\)\s*\}\}'
+DEP_CACHE_VOL_INFIX = '-depcache-'
+DEP_CACHE_HOME = '/root'
+RESTORE_CONTAINER_SUFFIX = '-restore'
+DEFAULT_DEP_CACHE_BUDGET_MB = 10 * 1024
+ENV_DEP_CACHE_BUDGET = 'CICD_DEP_CACHE_BUDGET_MB'
+# images committed after the setup scripts of a job, tagged by a hash of the base
+# image and the scripts
+SETUP_IMAGE_REPO = 'cicd-setup'
+SETUP_CONTAINER_SUFFIX = '-setup'
+DEFAULT_SETUP_IMAGE_BUDGET_MB = 20 * 1024
+ENV_SETUP_IMAGE_BUDGET = 'CICD_SETUP_IMAGE_BUDGET_MB'
+# shared docker client, connections kept for the concurrent jobs, timeout in seconds
+# of the API calls, retries of the failed connections with exponential backoff, and
+# seconds a job wait for the docker engine to come back
+DEFAULT_DOCKER_POOL_SIZE = 32
+DEFAULT_DOCKER_TIMEOUT = 120
+DEFAULT_DOCKER_RETRIES = 5
+DOCKER_RETRY_BACKOFF = 0.5
+DOCKER_RETRY_BACKOFF_MAX = 8
+DEFAULT_DOCKER_RECONNECT_WAIT = 60
+ENV_DOCKER_POOL_SIZE = 'CICD_DOCKER_POOL_SIZE'
+ENV_DOCKER_TIMEOUT = 'CICD_DOCKER_TIMEOUT'
+ENV_DOCKER_RETRIES = 'CICD_DOCKER_RETRIES'
+ENV_DOCKER_RECONNECT_WAIT = 'CICD_DOCKER_RECONNECT_WAIT'
+# seconds between the resource samples of a job container, 0 to disable. The
+# interval is doubled up to STATS_MAX_INTERVAL while a sample take longer than
+# STATS_OVERHEAD_RATIO of the interval
+DEFAULT_STATS_INTERVAL = 5
+STATS_MAX_INTERVAL = 60
+STATS_OVERHEAD_RATIO = 0.02
+ENV_STATS_INTERVAL = 'CICD_STATS_INTERVAL'
+
+# Daemon
+DEFAULT_DAEMON_SOCKET = '~/.cicd/cid.sock'
+ENV_DAEMON_SOCKET = 'CICD_DAEMON_SOCKET'
+# commands forwarded to the daemon when it is running, with their queue priority
+# (lower run first)
+DAEMON_COMMANDS = {('pipeline', 'report'): 0, ('pipeline', 'run'): 1}
+# requests executed concurrently, plus one worker kept for the priority 0 requests
+DEFAULT_DAEMON_WORKERS = 4
+DAEMON_REPORT_PRIORITY = 0
+DAEMON_CMD_EXEC = 'exec'
+DAEMON_CMD_STATUS = 'status'
+DAEMON_CMD_STOP = 'stop'
+DAEMON_MSG_OUT = 'out'
+DAEMON_MSG_ERR = 'err'
+DAEMON_MSG_EXIT = 'exit_code'
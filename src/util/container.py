@@ -3,20 +3,39 @@ for execution of pipeline job
 """
 from pathlib import Path
 import copy
+import hashlib
+import json
 import os
+import posixpath
 import re
+import shutil
+import socket
 import tarfile
+import tempfile
+import threading
 import time
 from abc import ABC, abstractmethod
-from shutil import make_archive
+from concurrent.futures import (ThreadPoolExecutor)
+from typing import Callable, Iterable
 import docker
 import docker.errors
 from botocore.exceptions import ClientError
 from docker.models.containers import Container
 import util.constant as c
+from util.artifact_stream import (HashWriter, TeeWriter, format_throughput, hash_tar,
+                                  iter_tar_files)
 from util.common_utils import (get_logger)
-from util.db_artifact import S3Client
-from util.model import (JobConfig, JobLog)
+from util.container_events import (ContainerSupervisor)
+from util.container_stats import (StatsSampler, get_stats_interval)
+from util.db_artifact import (ArtifactStore)
+from util.dep_cache import (DependencyCache)
+from util.docker_client import (DockerClientRegistry)
+from util.job_cache import JobCache
+from util.log_stream import (CommandTracker, JobLogStream)
+from util.resource_gc import (is_retained)
+from util.model import (ArtifactManifest, DepCacheLog, ImagePull, JobConfig, JobLog,
+                        SetupImageLog)
+from util.setup_image import (SetupImageCache)
 
 logger = get_logger("util.docker")
 
@@ -58,12 +77,26 @@ class DockerManager(ContainerManager):
     def __init__(self, client:docker.DockerClient=None,
                  log_tool=logger, repo:str="Repo", 
                  branch:str='main',
-                 pipeline:str="pipeline", run:str="run"):
+                 pipeline:str="pipeline", run:str="run",
+                 job_cache:JobCache=None,
+                 vol_retention:int=c.DEFAULT_VOL_RETENTION,
+                 pipeline_timeout:int=None,
+                 log_buffer_size:int=c.DEFAULT_LOG_BUFFER_SIZE,
+                 log_dir:str=None,
+                 log_handler:Callable[[str, str], None]=None,
+                 legacy_status_check:bool=False,
+                 pull_policy:str=c.DEFAULT_PULL_POLICY,
+                 executor:str=c.EXECUTOR_CONTAINER,
+                 artifact_dir:str=None,
+                 dep_cache:DependencyCache=None,
+                 setup_images:SetupImageCache=None,
+                 stats_interval:float=None):
         """ Initialize the DockerManager
 
         Args:
             client (docker.DockerClient, optional): client for the DockerEngine. 
-                Defaults to None.
+                Defaults to None, which use the client shared by the process, checked
+                before each job and reconnected if the engine restarted.
             log_tool (_type_, optional): logging tool. Defaults to logger.
             repo (str, optional): repo name, use to uniquely identify the volume used. 
                 Defaults to "Repo".
@@ -72,14 +105,105 @@ class DockerManager(ContainerManager):
             pipeline (str, optional): pipeline name, use to uniquely identify the volume used. 
                 Defaults to "pipeline".
             run (str, optional): run, use to uniquely identify the volume used. Defaults to "run".
+            job_cache (JobCache, optional): cache of job results, used for jobs with
+                inputs defined. Defaults to None, no caching.
+            vol_retention (int, optional): seconds a volume kept by remove_vol(retain=True)
+                is retained after the run before removed by remove_expired_vols, the
+                deadline is recorded in the jobs history by the caller.
+                Defaults to DEFAULT_VOL_RETENTION.
+            pipeline_timeout (int, optional): seconds from now after which all jobs
+                are stopped, jobs not started yet are not run. Defaults to None, no limit.
+            log_buffer_size (int, optional): maximum characters of a job log kept in
+                memory and recorded in the JobLog, older output is dropped.
+                Defaults to DEFAULT_LOG_BUFFER_SIZE.
+            log_dir (str, optional): directory to write the complete log of each job.
+                Defaults to None, only the log kept in memory is recorded.
+            log_handler (Callable[[str, str], None], optional): called with the job name
+                and each line of the job output while the job is running.
+                Defaults to None.
+            legacy_status_check (bool, optional): decide the job status by looking for
+                shell errors in stderr instead of the container exit code.
+                Defaults to False.
+            pull_policy (str, optional): when to pull the job images, one of
+                PULL_POLICIES. Defaults to DEFAULT_PULL_POLICY.
+            executor (str, optional): EXECUTOR_CONTAINER run each job in a new container,
+                EXECUTOR_EXEC run the jobs with exec in one long-lived container per image,
+                removed by remove_vol. Defaults to EXECUTOR_CONTAINER.
+            artifact_dir (str, optional): directory to also extract the artifacts to
+                while they are uploaded, in a sub directory per job.
+                Defaults to None, not extracted.
+            dep_cache (DependencyCache, optional): index of the dependency cache
+                volumes, used for jobs with a cache section. Defaults to None, no
+                dependency cache.
+            setup_images (SetupImageCache, optional): index of the setup images, used
+                for jobs with setup scripts. Defaults to None, the setup scripts run
+                before the scripts at each run.
+            stats_interval (float, optional): seconds between the resource samples of
+                the job containers, 0 to disable. Defaults to None, which use the
+                CICD_STATS_INTERVAL env value or DEFAULT_STATS_INTERVAL.
         """
+        # the shared client is replaced when it reconnect
+        self._shared_client = client is None
         if client is None:
-            self.client = docker.from_env()
+            self.client = DockerClientRegistry.get_client()
         else:
             self.client = client
         self.logger = log_tool
-        self.vol_name = repo + '-' + branch + '-' + pipeline + '-' + run
+        self.run_name = repo + '-' + branch + '-' + pipeline + '-' + run
+        # artifacts of the run are stored under <pipeline_prefix>/<run>/
+        self.pipeline_prefix = repo + '-' + branch + '-' + pipeline
+        self.run = run
+        self.repo = repo
+        # labels of the containers and volumes of the run, to find them from the
+        # docker events and collect them if the process die before removing them
+        self.labels = {
+            c.LABEL_RUN: self.run_name,
+            c.LABEL_REPO: repo,
+            c.LABEL_BRANCH: branch,
+            c.LABEL_PIPELINE: pipeline,
+            c.LABEL_RUN_NUMBER: run,
+            c.LABEL_OWNER: f"{socket.gethostname()}:{os.getpid()}"
+        }
+        self._vol_prefix = repo + '-' + branch + '-' + pipeline + '-'
+        self.vol_name = self._vol_prefix + run
+        self.vol_retention = vol_retention
         self.docker_vol = None
+        # copy of the workspace taken by snapshot_vol, each job started while it is
+        # set run in its own volume restored from it
+        self.snapshot = None
+        self.job_cache = job_cache
+        self.log_buffer_size = log_buffer_size
+        self.log_dir = log_dir
+        self.log_handler = log_handler
+        self.legacy_status_check = legacy_status_check
+        self.pull_policy = pull_policy
+        self._pulls = {}
+        self.executor = executor
+        self.artifact_dir = artifact_dir
+        self.dep_cache = dep_cache
+        # dependency cache volumes are created and restored one job at a time
+        self._dep_cache_lock = threading.Lock()
+        self.setup_images = setup_images
+        # the eviction is only needed after the caches were used by this run
+        self._dep_cache_used = False
+        self._setup_images_used = False
+        # a setup image is built once, the jobs needing it wait for the build
+        self._setup_locks = {}
+        self._setup_lock = threading.Lock()
+        # warm containers of the exec executor, by image and cache volumes, and the
+        # key of the container used by each job
+        self._pool = {}
+        self._pool_jobs = {}
+        self._pool_lock = threading.Lock()
+        self._pool_count = 0
+        # subscription to the docker events of the job containers, started on
+        # first use and again if it ended
+        self._supervisor = None
+        self._supervisor_lock = threading.Lock()
+        self.stats_interval = get_stats_interval(stats_interval, log_tool)
+        self.deadline = None
+        if pipeline_timeout is not None:
+            self.deadline = time.monotonic() + pipeline_timeout
 
     def run_job(self, job_name:str, job_config: dict) -> JobLog:
         """ run a single job and return its output. Docker exception 
@@ -98,78 +222,696 @@ class DockerManager(ContainerManager):
         JobConfig.model_validate(job_config)
         # create the vol for the first time
         if self.docker_vol is None:
-            self.docker_vol = self.client.volumes.create(self.vol_name)
+            self.docker_vol = self._create_vol(self.vol_name)
 
         # Extract important values
-        container_name = self.vol_name + '-' + job_name
-        docker_reg = job_config[c.KEY_DOCKER][c.KEY_DOCKER_REG]
-        docker_img = job_config[c.KEY_DOCKER][c.KEY_DOCKER_IMG]
-        # Update docker_img based on docker_reg value
-        if docker_reg != c.DEFAULT_DOCKER_REGISTRY:
-            docker_img = docker_reg + '/' + docker_img
+        container_name = self.run_name + '-' + job_name
+        docker_img = self.get_image_name(job_config)
         upload_path = job_config[c.KEY_ARTIFACT_PATH]
         commands = job_config[c.JOB_SUBKEY_SCRIPTS]
+        setup = job_config.get(c.JOB_SUBKEY_SETUP) or []
+        if self.setup_images is None:
+            # without setup images the setup scripts run with the scripts
+            commands, setup = setup + commands, []
+        # matrix values of a variant are available as environment variables
+        environment = {c.MATRIX_ENV_PREFIX + key.upper(): value
+                       for key, value in (job_config.get(c.JOB_SUBKEY_MATRIX) or {}).items()}
 
         # Prepare return
         job_log_info = copy.deepcopy(job_config)
         job_log_info[c.REPORT_KEY_JOBNAME] = job_name
         job_log_info[c.REPORT_KEY_START] = time.asctime()
         job_log = JobLog.model_validate(job_log_info)
-        output = ""
-        try:
-            container = self.client.containers.run(
-                    image=docker_img,
-                    name=container_name,
-                    command=f"sh -c '{' && '.join(commands)}'",
-                    detach=True,
-                    volumes={
-                        self.vol_name:{
-                            'bind': c.DEFAULT_DOCKER_DIR,
-                            'mode': 'rw'
-                        }
-                    },
-                    working_dir=c.DEFAULT_DOCKER_DIR
-                )
 
-            # Wait for the container to finish, required as we are running in detach mode
-            container.wait()
+        if not self._check_client():
+            job_log.job_logs = f"Job {job_name} not run, docker engine not available"
+            self._echo(job_name, job_log.job_logs)
+            job_log.completion_time = time.asctime()
+            return job_log
+
+        # Wait for the image, pulled in the background if pull_images was called
+        self.pull_images([docker_img])
+        image_pull = self._pulls[docker_img].result()
+        if image_pull.status == c.STATUS_FAILED:
+            job_log.job_logs = f"Fail to get image {docker_img}, {image_pull.error}"
+            self._echo(job_name, job_log.job_logs)
+            job_log.completion_time = time.asctime()
+            return job_log
+
+        # Jobs with inputs defined can be skipped if same result is in the cache
+        cache_key = self._get_cache_key(docker_img, job_config)
+        if cache_key is not None:
+            cached_log, artifact_path = self.job_cache.get(cache_key)
+            # the entry is incomplete if the artifact manifest is missing
+            if cached_log is not None and (artifact_path is not None or
+                                           c.JOB_SUBKEY_ARTIFACT not in job_config):
+                return self._restore_cached_job(job_log, cached_log, artifact_path,
+                                                job_config[c.JOB_SUBKEY_STAGE], upload_path,
+                                                docker_img)
+            job_log.cache_status = c.CACHE_MISS
+        timeout = self._get_timeout(job_config)
+        if timeout is not None and timeout <= 0:
+            job_log.job_status = c.STATUS_TIMEOUT
+            job_log.job_logs = f"Job {job_name} not run, pipeline timeout reached"
+            self._echo(job_name, job_log.job_logs)
+            job_log.completion_time = time.asctime()
+            return job_log
+        log_path = None
+        if self.log_dir is not None:
+            log_path = str(Path(self.log_dir).joinpath(container_name + '.log'))
+        tracker = CommandTracker(commands)
+        stderr_ok = True
 
-            # Retrieve the output from logs, default options will contain both
-            # stdout and stderr, we want to also check the stderr
-            output = container.logs().decode('utf-8')
-            output_stderr = container.logs(stdout=False).decode('utf-8')
+        def stderr_filter(line: str) -> bool:
+            nonlocal stderr_ok
+            if self.legacy_status_check and stderr_ok:
+                stderr_ok = self._check_status_from_log(line)
+            return tracker.parse(line)
 
-            # Note docker container will store some status log in stderr, currently
-            # only way to check if error in execution is to look for the keyword
-            # using the custom _check_status_from_log function
-            job_success = False
-            if self._check_status_from_log(output_stderr):
-                job_success = True
+        log_stream = JobLogStream(
+            self.log_buffer_size, log_path,
+            on_line=None if self.log_handler is None else
+            lambda line: self.log_handler(job_name, line),
+            stderr_filter=stderr_filter)
+        job_vol = None
+        cache_vols = None
+        job_container = None
+        job_success = False
+        try:
+            # start from the stage snapshot in a volume of its own
+            if self.snapshot is not None:
+                job_vol = self._create_vol(container_name)
+                self._copy_vol(self.snapshot.name, job_vol.name, docker_img,
+                               container_name + c.COPY_CONTAINER_SUFFIX)
+            # the job start from the image committed after its setup scripts
+            job_img = docker_img
+            if setup:
+                job_img = self._get_setup_image(
+                    job_name, setup, docker_img, environment,
+                    self.vol_name if job_vol is None else job_vol.name, log_stream, job_log)
+            cache_vols = self._restore_dep_cache(job_name, job_config, docker_img, job_log)
+            command = ["sh", "-c", tracker.script()]
+            exec_id = None
+            supervisor = None
+            if self.executor == c.EXECUTOR_EXEC and job_vol is None:
+                cache_mounts = self._get_cache_mounts(cache_vols)
+                pool_key = job_img + ''.join(sorted(cache_mounts))
+                container = self._get_pool_container(pool_key, job_img, cache_mounts)
+                self._pool_jobs[job_name] = pool_key
+                # the processes of the job are found by stop_job from this variable
+                exec_id = self.client.api.exec_create(
+                    container.id, command,
+                    environment={**environment, c.EXEC_JOB_ENV: job_name},
+                    workdir=c.DEFAULT_DOCKER_DIR)['Id']
+                output = self.client.api.exec_start(exec_id, stream=True, demux=True)
+            else:
+                # subscribed before the container start, so its exit is not missed
+                supervisor = self._get_supervisor()
+                container = self.client.containers.run(
+                        image=job_img,
+                        name=container_name,
+                        command=command,
+                        detach=True,
+                        volumes=self._get_volumes(
+                            self.vol_name if job_vol is None else job_vol.name,
+                            self._get_cache_mounts(cache_vols)),
+                        working_dir=c.DEFAULT_DOCKER_DIR,
+                        environment=environment,
+                        labels=self.labels
+                    )
+                job_container = container
+                output = container.attach(stdout=True, stderr=True, stream=True,
+                                          logs=True, demux=True)
+
+            # Stream the demultiplexed output until the job finish, required as we
+            # are running in detach mode. The watchdog stop the container if it is still
+            # running at the deadline, which end the stream
+            timed_out = threading.Event()
+            watchdog = None
+            if timeout is not None:
+                watchdog = threading.Timer(timeout, self._stop_on_timeout,
+                                           args=(job_name, timed_out))
+                watchdog.daemon = True
+                watchdog.start()
+            # the warm containers of the exec executor are shared by the jobs, only
+            # the containers of a single job are sampled
+            sampler = None
+            if exec_id is None and self.stats_interval > 0:
+                sampler = StatsSampler(container, self.stats_interval, self.logger)
+                sampler.start()
+            try:
+                for stdout, stderr in output:
+                    log_stream.feed(stdout, stderr)
+                if exec_id is not None:
+                    job_log.exit_code = self.client.api.exec_inspect(exec_id).get('ExitCode')
+                else:
+                    job_log.exit_code, oom_killed = self._wait_container(container,
+                                                                         supervisor)
+                    if oom_killed:
+                        job_log.failure_reason = c.FAILURE_OOM
+                        log_stream.write(f"\nJob {job_name} killed, out of memory")
+                log_stream.flush()
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+                if sampler is not None:
+                    job_log.resource_metrics = sampler.stop()
+
+            # The status come from the exit code of the script, which is the exit code of
+            # the first failed command. In legacy mode look for shell errors in stderr
+            # using the custom _check_status_from_log function on each stderr line
+            if self.legacy_status_check:
+                job_success = stderr_ok
+            else:
+                job_success = job_log.exit_code == 0
+            job_success = job_success and not timed_out.is_set()
 
             if c.JOB_SUBKEY_ARTIFACT in job_config:
                 upload_config = job_config[c.JOB_SUBKEY_ARTIFACT]
                 if job_success or not upload_config[c.ARTIFACT_SUBKEY_ONSUCCESS]:
                     indicator, msg = self._upload_artifact(container,
                                                         upload_path,
-                                                        upload_config[c.ARTIFACT_SUBKEY_PATH]
+                                                        upload_config[c.ARTIFACT_SUBKEY_PATH],
+                                                        job_name,
+                                                        job_config[c.JOB_SUBKEY_STAGE],
+                                                        cache_key=cache_key if job_success else None
                                                         )
                     job_success = job_success and indicator
-                    output += msg
+                    if indicator:
+                        job_log.artifact_manifest = ArtifactStore.manifest_key(
+                            self.pipeline_prefix, self.run,
+                            job_config[c.JOB_SUBKEY_STAGE], job_name)
+                    log_stream.write(msg)
             if job_success:
                 job_log.job_status = c.STATUS_SUCCESS
-            # Clean up container
-            container.remove()
+            elif timed_out.is_set():
+                job_log.job_status = c.STATUS_TIMEOUT
+                log_stream.write(
+                    f"\nJob {job_name} stopped after timeout of {timeout:.0f} seconds")
+            # Clean up container, the warm container is kept for the next jobs
+            if exec_id is None:
+                container.remove()
         except docker.errors.DockerException as de:
             # If caught DockerException
             self.logger.warning(f"Job run fail for {job_name}, exception is {de}")
-        # Add completion time and log to job_log
+            # the container of the job is removed even if it is still running
+            if job_container is not None:
+                try:
+                    job_container.remove(force=True)
+                except docker.errors.DockerException as rde:
+                    self.logger.warning(f"failed to remove container {job_container.name}, "
+                                        f"{rde}")
+        finally:
+            log_stream.close()
+            self._pool_jobs.pop(job_name, None)
+            if job_vol is not None:
+                self._remove_vol(job_vol)
+            if cache_vols is not None:
+                self._save_dep_cache(cache_vols, job_success, job_log)
+        # Add completion time, commands results and log to job_log
+        job_log.commands = tracker.finish()
         job_log.completion_time = time.asctime()
-        job_log.job_logs = output
+        job_log.job_logs = log_stream.text
+        job_log.log_file = log_path
+        # Only successful result is cached
+        if cache_key is not None and job_log.job_status == c.STATUS_SUCCESS:
+            self.job_cache.put(cache_key, job_log)
 
         return job_log
 
+    def _get_supervisor(self) -> ContainerSupervisor | None:
+        """ get the supervisor of the job containers of the run, subscribed to the
+        docker events on first use, and again if the subscription ended
+
+        Returns:
+            ContainerSupervisor | None: the supervisor, None if the subscription failed
+        """
+        with self._supervisor_lock:
+            if self._supervisor is None or not self._supervisor.alive:
+                supervisor = ContainerSupervisor(self.client, self.run_name, self.logger)
+                self._supervisor = supervisor if supervisor.start() else None
+            return self._supervisor
+
+    def _wait_container(self, container:Container,
+                        supervisor:ContainerSupervisor|None) -> tuple[int | None, bool]:
+        """ wait for a job container to exit, from its die event if the supervisor
+        receive the events, otherwise with a wait call and the container state
+
+        Args:
+            container (Container): job container
+            supervisor (ContainerSupervisor | None): supervisor subscribed before
+                the container started
+
+        Returns:
+            tuple[int | None, bool]: exit code, and if the container was killed for
+                out of memory
+        """
+        if supervisor is not None:
+            result = supervisor.wait(container.id)
+            if result is not None:
+                return result
+        exit_code = container.wait().get('StatusCode')
+        try:
+            container.reload()
+            oom_killed = (container.attrs.get('State') or {}).get('OOMKilled') is True
+        except docker.errors.DockerException as de:
+            self.logger.debug(f"Fail to inspect container {container.name}, {de}")
+            oom_killed = False
+        return exit_code, oom_killed
+
+    def stop_supervisor(self) -> None:
+        """ end the subscription to the docker events of the run
+        """
+        with self._supervisor_lock:
+            supervisor, self._supervisor = self._supervisor, None
+        if supervisor is not None:
+            supervisor.stop()
+
+    def _check_client(self) -> bool:
+        """ check the docker engine answer before a job, waiting for it to come back
+        and using the reconnected client if it restarted. A client given to the
+        DockerManager is not checked.
+
+        Returns:
+            bool: True if the docker engine is available
+        """
+        if not self._shared_client:
+            return True
+        if not DockerClientRegistry.check_health():
+            return False
+        self.client = DockerClientRegistry.get_client()
+        return True
+
+    def _get_setup_image(self, job_name:str, setup:list[str], docker_img:str,
+                         environment:dict, vol_name:str, log_stream:JobLogStream,
+                         job_log:JobLog) -> str:
+        """ get the setup image of a job, built on first use by running the setup
+        scripts on the base image and committing the container. The workspace is
+        mounted read only, as it is not part of the image and later runs skip the
+        setup. The use of the image is recorded in the job log.
+
+        Args:
+            job_name (str): name of the job
+            setup (list[str]): setup scripts
+            docker_img (str): base image
+            environment (dict): environment variables of the scripts
+            vol_name (str): workspace volume of the job
+            log_stream (JobLogStream): job log to write the output of the setup to
+            job_log (JobLog): job log to record the setup image
+
+        Returns:
+            str: setup image name
+
+        Raises:
+            docker.errors.DockerException: if the setup scripts or the commit failed
+        """
+        start = time.monotonic()
+        image_id = self.client.images.get(docker_img).id
+        image = self.setup_images.image_tag(image_id, setup, environment)
+        with self._setup_lock:
+            lock = self._setup_locks.setdefault(image, threading.Lock())
+        with lock:
+            try:
+                self.client.images.get(image)
+                status = c.CACHE_HIT
+                log_stream.write(f"Setup skipped, using image {image}\n")
+            except docker.errors.ImageNotFound:
+                status = c.CACHE_MISS
+                self._build_setup_image(image, job_name, setup, docker_img, environment,
+                                        vol_name, log_stream, job_log)
+        self.setup_images.touch(image, docker_img)
+        self._setup_images_used = True
+        job_log.setup_image = SetupImageLog(image=image, status=status,
+                                            build_time=round(time.monotonic() - start, 3))
+        return image
+
+    def _build_setup_image(self, image:str, job_name:str, setup:list[str],
+                           docker_img:str, environment:dict, vol_name:str,
+                           log_stream:JobLogStream, job_log:JobLog) -> None:
+        """ run the setup scripts on the base image and commit the container as the
+        setup image, the output is added to the job log
+
+        Args:
+            image (str): setup image name with its tag
+            job_name (str): name of the job
+            setup (list[str]): setup scripts
+            docker_img (str): base image
+            environment (dict): environment variables of the scripts
+            vol_name (str): workspace volume of the job, mounted read only
+            log_stream (JobLogStream): job log to write the output of the setup to
+            job_log (JobLog): job log to record the exit code of a failed setup
+
+        Raises:
+            docker.errors.DockerException: if the setup scripts or the commit failed
+        """
+        container = self.client.containers.run(
+            image=docker_img,
+            name=self.run_name + '-' + job_name + c.SETUP_CONTAINER_SUFFIX,
+            command=["sh", "-c", "set -e\n" + "\n".join(setup)],
+            detach=True,
+            volumes={vol_name: {'bind': c.DEFAULT_DOCKER_DIR, 'mode': 'ro'}},
+            working_dir=c.DEFAULT_DOCKER_DIR,
+            environment=environment,
+            labels=self.labels
+        )
+        try:
+            for stdout, stderr in container.attach(stdout=True, stderr=True, stream=True,
+                                                   logs=True, demux=True):
+                log_stream.feed(stdout, stderr)
+            log_stream.flush()
+            exit_code = container.wait().get('StatusCode')
+            if exit_code == 0:
+                repository, tag = image.rsplit(':', 1)
+                container.commit(repository=repository, tag=tag)
+        finally:
+            container.remove()
+        if exit_code != 0:
+            job_log.exit_code = exit_code
+            log_stream.write(f"\nSetup of job {job_name} failed with exit code {exit_code}")
+            raise docker.errors.DockerException(
+                f"setup scripts failed with exit code {exit_code}")
+
+    def _get_volumes(self, vol_name:str=None, extra_volumes:dict=None) -> dict:
+        """ volumes to mount in the job containers
+
+        Args:
+            vol_name (str, optional): volume to mount. Defaults to None, the run volume.
+            extra_volumes (dict, optional): other volumes to mount, e.g. the
+                dependency cache volumes. Defaults to None.
+
+        Returns:
+            dict: the volume mounted on DEFAULT_DOCKER_DIR, and the extra volumes
+        """
+        return {
+            (vol_name or self.vol_name):{
+                'bind': c.DEFAULT_DOCKER_DIR,
+                'mode': 'rw'
+            },
+            **(extra_volumes or {})
+        }
+
+    def _get_pool_container(self, pool_key:str, docker_img:str,
+                            extra_volumes:dict=None) -> Container:
+        """ get the warm container of the image for the exec executor, started
+        on first use with the run volume mounted. Jobs with different dependency
+        cache volumes use different containers.
+
+        Args:
+            pool_key (str): key of the container, the image and the cache volumes
+            docker_img (str): docker image name
+            extra_volumes (dict, optional): dependency cache volumes to mount.
+                Defaults to None.
+
+        Returns:
+            Container: running container
+        """
+        with self._pool_lock:
+            if pool_key not in self._pool:
+                self._pool[pool_key] = self.client.containers.run(
+                    image=docker_img,
+                    name=f"{self.run_name}-pool-{self._pool_count}",
+                    command=c.POOL_CONTAINER_COMMAND,
+                    detach=True,
+                    volumes=self._get_volumes(extra_volumes=extra_volumes),
+                    working_dir=c.DEFAULT_DOCKER_DIR,
+                    labels=self.labels
+                )
+                self._pool_count += 1
+            return self._pool[pool_key]
+
+    def remove_pool(self) -> None:
+        """ stop and remove the warm containers of the exec executor
+        """
+        with self._pool_lock:
+            pool = list(self._pool.values())
+            self._pool.clear()
+        for container in pool:
+            try:
+                container.remove(force=True)
+            except docker.errors.APIError as ae:
+                self.logger.warning(f"failed to remove container {container.name}, {ae}")
+
+    @staticmethod
+    def get_image_name(job_config:dict) -> str:
+        """ full name of the docker image of a job, with the registry prefix
+
+        Args:
+            job_config (dict): validated job configuration
+
+        Returns:
+            str: docker image name
+        """
+        docker_reg = job_config[c.KEY_DOCKER][c.KEY_DOCKER_REG]
+        docker_img = job_config[c.KEY_DOCKER][c.KEY_DOCKER_IMG]
+        # Update docker_img based on docker_reg value
+        if docker_reg != c.DEFAULT_DOCKER_REGISTRY:
+            docker_img = docker_reg + '/' + docker_img
+        return docker_img
+
+    def pull_images(self, images:list[str]) -> None:
+        """ start getting the images according to the pull policy, concurrently and
+        in the background. Jobs using an image wait for it before they start.
+
+        Args:
+            images (list[str]): docker image names, images already requested are ignored
+        """
+        images = [image for image in dict.fromkeys(images) if image not in self._pulls]
+        if not images:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(len(images), c.DEFAULT_PULL_WORKERS),
+                                      thread_name_prefix="pull")
+        for image in images:
+            self._pulls[image] = executor.submit(self._pull_image, image)
+        executor.shutdown(wait=False)
+
+    def get_image_pulls(self) -> list[ImagePull]:
+        """ results of the image pulls finished so far
+
+        Returns:
+            list[ImagePull]: status and duration of each image pull
+        """
+        return [future.result() for future in self._pulls.values() if future.done()]
+
+    def _pull_image(self, image:str) -> ImagePull:
+        """ get a single image according to the pull policy
+
+        Args:
+            image (str): docker image name
+
+        Returns:
+            ImagePull: status and duration of the pull
+        """
+        start = time.monotonic()
+        status = c.PULL_PRESENT
+        error = None
+        try:
+            if self.pull_policy == c.PULL_ALWAYS:
+                self.client.images.pull(image)
+                status = c.PULL_PULLED
+            else:
+                try:
+                    self.client.images.get(image)
+                except docker.errors.ImageNotFound:
+                    if self.pull_policy == c.PULL_NEVER:
+                        raise
+                    self.client.images.pull(image)
+                    status = c.PULL_PULLED
+        except docker.errors.DockerException as de:
+            self.logger.warning(f"Fail to get image {image}, exception is {de}")
+            status = c.STATUS_FAILED
+            error = str(de)
+        return ImagePull(image=image, status=status,
+                         duration=round(time.monotonic() - start, 3), error=error)
+
+    def _echo(self, job_name:str, text:str) -> None:
+        """ pass a job output not streamed from a container to the log handler
+
+        Args:
+            job_name (str): name of the job
+            text (str): output of the job
+        """
+        if self.log_handler is None:
+            return
+        for line in text.splitlines():
+            self.log_handler(job_name, line)
+
+    def _get_timeout(self, job_config:dict) -> float | None:
+        """ compute the time the job is allowed to run, the smaller of the job timeout
+        and the time left before the pipeline deadline
+
+        Args:
+            job_config (dict): validated job configuration
+
+        Returns:
+            float | None: seconds the job can run, or None if there is no limit
+        """
+        timeout = job_config.get(c.KEY_TIMEOUT)
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    def _stop_on_timeout(self, job_name:str, timed_out:threading.Event) -> None:
+        """ watchdog callback, stop the container of a job past its deadline
+
+        Args:
+            job_name (str): name of the job
+            timed_out (threading.Event): set to record the job is stopped by the watchdog
+        """
+        timed_out.set()
+        self.logger.warning(f"Job {job_name} timeout, stopping its container")
+        try:
+            self.stop_job(job_name)
+        except docker.errors.DockerException as de:
+            self.logger.warning(f"Fail to stop job {job_name} on timeout, exception is {de}")
+
+    def _get_cache_key(self, docker_img:str, job_config:dict) -> str | None:
+        """ compute the cache key of the job if job cache is enabled and the job
+        declares its inputs.
+
+        Args:
+            docker_img (str): full docker image name
+            job_config (dict): validated job configuration
+
+        Returns:
+            str | None: cache key, or None if the job should not use the cache
+        """
+        if self.job_cache is None or not job_config.get(c.JOB_SUBKEY_INPUTS):
+            return None
+        try:
+            try:
+                image = self.client.images.get(docker_img)
+            except docker.errors.ImageNotFound:
+                image = self.client.images.pull(docker_img)
+            return self.job_cache.compute_key(image.id, job_config)
+        except (docker.errors.DockerException, ValueError, OSError) as e:
+            self.logger.warning(f"Job cache disabled for image {docker_img}, error is {e}")
+            return None
+
+    def _restore_cached_job(self, job_log:JobLog, cached_log:JobLog,
+                            artifact_path:str|None, stage:str,
+                            upload_path:str, docker_img:str) -> JobLog:
+        """ build the job log for a cache hit, and store the cached artifact manifest
+        under the current run. The blobs are already in the bucket, they are also
+        written into the workspace where the job left them, for the next jobs.
+
+        Args:
+            job_log (JobLog): job log prepared for current run
+            cached_log (JobLog): job log stored in the cache
+            artifact_path (str | None): cached artifact manifest if any
+            stage (str): stage of the job
+            upload_path (str): target bucket
+            docker_img (str): image of the container used to reach the workspace
+
+        Returns:
+            JobLog: job log of the cache hit
+        """
+        job_log.job_status = c.STATUS_SUCCESS
+        job_log.cache_status = c.CACHE_HIT
+        job_log.job_logs = cached_log.job_logs
+        self._echo(job_log.job_name, job_log.job_logs)
+        if artifact_path is not None:
+            error_msg = None
+            try:
+                with open(artifact_path, 'r', encoding='utf-8') as file:
+                    manifest = ArtifactManifest.model_validate(json.load(file))
+                manifest = manifest.model_copy(update={
+                    'pipeline': self.pipeline_prefix, 'run': self.run,
+                    'stage': stage, 'job_name': job_log.job_name})
+                store = ArtifactStore(bucket_name=upload_path)
+                missing_blobs = store.missing_blobs(file.sha256 for file in manifest.files)
+                missing = [file.path for file in manifest.files
+                           if file.sha256 in missing_blobs]
+                if missing:
+                    error_msg = f"cached artifact files no longer stored: {missing}"
+                # the files of a job started from the stage snapshot are not kept
+                elif self.snapshot is None and not self._restore_artifact_files(
+                        store, manifest, docker_img, job_log.job_name):
+                    error_msg = f"Fail to copy the cached artifact into volume {self.vol_name}"
+                else:
+                    job_log.artifact_manifest = store.put_manifest(manifest)
+            except (ClientError, docker.errors.DockerException, tarfile.TarError,
+                    OSError, ValueError) as e:
+                error_msg = str(e)
+            if error_msg is not None:
+                self.logger.warning(error_msg)
+                job_log.job_status = c.STATUS_FAILED
+                job_log.job_logs += (f"\nFail to upload cached artifact for "
+                                     f"{self.run_name}-{job_log.job_name}, {error_msg}")
+        job_log.completion_time = time.asctime()
+        return job_log
+
+    def _restore_artifact_files(self, store:ArtifactStore, manifest:ArtifactManifest,
+                                docker_img:str, job_name:str) -> bool:
+        """ download the files of an artifact manifest and extract them into the
+        workspace volume, under the directory each file was uploaded from
+
+        Args:
+            store (ArtifactStore): artifact store
+            manifest (ArtifactManifest): files to restore
+            docker_img (str): image of the container used to reach the volume
+            job_name (str): name of the job
+
+        Returns:
+            bool: True if the files are extracted
+
+        Raises:
+            docker.errors.DockerException: if the container could not be created
+            tarfile.TarError: if the archive could not be written
+            OSError: if a file could not be downloaded
+            ClientError: if a download failed
+        """
+        if not manifest.files:
+            return True
+
+        def reset_owner(info:tarfile.TarInfo) -> tarfile.TarInfo:
+            info.uid = info.gid = 0
+            info.uname = info.gname = "root"
+            return info
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            files_dir = os.path.join(temp_dir, 'files')
+            store.download(manifest, files_dir)
+            archive_path = os.path.join(temp_dir, 'artifact.tar')
+            with tarfile.open(archive_path, 'w') as tar:
+                for file in manifest.files:
+                    tar.add(os.path.join(files_dir, file.path),
+                            arcname=posixpath.join(file.parent or '', file.path),
+                            filter=reset_owner)
+            with open(archive_path, 'rb') as archive:
+                return self._put_vol_archive(
+                    archive, docker_img,
+                    self.run_name + '-' + job_name + c.RESTORE_CONTAINER_SUFFIX)
+
+    def _put_vol_archive(self, archive, docker_img:str, container_name:str) -> bool:
+        """ extract a tar archive into the workspace volume, streamed to the docker
+        engine through a container created on the volume but never started
+
+        Args:
+            archive (Iterable[bytes] | BinaryIO): the tar archive
+            docker_img (str): image of the container
+            container_name (str): name of the container
+
+        Returns:
+            bool: True if the archive is extracted
+
+        Raises:
+            docker.errors.DockerException: if the container could not be created or
+                the archive could not be extracted
+        """
+        container = self.client.containers.create(
+            image=docker_img,
+            name=container_name,
+            volumes=self._get_volumes(),
+            labels=self.labels
+        )
+        try:
+            return container.put_archive(c.DEFAULT_DOCKER_DIR, archive)
+        finally:
+            container.remove(force=True)
+
     def _check_status_from_log(self, stderr:str)->bool:
-        """ Check the stderr for job status
+        """ Check the stderr for job status, only used in legacy_status_check mode
 
         Args:
             stderr (str): error log extracted from containers
@@ -188,67 +930,98 @@ class DockerManager(ContainerManager):
     def _upload_artifact(self,
                          container:Container,
                          upload_path:str,
-                         extract_paths:list[str]) -> tuple[bool,str]:
-        """ Move the artifacts from container to target upload path
+                         extract_paths:list[str],
+                         job_name:str,
+                         stage:str,
+                         cache_key:str=None) -> tuple[bool,str]:
+        """ Store the artifacts of the job in the bucket upload_path, as blobs named by
+        content hash and a manifest under <pipeline>/<run>/<stage>/<job>. The tar
+        archives of the paths are read twice from the docker engine: first to hash
+        the files, then to stream only the files whose blob is missing into
+        multipart uploads, so no temporary file is written and the memory used is
+        bounded.
 
         Args:
             container (Container): docker container object
-            upload_path (str): target upload_path, can be absolute or relative
+            upload_path (str): target bucket
             extract_paths (list[str]): List of paths to extract artifact
+            job_name (str): name of the job
+            stage (str): stage of the job
+            cache_key (str, optional): if given, the manifest is also stored in
+                the job cache under this key. Defaults to None.
 
         Returns:
-            tuple[bool,str]: tuple of boolean indicator if upload success and 
-            a str for potential error message
+            tuple[bool,str]: tuple of boolean indicator if upload success and
+            a str with the throughput, or the error message
         """
+        extract_dir = None
+        if self.artifact_dir is not None:
+            extract_dir = str(Path(self.artifact_dir).joinpath(self.run_name + '-' + job_name))
+        start = time.monotonic()
         try:
-            # First extract the contents in extract_paths from the docker
+            # first pass, hash the files
+            files = []
             for path in extract_paths:
                 bits, _ = container.get_archive(f"{c.DEFAULT_DOCKER_DIR}/{path}")
-                # Write the archive to the host filesystem
-                upload_path_obj = Path(upload_path)
-                if not upload_path_obj.is_dir():
-                    parent_path = Path.cwd()
-                    #print(parent_path)
-                    upload_path_obj = parent_path.joinpath(upload_path_obj)
-                    #print(upload_path_obj)
-                    # recursively make dir for parents if not exist
-                    upload_path_obj.mkdir(parents=True)
-                with open(f"{upload_path}/volume_contents.tar", "wb") as f:
-                    for chunk in bits:
-                        f.write(chunk)
-                # Extract the contents of the archive
-                with tarfile.open(f"{upload_path}/volume_contents.tar", "r") as tar:
-                    tar.extractall(path=upload_path)
-                os.remove(f"{upload_path}/volume_contents.tar")
-
-            # Try upload to s3
-            status, err = self._upload_to_s3(container.name, upload_path)
-            return status, err
-        except (docker.errors.DockerException, FileNotFoundError, AttributeError) as de:
-            return False, str(de)
-
-    def _upload_to_s3(self, file_name:str, upload_path:str) -> tuple[bool,str]:
-        """ Zip the artifacts in upload_path and upload into s3
-
-        Args:
-            file_name (str): file name to save in s3
-            upload_path (str): target upload_path to zip
+                # the archive of a path start from its last component
+                parent = posixpath.dirname(posixpath.normpath(path))
+                files += [file.model_copy(update={'parent': parent})
+                          for file in hash_tar(bits, extract_dir)]
+            store = ArtifactStore(bucket_name=upload_path)
+            missing = store.missing_blobs(file.sha256 for file in files)
+            # second pass, upload the missing blobs
+            uploaded = 0
+            size = 0
+            hashes = {file.path: file.sha256 for file in files} if missing else {}
+            for path in extract_paths if missing else []:
+                bits, _ = container.get_archive(f"{c.DEFAULT_DOCKER_DIR}/{path}")
+                for member, source in iter_tar_files(bits):
+                    sha256 = hashes.get(member.name)
+                    if sha256 not in missing:
+                        continue
+                    self._upload_blob(store, sha256, source)
+                    missing.discard(sha256)
+                    uploaded += 1
+                    size += member.size
+            if missing:
+                raise OSError(f"{len(missing)} artifact files changed while uploading")
+            manifest = ArtifactManifest(pipeline=self.pipeline_prefix, run=self.run,
+                                        stage=stage, job_name=job_name, files=files)
+            key = store.put_manifest(manifest)
+            if cache_key is not None:
+                self.job_cache.put_manifest(cache_key, manifest)
+            return True, format_throughput(f"s3://{upload_path}/{key}", len(files), uploaded,
+                                           size, time.monotonic() - start) + "\n"
+        except (ClientError, docker.errors.DockerException, tarfile.TarError, OSError) as e:
+            self.logger.warning(str(e))
+            return False, f"Fail to upload to s3 for {self.run_name}-{job_name}\nReason: {e}"
 
-        Returns:
-            tuple[bool,str]: tuple of boolean indicator if upload success and 
-            a str for potential error message
+    def _upload_blob(self, store:ArtifactStore, sha256:str, source) -> None:
+        """ stream a file into its blob, checking the content did not change since
+        it was hashed
+
+        Args:
+            store (ArtifactStore): artifact store
+            sha256 (str): hash of the file from the first pass
+            source (BinaryIO): content of the file
+
+        Raises:
+            OSError: if the content changed, the upload is aborted
+            ClientError: if the upload failed
         """
-        error_msg = f"Fail to upload to s3 for {file_name}"
+        writer = store.open_blob(sha256)
+        digest = hashlib.sha256()
         try:
-            s3_client = S3Client(bucket_name=upload_path)
-            archive_name = make_archive(file_name, 'zip', root_dir=upload_path)
-            s3_client.upload_file(archive_name)
-            os.remove(archive_name)
-            return True, ""
-        except (ClientError, OSError) as e:
-            self.logger.warning(str(e))
-            error_msg += f"\nReason: {e}"
-            return False, error_msg
+            shutil.copyfileobj(source, TeeWriter([writer, HashWriter(digest)]),
+                               c.ARCHIVE_CHUNK_SIZE)
+        except (ClientError, OSError):
+            writer.abort()
+            raise
+        if digest.hexdigest() != sha256:
+            writer.abort()
+            raise OSError(f"artifact file changed while uploading, blob {sha256}")
+        writer.close()
+        store.mark_stored(sha256)
 
     def stop_job(self, job_name: str) -> str:
         """ stop a job
@@ -258,22 +1031,361 @@ class DockerManager(ContainerManager):
         Returns:
             str: latest container logs
         """
+        # A job of the exec executor has its processes killed, the warm container
+        # keep running the other jobs. Its output is already streamed to the job log
+        pool_key = self._pool_jobs.get(job_name)
+        if pool_key is not None:
+            with self._pool_lock:
+                container = self._pool.get(pool_key)
+            if container is None:
+                return ""
+            container.exec_run(["sh", "-c", c.EXEC_KILL_SCRIPT, "sh",
+                                f"{c.EXEC_JOB_ENV}={job_name}", str(c.EXEC_STOP_GRACE)])
+            return ""
         # Reconstruct container name
-        container_name = self.vol_name + '-' + job_name
+        container_name = self.run_name + '-' + job_name
         container = self.client.containers.get(container_name)
         container.stop()
         container.wait()
         output = container.logs().decode('utf-8')
         return output
 
-    def remove_vol(self) -> bool:
+    def _create_vol(self, vol_name:str):
+        """ create a volume labelled with the run, so it is removed by
+        remove_expired_vols or the garbage collection once the run is finished
+
+        Args:
+            vol_name (str): volume name
+
+        Returns:
+            Volume: the volume created
+        """
+        return self.client.volumes.create(vol_name, labels=self.labels)
+
+    def _remove_vol(self, volume) -> None:
+        """ remove a volume, logging the failure
+
+        Args:
+            volume (Volume): volume to remove
+        """
+        try:
+            volume.remove()
+        except docker.errors.APIError as ae:
+            self.logger.warning(f"failed to remove volume {volume.name}, {ae}")
+
+    def _copy_vol(self, src_vol:str, dst_vol:str, docker_img:str,
+                  container_name:str) -> None:
+        """ copy the content of a volume into another one, within the docker engine
+
+        Args:
+            src_vol (str): volume to copy from
+            dst_vol (str): volume to copy to
+            docker_img (str): image with sh and cp to run the copy
+            container_name (str): name of the container running the copy
+
+        Raises:
+            docker.errors.DockerException: if the copy failed
+        """
+        container = self.client.containers.run(
+            image=docker_img,
+            name=container_name,
+            command=["sh", "-c", c.COPY_VOL_COMMAND],
+            detach=True,
+            volumes={
+                src_vol: {'bind': c.COPY_SRC_DIR, 'mode': 'ro'},
+                dst_vol: {'bind': c.COPY_DST_DIR, 'mode': 'rw'}
+            },
+            labels=self.labels
+        )
+        try:
+            exit_code = container.wait().get('StatusCode')
+        finally:
+            container.remove()
+        if exit_code != 0:
+            raise docker.errors.DockerException(
+                f"copy of volume {src_vol} failed with exit code {exit_code}")
+
+    def _restore_dep_cache(self, job_name:str, job_config:dict, docker_img:str,
+                           job_log:JobLog) -> dict | None:
+        """ get the dependency cache volumes of a job, one per path of its cache
+        section. A volume missing for the key is created and restored from the
+        nearest key if any, otherwise the job start with an empty cache. The
+        restore time is recorded in the job log.
+
+        Args:
+            job_name (str): name of the job
+            job_config (dict): job configuration
+            docker_img (str): image with sh and cp to run the copy
+            job_log (JobLog): job log to record the cache use
+
+        Returns:
+            dict | None: path and created flag of each volume, None if the job has
+                no cache section or the dependency cache is disabled
+
+        Raises:
+            docker.errors.DockerException: if a volume could not be created
+        """
+        cache_config = job_config.get(c.JOB_SUBKEY_CACHE)
+        if self.dep_cache is None or not cache_config:
+            return None
+        start = time.monotonic()
+        template = cache_config[c.CACHE_SUBKEY_KEY]
+        key = self.dep_cache.resolve_key(template)
+        prefixes = self.dep_cache.restore_prefixes(
+            template, cache_config.get(c.CACHE_SUBKEY_RESTORE_KEYS))
+        cache_vols = {}
+        restored_from = None
+        missed = False
+        self._dep_cache_used = True
+        with self._dep_cache_lock:
+            for path in cache_config[c.CACHE_SUBKEY_PATHS]:
+                vol_name = self.dep_cache.volume_name(self.repo, key, path)
+                try:
+                    self.client.volumes.get(vol_name)
+                    cache_vols[vol_name] = (path, False)
+                    continue
+                except docker.errors.NotFound:
+                    self.client.volumes.create(vol_name)
+                    cache_vols[vol_name] = (path, True)
+                source = self.dep_cache.nearest(self.repo, path, prefixes, exclude=vol_name)
+                if source is None:
+                    missed = True
+                    continue
+                try:
+                    self._copy_vol(source[0], vol_name, docker_img,
+                                   self.run_name + '-' + job_name +
+                                   c.RESTORE_CONTAINER_SUFFIX)
+                    restored_from = restored_from or source[1]
+                except docker.errors.DockerException as de:
+                    # start empty, the source is left out from now on
+                    self.logger.warning(f"Fail to restore cache {source[0]}, error is {de}")
+                    self.dep_cache.forget([source[0]])
+                    missed = True
+        if missed:
+            status = c.CACHE_MISS
+        else:
+            status = c.CACHE_HIT if restored_from is None else c.CACHE_RESTORED
+        job_log.dep_cache = DepCacheLog(key=key, status=status, restored_from=restored_from,
+                                        restore_time=round(time.monotonic() - start, 3))
+        return cache_vols
+
+    def _get_cache_mounts(self, cache_vols:dict|None) -> dict:
+        """ mount points of the dependency cache volumes, ~ is the home directory
+        DEP_CACHE_HOME and relative paths are in the workspace
+
+        Args:
+            cache_vols (dict | None): path and created flag of each volume
+
+        Returns:
+            dict: volumes to mount, in the format of _get_volumes
+        """
+        mounts = {}
+        for vol_name, (path, _) in (cache_vols or {}).items():
+            if path == '~' or path.startswith('~/'):
+                target = c.DEP_CACHE_HOME + path[1:]
+            else:
+                target = posixpath.join(c.DEFAULT_DOCKER_DIR, path)
+            mounts[vol_name] = {'bind': posixpath.normpath(target), 'mode': 'rw'}
+        return mounts
+
+    def _save_dep_cache(self, cache_vols:dict, job_success:bool, job_log:JobLog) -> None:
+        """ keep the dependency cache volumes of a successful job for the next runs,
+        or remove the volumes created for a job that failed, so a cache is only
+        saved from a successful job. The save time is recorded in the job log.
+
+        Args:
+            cache_vols (dict): path and created flag of each volume
+            job_success (bool): if the job succeeded
+            job_log (JobLog): job log with the cache use
+        """
+        start = time.monotonic()
+        if job_success:
+            for vol_name, (path, _) in cache_vols.items():
+                self.dep_cache.touch(vol_name, self.repo, job_log.dep_cache.key, path)
+            job_log.dep_cache.save_time = round(time.monotonic() - start, 3)
+            return
+        created = [vol_name for vol_name, (_, is_new) in cache_vols.items() if is_new]
+        for vol_name in created:
+            try:
+                self.client.volumes.get(vol_name).remove()
+            except docker.errors.DockerException as de:
+                self.logger.warning(f"failed to remove cache volume {vol_name}, {de}")
+        self.dep_cache.forget(created)
+
+    def evict_dep_cache(self) -> int:
+        """ remove the least recently used dependency cache volumes until the
+        volumes fit in the disk budget. Volumes still in use are skipped. Nothing
+        is done if no job of the run used the cache or the index is empty, as
+        getting the disk usage from the engine is slow.
+
+        Returns:
+            int: number of volumes removed
+        """
+        if (self.dep_cache is None or not self._dep_cache_used
+                or not self.dep_cache.index.entries()):
+            return 0
+        try:
+            usage = self.client.df().get('Volumes') or []
+        except docker.errors.APIError as ae:
+            self.logger.warning(f"failed to get volumes usage, exception is {ae}")
+            return 0
+        # size is -1 when the engine did not compute it
+        sizes = {volume['Name']: max(0, (volume.get('UsageData') or {}).get('Size', 0))
+                 for volume in usage}
+        removed = []
+        for vol_name in self.dep_cache.select_evictions(sizes):
+            try:
+                self.client.volumes.get(vol_name).remove()
+                removed.append(vol_name)
+            except docker.errors.DockerException as de:
+                self.logger.debug(f"failed to evict cache volume {vol_name}, {de}")
+        self.dep_cache.forget(removed)
+        return len(removed)
+
+    def evict_setup_images(self) -> int:
+        """ remove the least recently used setup images until the images fit in the
+        disk budget. Images still in use are skipped. Nothing is done if no job of
+        the run used a setup image or the index is empty, as getting the disk usage
+        from the engine is slow.
+
+        Returns:
+            int: number of images removed
+        """
+        if (self.setup_images is None or not self._setup_images_used
+                or not self.setup_images.index.entries()):
+            return 0
+        try:
+            usage = self.client.df().get('Images') or []
+        except docker.errors.APIError as ae:
+            self.logger.warning(f"failed to get images usage, exception is {ae}")
+            return 0
+        # only the layers of the setup are counted, the base image is shared.
+        # shared size is -1 when the engine did not compute it
+        sizes = {}
+        for image in usage:
+            size = max(0, image.get('Size', 0) - max(0, image.get('SharedSize', 0)))
+            for tag in image.get('RepoTags') or []:
+                sizes[tag] = size
+        removed = []
+        for image in self.setup_images.select_evictions(sizes):
+            try:
+                self.client.images.remove(image)
+                removed.append(image)
+            except docker.errors.DockerException as de:
+                self.logger.debug(f"failed to evict setup image {image}, {de}")
+        self.setup_images.forget(removed)
+        return len(removed)
+
+    def seed_vol(self, archive:Iterable[bytes], docker_img:str) -> tuple[bool, str]:
+        """ extract a tar archive of the repository files into the workspace volume.
+        The archive is streamed to the docker engine as it is read, through a
+        container created on the volume but never started
+
+        Args:
+            archive (Iterable[bytes]): chunks of the tar archive
+            docker_img (str): image of the container used to reach the volume
+
+        Returns:
+            tuple[bool, str]: tuple of boolean indicator if the volume is seeded and
+            a str for potential error message
+        """
+        if self.docker_vol is None:
+            self.docker_vol = self._create_vol(self.vol_name)
+        self.pull_images([docker_img])
+        image_pull = self._pulls[docker_img].result()
+        if image_pull.status == c.STATUS_FAILED:
+            return False, f"Fail to get image {docker_img}, {image_pull.error}"
+        try:
+            if not self._put_vol_archive(archive, docker_img,
+                                         self.run_name + c.SEED_CONTAINER_SUFFIX):
+                return False, f"Fail to copy the repository into volume {self.vol_name}"
+            return True, ""
+        except docker.errors.DockerException as de:
+            error_msg = f"Fail to copy the repository into volume {self.vol_name}, {de}"
+            self.logger.warning(error_msg)
+            return False, error_msg
+
+    def snapshot_vol(self, docker_img:str) -> tuple[bool, str]:
+        """ take a copy of the workspace volume, the jobs started until drop_snapshot
+        is called each run in a new volume restored from this copy, so they start
+        from the same tree and do not see the changes of each other
+
+        Args:
+            docker_img (str): image with sh and cp to run the copy
+
+        Returns:
+            tuple[bool, str]: tuple of boolean indicator if the snapshot is taken and
+            a str for potential error message
+        """
+        self.drop_snapshot()
+        if self.docker_vol is None:
+            self.docker_vol = self._create_vol(self.vol_name)
+        self.pull_images([docker_img])
+        image_pull = self._pulls[docker_img].result()
+        if image_pull.status == c.STATUS_FAILED:
+            return False, f"Fail to get image {docker_img}, {image_pull.error}"
+        snapshot_name = self.vol_name + c.SNAPSHOT_VOL_SUFFIX
+        try:
+            snapshot = self._create_vol(snapshot_name)
+        except docker.errors.DockerException as de:
+            return False, f"Fail to create volume {snapshot_name}, {de}"
+        try:
+            self._copy_vol(self.vol_name, snapshot_name, docker_img,
+                           snapshot_name + c.COPY_CONTAINER_SUFFIX)
+        except docker.errors.DockerException as de:
+            self._remove_vol(snapshot)
+            return False, f"Fail to snapshot volume {self.vol_name}, {de}"
+        self.snapshot = snapshot
+        return True, ""
+
+    def drop_snapshot(self) -> None:
+        """ remove the snapshot taken by snapshot_vol, next jobs run in the
+        workspace volume
+        """
+        if self.snapshot is not None:
+            self._remove_vol(self.snapshot)
+            self.snapshot = None
+
+    def attach_vol(self, volume_run:str=None) -> bool:
+        """ Use the existing volume, e.g. the workspace of an earlier run to resume.
+        The jobs then run in this volume
+
+        Args:
+            volume_run (str, optional): run whose volume is used. Defaults to None,
+                the volume of this run.
+
+        Returns:
+            bool: True if the volume exists
+        """
+        vol_name = self.vol_name if volume_run is None else self._vol_prefix + volume_run
+        try:
+            self.docker_vol = self.client.volumes.get(vol_name)
+        except docker.errors.NotFound:
+            return False
+        self.vol_name = vol_name
+        return True
+
+    def remove_vol(self, retain:bool=False) -> bool:
         """ Remove the volume associated 
 
+        Args:
+            retain (bool, optional): keep the volume so the run can be resumed,
+                it is removed by remove_expired_vols after the retention deadline
+                recorded with the finished run. Defaults to False.
+
         Returns:
             bool: if removal is successful
         """
+        # the warm containers use the volume
+        self.remove_pool()
+        self.stop_supervisor()
+        self.drop_snapshot()
         if not self.docker_vol:
             return True
+        if retain:
+            self.logger.info(f"volume {self.vol_name} retained for resume")
+            self.docker_vol = None
+            return True
         try:
             self.docker_vol.remove()
             self.docker_vol = None
@@ -283,3 +1395,46 @@ class DockerManager(ContainerManager):
             error_msg += f"exception is {ae}"
             self.logger.warning(error_msg)
             return False
+
+    def remove_expired_vols(self, run_job:Callable[[str, str, str, int], dict | None]) -> int:
+        """ Remove the volumes of the finished runs of the pipeline, except the volumes
+        retained for resume until the retention deadline recorded with the run. Volumes
+        of the runs not finished, and volumes still in use, are skipped.
+
+        Args:
+            run_job (Callable[[str, str, str, int], dict | None]): job record of a run
+                in the jobs history from the repository name, branch, pipeline name and
+                run number, None if the run is not found
+
+        Returns:
+            int: number of volumes removed
+        """
+        removed = 0
+        now = int(time.time())
+        pipeline_keys = (c.LABEL_REPO, c.LABEL_BRANCH, c.LABEL_PIPELINE)
+        try:
+            volumes = self.client.volumes.list(filters={'label': [
+                f"{key}={self.labels[key]}" for key in pipeline_keys]})
+        except docker.errors.APIError as ae:
+            self.logger.warning(f"failed to list volumes, exception is {ae}")
+            return removed
+        jobs = {}
+        for volume in volumes:
+            labels = volume.attrs.get('Labels') or {}
+            try:
+                run_number = int(labels.get(c.LABEL_RUN_NUMBER))
+            except (TypeError, ValueError):
+                continue
+            if run_number not in jobs:
+                jobs[run_number] = run_job(*(self.labels[key] for key in pipeline_keys),
+                                           run_number)
+            job = jobs[run_number]
+            if not job or job.get(c.FIELD_STATUS) in (None, c.STATUS_PENDING) or \
+                    is_retained(job, now):
+                continue
+            try:
+                volume.remove()
+                removed += 1
+            except docker.errors.APIError as ae:
+                self.logger.debug(f"failed to remove expired volume {volume.name}, {ae}")
+        return removed
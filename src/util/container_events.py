@@ -0,0 +1,152 @@
+""" container_events module provide the supervision of the job containers of a run
+over the docker events API: one subscription, filtered by the run label, receive
+the die and oom events of all the containers of the run and wake the jobs waiting
+for them, instead of one blocking wait call per container.
+"""
+import threading
+import docker
+import docker.errors
+from requests.exceptions import RequestException
+from util.common_utils import (get_logger)
+import util.constant as c
+
+logger = get_logger("util.container_events")
+# pylint: disable=logging-fstring-interpolation
+
+
+class ContainerSupervisor:
+    """ Dispatch the die and oom events of the containers labelled with a run to
+    the jobs waiting for them, from a single thread. The events of a container
+    are kept until a job wait for it, so a container exiting before the wait
+    is not missed.
+    """
+
+    def __init__(self, client: docker.DockerClient, run_name: str,
+                 log_tool=logger) -> None:
+        """ Initialize the ContainerSupervisor, start must be called before the
+        containers to supervise are started
+
+        Args:
+            client (docker.DockerClient): docker client
+            run_name (str): value of the run label of the containers
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+        """
+        self.client = client
+        self.run_name = run_name
+        self.logger = log_tool
+        self._lock = threading.Lock()
+        # exit code of the containers died, oom killed containers and the waiters
+        self._exits = {}
+        self._oom = set()
+        self._waiters = {}
+        self._events = None
+        self._thread = None
+        self._alive = False
+
+    def start(self) -> bool:
+        """ subscribe to the events of the run, the subscription is active when this
+        method return, and dispatch them from a daemon thread
+
+        Returns:
+            bool: True if the subscription is active
+        """
+        try:
+            self._events = self.client.events(decode=True, filters={
+                'type': 'container',
+                'label': f"{c.LABEL_RUN}={self.run_name}",
+                'event': [c.EVENT_DIE, c.EVENT_OOM]})
+        except (docker.errors.DockerException, RequestException) as e:
+            self.logger.warning(f"Fail to subscribe to docker events, error is {e}")
+            return False
+        self._alive = True
+        self._thread = threading.Thread(target=self._dispatch, daemon=True,
+                                        name=f"events-{self.run_name}")
+        self._thread.start()
+        return True
+
+    @property
+    def alive(self) -> bool:
+        """ if the events are still received
+
+        Returns:
+            bool: False once the subscription ended or failed
+        """
+        return self._alive
+
+    def wait(self, container_id: str) -> tuple[int | None, bool] | None:
+        """ wait for a container of the run to exit
+
+        Args:
+            container_id (str): id of the container
+
+        Returns:
+            tuple[int | None, bool] | None: exit code and if the container was killed for
+                out of memory, None if the subscription ended before the container
+                exited, the container must be waited for another way
+        """
+        with self._lock:
+            if container_id not in self._exits:
+                if not self._alive:
+                    return None
+                waiter = self._waiters.setdefault(container_id, threading.Event())
+            else:
+                waiter = None
+        if waiter is not None:
+            waiter.wait()
+        with self._lock:
+            self._waiters.pop(container_id, None)
+            if container_id not in self._exits:
+                return None
+            oom_killed = container_id in self._oom
+            self._oom.discard(container_id)
+            return self._exits.pop(container_id), oom_killed
+
+    def stop(self) -> None:
+        """ end the subscription, the jobs still waiting are woken up
+        """
+        self._alive = False
+        if self._events is not None:
+            try:
+                self._events.close()
+            except (docker.errors.DockerException, RequestException, OSError) as e:
+                self.logger.debug(f"Fail to close docker events, error is {e}")
+        self._wake_all()
+
+    def _dispatch(self) -> None:
+        """ record the events received and wake the waiting jobs, until the
+        subscription end
+        """
+        try:
+            for event in self._events:
+                container_id = event.get('id') or (event.get('Actor') or {}).get('ID')
+                if container_id is None:
+                    continue
+                action = event.get('Action') or event.get('status')
+                with self._lock:
+                    if action == c.EVENT_OOM:
+                        self._oom.add(container_id)
+                        continue
+                    attributes = (event.get('Actor') or {}).get('Attributes') or {}
+                    try:
+                        self._exits[container_id] = int(attributes.get('exitCode'))
+                    except (TypeError, ValueError):
+                        self._exits[container_id] = None
+                    waiter = self._waiters.get(container_id)
+                if waiter is not None:
+                    waiter.set()
+        except (docker.errors.DockerException, RequestException, OSError) as e:
+            if self._alive:
+                self.logger.warning(f"docker events ended, error is {e}")
+        finally:
+            self._alive = False
+            self._wake_all()
+
+    def _wake_all(self) -> None:
+        """ wake all the waiting jobs, the jobs without exit event fall back to
+        wait the container themselves
+        """
+        with self._lock:
+            waiters = list(self._waiters.values())
+        for waiter in waiters:
+            waiter.set()
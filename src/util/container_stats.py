@@ -0,0 +1,164 @@
+""" container_stats module provide the sampling of the resource usage of a job
+container while it runs: cpu, memory, block I/O and network, read from the docker
+stats API on a background thread. The time spent sampling is measured, and the
+interval grow while the samples cost more than STATS_OVERHEAD_RATIO of it.
+"""
+import threading
+import time
+import docker
+import docker.errors
+from docker.models.containers import Container
+from requests.exceptions import RequestException
+from util.common_utils import (get_int_setting, get_logger)
+from util.model import (MetricSummary, ResourceMetrics)
+import util.constant as c
+
+logger = get_logger("util.container_stats")
+# pylint: disable=logging-fstring-interpolation
+
+
+def get_stats_interval(interval: float = None, log_tool=logger) -> float:
+    """ seconds between the samples, given or read from the env value
+
+    Args:
+        interval (float, optional): interval given by the caller, used over the env
+            value. Defaults to None.
+        log_tool (logging.Logger, optional): log tool. Defaults to logger.
+
+    Returns:
+        float: interval in seconds, 0 if the sampling is disabled
+    """
+    if interval is None:
+        interval = get_int_setting(c.ENV_STATS_INTERVAL, c.DEFAULT_STATS_INTERVAL,
+                                   minimum=0, log_tool=log_tool)
+    return max(0.0, float(interval))
+
+
+class StatsSampler:
+    """ Sample the resource usage of a container every interval seconds until
+    stopped. Each sample is a single one shot stats call, the cpu usage is computed
+    from the cpu time between two samples.
+    """
+
+    def __init__(self, container: Container, interval: float,
+                 log_tool=logger) -> None:
+        """ Initialize the StatsSampler
+
+        Args:
+            container (Container): running container to sample
+            interval (float): seconds between the samples
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+        """
+        self.container = container
+        self.interval = interval
+        self.logger = log_tool
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._cpu = []
+        self._memory = []
+        self._totals = {'block_read_bytes': 0, 'block_write_bytes': 0,
+                        'net_rx_bytes': 0, 'net_tx_bytes': 0}
+        self._overhead = 0.0
+        # cpu time in ns and monotonic time of the previous sample
+        self._last_cpu = None
+
+    def start(self) -> None:
+        """ take the first sample and the next ones from a daemon thread
+        """
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"stats-{self.container.name}")
+        self._thread.start()
+
+    def stop(self) -> ResourceMetrics | None:
+        """ stop the sampling, the sample in progress if any is not waited for
+
+        Returns:
+            ResourceMetrics | None: summary of the samples, None if no sample was taken
+        """
+        self._stop.set()
+        with self._lock:
+            if not self._memory:
+                return None
+            return ResourceMetrics(
+                samples=len(self._memory),
+                interval=self.interval,
+                cpu_percent=self._summarize(self._cpu),
+                memory_bytes=self._summarize(self._memory),
+                overhead=round(self._overhead, 3),
+                **self._totals)
+
+    def _run(self) -> None:
+        """ sample until stopped or the container is gone
+        """
+        while not self._stop.is_set():
+            start = time.monotonic()
+            try:
+                stats = self.container.stats(stream=False, one_shot=True)
+            except (docker.errors.DockerException, RequestException) as e:
+                self.logger.debug(f"stats of {self.container.name} ended, error is {e}")
+                return
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self._overhead += elapsed
+                if self._stop.is_set():
+                    return
+                self._record(stats, time.monotonic())
+            # the sampling must cost a small part of the job
+            if elapsed > self.interval * c.STATS_OVERHEAD_RATIO:
+                self.interval = min(self.interval * 2, c.STATS_MAX_INTERVAL)
+            self._stop.wait(self.interval)
+
+    def _record(self, stats: dict, now: float) -> None:
+        """ add a sample, must be called with the lock. Samples of an exited
+        container, without memory usage, are skipped
+
+        Args:
+            stats (dict): answer of the docker stats API
+            now (float): monotonic time of the sample
+        """
+        memory_stats = stats.get('memory_stats') or {}
+        if 'usage' not in memory_stats:
+            return
+        # same as docker stats, the page cache that can be reclaimed is not counted
+        details = memory_stats.get('stats') or {}
+        inactive = details.get('inactive_file', details.get('total_inactive_file', 0))
+        self._memory.append(max(0, memory_stats['usage'] - inactive))
+
+        cpu_time = ((stats.get('cpu_stats') or {}).get('cpu_usage') or {}).get(
+            'total_usage')
+        if cpu_time is not None:
+            if self._last_cpu is not None and now > self._last_cpu[1]:
+                cpu_ns = cpu_time - self._last_cpu[0]
+                self._cpu.append(max(0.0, cpu_ns / ((now - self._last_cpu[1]) * 1e9) * 100))
+            self._last_cpu = (cpu_time, now)
+
+        # block I/O and network counters are totals since the container started
+        block = {'read': 0, 'write': 0}
+        for entry in (stats.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+            operation = str(entry.get('op', '')).lower()
+            if operation in block:
+                block[operation] += entry.get('value', 0)
+        networks = (stats.get('networks') or {}).values()
+        for key, value in (('block_read_bytes', block['read']),
+                           ('block_write_bytes', block['write']),
+                           ('net_rx_bytes', sum(net.get('rx_bytes', 0) for net in networks)),
+                           ('net_tx_bytes', sum(net.get('tx_bytes', 0) for net in networks))):
+            self._totals[key] = max(self._totals[key], value)
+
+    @staticmethod
+    def _summarize(values: list[float]) -> MetricSummary:
+        """ min, average and peak of the samples
+
+        Args:
+            values (list[float]): sampled values
+
+        Returns:
+            MetricSummary: summary, zeros if no value
+        """
+        if not values:
+            return MetricSummary()
+        return MetricSummary(min=round(min(values), 2),
+                             avg=round(sum(values) / len(values), 2),
+                             peak=round(max(values), 2))
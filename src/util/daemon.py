@@ -0,0 +1,491 @@
+""" daemon module provide the unix socket server and client used to run the cid
+commands in a long-lived process. The server hold a priority queue of requests,
+requests of the same priority are served fairly between users. The requests are
+executed concurrently by a pool of workers, with one worker kept for the reports.
+"""
+import collections
+import getpass
+import heapq
+import io
+import itertools
+import json
+import os
+import socket
+import sys
+import threading
+from typing import Callable, Iterator
+import util.constant as c
+from util.common_utils import (get_logger)
+
+logger = get_logger("util.daemon")
+
+# pylint: disable=logging-fstring-interpolation
+
+
+def get_socket_path(socket_path: str = None) -> str:
+    """ resolve the path of the daemon socket
+
+    Args:
+        socket_path (str, optional): path given by the user. Defaults to None, which
+            use the CICD_DAEMON_SOCKET environment variable or DEFAULT_DAEMON_SOCKET.
+
+    Returns:
+        str: absolute path of the socket
+    """
+    if not socket_path:
+        socket_path = os.environ.get(c.ENV_DAEMON_SOCKET, c.DEFAULT_DAEMON_SOCKET)
+    return os.path.abspath(os.path.expanduser(socket_path))
+
+
+def send_message(conn: socket.socket, message: dict) -> None:
+    """ send one message, encoded as a single line of json
+
+    Args:
+        conn (socket.socket): connected socket
+        message (dict): message to send
+    """
+    conn.sendall((json.dumps(message) + '\n').encode('utf-8'))
+
+
+def read_messages(conn: socket.socket) -> Iterator[dict]:
+    """ read the messages until the connection is closed
+
+    Args:
+        conn (socket.socket): connected socket
+
+    Yields:
+        Iterator[dict]: messages received
+    """
+    with conn.makefile('r', encoding='utf-8') as reader:
+        for line in reader:
+            yield json.loads(line)
+
+
+class RunQueue:
+    """ Priority queue of requests. Requests are ordered by priority, then by the
+    number of requests the same user already has waiting or running, then by arrival,
+    so one user submitting many runs does not starve the others.
+    """
+
+    def __init__(self):
+        """ Initialize an empty queue
+        """
+        self._heap = []
+        self._seq = itertools.count()
+        self._user_load = collections.Counter()
+        self._cond = threading.Condition()
+
+    def put(self, item, user: str, priority: int = 0) -> None:
+        """ add an item to the queue
+
+        Args:
+            item (any): item to queue
+            user (str): user submitting the item
+            priority (int, optional): lower value is served first. Defaults to 0.
+        """
+        with self._cond:
+            heapq.heappush(self._heap,
+                           (priority, self._user_load[user], next(self._seq), user, item))
+            self._user_load[user] += 1
+            self._cond.notify_all()
+
+    def get(self, timeout: float = None, max_priority: int = None):
+        """ remove and return the next item, waiting for one if the queue is empty
+
+        Args:
+            timeout (float, optional): seconds to wait. Defaults to None, wait forever.
+            max_priority (int, optional): only return an item of this priority or
+                lower. Defaults to None, any priority.
+
+        Returns:
+            any: next item, None if timeout
+        """
+        def available():
+            return self._heap and (max_priority is None or self._heap[0][0] <= max_priority)
+
+        with self._cond:
+            if not self._cond.wait_for(available, timeout=timeout):
+                return None
+            item = heapq.heappop(self._heap)[-1]
+            # other workers may wait for an item of higher priority
+            self._cond.notify_all()
+            return item
+
+    def task_done(self, user: str) -> None:
+        """ record an item of the user has finished, lowering the user load
+
+        Args:
+            user (str): user of the finished item
+        """
+        with self._cond:
+            self._user_load[user] -= 1
+            if self._user_load[user] <= 0:
+                del self._user_load[user]
+
+    def snapshot(self) -> list:
+        """ list the waiting items in the order they will be served
+
+        Returns:
+            list: waiting items
+        """
+        with self._cond:
+            return [entry[-1] for entry in sorted(self._heap)]
+
+
+class DaemonRequest:
+    """ Request received from a client, executed by a daemon worker
+    """
+
+    def __init__(self, conn: socket.socket, message: dict):
+        """ Initialize the request
+
+        Args:
+            conn (socket.socket): connection to the client
+            message (dict): request message sent by the client
+        """
+        self.conn = conn
+        self.message = message
+        self.args = message.get('args', [])
+        self.user = message.get('user', '')
+        self.cwd = message.get('cwd')
+        self.color = message.get('color')
+        # set when the client disconnect, the running command should stop
+        self.cancel_event = threading.Event()
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def send(self, message: dict) -> bool:
+        """ send a message to the client, ignoring a closed connection
+
+        Args:
+            message (dict): message to send
+
+        Returns:
+            bool: True if sent
+        """
+        with self._lock:
+            if self.cancel_event.is_set():
+                return False
+            try:
+                send_message(self.conn, message)
+                return True
+            except OSError:
+                self.cancel_event.set()
+                return False
+
+    def describe(self) -> dict:
+        """ summary of the request for the daemon status
+
+        Returns:
+            dict: user, cwd and command arguments
+        """
+        return {'user': self.user, 'cwd': self.cwd, 'args': self.args}
+
+
+class SocketStream(io.TextIOBase):
+    """ Text stream forwarding everything written to the client of a request,
+    used in place of stdout and stderr while the daemon execute the request
+    """
+
+    def __init__(self, request: DaemonRequest, name: str):
+        """ Initialize the stream
+
+        Args:
+            request (DaemonRequest): request to forward the output to
+            name (str): message key, DAEMON_MSG_OUT or DAEMON_MSG_ERR
+        """
+        super().__init__()
+        self.request = request
+        self.name = name
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return False
+
+    def write(self, s: str) -> int:
+        if not isinstance(s, str):
+            raise TypeError(f"write() argument must be str, not {type(s).__name__}")
+        if s:
+            self.request.send({self.name: s})
+        return len(s)
+
+
+class DaemonServer:
+    """ Unix socket server of the cid daemon. Connections are accepted concurrently,
+    requests are queued and executed concurrently by a pool of workers in queue
+    order. One more worker only execute the requests of DAEMON_REPORT_PRIORITY, so
+    a report does not wait behind long runs. The handler must not change the working
+    directory or the standard streams of the process, see util.request_context.
+    """
+
+    # interval in seconds to check for shutdown while waiting
+    poll_interval = 0.5
+
+    def __init__(self, handler: Callable[[DaemonRequest, SocketStream, SocketStream], int],
+                 socket_path: str = None, workers: int = c.DEFAULT_DAEMON_WORKERS,
+                 log_tool=logger):
+        """ Initialize the server
+
+        Args:
+            handler (Callable[[DaemonRequest, SocketStream, SocketStream], int]): function
+                executing a request given its stdout and stderr streams, return the
+                exit code. Called from several workers at once.
+            socket_path (str, optional): path of the socket. Defaults to None, see
+                get_socket_path.
+            workers (int, optional): number of requests of any priority executed
+                concurrently. Defaults to DEFAULT_DAEMON_WORKERS.
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+        """
+        self.handler = handler
+        self.socket_path = get_socket_path(socket_path)
+        self.workers = max(1, workers)
+        self.logger = log_tool
+        self.queue = RunQueue()
+        self.running = []
+        self._running_lock = threading.Lock()
+        self.ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._server = None
+
+    def serve_forever(self) -> None:
+        """ listen on the socket and serve the requests until shutdown
+
+        Raises:
+            RuntimeError: if another daemon is listening on the socket
+        """
+        if os.path.exists(self.socket_path):
+            if DaemonClient(self.socket_path).connect():
+                raise RuntimeError(f"cid daemon already running on {self.socket_path}")
+            # left over by a daemon that did not exit cleanly
+            os.unlink(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._server.listen()
+        self._server.settimeout(self.poll_interval)
+        workers = [threading.Thread(target=self._work, name=f"daemon-worker-{idx}",
+                                    daemon=True) for idx in range(self.workers)]
+        workers.append(threading.Thread(target=self._work, args=(c.DAEMON_REPORT_PRIORITY,),
+                                        name="daemon-report", daemon=True))
+        for worker in workers:
+            worker.start()
+        self.ready.set()
+        self.logger.info(f"cid daemon listening on {self.socket_path}")
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    conn, _ = self._server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                threading.Thread(target=self._handle_connection, args=(conn,),
+                                 name="daemon-conn", daemon=True).start()
+        except KeyboardInterrupt:
+            with self._running_lock:
+                for request in self.running:
+                    request.cancel_event.set()
+            raise
+        finally:
+            self._stop_event.set()
+            self._server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            for worker in workers:
+                worker.join()
+
+    def shutdown(self) -> None:
+        """ stop accepting requests, the running requests are completed and the waiting
+        requests are rejected
+        """
+        self._stop_event.set()
+
+    def status(self) -> dict:
+        """ describe the running and waiting requests
+
+        Returns:
+            dict: lists of running requests and of waiting requests
+        """
+        with self._running_lock:
+            running = list(self.running)
+        return {
+            'running': [request.describe() for request in running],
+            'queued': [request.describe() for request in self.queue.snapshot()],
+        }
+
+    def _handle_connection(self, conn: socket.socket) -> None:
+        """ read the request of a new connection and answer it
+
+        Args:
+            conn (socket.socket): client connection
+        """
+        with conn:
+            try:
+                message = next(read_messages(conn), None)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"invalid daemon request, {e}")
+                return
+            if message is None:
+                return
+            command = message.get('command')
+            if command == c.DAEMON_CMD_STATUS:
+                send_message(conn, self.status())
+            elif command == c.DAEMON_CMD_STOP:
+                send_message(conn, {c.DAEMON_MSG_OUT: "cid daemon stopping\n",
+                                    c.DAEMON_MSG_EXIT: 0})
+                self.shutdown()
+            elif command == c.DAEMON_CMD_EXEC:
+                request = DaemonRequest(conn, message)
+                self.queue.put(request, request.user, message.get('priority', 0))
+                self._wait_request(request)
+            else:
+                send_message(conn, {c.DAEMON_MSG_ERR: f"unknown command {command}\n",
+                                    c.DAEMON_MSG_EXIT: 2})
+
+    def _wait_request(self, request: DaemonRequest) -> None:
+        """ wait until the request is done, cancel it if the client disconnect first
+
+        Args:
+            request (DaemonRequest): queued request
+        """
+        try:
+            # the client send nothing after the request, recv return when it is closed
+            while request.conn.recv(1024):
+                pass
+        except OSError:
+            pass
+        if not request.done.is_set():
+            self.logger.info(f"client of {request.args} disconnected, cancel the request")
+            request.cancel_event.set()
+        request.done.wait()
+
+    def _work(self, max_priority: int = None) -> None:
+        """ worker loop, execute the requests one at a time in queue order
+
+        Args:
+            max_priority (int, optional): only execute the requests of this priority
+                or lower. Defaults to None, any priority.
+        """
+        while not self._stop_event.is_set():
+            request = self.queue.get(timeout=self.poll_interval, max_priority=max_priority)
+            if request is not None:
+                self._execute(request)
+        # reject the requests still waiting
+        while (request := self.queue.get(timeout=0, max_priority=max_priority)) is not None:
+            request.send({c.DAEMON_MSG_ERR: "cid daemon stopped before running the command\n",
+                          c.DAEMON_MSG_EXIT: 1})
+            self.queue.task_done(request.user)
+            request.done.set()
+
+    def _execute(self, request: DaemonRequest) -> None:
+        """ execute one request and send its exit code
+
+        Args:
+            request (DaemonRequest): request to execute
+        """
+        with self._running_lock:
+            self.running.append(request)
+        try:
+            if request.cancel_event.is_set():
+                return
+            out = SocketStream(request, c.DAEMON_MSG_OUT)
+            err = SocketStream(request, c.DAEMON_MSG_ERR)
+            try:
+                exit_code = self.handler(request, out, err)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self.logger.error(f"daemon request {request.args} fail, {e}")
+                err.write(f"cid daemon fail to execute the command, {e}\n")
+                exit_code = 1
+            request.send({c.DAEMON_MSG_EXIT: exit_code})
+        finally:
+            with self._running_lock:
+                self.running.remove(request)
+            self.queue.task_done(request.user)
+            request.done.set()
+
+
+class DaemonClient:
+    """ Client of the cid daemon, forward a command and stream back its output
+    """
+
+    def __init__(self, socket_path: str = None):
+        """ Initialize the client
+
+        Args:
+            socket_path (str, optional): path of the socket. Defaults to None, see
+                get_socket_path.
+        """
+        self.socket_path = get_socket_path(socket_path)
+        self.conn = None
+
+    def connect(self) -> bool:
+        """ connect to the daemon
+
+        Returns:
+            bool: True if the daemon is running
+        """
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+        except OSError:
+            conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    def request(self, message: dict) -> Iterator[dict]:
+        """ send a request and read the answers, connecting first if required
+
+        Args:
+            message (dict): request message
+
+        Raises:
+            ConnectionError: if the daemon is not running
+
+        Yields:
+            Iterator[dict]: answers from the daemon
+        """
+        if self.conn is None and not self.connect():
+            raise ConnectionError(f"cid daemon is not running on {self.socket_path}")
+        try:
+            send_message(self.conn, message)
+            yield from read_messages(self.conn)
+        finally:
+            self.conn.close()
+            self.conn = None
+
+    def execute(self, args: list, priority: int = 0, out=None, err=None) -> int:
+        """ execute a cid command in the daemon, from the current directory
+
+        Args:
+            args (list): command line arguments, e.g. ['pipeline', 'run']
+            priority (int, optional): queue priority, lower value is served first.
+                Defaults to 0.
+            out (io.TextIOBase, optional): stream for the output. Defaults to stdout.
+            err (io.TextIOBase, optional): stream for the errors. Defaults to stderr.
+
+        Returns:
+            int: exit code of the command, 1 if the daemon stop without one
+        """
+        out = out or sys.stdout
+        err = err or sys.stderr
+        message = {
+            'command': c.DAEMON_CMD_EXEC,
+            'args': args,
+            'cwd': os.getcwd(),
+            'user': getpass.getuser(),
+            'color': out.isatty(),
+            'priority': priority,
+        }
+        for answer in self.request(message):
+            for key, stream in ((c.DAEMON_MSG_OUT, out), (c.DAEMON_MSG_ERR, err)):
+                if key in answer:
+                    stream.write(answer[key])
+                    stream.flush()
+            if c.DAEMON_MSG_EXIT in answer:
+                return answer[c.DAEMON_MSG_EXIT]
+        err.write("cid daemon closed the connection\n")
+        return 1
@@ -1,21 +1,158 @@
 """ Module to manage upload files to aws s3
 """
+import hashlib
+import json
 import os
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import (ThreadPoolExecutor)
+from typing import Iterable
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from util.common_utils import (get_env, get_logger)
+from util.common_utils import (get_env, get_int_setting, get_logger)
 import util.constant as c
+from util.model import (ArtifactManifest)
 
 env = get_env()
 logger = get_logger("util.db_artifact")
 # pylint: disable=logging-fstring-interpolation
 # pylint: disable=too-few-public-methods
+
+class S3ClientRegistry:
+    """ Process wide registry of the s3 client, shared by all uploads and downloads
+    so they reuse one connection pool, of the buckets known to exist, so
+    create_bucket is called once per bucket, and of the artifact blobs known to be
+    stored, so their existence is checked once. boto3 clients are thread safe.
+    The part size and threads of the transfers are read from the env values
+    CICD_S3_PART_SIZE_MB and CICD_S3_THREADS.
+    """
+    _lock = threading.Lock()
+    _client = None
+    _transfer_config = None
+    _known_buckets = set()
+    _known_blobs = set()
+
+    @classmethod
+    def get_client(cls):
+        """ get the shared s3 client, created on first use
+
+        Returns:
+            S3.Client: boto3 s3 client
+        """
+        with cls._lock:
+            if cls._client is None:
+                threads = get_int_setting(c.ENV_S3_THREADS, c.DEFAULT_S3_THREADS)
+                # enough connections for the parallel parts of concurrent jobs
+                cls._client = boto3.client('s3', config=Config(
+                    max_pool_connections=max(c.DEFAULT_S3_POOL_SIZE, threads * 2)))
+            return cls._client
+
+    @classmethod
+    def get_transfer_config(cls) -> TransferConfig:
+        """ get the transfer configuration of the multipart uploads and downloads
+
+        Returns:
+            TransferConfig: part size and threads of the transfers
+        """
+        with cls._lock:
+            if cls._transfer_config is None:
+                part_size = cls.get_part_size()
+                cls._transfer_config = TransferConfig(
+                    multipart_threshold=part_size,
+                    multipart_chunksize=part_size,
+                    max_concurrency=get_int_setting(c.ENV_S3_THREADS, c.DEFAULT_S3_THREADS))
+            return cls._transfer_config
+
+    @classmethod
+    def get_part_size(cls) -> int:
+        """ part size of the multipart uploads, at least the 5 MiB required by s3
+
+        Returns:
+            int: part size in bytes
+        """
+        part_size_mb = get_int_setting(c.ENV_S3_PART_SIZE, c.S3_PART_SIZE // (1024 * 1024))
+        return max(part_size_mb, c.S3_MIN_PART_SIZE_MB) * 1024 * 1024
+
+    @classmethod
+    def get_threads(cls) -> int:
+        """ number of parts uploaded in parallel
+
+        Returns:
+            int: threads per transfer
+        """
+        return get_int_setting(c.ENV_S3_THREADS, c.DEFAULT_S3_THREADS)
+
+    @classmethod
+    def is_known_bucket(cls, bucket_name:str) -> bool:
+        """ check if the bucket is known to exist
+
+        Args:
+            bucket_name (str): bucket name
+
+        Returns:
+            bool: True if the bucket was created or found by this process
+        """
+        with cls._lock:
+            return bucket_name in cls._known_buckets
+
+    @classmethod
+    def add_known_bucket(cls, bucket_name:str) -> None:
+        """ record the bucket as existing
+
+        Args:
+            bucket_name (str): bucket name
+        """
+        with cls._lock:
+            cls._known_buckets.add(bucket_name)
+
+    @classmethod
+    def filter_known_blobs(cls, bucket_name:str, sha256s:set[str]) -> set[str]:
+        """ filter out the blobs known to be stored in the bucket
+
+        Args:
+            bucket_name (str): bucket name
+            sha256s (set[str]): hex digests of the blobs
+
+        Returns:
+            set[str]: the blobs not known to be stored
+        """
+        with cls._lock:
+            return {sha256 for sha256 in sha256s
+                    if (bucket_name, sha256) not in cls._known_blobs}
+
+    @classmethod
+    def add_known_blobs(cls, bucket_name:str, sha256s:set[str]) -> None:
+        """ record the blobs as stored in the bucket
+
+        Args:
+            bucket_name (str): bucket name
+            sha256s (set[str]): hex digests of the blobs
+        """
+        with cls._lock:
+            cls._known_blobs.update((bucket_name, sha256) for sha256 in sha256s)
+
+    @classmethod
+    def reset(cls) -> None:
+        """ drop the shared client, the known buckets and blobs, e.g. when the
+        credentials or endpoint changed
+        """
+        with cls._lock:
+            cls._client = None
+            cls._transfer_config = None
+            cls._known_buckets = set()
+            cls._known_blobs = set()
+
+
 class S3Client:
     """ Class to handle operations related to artifacts upload to s3
     """
 
     def __init__(self, bucket_name:str) -> None:
-        """ initialize the object based on given bucket_name
+        """ initialize the object based on given bucket_name, using the shared
+        s3 client. The bucket is created if not known to exist yet.
 
         Args:
             bucket_name (str): target bucket to store the artifact
@@ -23,12 +160,14 @@ class S3Client:
         Raises:
             ClientError: error in initializing s3 client
         """
+        self.bucket_name = bucket_name
+        self.s3_client = S3ClientRegistry.get_client()
+        if S3ClientRegistry.is_known_bucket(bucket_name):
+            return
         try:
-            self.bucket_name = bucket_name
             s3_region = c.DEFAULT_S3_LOC
             if "AWS_S3_REGION" in env:
                 s3_region = env["AWS_S3_REGION"]
-            self.s3_client = boto3.client('s3')
             self.s3_client.create_bucket(
                 CreateBucketConfiguration={
                     'LocationConstraint': s3_region,
@@ -41,22 +180,427 @@ class S3Client:
             if error_code != 'BucketAlreadyOwnedByYou':
                 logger.warning("Error in initializing s3client, error is %s", ce.response)
                 raise ce
+        S3ClientRegistry.add_known_bucket(bucket_name)
 
-    def upload_file(self, file_name:str) -> bool:
+    def upload_file(self, file_name:str, object_name:str=None) -> bool:
         """ Upload a file to target s3 bucket
 
         Args:
             file_name (str): file name to upload
+            object_name (str, optional): object name in the bucket.
+                Defaults to None, which use the base name of the file.
 
         Returns:
             bool: True if file was uploaded, else False
         """
         try:
-            object_name = os.path.basename(file_name)
-            self.s3_client.upload_file(file_name, self.bucket_name, object_name)
+            if object_name is None:
+                object_name = os.path.basename(file_name)
+            self.s3_client.upload_file(file_name, self.bucket_name, object_name,
+                                       Config=S3ClientRegistry.get_transfer_config())
             return True
         except (TypeError, ClientError) as e:
             error_msg = f"Error in uploading file for {file_name}\n"
             error_msg += f"Error message = {str(e)}"
             logger.warning(error_msg)
             return False
+
+    def open_upload(self, object_name:str, part_size:int=None,
+                    threads:int=None) -> 'S3MultipartWriter':
+        """ Open a multipart upload to write an object as a stream
+
+        Args:
+            object_name (str): object name in the bucket
+            part_size (int, optional): bytes buffered before each part is uploaded.
+                Defaults to None, which use the registry part size.
+            threads (int, optional): parts uploaded in parallel. Defaults to None,
+                which use the registry threads.
+
+        Returns:
+            S3MultipartWriter: writer of the object content
+        """
+        return S3MultipartWriter(self.s3_client, self.bucket_name, object_name,
+                                 part_size or S3ClientRegistry.get_part_size(),
+                                 threads or S3ClientRegistry.get_threads())
+
+    def download_file(self, object_name:str, file_name:str) -> bool:
+        """ Download an object from target s3 bucket
+
+        Args:
+            object_name (str): object name in the bucket
+            file_name (str): local file name to save to
+
+        Returns:
+            bool: True if file was downloaded, else False
+        """
+        try:
+            self.s3_client.download_file(self.bucket_name, object_name, file_name,
+                                         Config=S3ClientRegistry.get_transfer_config())
+            return True
+        except (TypeError, ClientError) as e:
+            error_msg = f"Error in downloading file for {object_name}\n"
+            error_msg += f"Error message = {str(e)}"
+            logger.warning(error_msg)
+            return False
+
+
+class S3MultipartWriter:
+    """ Write only, non seekable file object uploading its content as the parts
+    of a s3 multipart upload. Up to threads parts are uploaded in parallel, and
+    write wait for the oldest part when all threads are busy, so the memory used
+    is bounded by threads + 1 parts. The upload is created on the first part,
+    and the object is only visible once close is called.
+    """
+
+    def __init__(self, s3_client, bucket_name:str, object_name:str,
+                 part_size:int=c.S3_PART_SIZE, threads:int=1) -> None:
+        """ initialize the writer
+
+        Args:
+            s3_client (S3.Client): boto3 s3 client
+            bucket_name (str): target bucket
+            object_name (str): object name in the bucket
+            part_size (int, optional): bytes buffered before each part is uploaded.
+                Defaults to S3_PART_SIZE.
+            threads (int, optional): parts uploaded in parallel. Defaults to 1.
+        """
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.object_name = object_name
+        self.part_size = part_size
+        self.threads = max(1, threads)
+        self.size = 0
+        self._buffer = bytearray()
+        self._parts = []
+        self._pending = deque()
+        self._executor = None
+        self._upload_id = None
+
+    def write(self, data:bytes) -> int:
+        """ buffer the data, uploading a part each time part_size bytes are buffered
+
+        Args:
+            data (bytes): data to write
+
+        Returns:
+            int: number of bytes written
+        """
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._submit_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def flush(self) -> None:
+        """ nothing to flush, parts smaller than part_size are only uploaded by close
+        """
+
+    def close(self) -> None:
+        """ upload the last part, wait for all parts and complete the upload
+
+        Raises:
+            ClientError: if the upload failed, the upload is aborted
+        """
+        try:
+            if self._buffer or not self._parts and not self._pending:
+                self._submit_part(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._parts.append(self._pending.popleft().result())
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.object_name,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': self._parts}
+            )
+        except ClientError:
+            self.abort()
+            raise
+        finally:
+            self._shutdown()
+
+    def abort(self) -> None:
+        """ abort the upload, so the parts uploaded are not kept in the bucket
+        """
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._shutdown()
+        if self._upload_id is None:
+            return
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=self.object_name, UploadId=self._upload_id)
+        except ClientError as ce:
+            logger.warning(f"Error in aborting upload of {self.object_name}, error is {ce}")
+        self._upload_id = None
+
+    def _submit_part(self, body:bytes) -> None:
+        """ upload a part in the background, creating the multipart upload for the
+        first one. Wait for the oldest part if all threads are busy
+
+        Args:
+            body (bytes): content of the part
+        """
+        if self._upload_id is None:
+            self._upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=self.object_name)['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=self.threads)
+        if len(self._pending) >= self.threads:
+            self._parts.append(self._pending.popleft().result())
+        part_number = len(self._parts) + len(self._pending) + 1
+        self._pending.append(self._executor.submit(self._upload_part, part_number, body))
+
+    def _upload_part(self, part_number:int, body:bytes) -> dict:
+        """ upload a part
+
+        Args:
+            part_number (int): number of the part, starting from 1
+            body (bytes): content of the part
+
+        Returns:
+            dict: ETag and PartNumber of the part, to complete the upload
+        """
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.object_name,
+            PartNumber=part_number,
+            UploadId=self._upload_id,
+            Body=body
+        )
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def _shutdown(self) -> None:
+        """ stop the upload threads
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class ArtifactStore:
+    """ Content addressed store of the job artifacts in a bucket. Each file is
+    stored once as a blob named by its sha256, and each job run store a manifest
+    listing its files under <pipeline>/<run>/<stage>/<job>/manifest.json, so files
+    unchanged since an earlier run, or shared with another job, are not uploaded
+    again.
+    """
+
+    def __init__(self, bucket_name:str) -> None:
+        """ initialize the store on the bucket
+
+        Args:
+            bucket_name (str): bucket of the artifacts
+
+        Raises:
+            ClientError: error in initializing s3 client
+        """
+        self.s3 = S3Client(bucket_name=bucket_name)
+
+    @staticmethod
+    def blob_key(sha256:str) -> str:
+        """ object name of a blob
+
+        Args:
+            sha256 (str): hex digest of the file content
+
+        Returns:
+            str: object name
+        """
+        return c.ARTIFACT_BLOB_PREFIX + sha256
+
+    @staticmethod
+    def manifest_key(pipeline:str, run:str, stage:str, job_name:str) -> str:
+        """ object name of the manifest of a job run
+
+        Args:
+            pipeline (str): pipeline prefix, repo-branch-pipeline
+            run (str): run number
+            stage (str): stage of the job
+            job_name (str): name of the job
+
+        Returns:
+            str: object name
+        """
+        return f"{pipeline}/{run}/{stage}/{job_name}/{c.ARTIFACT_MANIFEST_FILE}"
+
+    def missing_blobs(self, sha256s:Iterable[str]) -> set[str]:
+        """ find the blobs not stored yet. Instead of one request per blob, the blobs
+        are grouped by the first ARTIFACT_LIST_PREFIX_LEN hex digits of their hash,
+        and each group is checked with one listing run in parallel. The blobs found
+        are recorded in the S3ClientRegistry, so they are not checked again.
+
+        Args:
+            sha256s (Iterable[str]): hex digests of the file contents
+
+        Returns:
+            set[str]: the blobs to upload
+
+        Raises:
+            ClientError: if a listing failed
+        """
+        bucket_name = self.s3.bucket_name
+        unknown = S3ClientRegistry.filter_known_blobs(bucket_name, set(sha256s))
+        groups = {}
+        for sha256 in unknown:
+            groups.setdefault(sha256[:c.ARTIFACT_LIST_PREFIX_LEN], []).append(sha256)
+        found = set()
+        if groups:
+            with ThreadPoolExecutor(
+                    max_workers=min(len(groups), S3ClientRegistry.get_threads())) as executor:
+                for stored in executor.map(self._list_blobs, groups.values()):
+                    found |= stored
+        S3ClientRegistry.add_known_blobs(bucket_name, found)
+        return unknown - found
+
+    def _list_blobs(self, sha256s:list[str]) -> set[str]:
+        """ list the stored blobs of a group sharing the same prefix. Keys are listed
+        in order, so the listing starts before the smallest hash of the group and
+        stops after the largest one.
+
+        Args:
+            sha256s (list[str]): hex digests sharing the first ARTIFACT_LIST_PREFIX_LEN
+                digits
+
+        Returns:
+            set[str]: the blobs of the group that are stored
+        """
+        wanted = set(sha256s)
+        last = max(sha256s)
+        prefix = self.blob_key(last[:c.ARTIFACT_LIST_PREFIX_LEN])
+        paginator = self.s3.s3_client.get_paginator('list_objects_v2')
+        stored = set()
+        # StartAfter is exclusive, start after a key just before the smallest blob
+        for page in paginator.paginate(Bucket=self.s3.bucket_name, Prefix=prefix,
+                                       StartAfter=self.blob_key(min(sha256s))[:-1]):
+            for item in page.get('Contents', []):
+                sha256 = item['Key'][len(c.ARTIFACT_BLOB_PREFIX):]
+                if sha256 > last:
+                    return stored
+                if sha256 in wanted:
+                    stored.add(sha256)
+        return stored
+
+    def mark_stored(self, sha256:str) -> None:
+        """ record a blob uploaded by this process as stored
+
+        Args:
+            sha256 (str): hex digest of the file content
+        """
+        S3ClientRegistry.add_known_blobs(self.s3.bucket_name, {sha256})
+
+    def open_blob(self, sha256:str) -> S3MultipartWriter:
+        """ open the upload of a blob
+
+        Args:
+            sha256 (str): hex digest of the file content
+
+        Returns:
+            S3MultipartWriter: writer of the blob content
+        """
+        return self.s3.open_upload(self.blob_key(sha256))
+
+    def put_manifest(self, manifest:ArtifactManifest) -> str:
+        """ store the manifest of a job run
+
+        Args:
+            manifest (ArtifactManifest): files of the job run
+
+        Returns:
+            str: object name of the manifest
+
+        Raises:
+            ClientError: if the upload failed
+        """
+        key = self.manifest_key(manifest.pipeline, manifest.run, manifest.stage,
+                                manifest.job_name)
+        self.s3.s3_client.put_object(Bucket=self.s3.bucket_name, Key=key,
+                                     Body=manifest.model_dump_json().encode('utf-8'),
+                                     ContentType='application/json')
+        return key
+
+    def get_manifest(self, key:str) -> ArtifactManifest | None:
+        """ read the manifest of a job run
+
+        Args:
+            key (str): object name of the manifest
+
+        Returns:
+            ArtifactManifest | None: the manifest, None if not found or invalid
+        """
+        try:
+            response = self.s3.s3_client.get_object(Bucket=self.s3.bucket_name, Key=key)
+            return ArtifactManifest.model_validate(json.loads(response['Body'].read()))
+        except (ClientError, ValueError) as e:
+            logger.warning(f"Error in reading manifest {key}, error is {e}")
+            return None
+
+    def download(self, manifest:ArtifactManifest, dest_dir:str) -> int:
+        """ download the files of a manifest to a directory. The blobs are split in
+        ranges of the registry part size, fetched in parallel with ranged GETs
+        written in place, then each file is checked against its hash. A blob used
+        by several files is downloaded once.
+
+        Args:
+            manifest (ArtifactManifest): files to download
+            dest_dir (str): directory to write the files to, under their path
+
+        Returns:
+            int: bytes downloaded
+
+        Raises:
+            ValueError: if a path of the manifest is outside of dest_dir
+            OSError: if a file could not be written, or does not match its hash
+            ClientError: if a download failed
+        """
+        root = os.path.realpath(dest_dir)
+        targets = {}
+        for file in manifest.files:
+            target = os.path.realpath(os.path.join(root, file.path))
+            if os.path.commonpath([root, target]) != root:
+                raise ValueError(f"artifact path {file.path} is outside of {dest_dir}")
+            targets.setdefault(file.sha256, []).append((target, file))
+
+        # the first file of each blob is allocated, and its ranges written in place
+        part_size = S3ClientRegistry.get_part_size()
+        ranges = []
+        for sha256, entries in targets.items():
+            target, file = entries[0]
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as local:
+                local.truncate(file.size)
+            ranges += [(sha256, target, start, min(start + part_size, file.size) - 1)
+                       for start in range(0, file.size, part_size)]
+        with ThreadPoolExecutor(max_workers=S3ClientRegistry.get_threads()) as executor:
+            list(executor.map(lambda args: self._download_range(*args), ranges))
+
+        size = 0
+        for sha256, entries in targets.items():
+            first, file = entries[0]
+            with open(first, 'rb') as local:
+                if hashlib.file_digest(local, 'sha256').hexdigest() != sha256:
+                    raise OSError(f"downloaded file {file.path} does not match blob {sha256}")
+            size += file.size
+            for target, _ in entries[1:]:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(first, target)
+            for target, entry in entries:
+                os.chmod(target, entry.mode)
+        return size
+
+    def _download_range(self, sha256:str, target:str, start:int, end:int) -> None:
+        """ download a range of a blob into its place in the local file
+
+        Args:
+            sha256 (str): hex digest of the blob
+            target (str): local file, allocated to the blob size
+            start (int): first byte of the range
+            end (int): last byte of the range, inclusive
+        """
+        response = self.s3.s3_client.get_object(Bucket=self.s3.bucket_name,
+                                                Key=self.blob_key(sha256),
+                                                Range=f"bytes={start}-{end}")
+        with open(target, 'r+b') as local:
+            local.seek(start)
+            shutil.copyfileobj(response['Body'], local, c.ARCHIVE_CHUNK_SIZE)
@@ -18,12 +18,37 @@ class MongoAdapter:
     """ Adapter class to provide standardize queries to mongo db
     """
 
-    def __init__(self):
+    def __init__(self, shared_client: bool = False):
         """ Default Constructor
+
+        Args:
+            shared_client (bool, optional): keep one client open and reuse it for all
+                operations, for long-lived process like the daemon. Defaults to False,
+                a new client is opened and closed for every operation.
         """
         # store the mongoDB url in bash rc file. Using atlas for this.
         # self.mongo_uri = os.getenv('MONGO_DB_URL')
         self.mongo_uri = env['MONGO_DB_URL'] if 'MONGO_DB_URL' in env else ""
+        self.shared_client = MongoClient(self.mongo_uri) if shared_client else None
+
+    def _connect(self) -> MongoClient:
+        """ Get the client to run an operation, the shared client if any
+
+        Returns:
+            MongoClient: mongo client
+        """
+        if self.shared_client is not None:
+            return self.shared_client
+        return MongoClient(self.mongo_uri)
+
+    def _disconnect(self, mongo_client: MongoClient) -> None:
+        """ Close the client after an operation, unless it is the shared client
+
+        Args:
+            mongo_client (MongoClient): client returned by _connect
+        """
+        if mongo_client is not self.shared_client:
+            mongo_client.close()
 
     def _insert(self, data: dict, db_name: str, collection_name: str) -> str:
         """ Generic Helper method to insert the data
@@ -36,11 +61,11 @@ class MongoAdapter:
         Returns:
             str: the inserted_id(converted to str) if successful
         """
-        mongo_client = MongoClient(self.mongo_uri)
+        mongo_client = self._connect()
         database = mongo_client[db_name]
         collection = database[collection_name]
         result = collection.insert_one(data)
-        mongo_client.close()
+        self._disconnect(mongo_client)
         return str(result.inserted_id)
 
     def _update(self, data: dict, db_name: str, collection_name: str) -> bool:
@@ -55,7 +80,7 @@ class MongoAdapter:
         Returns:
             bool: boolean indicator if successful
         """
-        mongo_client = MongoClient(self.mongo_uri)
+        mongo_client = self._connect()
         database = mongo_client[db_name]
         collection = database[collection_name]
         updated_data = copy.deepcopy(data)
@@ -65,7 +90,7 @@ class MongoAdapter:
         update_operation = {'$set': updated_data}
         result = collection.update_one(
             query_filter, update_operation)
-        mongo_client.close()
+        self._disconnect(mongo_client)
         return result.acknowledged
 
     def _update_by_query(self, query:dict, data:dict, db_name: str, collection_name: str)-> bool:
@@ -82,7 +107,7 @@ class MongoAdapter:
         Returns:
             bool: boolean indicator if successful
         """
-        mongo_client = MongoClient(self.mongo_uri)
+        mongo_client = self._connect()
         database = mongo_client[db_name]
         collection = database[collection_name]
         updated_data = copy.deepcopy(data)
@@ -92,7 +117,7 @@ class MongoAdapter:
         update_operation = {'$set': updated_data}
         result = collection.update_one(
             query, update_operation, upsert=True)
-        mongo_client.close()
+        self._disconnect(mongo_client)
         return result.acknowledged
 
     def _retrieve(
@@ -110,12 +135,12 @@ class MongoAdapter:
         Returns:
             dict: target record in dict form
         """
-        mongo_client = MongoClient(self.mongo_uri)
+        mongo_client = self._connect()
         database = mongo_client[db_name]
         collection = database[collection_name]
         result = collection.find_one(
             {c.FIELD_ID: bson.objectid.ObjectId(doc_id)})
-        mongo_client.close()
+        self._disconnect(mongo_client)
         return result
 
     def _retrieve_by_query(self, query:dict, db_name: str,
@@ -131,11 +156,11 @@ class MongoAdapter:
         Returns:
             dict: target record in dict form
         """
-        mongo_client = MongoClient(self.mongo_uri)
+        mongo_client = self._connect()
         database = mongo_client[db_name]
         collection = database[collection_name]
         result = collection.find_one(query)
-        mongo_client.close()
+        self._disconnect(mongo_client)
         return result
 
     def _delete(self, doc_id: str, db_name: str, collection_name: str) -> bool:
@@ -149,12 +174,12 @@ class MongoAdapter:
         Returns:
             bool: boolean indicator if successful
         """
-        mongo_client = MongoClient(self.mongo_uri)
+        mongo_client = self._connect()
         database = mongo_client[db_name]
         collection = database[collection_name]
         result = collection.delete_one(
             {c.FIELD_ID: bson.objectid.ObjectId(doc_id)})
-        mongo_client.close()
+        self._disconnect(mongo_client)
         return result.acknowledged
 
     def insert_repo_pipelines(
@@ -412,11 +437,11 @@ class MongoAdapter:
                 c.FIELD_ID: 1,
                 f"pipelines.{pipeline_name}": 1
             }
-            mongo_client = MongoClient(self.mongo_uri)
+            mongo_client = self._connect()
             database = mongo_client[c.MONGO_DB_NAME]
             collection = database[c.MONGO_PIPELINES_TABLE]
             pipeline_document = collection.find_one(query_filter, projection)
-            mongo_client.close()
+            self._disconnect(mongo_client)
             if pipeline_document:
                 pipeline_data = pipeline_document[c.FIELD_PIPELINES].get(pipeline_name, {})
                 pipeline_data[c.FIELD_PIPELINE_NAME] = pipeline_name
@@ -434,6 +459,62 @@ class MongoAdapter:
             print(f"pipelines: {pipeline_document} is empty.\nError: {str(attr)}")
             return {}
 
+    def get_run_status(self, repo_name: str, branch: str, pipeline_name: str,
+                       run_number: int) -> str | None:
+        """Retrieve the status of a pipeline run from the jobs history.
+
+        Args:
+            repo_name (str): Repository name.
+            branch (str): Repository branch.
+            pipeline_name (str): Name of the pipeline.
+            run_number (int): Run number of the pipeline.
+
+        Returns:
+            str | None: Status of the run, None if the run is not recorded or
+                not finished.
+        """
+        return (self.get_run_job(repo_name, branch, pipeline_name, run_number) or {}).get(
+            c.FIELD_STATUS)
+
+    def get_run_job(self, repo_name: str, branch: str, pipeline_name: str,
+                    run_number: int) -> dict | None:
+        """Retrieve the job record of a pipeline run from the jobs history, e.g. to
+        reconcile the docker resources labelled with the run.
+
+        Args:
+            repo_name (str): Repository name.
+            branch (str): Repository branch.
+            pipeline_name (str): Name of the pipeline.
+            run_number (int): Run number of the pipeline.
+
+        Returns:
+            dict | None: Job record of the run, None if the run is not recorded.
+        """
+        try:
+            query_filter = {
+                c.FIELD_REPO_NAME: repo_name,
+                c.FIELD_BRANCH: branch,
+                f"{c.FIELD_PIPELINES}.{pipeline_name}": {"$exists": True}
+            }
+            projection = {
+                f"{c.FIELD_PIPELINES}.{pipeline_name}.{c.FIELD_JOB_RUN_HISTORY}": 1
+            }
+            mongo_client = self._connect()
+            database = mongo_client[c.MONGO_DB_NAME]
+            pipeline_document = database[c.MONGO_PIPELINES_TABLE].find_one(
+                query_filter, projection)
+            self._disconnect(mongo_client)
+            if not pipeline_document:
+                return None
+            job_run_history = pipeline_document[c.FIELD_PIPELINES][pipeline_name].get(
+                c.FIELD_JOB_RUN_HISTORY) or []
+            if run_number < 1 or run_number > len(job_run_history):
+                return None
+            return self.get_job(job_run_history[run_number - 1]) or None
+        except errors.PyMongoError as e:
+            logger.warning("Error retrieving run: %s", str(e))
+            return None
+
     def update_pipeline_info(
             self,
             repo_name: str,
@@ -503,11 +584,11 @@ class MongoAdapter:
         aggregation_pipeline.append({"$sort": {"job_details.run_number": -1}})
 
         try:
-            mongo_client = MongoClient(self.mongo_uri)
+            mongo_client = self._connect()
             database = mongo_client[c.MONGO_DB_NAME]
             repo_collection = database[c.MONGO_PIPELINES_TABLE]
             result = list(repo_collection.aggregate(aggregation_pipeline))
-            mongo_client.close()
+            self._disconnect(mongo_client)
             return result
 
         except errors.PyMongoError as e:
@@ -0,0 +1,160 @@
+""" dep_cache module provide the index of the dependency cache volumes, which hold
+the paths declared in the cache section of the jobs (e.g. ~/.cache/pip,
+node_modules) across runs. The volumes are managed by the DockerManager, the
+index record the key, path and last use of each volume to find the nearest key
+to restore from and to evict the least recently used volumes.
+"""
+import hashlib
+import json
+import re
+from pathlib import Path
+import util.constant as c
+from util.common_utils import (get_logger)
+from util.lru_index import (LruIndex, get_budget)
+from util.repo_manager import (RepoManager)
+
+logger = get_logger("util.dep_cache")
+
+class DependencyCache:
+    """ Index of the dependency cache volumes, stored as a json file in the cache
+    directory. Each volume hold one path of one key, and is named by the hash of
+    the repository, key and path.
+    """
+    INDEX_FILE = 'dep_cache.json'
+
+    def __init__(self, cache_dir: str = None, repo_path: str = None,
+                 budget_mb: int = None, log_tool=logger) -> None:
+        """ Initialize the DependencyCache
+
+        Args:
+            cache_dir (str, optional): directory of the index file. Defaults to None,
+                which use DEFAULT_CACHE_DIR under the home directory.
+            repo_path (str, optional): repository to hash the files of the key
+                templates from. Defaults to None, which use the current working directory.
+            budget_mb (int, optional): disk budget of all the cache volumes in MiB.
+                Defaults to None, which use the CICD_DEP_CACHE_BUDGET_MB env value
+                or DEFAULT_DEP_CACHE_BUDGET_MB.
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+        """
+        self.logger = log_tool
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home().joinpath(
+            c.DEFAULT_CACHE_DIR)
+        self.repo_path = repo_path
+        self.repo_manager = RepoManager()
+        self.budget = get_budget(c.ENV_DEP_CACHE_BUDGET, c.DEFAULT_DEP_CACHE_BUDGET_MB,
+                                 budget_mb, log_tool)
+        self.index = LruIndex(self.cache_dir.joinpath(self.INDEX_FILE), self.budget,
+                              log_tool)
+
+    def resolve_key(self, template: str) -> str:
+        """ resolve the key template of a job, each ${{ hashFiles('a', 'b') }} is
+        replaced by the hash of the git hashes of the files at the current commit,
+        so the key changes only when one of the files changed
+
+        Args:
+            template (str): key template
+
+        Returns:
+            str: the key
+        """
+        def replace(match: re.Match) -> str:
+            paths = [path.strip().strip('\'"') for path in match.group(1).split(',')]
+            hashes = self.repo_manager.get_tree_hashes([path for path in paths if path],
+                                                       self.repo_path)
+            serialized = json.dumps(hashes, sort_keys=True)
+            return hashlib.sha256(serialized.encode('utf-8')).hexdigest()[:16]
+        return re.sub(c.REGEX_HASH_FILES_REF, replace, template).strip()
+
+    @staticmethod
+    def restore_prefixes(template: str, restore_keys: list[str] = None) -> list[str]:
+        """ prefixes of the keys a cache can be restored from when its key is not
+        found, in order of preference. Defaults to the part of the key template
+        before its first ${{ }} reference
+
+        Args:
+            template (str): key template
+            restore_keys (list[str], optional): prefixes given by the job.
+                Defaults to None.
+
+        Returns:
+            list[str]: the prefixes, empty if none apply
+        """
+        if restore_keys:
+            return [str(prefix) for prefix in restore_keys if str(prefix)]
+        prefix = template.split('${{', 1)[0]
+        return [prefix] if prefix and prefix != template else []
+
+    @staticmethod
+    def volume_name(repo: str, key: str, path: str) -> str:
+        """ name of the volume holding a path of a key
+
+        Args:
+            repo (str): repository name
+            key (str): resolved cache key
+            path (str): path in the job container
+
+        Returns:
+            str: volume name
+        """
+        digest = hashlib.sha256(f"{repo}\n{key}\n{path}".encode('utf-8')).hexdigest()
+        return repo + c.DEP_CACHE_VOL_INFIX + digest[:24]
+
+    def nearest(self, repo: str, path: str, prefixes: list[str],
+                exclude: str = None) -> tuple[str, str] | None:
+        """ find the volume to restore a path from, the most recently used volume
+        of the same repository and path whose key start with the first prefix
+        that has one
+
+        Args:
+            repo (str): repository name
+            path (str): path in the job container
+            prefixes (list[str]): prefixes of the keys, in order of preference
+            exclude (str, optional): volume to leave out. Defaults to None.
+
+        Returns:
+            tuple[str, str] | None: volume name and its key, None if no key match
+        """
+        index = self.index.entries()
+        for prefix in prefixes:
+            candidates = [(entry['last_used'], name, entry['key'])
+                          for name, entry in index.items()
+                          if name != exclude and entry['repo'] == repo and
+                          entry['path'] == path and entry['key'].startswith(prefix)]
+            if candidates:
+                _, name, key = max(candidates)
+                return name, key
+        return None
+
+    def touch(self, volume: str, repo: str, key: str, path: str) -> None:
+        """ record the use of a volume, the volume is then found by nearest and
+        kept by select_evictions over the volumes used earlier
+
+        Args:
+            volume (str): volume name
+            repo (str): repository name
+            key (str): resolved cache key
+            path (str): path in the job container
+        """
+        self.index.touch(volume, repo=repo, key=key, path=path)
+
+    def forget(self, volumes: list[str]) -> None:
+        """ remove volumes from the index, e.g. removed or not saved
+
+        Args:
+            volumes (list[str]): volume names
+        """
+        self.index.forget(volumes)
+
+    def select_evictions(self, sizes: dict) -> list[str]:
+        """ select the least recently used volumes to remove so the total size of
+        the volumes is within the budget
+
+        Args:
+            sizes (dict): size in bytes of each volume of the index still present,
+                volumes missing are dropped from the index
+
+        Returns:
+            list[str]: volume names to remove, least recently used first
+        """
+        return self.index.select_evictions(sizes)
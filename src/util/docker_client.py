@@ -0,0 +1,116 @@
+""" docker_client module provide the docker client shared by all the pipeline runs
+of the process, with a connection pool sized for the concurrent jobs, the timeout
+and the retry policy of the API calls, and a health check reconnecting to the
+docker engine after a restart.
+"""
+import threading
+import time
+import docker
+import docker.errors
+from requests.exceptions import RequestException
+from urllib3.util.retry import Retry
+from util.common_utils import (get_int_setting, get_logger)
+import util.constant as c
+
+logger = get_logger("util.docker_client")
+# pylint: disable=logging-fstring-interpolation
+
+
+class DockerClientRegistry:
+    """ Process wide registry of the docker client, shared by all DockerManager so
+    the API calls of concurrent jobs use one connection pool. docker clients are
+    thread safe. The pool size, timeout in seconds and retries of the API calls are
+    read from the env values CICD_DOCKER_POOL_SIZE, CICD_DOCKER_TIMEOUT and
+    CICD_DOCKER_RETRIES. Connection errors are retried for all calls, as the
+    request was not sent, read errors only for GET calls.
+    """
+    _lock = threading.Lock()
+    _client = None
+
+    @classmethod
+    def get_client(cls) -> docker.DockerClient:
+        """ get the shared docker client, created on first use from the environment
+
+        Returns:
+            docker.DockerClient: docker client
+
+        Raises:
+            docker.errors.DockerException: if the docker engine is not reachable
+        """
+        with cls._lock:
+            if cls._client is None:
+                cls._client = cls._create_client()
+            return cls._client
+
+    @classmethod
+    def check_health(cls, wait: float = None) -> bool:
+        """ check the docker engine answer, otherwise reconnect until it answer again
+        or the wait is over, e.g. while the engine restart. The shared client is
+        replaced on reconnect, get_client return the new one.
+
+        Args:
+            wait (float, optional): seconds to wait for the engine. Defaults to None,
+                which use the CICD_DOCKER_RECONNECT_WAIT env value.
+
+        Returns:
+            bool: True if the docker engine is available
+        """
+        if wait is None:
+            wait = get_int_setting(c.ENV_DOCKER_RECONNECT_WAIT,
+                                    c.DEFAULT_DOCKER_RECONNECT_WAIT)
+        deadline = time.monotonic() + wait
+        delay = c.DOCKER_RETRY_BACKOFF
+        client = None
+        while True:
+            try:
+                client = client or cls.get_client()
+                client.ping()
+                return True
+            except (docker.errors.DockerException, RequestException) as e:
+                if time.monotonic() + delay > deadline:
+                    logger.warning(f"docker engine not available, error is {e}")
+                    return False
+                logger.info(f"docker engine not available, reconnecting in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, c.DOCKER_RETRY_BACKOFF_MAX)
+            cls.reset(client)
+            client = None
+
+    @classmethod
+    def reset(cls, client: docker.DockerClient = None) -> None:
+        """ close and drop the shared client, the next get_client connect again
+
+        Args:
+            client (docker.DockerClient, optional): drop the shared client only if it
+                is this one, so concurrent reconnects replace it once. Defaults to None,
+                always drop.
+        """
+        with cls._lock:
+            if cls._client is None or (client is not None and cls._client is not client):
+                return
+            old_client, cls._client = cls._client, None
+        try:
+            old_client.close()
+        except (docker.errors.DockerException, RequestException) as e:
+            logger.debug(f"failed to close docker client, error is {e}")
+
+    @classmethod
+    def _create_client(cls) -> docker.DockerClient:
+        """ create a docker client from the environment with the pool size, timeout
+        and retry policy of the env values
+
+        Returns:
+            docker.DockerClient: docker client
+        """
+        retries = get_int_setting(c.ENV_DOCKER_RETRIES, c.DEFAULT_DOCKER_RETRIES)
+        client = docker.from_env(
+            timeout=get_int_setting(c.ENV_DOCKER_TIMEOUT, c.DEFAULT_DOCKER_TIMEOUT),
+            max_pool_size=get_int_setting(c.ENV_DOCKER_POOL_SIZE,
+                                           c.DEFAULT_DOCKER_POOL_SIZE))
+        retry = Retry(total=retries, connect=retries, read=retries, status=0,
+                      allowed_methods=frozenset(['GET', 'HEAD']),
+                      backoff_factor=c.DOCKER_RETRY_BACKOFF,
+                      raise_on_status=False)
+        for adapter in client.api.adapters.values():
+            adapter.max_retries = retry
+        return client
@@ -0,0 +1,185 @@
+""" job_cache module provide the content-addressed cache of job results, so
+a job whose inputs are unchanged can be skipped. The cache has a local on-disk
+tier and an optional s3 tier shared between machines.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from botocore.exceptions import ClientError
+import util.constant as c
+from util.common_utils import (get_env, get_logger)
+from util.db_artifact import (S3Client)
+from util.model import (ArtifactManifest, JobLog)
+from util.repo_manager import (RepoManager)
+
+logger = get_logger("util.job_cache")
+
+# pylint: disable=logging-fstring-interpolation
+
+class JobCache:
+    """ Cache of successful job results. Each entry is stored in a directory named
+    by the cache key, holding the job log and the artifact manifest if any. The job
+    log is written last, so an entry is only visible once complete.
+    """
+    JOB_LOG_FILE = 'job_log.json'
+    ARTIFACT_FILE = 'artifacts.json'
+
+    def __init__(self, cache_dir: str = None, s3_bucket: str = None,
+                 repo_path: str = None, log_tool=logger) -> None:
+        """ Initialize the JobCache
+
+        Args:
+            cache_dir (str, optional): local cache directory. Defaults to None,
+                which use DEFAULT_CACHE_DIR under the home directory.
+            s3_bucket (str, optional): bucket for the shared s3 tier. Defaults to None,
+                which use the CICD_CACHE_BUCKET env value if set.
+            repo_path (str, optional): repository to hash the job inputs from.
+                Defaults to None, which use the current working directory.
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+        """
+        self.logger = log_tool
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home().joinpath(
+            c.DEFAULT_CACHE_DIR)
+        if s3_bucket is None:
+            s3_bucket = get_env().get(c.ENV_CACHE_BUCKET)
+        self.s3_bucket = s3_bucket
+        self.repo_path = repo_path
+        self.repo_manager = RepoManager()
+        self._s3_client = None
+
+    def compute_key(self, image_id: str, job_config: dict) -> str:
+        """ compute the cache key of a job from the resolved image id, the
+        scripts, the rest of the job configuration and the git hashes of the
+        declared inputs.
+
+        Args:
+            image_id (str): id (digest) of the docker image used
+            job_config (dict): validated job configuration
+
+        Returns:
+            str: sha256 hex digest as the cache key
+        """
+        input_hashes = self.repo_manager.get_tree_hashes(
+            job_config.get(c.JOB_SUBKEY_INPUTS, []), self.repo_path)
+        key_content = {
+            'image_id': image_id,
+            c.JOB_SUBKEY_SCRIPTS: job_config[c.JOB_SUBKEY_SCRIPTS],
+            'job_config': job_config,
+            'input_hashes': input_hashes,
+        }
+        serialized = json.dumps(key_content, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> tuple[JobLog | None, str | None]:
+        """ look up the cache entry, from local tier first then the s3 tier.
+        An entry found in s3 is copied into the local tier.
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            tuple[JobLog | None, str | None]: cached job log, or None for a miss.
+                second item is the path of the cached artifact manifest if any
+        """
+        entry_dir = self.cache_dir.joinpath(key)
+        job_log_path = entry_dir.joinpath(self.JOB_LOG_FILE)
+        if not job_log_path.is_file() and not self._download_entry(key, entry_dir):
+            return None, None
+        try:
+            with open(job_log_path, 'r', encoding='utf-8') as file:
+                job_log = JobLog.model_validate(json.load(file))
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Fail to read cache entry {key}, error is {e}")
+            return None, None
+        artifact_path = entry_dir.joinpath(self.ARTIFACT_FILE)
+        return job_log, str(artifact_path) if artifact_path.is_file() else None
+
+    def put_manifest(self, key: str, manifest: ArtifactManifest) -> None:
+        """ store the artifact manifest of a job in the cache entry. Must be called
+        before put, as the entry is complete once the job log is stored.
+
+        Args:
+            key (str): cache key
+            manifest (ArtifactManifest): files of the job artifacts
+        """
+        try:
+            entry_dir = self.cache_dir.joinpath(key)
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            with open(entry_dir.joinpath(self.ARTIFACT_FILE), 'w', encoding='utf-8') as file:
+                file.write(manifest.model_dump_json())
+        except OSError as e:
+            self.logger.warning(f"Fail to cache artifact for {key}, error is {e}")
+
+    def put(self, key: str, job_log: JobLog) -> None:
+        """ store the job log in the cache entry, and upload the entry to
+        the s3 tier if configured.
+
+        Args:
+            key (str): cache key
+            job_log (JobLog): job log of the successful job run
+        """
+        try:
+            entry_dir = self.cache_dir.joinpath(key)
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = entry_dir.joinpath(self.JOB_LOG_FILE + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(job_log.model_dump(), file)
+            os.replace(tmp_path, entry_dir.joinpath(self.JOB_LOG_FILE))
+        except OSError as e:
+            self.logger.warning(f"Fail to cache job log for {key}, error is {e}")
+            return
+        self._upload_entry(key, entry_dir)
+
+    def _get_s3_client(self) -> S3Client | None:
+        """ lazily create the s3 client for the s3 tier
+
+        Returns:
+            S3Client | None: the client, None if s3 tier not configured or not available
+        """
+        if not self.s3_bucket:
+            return None
+        if self._s3_client is None:
+            try:
+                self._s3_client = S3Client(bucket_name=self.s3_bucket)
+            except ClientError as ce:
+                self.logger.warning(f"s3 cache tier not available, error is {ce}")
+                self.s3_bucket = None
+        return self._s3_client
+
+    def _download_entry(self, key: str, entry_dir: Path) -> bool:
+        """ copy the cache entry from the s3 tier into the local tier
+
+        Args:
+            key (str): cache key
+            entry_dir (Path): local directory of the entry
+
+        Returns:
+            bool: True if the entry is found in s3
+        """
+        s3_client = self._get_s3_client()
+        if s3_client is None:
+            return False
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        # artifact first, the entry only become visible with the job log
+        s3_client.download_file(f"{key}/{self.ARTIFACT_FILE}",
+                                str(entry_dir.joinpath(self.ARTIFACT_FILE)))
+        return s3_client.download_file(f"{key}/{self.JOB_LOG_FILE}",
+                                       str(entry_dir.joinpath(self.JOB_LOG_FILE)))
+
+    def _upload_entry(self, key: str, entry_dir: Path) -> None:
+        """ upload the local cache entry to the s3 tier
+
+        Args:
+            key (str): cache key
+            entry_dir (Path): local directory of the entry
+        """
+        s3_client = self._get_s3_client()
+        if s3_client is None:
+            return
+        artifact_path = entry_dir.joinpath(self.ARTIFACT_FILE)
+        if artifact_path.is_file():
+            s3_client.upload_file(str(artifact_path), f"{key}/{self.ARTIFACT_FILE}")
+        s3_client.upload_file(str(entry_dir.joinpath(self.JOB_LOG_FILE)),
+                              f"{key}/{self.JOB_LOG_FILE}")
@@ -0,0 +1,225 @@
+""" log_stream module provide the classes to capture the output of a job container
+while it is running, with a bounded memory usage regardless of the log size, and
+to track the exit code and duration of each command of the job scripts
+"""
+import codecs
+import re
+from collections import deque
+import time
+from pathlib import Path
+from typing import Callable
+import util.constant as c
+from util.model import (CommandLog)
+
+
+class JobLogStream:
+    """ Sink for the demultiplexed stdout / stderr chunks of a container. The chunks
+    are split into lines, stderr lines can be filtered out, and each line is written
+    to the optional log file, echoed, and appended to an in-memory tail of at most
+    buffer_size characters.
+    """
+
+    def __init__(self, buffer_size: int = c.DEFAULT_LOG_BUFFER_SIZE,
+                 log_path: str = None,
+                 on_line: Callable[[str], None] = None,
+                 stderr_filter: Callable[[str], bool] = None) -> None:
+        """ Initialize the JobLogStream
+
+        Args:
+            buffer_size (int, optional): maximum number of characters of the log kept
+                in memory, older output is dropped. Defaults to DEFAULT_LOG_BUFFER_SIZE.
+            log_path (str, optional): file to write the complete log to.
+                Defaults to None, no file written.
+            on_line (Callable[[str], None], optional): called with every line of
+                output, without the line break. Defaults to None.
+            stderr_filter (Callable[[str], bool], optional): called with every line
+                of stderr, returning False leave the line out of the log.
+                Defaults to None, all lines kept.
+        """
+        self.buffer_size = max(1, buffer_size)
+        self.log_path = log_path
+        self.on_line = on_line
+        self.stderr_filter = stderr_filter
+        self.dropped = 0
+        # lines of the tail and their total length, the oldest are dropped first
+        self._tail = deque()
+        self._tail_size = 0
+        self._decoders = {
+            stream: codecs.getincrementaldecoder('utf-8')(errors='replace')
+            for stream in (c.LOG_STDOUT, c.LOG_STDERR)
+        }
+        self._partial = {c.LOG_STDOUT: "", c.LOG_STDERR: ""}
+        self._file = None
+        if log_path is not None:
+            Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(log_path, 'w', encoding='utf-8')  # pylint: disable=consider-using-with
+
+    def feed(self, stdout: bytes | None, stderr: bytes | None) -> None:
+        """ add a chunk read from the container, as returned by attach(demux=True)
+
+        Args:
+            stdout (bytes | None): chunk of stdout if any
+            stderr (bytes | None): chunk of stderr if any
+        """
+        for stream, chunk in ((c.LOG_STDOUT, stdout), (c.LOG_STDERR, stderr)):
+            if chunk:
+                self._split(stream, self._decoders[stream].decode(chunk))
+
+    def write(self, text: str) -> None:
+        """ add a message of the runner, e.g. artifact upload error, to the job log
+
+        Args:
+            text (str): message to add
+        """
+        self._split(c.LOG_STDOUT, text)
+
+    def flush(self) -> None:
+        """ handle the last line of each stream when the container output ended,
+        so it is kept even without line break
+        """
+        for stream, decoder in self._decoders.items():
+            self._split(stream, decoder.decode(b"", final=True))
+            if self._partial[stream]:
+                self._line(stream, self._partial[stream], line_break=False)
+                self._partial[stream] = ""
+
+    def close(self) -> None:
+        """ flush the pending output and close the log file
+        """
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def text(self) -> str:
+        """ the output kept in memory, with a notice if the beginning was dropped
+
+        Returns:
+            str: tail of the job log
+        """
+        tail = "".join(self._tail)
+        if not self.dropped:
+            return tail
+        notice = f"... {self.dropped} characters truncated"
+        if self.log_path is not None:
+            notice += f", full log in {self.log_path}"
+        return notice + "\n" + tail
+
+    def _split(self, stream: str, text: str) -> None:
+        """ split decoded text into lines, the last line is kept until complete
+
+        Args:
+            stream (str): LOG_STDOUT or LOG_STDERR
+            text (str): decoded text
+        """
+        if not text:
+            return
+        lines = (self._partial[stream] + text).split("\n")
+        for line in lines[:-1]:
+            self._line(stream, line)
+        # a line without line break is bounded by the buffer size as well
+        partial = lines[-1]
+        if len(partial) > self.buffer_size:
+            self._line(stream, partial, line_break=False)
+            partial = ""
+        self._partial[stream] = partial
+
+    def _line(self, stream: str, line: str, line_break: bool = True) -> None:
+        """ pass a line to all the sinks
+
+        Args:
+            stream (str): LOG_STDOUT or LOG_STDERR
+            line (str): line without the line break
+            line_break (bool, optional): whether the line ended with a line break.
+                Defaults to True.
+        """
+        if stream == c.LOG_STDERR and self.stderr_filter is not None and \
+                not self.stderr_filter(line):
+            return
+        text = line + "\n" if line_break else line
+        if self._file is not None:
+            self._file.write(text)
+        self._tail.append(text)
+        self._tail_size += len(text)
+        while self._tail_size > self.buffer_size:
+            excess = self._tail_size - self.buffer_size
+            oldest = self._tail[0]
+            if len(oldest) <= excess:
+                self._tail.popleft()
+                excess = len(oldest)
+            else:
+                self._tail[0] = oldest[excess:]
+            self._tail_size -= excess
+            self.dropped += excess
+        if self.on_line is not None:
+            self.on_line(line)
+
+
+class CommandTracker:
+    """ Wrap the scripts of a job so each command report its exit code on stderr,
+    and collect the exit codes and durations from the marker lines. The durations
+    are measured from the time the markers are read from the stream.
+    """
+
+    def __init__(self, commands: list[str]) -> None:
+        """ Initialize the CommandTracker
+
+        Args:
+            commands (list[str]): scripts of the job, run one after another until
+                one of them fails
+        """
+        self.commands = [CommandLog(command=command) for command in commands]
+        self._started = {}
+        self._marker = re.compile(c.REGEX_COMMAND_MARKER)
+
+    def script(self) -> str:
+        """ build the shell script running the commands in the same shell, so that
+        e.g. cd or exported variables apply to the next commands
+
+        Returns:
+            str: shell script to run with sh -c
+        """
+        lines = []
+        for idx, command in enumerate(self.commands):
+            lines.append(f"echo '{c.COMMAND_MARKER}start:{idx}' >&2")
+            lines.append(command.command)
+            lines.append(f"{c.COMMAND_RC_VAR}=$?")
+            lines.append(f"echo \"{c.COMMAND_MARKER}end:{idx}:${c.COMMAND_RC_VAR}\" >&2")
+            lines.append(f"[ ${c.COMMAND_RC_VAR} -eq 0 ] || exit ${c.COMMAND_RC_VAR}")
+        return "\n".join(lines)
+
+    def parse(self, line: str) -> bool:
+        """ record the marker in a stderr line, used as stderr_filter of JobLogStream
+
+        Args:
+            line (str): line of stderr
+
+        Returns:
+            bool: False if the line is a marker, to leave it out of the log
+        """
+        match = self._marker.fullmatch(line)
+        if match is None:
+            return True
+        event, idx, exit_code = match.group(1), int(match.group(2)), match.group(3)
+        if idx >= len(self.commands):
+            return True
+        if event == 'start':
+            self._started[idx] = time.monotonic()
+        elif idx in self._started:
+            self.commands[idx].exit_code = int(exit_code)
+            self.commands[idx].duration = round(time.monotonic() - self._started[idx], 3)
+        return False
+
+    def finish(self) -> list[CommandLog]:
+        """ close the command still running when the container stopped, e.g. timeout
+
+        Returns:
+            list[CommandLog]: exit code and duration of each command, None for the
+                commands not run
+        """
+        now = time.monotonic()
+        for idx, started in self._started.items():
+            if self.commands[idx].duration is None:
+                self.commands[idx].duration = round(now - started, 3)
+        return self.commands
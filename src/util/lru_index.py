@@ -0,0 +1,143 @@
+""" lru_index module provide a small index of docker resources kept across runs,
+e.g. the dependency cache volumes or the setup images. Each entry record the last
+use of a resource, to select the least recently used resources to remove when
+they exceed a disk budget. The index is a json file shared by the processes.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from util.common_utils import (get_int_setting, get_logger)
+
+logger = get_logger("util.lru_index")
+
+# pylint: disable=logging-fstring-interpolation
+
+def get_budget(env_key: str, default_mb: int, budget_mb: int = None,
+               log_tool=logger) -> int:
+    """ disk budget in bytes, given in MiB or read from an env value
+
+    Args:
+        env_key (str): env value of the budget in MiB
+        default_mb (int): budget in MiB if the env value is not set or invalid
+        budget_mb (int, optional): budget in MiB given by the caller, used over the
+            env value. Defaults to None.
+        log_tool (logging.Logger, optional): log tool. Defaults to logger.
+
+    Returns:
+        int: budget in bytes
+    """
+    if budget_mb is None:
+        budget_mb = get_int_setting(env_key, default_mb, minimum=0, log_tool=log_tool)
+    return budget_mb * 1024 * 1024
+
+
+class LruIndex:
+    """ Index of resources by name, with the last use time of each resource and
+    the fields given by the caller, stored as a json file.
+    """
+
+    def __init__(self, index_path: Path, budget: int, log_tool=logger) -> None:
+        """ Initialize the LruIndex
+
+        Args:
+            index_path (Path): path of the index file
+            budget (int): disk budget of all the resources in bytes
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+        """
+        self.logger = log_tool
+        self.index_path = index_path
+        self.budget = budget
+        self._lock = threading.Lock()
+
+    def entries(self) -> dict:
+        """ read the entries of the index
+
+        Returns:
+            dict: fields and last_used time of each resource
+        """
+        with self._lock:
+            return self._read_index()
+
+    def touch(self, name: str, **fields) -> None:
+        """ record the use of a resource, it is then kept by select_evictions over
+        the resources used earlier
+
+        Args:
+            name (str): resource name
+            **fields: values recorded with the resource
+        """
+        with self._lock:
+            index = self._read_index()
+            index[name] = {**fields, 'last_used': time.time()}
+            self._write_index(index)
+
+    def forget(self, names: list[str]) -> None:
+        """ remove resources from the index, e.g. removed or not saved
+
+        Args:
+            names (list[str]): resource names
+        """
+        with self._lock:
+            index = self._read_index()
+            for name in names:
+                index.pop(name, None)
+            self._write_index(index)
+
+    def select_evictions(self, sizes: dict) -> list[str]:
+        """ select the least recently used resources to remove so the total size of
+        the resources is within the budget
+
+        Args:
+            sizes (dict): size in bytes of each resource of the index still present,
+                resources missing are dropped from the index
+
+        Returns:
+            list[str]: resource names to remove, least recently used first
+        """
+        with self._lock:
+            index = self._read_index()
+            index = {name: entry for name, entry in index.items() if name in sizes}
+            self._write_index(index)
+        total = sum(sizes[name] for name in index)
+        evictions = []
+        for name in sorted(index, key=lambda name: index[name]['last_used']):
+            if total <= self.budget:
+                break
+            evictions.append(name)
+            total -= sizes[name]
+        return evictions
+
+    def _read_index(self) -> dict:
+        """ read the index file, must be called with the lock
+
+        Returns:
+            dict: entry of each resource, empty if the index is missing or invalid
+        """
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            return index if isinstance(index, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Fail to read index {self.index_path}, error is {e}")
+            return {}
+
+    def _write_index(self, index: dict) -> None:
+        """ write the index file, replaced at once so readers never see a partial
+        file. Must be called with the lock
+
+        Args:
+            index (dict): entry of each resource
+        """
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(index, file)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            self.logger.warning(f"Fail to write index {self.index_path}, error is {e}")
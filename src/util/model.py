@@ -26,6 +26,16 @@ class ArtifactConfig(BaseModel):
     on_success_only: bool
     paths: list[str]
 
+class CacheConfig(BaseModel):
+    """ class to hold configuration for a dependency cache section
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    key: str
+    paths: list[str]
+    restore_keys: Optional[list[str]] = None
+
 class JobConfig(BaseModel):
     """ class to hold configuration for a job
 
@@ -39,6 +49,75 @@ class JobConfig(BaseModel):
     artifact_upload_path: Optional[str]
     scripts: list[str]
     artifacts: Optional[ArtifactConfig] = None
+    inputs: Optional[list[str]] = None
+    changes: Optional[list[str]] = None
+    matrix: Optional[dict] = None
+    matrix_parent: Optional[str] = None
+    timeout: Optional[int] = None
+    cache: Optional[CacheConfig] = None
+    setup: Optional[list[str]] = None
+
+class CommandLog(BaseModel):
+    """ class to hold the result of a single command of a job scripts,
+    exit_code and duration are None for a command not run
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    command: str
+    exit_code: Optional[int] = None
+    duration: Optional[float] = None
+
+class DepCacheLog(BaseModel):
+    """ class to hold the use of the dependency cache by a job, times in seconds
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    key: str
+    status: str
+    restored_from: Optional[str] = None
+    restore_time: Optional[float] = None
+    save_time: Optional[float] = None
+
+class SetupImageLog(BaseModel):
+    """ class to hold the setup image used by a job, status is CACHE_HIT if the
+    image existed and CACHE_MISS if the setup scripts ran to build it, time in seconds
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    image: str
+    status: str
+    build_time: Optional[float] = None
+
+class MetricSummary(BaseModel):
+    """ class to hold the min, average and peak of a metric sampled while a job ran
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    min: float = 0.0
+    avg: float = 0.0
+    peak: float = 0.0
+
+class ResourceMetrics(BaseModel):
+    """ class to hold the resource usage of a job container, sampled every interval
+    seconds. cpu in percent of one cpu, memory in bytes, block I/O and network
+    totals in bytes, overhead is the seconds spent sampling
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    samples: int = 0
+    interval: float
+    cpu_percent: MetricSummary = MetricSummary()
+    memory_bytes: MetricSummary = MetricSummary()
+    block_read_bytes: int = 0
+    block_write_bytes: int = 0
+    net_rx_bytes: int = 0
+    net_tx_bytes: int = 0
+    overhead: float = 0.0
 
 class JobLog(BaseModel):
     """ class to hold information for a single job
@@ -52,6 +131,54 @@ class JobLog(BaseModel):
     start_time: str
     completion_time: Optional[str] = time.asctime()
     job_logs: Optional[str] = ""
+    log_file: Optional[str] = None
+    exit_code: Optional[int] = None
+    failure_reason: Optional[str] = None
+    commands: Optional[list[CommandLog]] = None
+    cache_status: Optional[str] = None
+    matrix: Optional[dict] = None
+    matrix_parent: Optional[str] = None
+    artifact_manifest: Optional[str] = None
+    dep_cache: Optional[DepCacheLog] = None
+    setup_image: Optional[SetupImageLog] = None
+    resource_metrics: Optional[ResourceMetrics] = None
+
+class ArtifactFile(BaseModel):
+    """ class to hold a file of the artifacts of a job, stored in the bucket
+    as the blob named by its content hash
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    path: str
+    sha256: str
+    size: int
+    mode: Optional[int] = 0o644
+    # directory of the workspace the path is relative to
+    parent: Optional[str] = ""
+
+class ArtifactManifest(BaseModel):
+    """ class to hold the list of the artifact files uploaded by a job run
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    pipeline: str
+    run: str
+    stage: str
+    job_name: str
+    files: list[ArtifactFile] = []
+
+class ImagePull(BaseModel):
+    """ class to hold the result of the pre-pull of a docker image
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    image: str
+    status: str
+    duration: float
+    error: Optional[str] = None
 
 class SessionDetail(BaseModel):
     """ class to hold information to identify a repo for pipeline run
@@ -76,6 +203,12 @@ class GlobalConfig(BaseModel):
     pipeline_name: str
     docker: DockerConfig
     artifact_upload_path: str
+    max_concurrency: Optional[int] = c.DEFAULT_MAX_CONCURRENCY
+    dag_mode: Optional[bool] = False
+    timeout: Optional[int] = None
+    log_buffer_size: Optional[int] = c.DEFAULT_LOG_BUFFER_SIZE
+    legacy_status_check: Optional[bool] = False
+    executor: Optional[str] = c.EXECUTOR_CONTAINER
 
 class ValidatedStage(BaseModel):
     """ class to hold information for a Validated Stage in Stages Section
@@ -85,12 +218,15 @@ class ValidatedStage(BaseModel):
     """
     job_graph: dict
     job_groups: list[list]
+    changes: Optional[list[str]] = None
+    snapshot: Optional[bool] = False
 
 class PipelineConfig(BaseModel):
     """ class to hold information for a valid pipeline configuration. 
     Note one of the keyword global is reserved in Python, thus we need 
     to load by alias='global', when output to dict / json, need to specify
-    model_dump(byalias=True)
+    model_dump(byalias=True). job_graph is the pipeline wide dependency graph,
+    only available when global dag_mode is enabled.
 
     Args:
         BaseModel (BaseModel): Base Pydantic Class
@@ -98,6 +234,7 @@ class PipelineConfig(BaseModel):
     global_: GlobalConfig = Field(alias=c.KEY_GLOBAL)
     stages : OrderedDict
     jobs: dict
+    job_graph: Optional[dict] = None
 
 class RawPipelineInfo(BaseModel):
     """ class to hold information for a single pipeline 
@@ -122,6 +259,7 @@ class PipelineInfo(BaseModel):
     active: Optional[bool] = False
     running: Optional[bool] = False
     last_commit_hash: Optional[str] = ""
+    last_success_commit_hash: Optional[str] = ""
 
     @field_validator(c.FIELD_JOB_RUN_HISTORY)
     @classmethod
@@ -174,3 +312,15 @@ class ValidationResult(BaseModel):
     valid: bool
     error_msg: str
     pipeline_config: Union[PipelineConfig, dict]
+
+class GcReport(BaseModel):
+    """ class to hold the result of a garbage collection of the run resources
+
+    Args:
+        BaseModel (BaseModel): Base Pydantic Class
+    """
+    stale_runs: list[str] = []
+    containers: list[str] = []
+    volumes: list[str] = []
+    kept: int = 0
+    errors: list[str] = []
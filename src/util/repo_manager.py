@@ -8,9 +8,11 @@ import os
 from urllib.parse import urlparse
 import subprocess
 import shutil
+from typing import Iterator
 from git import Repo, GitCommandError, InvalidGitRepositoryError
 from gitdb.exc import BadObject
 from util.common_utils import get_logger
+from util.request_context import (get_cwd, resolve_path)
 import util.constant as c
 
 logger = get_logger(logger_name='util.repo_manager')
@@ -54,10 +56,10 @@ class RepoManager:
         if not repo_source:
             return False, "Provided repository path is empty.", {}
 
-        current_directory = Path(os.getcwd())
+        current_directory = Path(get_cwd())
 
         if not is_remote:
-            repo_source = str(Path(repo_source).resolve())
+            repo_source = str(Path(resolve_path(repo_source)).resolve())
 
         # Ensure the current directory is empty for cloning
         # Else, return error message
@@ -110,7 +112,7 @@ class RepoManager:
             branch,
             commit_hash)
 
-        current_directory = Path(os.getcwd())
+        current_directory = Path(get_cwd())
 
         # Get repo name using helper method, based on local or remote
         repo_name = self._extract_repo_name_from_url(
@@ -119,7 +121,7 @@ class RepoManager:
         # Logic for cloning repository
         try:
             clone_source = repo_source if not is_local else str(
-                Path(repo_source).resolve())
+                Path(resolve_path(repo_source)).resolve())
             repo = Repo.clone_from(
                 clone_source,
                 current_directory,
@@ -217,7 +219,7 @@ class RepoManager:
         # Check if the source is a local path, then check if given
         # repo source is a valid git repository
         try:
-            local_path = Path(repo_source).resolve()
+            local_path = Path(resolve_path(repo_source)).resolve()
             if local_path.is_dir() and (local_path / ".git").is_dir():
                 return True, False, "Local repository is valid."
         except Exception as e:
@@ -283,9 +285,9 @@ class RepoManager:
                 - bool: True if in the root directory of the Git repo, otherwise False.
         """
         try:
-            repo = Repo(os.getcwd(), search_parent_directories=True)
+            repo = Repo(get_cwd(), search_parent_directories=True)
             repo_name = os.path.basename(repo.working_tree_dir)
-            is_in_root = os.getcwd() == repo.working_tree_dir
+            is_in_root = get_cwd() == repo.working_tree_dir
             return True, is_in_root, repo_name
         except InvalidGitRepositoryError:
             return False, False, None
@@ -323,7 +325,7 @@ class RepoManager:
         """
         try:
             repo = Repo(
-                repo_path or os.getcwd(),
+                repo_path or get_cwd(),
                 search_parent_directories=True)
             origin_url = next(
                 iter(
@@ -332,7 +334,7 @@ class RepoManager:
             branch = repo.active_branch.name
             commit_hash = repo.head.commit.hexsha
             repo_name = self._extract_repo_name_from_url(origin_url) if (
-                origin_url) else Path(os.getcwd()).name
+                origin_url) else Path(get_cwd()).name
 
             return {
                 "repo_url": origin_url or str(repo_path),
@@ -343,12 +345,98 @@ class RepoManager:
         except InvalidGitRepositoryError:
             logger.error(
                 "Invalid Git repository at %s",
-                repo_path or os.getcwd())
+                repo_path or get_cwd())
             return {}
         except Exception as e:
             logger.error("Error while retrieving repository details: %s", e)
             return {}
 
+    def get_tree_hashes(self, paths: list[str], repo_path: Path = None) -> dict:
+        """
+        Retrieves the git object hash of the given paths at the current commit (HEAD).
+        A directory gives the tree hash, a file gives the blob hash, so the hash
+        changes only if the content under the path changed.
+
+        Args:
+            paths (list[str]): paths relative to the repository root.
+            repo_path (Path, optional): Path to the repository.
+            Defaults to the current working directory.
+
+        Returns:
+            dict: path as key and object hash as value, empty string for
+            paths not found in the commit.
+        """
+        repo = Repo(repo_path or get_cwd(), search_parent_directories=True)
+        tree = repo.head.commit.tree
+        hashes = {}
+        for path in paths:
+            normalized = path.strip('/')
+            try:
+                hashes[path] = tree.hexsha if normalized in ('', '.') else (
+                    tree / normalized).hexsha
+            except KeyError:
+                logger.warning("Input path %s not found in commit %s",
+                               path, repo.head.commit.hexsha)
+                hashes[path] = c.DEFAULT_STR
+        return hashes
+
+    def stream_archive(self, commit_hash: str, repo_path: Path = None) -> Iterator[bytes]:
+        """
+        Streams a tar archive of the files at the given commit, read from the output
+        of git archive as it is produced, without writing it to disk.
+
+        Args:
+            commit_hash (str): commit to archive.
+            repo_path (Path, optional): Path to the repository.
+            Defaults to the current working directory.
+
+        Yields:
+            bytes: chunks of the tar archive.
+
+        Raises:
+            GitCommandError: if git archive failed, e.g. unknown commit.
+        """
+        repo = Repo(repo_path or get_cwd(), search_parent_directories=True)
+        process = repo.git.archive('--format=tar', commit_hash, as_process=True)
+        try:
+            while True:
+                chunk = process.stdout.read(c.ARCHIVE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        except BaseException:
+            # the consumer stopped early (GeneratorExit) or failed, git would block
+            # writing to the pipe nobody reads
+            process.proc.kill()
+            process.stdout.close()
+            process.proc.wait()
+            raise
+        # raise GitCommandError on non zero exit code
+        process.wait()
+
+    def get_changed_files(self, base_commit: str, repo_path: Path = None) -> list[str] | None:
+        """
+        Retrieves the files changed between base_commit and the current commit (HEAD).
+
+        Args:
+            base_commit (str): commit hash to compare with.
+            repo_path (Path, optional): Path to the repository.
+            Defaults to the current working directory.
+
+        Returns:
+            list[str] | None: paths changed relative to the repository root, or None
+            if the base commit is not given or not available in the repository.
+        """
+        if not base_commit:
+            return None
+        try:
+            repo = Repo(repo_path or get_cwd(), search_parent_directories=True)
+            diff = repo.git.diff('--name-only', base_commit, 'HEAD')
+            return [path for path in diff.splitlines() if path]
+        except (GitCommandError, InvalidGitRepositoryError, ValueError) as e:
+            logger.warning("Cannot diff against commit %s: %s", base_commit, e)
+            return None
+
     def checkout_branch_and_commit(
             self, branch: str = None, commit_hash: str = None) -> tuple[bool, str]:
         """
@@ -363,7 +451,7 @@ class RepoManager:
                 - bool: True if successful, False otherwise.
                 - str: Message indicating the outcome.
         """
-        repo = Repo(os.getcwd())
+        repo = Repo(get_cwd())
 
         branch = branch or repo.active_branch.name
 
@@ -0,0 +1,135 @@
+""" request_context module provide the context of the cid command being executed,
+its working directory and output streams. The daemon execute the commands of its
+clients concurrently in threads, each with the directory and the streams of its
+client, instead of changing the working directory and the standard streams of the
+process. The threads started for a command inherit its context with
+inherit_context.
+"""
+import contextlib
+import io
+import os
+import sys
+import threading
+from typing import Iterator
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+def get_cwd() -> str:
+    """ working directory of the command being executed
+
+    Returns:
+        str: directory of the daemon client for a command executed by the daemon,
+            otherwise the working directory of the process
+    """
+    return getattr(_local, 'cwd', None) or os.getcwd()
+
+
+def resolve_path(path: str) -> str:
+    """ resolve a path given by the user against the working directory of the command
+
+    Args:
+        path (str): absolute or relative path
+
+    Returns:
+        str: absolute path
+    """
+    return os.path.join(get_cwd(), os.path.expanduser(path))
+
+
+def get_context() -> dict:
+    """ context of the command executed by the current thread
+
+    Returns:
+        dict: working directory and output streams, None when not set
+    """
+    return {'cwd': getattr(_local, 'cwd', None), 'out': getattr(_local, 'out', None),
+            'err': getattr(_local, 'err', None)}
+
+
+def inherit_context(context: dict) -> None:
+    """ set the context of the current thread, used as initializer of the thread pools
+    started by a command, with the context returned by get_context
+
+    Args:
+        context (dict): context of the command
+    """
+    _local.cwd = context.get('cwd')
+    _local.out = context.get('out')
+    _local.err = context.get('err')
+
+
+@contextlib.contextmanager
+def request_context(cwd: str, out: io.TextIOBase, err: io.TextIOBase) -> Iterator[None]:
+    """ execute a command of the current thread from a directory and with its output
+    and errors written to the given streams, other threads are not affected
+
+    Args:
+        cwd (str): working directory of the command
+        out (io.TextIOBase): stream of the output
+        err (io.TextIOBase): stream of the errors
+
+    Yields:
+        Iterator[None]: while the context is set
+    """
+    install_streams()
+    previous = get_context()
+    inherit_context({'cwd': cwd, 'out': out, 'err': err})
+    try:
+        yield
+    finally:
+        inherit_context(previous)
+
+
+def install_streams() -> None:
+    """ replace the standard streams of the process by streams writing to the
+    stream of the context of each thread, once
+    """
+    with _install_lock:
+        if not isinstance(sys.stdout, ContextStream):
+            sys.stdout = ContextStream('out', sys.stdout)
+        if not isinstance(sys.stderr, ContextStream):
+            sys.stderr = ContextStream('err', sys.stderr)
+
+
+class ContextStream(io.TextIOBase):
+    """ Text stream writing to the stream of the context of the current thread,
+    or to the default stream outside of a command
+    """
+
+    def __init__(self, name: str, default: io.TextIOBase):
+        """ Initialize the stream
+
+        Args:
+            name (str): 'out' or 'err'
+            default (io.TextIOBase): stream used outside of a command
+        """
+        super().__init__()
+        self.name = name
+        self.default = default
+
+    @property
+    def target(self) -> io.TextIOBase:
+        """ stream of the current thread
+
+        Returns:
+            io.TextIOBase: stream of the context, or the default stream
+        """
+        return getattr(_local, self.name, None) or self.default
+
+    @property
+    def encoding(self) -> str:
+        return getattr(self.target, 'encoding', None) or 'utf-8'
+
+    def writable(self) -> bool:
+        return True
+
+    def isatty(self) -> bool:
+        return self.target.isatty()
+
+    def write(self, s: str) -> int:
+        return self.target.write(s)
+
+    def flush(self) -> None:
+        self.target.flush()
@@ -0,0 +1,196 @@
+""" resource_gc module provide the garbage collection of the containers and volumes
+left by the pipeline runs, e.g. when the process running a pipeline died before
+removing them. The resources are found by the labels set by the DockerManager and
+reconciled with the jobs history and the process owning the run.
+"""
+import os
+import socket
+import time
+from concurrent.futures import (ThreadPoolExecutor)
+from typing import Callable
+import docker
+import docker.errors
+from util.common_utils import (get_logger)
+from util.model import (GcReport)
+import util.constant as c
+
+logger = get_logger("util.resource_gc")
+# pylint: disable=logging-fstring-interpolation
+
+
+def is_retained(job: dict | None, now: int) -> bool:
+    """ check if the volumes of a finished run are retained to resume the run, the
+    deadline is recorded in the jobs history when the run end
+
+    Args:
+        job (dict | None): job record of the run
+        now (int): current time
+
+    Returns:
+        bool: True if the run failed and the retention deadline is not reached
+    """
+    if not job or job.get(c.FIELD_STATUS) not in (c.STATUS_FAILED, c.STATUS_TIMEOUT):
+        return False
+    try:
+        return int(job.get(c.FIELD_RETAIN_UNTIL) or 0) >= now
+    except (TypeError, ValueError):
+        return False
+
+
+class ResourceCollector:
+    """ Find the resources of the runs that are finished or whose process died,
+    and remove them in batches. The volumes of a failed run are kept until their
+    retention deadline so the run can be resumed.
+    """
+
+    def __init__(self, client: docker.DockerClient,
+                 run_job: Callable[[str, str, str, int], dict | None],
+                 log_tool=logger) -> None:
+        """ Initialize the ResourceCollector
+
+        Args:
+            client (docker.DockerClient): docker client
+            run_job (Callable[[str, str, str, int], dict | None]): job record of a run
+                in the jobs history from the repository name, branch, pipeline name and
+                run number, None if the run is not found
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+        """
+        self.client = client
+        self.run_job = run_job
+        self.logger = log_tool
+
+    def collect(self, dry_run: bool = False) -> GcReport:
+        """ remove the containers then the volumes of the stale runs
+
+        Args:
+            dry_run (bool, optional): only report the stale resources.
+                Defaults to False.
+
+        Returns:
+            GcReport: stale runs, resources removed (or to remove on dry run),
+                resources kept and errors
+        """
+        report = GcReport()
+        try:
+            containers = self.client.containers.list(all=True,
+                                                     filters={'label': c.LABEL_RUN})
+            volumes = self.client.volumes.list(filters={'label': c.LABEL_RUN})
+        except docker.errors.DockerException as de:
+            report.errors.append(f"Fail to list the run resources, {de}")
+            return report
+        runs = {}
+        for container in containers:
+            labels = container.labels or {}
+            runs.setdefault(labels[c.LABEL_RUN], ([], []))[0].append((container, labels))
+        for volume in volumes:
+            labels = volume.attrs.get('Labels') or {}
+            runs.setdefault(labels[c.LABEL_RUN], ([], []))[1].append((volume, labels))
+
+        stale_containers, stale_volumes = [], []
+        now = int(time.time())
+        for run_name, (run_containers, run_volumes) in runs.items():
+            status, job = self._get_status(
+                [labels for _, labels in run_containers + run_volumes])
+            if status is None:
+                report.kept += len(run_containers) + len(run_volumes)
+                continue
+            report.stale_runs.append(run_name)
+            stale_containers.extend(container for container, _ in run_containers)
+            if is_retained(job, now):
+                report.kept += len(run_volumes)
+            else:
+                stale_volumes.extend(volume for volume, _ in run_volumes)
+
+        report.containers = [container.name for container in stale_containers]
+        report.volumes = [volume.name for volume in stale_volumes]
+        if dry_run:
+            return report
+        report.containers = self._remove(stale_containers,
+                                         lambda container: container.remove(force=True),
+                                         report.errors)
+        report.volumes = self._remove(stale_volumes, lambda volume: volume.remove(),
+                                      report.errors)
+        return report
+
+    def _get_status(self, labels_list: list[dict]) -> tuple[str | None, dict | None]:
+        """ decide if the resources of a run are stale, when the run is finished in
+        the jobs history or the process owning the run died. A run whose resources
+        have a live owner is never stale, as a new run can reuse the name of a run
+        that died before it was recorded.
+
+        Args:
+            labels_list (list[dict]): labels of the resources of the run
+
+        Returns:
+            tuple[str | None, dict | None]: status of the finished run, STATUS_CANCELLED
+                if its owner died, None if the run is not stale. Then the job record of
+                the run, None if not found
+        """
+        owners = [self._owner_alive(labels.get(c.LABEL_OWNER)) for labels in labels_list]
+        labels = labels_list[0]
+        job = None
+        try:
+            job = self.run_job(labels[c.LABEL_REPO], labels[c.LABEL_BRANCH],
+                               labels[c.LABEL_PIPELINE], int(labels[c.LABEL_RUN_NUMBER]))
+        except (KeyError, ValueError):
+            self.logger.debug(f"run {labels.get(c.LABEL_RUN)} not in the jobs history")
+        status = (job or {}).get(c.FIELD_STATUS)
+        if status not in (None, c.STATUS_PENDING):
+            return status, job
+        if owners and all(alive is False for alive in owners):
+            return c.STATUS_CANCELLED, job
+        return None, job
+
+    @staticmethod
+    def _owner_alive(owner: str | None) -> bool | None:
+        """ check if the process owning a run is alive
+
+        Args:
+            owner (str | None): owner label, <hostname>:<pid>
+
+        Returns:
+            bool | None: None if the owner is unknown or on another host
+        """
+        if not owner:
+            return None
+        host, _, pid = owner.rpartition(':')
+        if host != socket.gethostname():
+            return None
+        try:
+            os.kill(int(pid), 0)
+        except ValueError:
+            return None
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # exists, owned by another user
+            return True
+        return True
+
+    def _remove(self, resources: list, remove: Callable, errors: list[str]) -> list[str]:
+        """ remove resources, GC_WORKERS at a time in batches of GC_BATCH_SIZE
+
+        Args:
+            resources (list): containers or volumes
+            remove (Callable): remove a single resource
+            errors (list[str]): errors of the resources not removed, appended
+
+        Returns:
+            list[str]: names of the resources removed
+        """
+        def remove_one(resource) -> str | None:
+            try:
+                remove(resource)
+                return resource.name
+            except docker.errors.DockerException as de:
+                errors.append(f"Fail to remove {resource.name}, {de}")
+                return None
+
+        removed = []
+        with ThreadPoolExecutor(max_workers=c.GC_WORKERS, thread_name_prefix="gc") as executor:
+            for start in range(0, len(resources), c.GC_BATCH_SIZE):
+                batch = resources[start:start + c.GC_BATCH_SIZE]
+                removed.extend(name for name in executor.map(remove_one, batch) if name)
+                self.logger.info(f"removed {len(removed)} of {len(resources)} resources")
+        return removed
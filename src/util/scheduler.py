@@ -0,0 +1,187 @@
+""" scheduler module provide the class required to schedule the jobs of a
+pipeline based on their dependencies (needs)
+"""
+import collections
+import threading
+import time
+from concurrent.futures import (ThreadPoolExecutor, wait, FIRST_COMPLETED)
+from typing import Callable
+import util.constant as c
+from util.common_utils import (get_logger, TopoSort)
+from util.model import (JobLog)
+from util.request_context import (get_context, inherit_context)
+
+logger = get_logger("util.scheduler")
+
+# pylint: disable=logging-fstring-interpolation
+# pylint: disable=too-many-instance-attributes
+
+class JobScheduler:
+    """ Ready-queue scheduler for a job dependency graph. A job is dispatched
+    as soon as all the jobs it needs are finished, up to a concurrency limit.
+    If a job failed and does not allow failure, all the jobs depending on it
+    (directly or indirectly) are skipped, while independent jobs continue.
+    A job returned as skipped by run_job (e.g. no changes) does not block its dependants.
+    """
+
+    # interval in seconds to check for cancel_event while jobs are running
+    poll_interval = 0.5
+
+    def __init__(self, job_graph: dict,
+                 max_concurrency: int = c.DEFAULT_MAX_CONCURRENCY,
+                 job_order: list = None,
+                 log_tool=logger,
+                 job_slots: threading.Semaphore = None,
+                 cancel_event: threading.Event = None) -> None:
+        """ Initialize the scheduler
+
+        Args:
+            job_graph (dict): adjacency list of the jobs, key is the job required by
+                the jobs in the value list. Every job must be present as key.
+            max_concurrency (int, optional): maximum number of jobs running at the
+                same time. Defaults to DEFAULT_MAX_CONCURRENCY.
+            job_order (list, optional): preferred dispatch order for jobs that are ready
+                at the same time, e.g. the flatten job_groups. Defaults to None, which
+                use the order of the job_graph keys.
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+            job_slots (threading.Semaphore, optional): job slots shared with other
+                schedulers, a job must hold a slot while running. Defaults to None.
+            cancel_event (threading.Event, optional): when set, the scheduler stop
+                as if interrupted by the user. Defaults to None.
+        """
+        self.job_graph = job_graph
+        self.max_concurrency = max(1, max_concurrency)
+        self.job_order = job_order if job_order else list(job_graph.keys())
+        self.logger = log_tool
+        self.job_slots = job_slots
+        self.cancel_event = cancel_event
+        self.depend_cnt = TopoSort(job_graph).node2depend_cnt
+        self.started = []
+        self.results = {}
+        self.skipped = []
+        self.early_break = False
+
+    def run(self, run_job: Callable[[str], JobLog],
+            on_complete: Callable[[str, JobLog], None] = None) -> dict:
+        """ run all jobs in the graph.
+
+        Args:
+            run_job (Callable[[str], JobLog]): function to run a single job given
+                the job name, will be called from worker threads
+            on_complete (Callable[[str, JobLog], None], optional): callback when a job
+                finished, called from the calling thread. Defaults to None.
+
+        Raises:
+            KeyboardInterrupt: re-raised after stop scheduling new jobs, also raised
+                when cancel_event is set. Jobs in self.started that are not in
+                self.results were still running.
+
+        Returns:
+            dict: dictionary of job_name:JobLog for all jobs that were run
+        """
+        position = {job: idx for idx, job in enumerate(self.job_order)}
+        ready = collections.deque(
+            sorted((job for job, cnt in self.depend_cnt.items() if cnt == 0),
+                   key=lambda job: position.get(job, len(position))))
+        running = {}
+        timeout = self.poll_interval if self.cancel_event else None
+        # the output of the jobs go to the command running the pipeline
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                      thread_name_prefix="job",
+                                      initializer=inherit_context,
+                                      initargs=(get_context(),))
+        try:
+            while ready or running:
+                self._check_cancelled()
+                while ready and len(running) < self.max_concurrency:
+                    job_name = ready.popleft()
+                    self.started.append(job_name)
+                    running[executor.submit(self._run_in_slot, run_job, job_name)] = job_name
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_name = running.pop(future)
+                    job_log = future.result()
+                    self.results[job_name] = job_log
+                    if on_complete:
+                        on_complete(job_name, job_log)
+                    if job_log.job_status in (c.STATUS_SUCCESS, c.STATUS_SKIPPED) or \
+                            job_log.allow_failure:
+                        newly_ready = self._release_dependants(job_name)
+                        newly_ready.sort(key=lambda job: position.get(job, len(position)))
+                        ready.extend(newly_ready)
+                    else:
+                        self.early_break = True
+                        self._skip_dependants(job_name)
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+        return self.results
+
+    def _check_cancelled(self) -> None:
+        """ raise KeyboardInterrupt if the cancel_event is set
+
+        Raises:
+            KeyboardInterrupt: if cancelled
+        """
+        if self.cancel_event and self.cancel_event.is_set():
+            raise KeyboardInterrupt
+
+    def _run_in_slot(self, run_job: Callable[[str], JobLog], job_name: str) -> JobLog:
+        """ run the job, holding one of the shared job slots if available. An error
+        raised by run_job fails the job, so the other jobs are handled as usual
+
+        Args:
+            run_job (Callable[[str], JobLog]): function to run a single job
+            job_name (str): name of the job
+
+        Returns:
+            JobLog: result of the job
+        """
+        start_time = time.asctime()
+        try:
+            if self.job_slots is None:
+                return run_job(job_name)
+            with self.job_slots:
+                self._check_cancelled()
+                return run_job(job_name)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.warning(f"job {job_name} failed to run, error is {e}")
+            return JobLog(job_name=job_name, job_status=c.STATUS_FAILED,
+                          allow_failure=False, start_time=start_time,
+                          completion_time=time.asctime(),
+                          job_logs=f"Job {job_name} failed to run, {e}")
+
+    def _release_dependants(self, job_name: str) -> list:
+        """ decrease the dependency count of the jobs depending on job_name
+
+        Args:
+            job_name (str): name of the finished job
+
+        Returns:
+            list: jobs that become ready to run
+        """
+        newly_ready = []
+        for required_by in self.job_graph.get(job_name, []):
+            if required_by in self.skipped:
+                continue
+            self.depend_cnt[required_by] -= 1
+            if self.depend_cnt[required_by] == 0:
+                newly_ready.append(required_by)
+        return newly_ready
+
+    def _skip_dependants(self, job_name: str) -> None:
+        """ mark all jobs depending on job_name, directly or indirectly, as skipped
+
+        Args:
+            job_name (str): name of the failed job
+        """
+        queue = collections.deque(self.job_graph.get(job_name, []))
+        while queue:
+            curr = queue.popleft()
+            if curr in self.skipped:
+                continue
+            self.skipped.append(curr)
+            self.logger.debug(f"job {curr} skipped due to failed job {job_name}")
+            queue.extend(self.job_graph.get(curr, []))
@@ -0,0 +1,91 @@
+""" setup_image module provide the index of the setup images, the images committed
+from a container after running the setup scripts of a job on its base image. Later
+runs start the job from the image and skip the setup. The images are managed by
+the DockerManager, the index record the last use of each image to remove the least
+recently used images over the disk budget.
+"""
+import hashlib
+import json
+from pathlib import Path
+import util.constant as c
+from util.common_utils import (get_logger)
+from util.lru_index import (LruIndex, get_budget)
+
+logger = get_logger("util.setup_image")
+
+
+class SetupImageCache:
+    """ Index of the setup images, stored as a json file in the cache directory.
+    Each image is tagged by the hash of its base image and setup scripts.
+    """
+    INDEX_FILE = 'setup_images.json'
+
+    def __init__(self, cache_dir: str = None, budget_mb: int = None,
+                 log_tool=logger) -> None:
+        """ Initialize the SetupImageCache
+
+        Args:
+            cache_dir (str, optional): directory of the index file. Defaults to None,
+                which use DEFAULT_CACHE_DIR under the home directory.
+            budget_mb (int, optional): disk budget of all the setup images in MiB.
+                Defaults to None, which use the CICD_SETUP_IMAGE_BUDGET_MB env value
+                or DEFAULT_SETUP_IMAGE_BUDGET_MB.
+            log_tool (logging.Logger, optional): log tool to be used by this class.
+                Defaults to logger.
+        """
+        self.logger = log_tool
+        self.cache_dir = Path(cache_dir) if cache_dir else Path.home().joinpath(
+            c.DEFAULT_CACHE_DIR)
+        self.budget = get_budget(c.ENV_SETUP_IMAGE_BUDGET, c.DEFAULT_SETUP_IMAGE_BUDGET_MB,
+                                 budget_mb, log_tool)
+        self.index = LruIndex(self.cache_dir.joinpath(self.INDEX_FILE), self.budget,
+                              log_tool)
+
+    @staticmethod
+    def image_tag(image_id: str, setup: list[str], environment: dict) -> str:
+        """ name of the setup image of a job, a new image is built when the base
+        image, the setup scripts or the environment of the scripts change
+
+        Args:
+            image_id (str): id (digest) of the base image
+            setup (list[str]): setup scripts
+            environment (dict): environment variables of the scripts
+
+        Returns:
+            str: image name with its tag
+        """
+        serialized = json.dumps({'image_id': image_id, c.JOB_SUBKEY_SETUP: setup,
+                                 'environment': environment}, sort_keys=True)
+        digest = hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+        return f"{c.SETUP_IMAGE_REPO}:{digest[:24]}"
+
+    def touch(self, image: str, base_image: str) -> None:
+        """ record the use of a setup image, it is then kept by select_evictions
+        over the images used earlier
+
+        Args:
+            image (str): setup image name with its tag
+            base_image (str): image the setup scripts ran on
+        """
+        self.index.touch(image, base_image=base_image)
+
+    def forget(self, images: list[str]) -> None:
+        """ remove images from the index, e.g. removed
+
+        Args:
+            images (list[str]): setup image names
+        """
+        self.index.forget(images)
+
+    def select_evictions(self, sizes: dict) -> list[str]:
+        """ select the least recently used images to remove so the total size of
+        the images is within the budget
+
+        Args:
+            sizes (dict): size in bytes of each setup image still present,
+                images missing are dropped from the index
+
+        Returns:
+            list[str]: image names to remove, least recently used first
+        """
+        return self.index.select_evictions(sizes)
@@ -8,6 +8,7 @@ import ruamel.yaml
 import util.constant as c
 from util.common_utils import get_logger
 from util.model import (RawPipelineInfo)
+from util.request_context import (resolve_path)
 
 logger = get_logger(logger_name='util.yaml_parser')
 # pylint: disable=logging-fstring-interpolation
@@ -119,13 +120,13 @@ class YamlParser:
         Returns:
             list[str]: a list of the absolute paths of the YAML files.
         """
-        if not os.path.isdir(directory):
+        if not os.path.isdir(resolve_path(directory)):
             error_msg = f"Given directory:{directory} is not a valid directory"
             logger.error(error_msg)
             raise FileNotFoundError(error_msg)
 
         yaml_filepaths = []
-        for root, _, files in os.walk(directory):
+        for root, _, files in os.walk(resolve_path(directory)):
             for file in files:
                 if file.endswith(('.yml', '.yaml')):
                     yaml_filepaths.append(os.path.join(root, file))
@@ -188,12 +189,12 @@ class YamlParser:
             dict: the key-value pairs from the YAML file. 
             contain the lines and columns information of the key
         """
-        if not os.path.isfile(file_path):
+        if not os.path.isfile(resolve_path(file_path)):
             error_msg = f"Given file_path:{file_path} is not a valid yaml file"
             logger.error(error_msg)
             raise FileNotFoundError(error_msg)
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
+            with open(resolve_path(file_path), 'r', encoding='utf-8') as file:
                 logger.info("Parsing YAML file at %s", file_path)
                 return self.yaml.load(file)
         except ruamel.yaml.YAMLError as e:
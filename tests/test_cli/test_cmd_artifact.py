@@ -0,0 +1,134 @@
+""" Test cid artifact command
+"""
+from unittest import TestCase
+from unittest.mock import patch
+from botocore.exceptions import ClientError
+from click.testing import CliRunner
+from cli import (cmd_artifact)
+from util.model import (ArtifactFile, ArtifactManifest, SessionDetail)
+import util.constant as c
+
+
+def test_artifact_help():
+    """ Test the main artifact command just by calling it with --help option
+    """
+    runner = CliRunner()
+    result = runner.invoke(cmd_artifact.artifact, '--help')
+    # 0 exit code mean successful
+    assert result.exit_code == 0
+
+
+class TestArtifactGet(TestCase):
+    """ Test class to perform integration test between the cli cmd
+    cid artifact get and corresponding controller method of
+    get_artifacts(). The database and the artifact store are patched.
+
+    Args:
+        TestCase (class): base class
+    """
+
+    def setUp(self):
+        self.runner = CliRunner()
+        self.session_data = SessionDetail(
+            user_id='random',
+            repo_name='cicd-python',
+            repo_url="https://github.com/sjchin88/cicd-python",
+            branch=c.DEFAULT_BRANCH,
+            is_remote=True,
+            commit_hash="abcdef"
+        )
+        self.manifest_key = "cicd-python-main-cicd_pipeline/2/build/compile/manifest.json"
+        self.run = {
+            c.FIELD_RUN_NUMBER: 2,
+            c.FIELD_PIPELINE_CONFIG_USED: {
+                c.KEY_GLOBAL: {c.KEY_ARTIFACT_PATH: 'global-bucket'},
+                c.KEY_JOBS: {'compile': {c.KEY_ARTIFACT_PATH: 'job-bucket'}}
+            },
+            c.FIELD_LOGS: [{
+                c.FIELD_STAGE_NAME: 'build',
+                c.FIELD_JOBS: {'compile': {
+                    c.FIELD_JOB_NAME: 'compile',
+                    c.FIELD_ARTIFACT_MANIFEST: self.manifest_key}}
+            }]
+        }
+        self.cmd_list = ['get', '--pipeline', 'cicd_pipeline', '--run', '2',
+                         '--job', 'compile']
+
+    @patch("controller.controller.ArtifactStore")
+    @patch("controller.controller.MongoAdapter.get_job")
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    @patch("controller.controller.Controller.handle_repo")
+    def test_get(self, mock_handle, mock_history, mock_job, mock_store):
+        """ test the manifest recorded by the run is downloaded from the bucket of the job
+
+        Args:
+            mock_handle (MagicMock): mock the Controller.handle_repo function
+            mock_history (MagicMock): mock MongoAdapter.get_pipeline_history
+            mock_job (MagicMock): mock MongoAdapter.get_job
+            mock_store (MagicMock): mock the ArtifactStore
+        """
+        mock_handle.return_value = (True, "", self.session_data)
+        mock_history.return_value = {c.FIELD_JOB_RUN_HISTORY: ['id1', 'id2']}
+        mock_job.return_value = self.run
+        manifest = ArtifactManifest(pipeline="cicd-python-main-cicd_pipeline", run="2",
+                                    stage="build", job_name="compile", files=[
+                                        ArtifactFile(path="dist/app.whl", sha256="abc",
+                                                     size=5)])
+        store = mock_store.return_value
+        store.get_manifest.return_value = manifest
+        store.download.return_value = 5
+        with self.runner.isolated_filesystem():
+            result = self.runner.invoke(cmd_artifact.artifact, self.cmd_list + ['-o', 'out'])
+        assert result.exit_code == 0
+        assert "Artifacts of compile downloaded to out: 1 files" in result.output
+        mock_job.assert_called_once_with('id2')
+        mock_store.assert_called_once_with(bucket_name='job-bucket')
+        store.get_manifest.assert_called_once_with(self.manifest_key)
+        store.download.assert_called_once_with(manifest, 'out')
+
+        # failed download
+        store.download.side_effect = ClientError(
+            error_response={'Error':{'Code':'Any'}}, operation_name='get_object')
+        result = self.runner.invoke(cmd_artifact.artifact, self.cmd_list)
+        assert result.exit_code == 1
+        assert "Fail to download artifacts of compile" in result.output
+
+    @patch("controller.controller.MongoAdapter.get_job")
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    @patch("controller.controller.Controller.handle_repo")
+    def test_get_not_found(self, mock_handle, mock_history, mock_job):
+        """ test the errors for an unknown run, job, or job without artifacts
+
+        Args:
+            mock_handle (MagicMock): mock the Controller.handle_repo function
+            mock_history (MagicMock): mock MongoAdapter.get_pipeline_history
+            mock_job (MagicMock): mock MongoAdapter.get_job
+        """
+        mock_handle.return_value = (True, "", self.session_data)
+        mock_history.return_value = {c.FIELD_JOB_RUN_HISTORY: ['id1']}
+        result = self.runner.invoke(cmd_artifact.artifact, self.cmd_list)
+        assert result.exit_code == 1
+        assert "Run 2 not found for pipeline cicd_pipeline" in result.output
+
+        mock_history.return_value = {c.FIELD_JOB_RUN_HISTORY: ['id1', 'id2']}
+        mock_job.return_value = self.run
+        result = self.runner.invoke(cmd_artifact.artifact, ['get', '--pipeline',
+                                    'cicd_pipeline', '--run', '2', '--job', 'test'])
+        assert result.exit_code == 1
+        assert "Job test not found in run 2" in result.output
+
+        del self.run[c.FIELD_LOGS][0][c.FIELD_JOBS]['compile'][c.FIELD_ARTIFACT_MANIFEST]
+        result = self.runner.invoke(cmd_artifact.artifact, self.cmd_list)
+        assert result.exit_code == 1
+        assert "No artifacts stored for job compile in run 2" in result.output
+
+    @patch("controller.controller.Controller.handle_repo")
+    def test_error_handling_repo(self, mock_handle):
+        """ test if exit correctly when handling repo return false
+
+        Args:
+            mock_handle (MagicMock): mock the Controller.handle_repo function
+        """
+        mock_handle.return_value = (False, "error", None)
+        result = self.runner.invoke(cmd_artifact.artifact, self.cmd_list)
+        assert result.exit_code == 2
@@ -0,0 +1,119 @@
+""" Test cid daemon command
+"""
+import functools
+import io
+import os
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import (patch, MagicMock)
+from click.testing import CliRunner
+from cli import (__main__, cmd_daemon)
+from controller.controller import Controller
+from util.daemon import (DaemonClient, DaemonServer)
+from util.request_context import (get_cwd)
+import util.constant as c
+
+
+def test_daemon_help():
+    """ Test the daemon command just by calling it with --help option
+    """
+    runner = CliRunner()
+    result = runner.invoke(cmd_daemon.daemon, '--help')
+    assert result.exit_code == 0
+
+
+@patch.dict(os.environ, {c.ENV_GC_INTERVAL: "1"})
+def test_gc_sweep():
+    """ Test the background gc run at the interval from the env value until stopped,
+    and is disabled with an interval of 0
+    """
+    controller = MagicMock()
+    controller.gc.return_value = (True, "Stale runs: 0")
+    stop_event = cmd_daemon._start_gc_sweep(controller, 0)
+    assert not stop_event.wait(0.1)
+    controller.gc.assert_not_called()
+    stop_event = cmd_daemon._start_gc_sweep(controller)
+    try:
+        for _ in range(30):
+            if controller.gc.called:
+                break
+            stop_event.wait(0.1)
+        controller.gc.assert_called()
+    finally:
+        stop_event.set()
+
+
+class TestDaemon(TestCase):
+    """ Test class for the commands executed through a running daemon
+
+    Args:
+        TestCase (class): base class
+    """
+
+    def setUp(self):
+        self.runner = CliRunner()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmp_dir.name, 'cid.sock')
+        self.controller = Controller()
+        self.server = DaemonServer(
+            functools.partial(cmd_daemon._execute_request, __main__.cid, self.controller),
+            self.socket_path)
+        self.server.poll_interval = 0.05
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        assert self.server.ready.wait(5)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.tmp_dir.cleanup()
+
+    @patch("controller.controller.Controller.pipeline_history")
+    def test_report_through_daemon(self, mock_history):
+        """ Test the report is produced by the daemon controller and sent back
+
+        Args:
+            mock_history (MagicMock): mock the pipeline_history method
+        """
+        request_cwd = []
+
+        def history(*args, **kwargs):
+            request_cwd.append(get_cwd())
+            return True, "report from daemon"
+
+        mock_history.side_effect = history
+        out = io.StringIO()
+        exit_code = DaemonClient(self.socket_path).execute(
+            ['pipeline', 'report', '--repo', 'https://github.com/sjchin88/cicd-python',
+             '--pipeline', 'sample_pipeline'],
+            out=out, err=io.StringIO())
+        assert exit_code == 0
+        assert "report from daemon" in out.getvalue()
+        # the report run from the directory of the client, without changing the
+        # directory of the daemon or its shared controller
+        assert request_cwd == [os.getcwd()]
+        assert self.controller.cancel_event is None
+
+        mock_history.side_effect = None
+
+        mock_history.return_value = (False, "no report")
+        out = io.StringIO()
+        exit_code = DaemonClient(self.socket_path).execute(
+            ['pipeline', 'report', '--repo', 'https://github.com/sjchin88/cicd-python'],
+            out=out, err=io.StringIO())
+        assert exit_code == 1
+        assert "no report" in out.getvalue()
+
+    def test_status_and_stop(self):
+        """ Test cid daemon status and cid daemon stop
+        """
+        result = self.runner.invoke(cmd_daemon.daemon, ['status', '--socket', self.socket_path])
+        assert result.exit_code == 0
+        assert "queued: 0" in result.output
+        result = self.runner.invoke(cmd_daemon.daemon, ['stop', '--socket', self.socket_path])
+        assert result.exit_code == 0
+        self.thread.join(5)
+        result = self.runner.invoke(cmd_daemon.daemon, ['status', '--socket', self.socket_path])
+        assert result.exit_code == 1
+        assert "not running" in result.output
@@ -0,0 +1,61 @@
+""" Test cid gc command
+"""
+from unittest import TestCase
+from unittest.mock import (patch, MagicMock)
+from click.testing import CliRunner
+from docker.errors import DockerException
+from cli import (cmd_gc)
+from controller.controller import (Controller)
+from util.model import (GcReport)
+
+
+def test_gc_help():
+    """ Test the gc command just by calling it with --help option
+    """
+    runner = CliRunner()
+    result = runner.invoke(cmd_gc.gc, '--help')
+    # 0 exit code mean successful
+    assert result.exit_code == 0
+
+
+class TestGc(TestCase):
+    """ Test class to perform integration test between the cli cmd
+    cid gc and corresponding controller method of gc(). The collector
+    is patched.
+
+    Args:
+        TestCase (class): base class
+    """
+
+    def setUp(self):
+        self.runner = CliRunner()
+        self.controller = Controller(mongo_ds=MagicMock(), docker_client=MagicMock())
+
+    @patch("controller.controller.ResourceCollector")
+    def test_gc(self, mock_collector):
+        """ test the removed resources are listed, and the dry run is passed on
+        """
+        mock_collector.return_value.collect.return_value = GcReport(
+            stale_runs=['repo-main-pipe-1'], containers=['repo-main-pipe-1-build'],
+            volumes=['repo-main-pipe-1'], kept=2)
+        result = self.runner.invoke(cmd_gc.gc, ['--dry-run'], obj=self.controller)
+        assert result.exit_code == 0
+        assert "Containers to remove: 1" in result.output
+        assert "repo-main-pipe-1-build" in result.output
+        assert "Resources kept: 2" in result.output
+        mock_collector.return_value.collect.assert_called_once_with(dry_run=True)
+
+        mock_collector.return_value.collect.return_value = GcReport(
+            errors=["Fail to remove repo-main-pipe-1, volume is in use"])
+        result = self.runner.invoke(cmd_gc.gc, [], obj=self.controller)
+        assert result.exit_code == 1
+        assert "volume is in use" in result.output
+
+    @patch("controller.controller.DockerClientRegistry.get_client",
+           side_effect=DockerException("engine down"))
+    def test_gc_docker_unavailable(self, mock_client):
+        """ test the gc fail if docker is not available
+        """
+        result = self.runner.invoke(cmd_gc.gc, [], obj=Controller(mongo_ds=MagicMock()))
+        assert result.exit_code == 1
+        assert "docker service not available" in result.output
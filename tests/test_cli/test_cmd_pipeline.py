@@ -9,7 +9,7 @@ from pydantic import ValidationError
 from bson import ObjectId
 from click.testing import CliRunner
 from cli import (__main__, cmd_pipeline)
-from util.model import (PipelineConfig, SessionDetail, ValidationResult)
+from util.model import (PipelineConfig, SessionDetail, ValidationResult, RawPipelineInfo)
 from util.common_utils import get_logger
 import util.constant as c
 
@@ -327,6 +327,74 @@ class TestPipelineRun(TestCase):
         assert result.exit_code == 0
 
 
+    def test_all_with_pipeline_name(self):
+        """ test if --all is passed together with --pipeline, it should return error
+        """
+        result = self.runner.invoke(cmd_pipeline.pipeline,
+                                    ['run', '--all', '--pipeline', 'valid_pipeline_default'])
+        assert result.exit_code == 2
+        assert "--all can't be used with --file or --pipeline" in result.output
+
+    def test_invalid_pull_policy(self):
+        """ test --pull only accept the pull policies
+        """
+        result = self.runner.invoke(cmd_pipeline.pipeline, ['run', '--pull', 'sometimes'])
+        assert result.exit_code == 2
+        assert "Invalid value for '--pull'" in result.output
+
+    def test_all_with_resume(self):
+        """ test if --all is passed together with --resume, it should return error
+        """
+        result = self.runner.invoke(cmd_pipeline.pipeline, ['run', '--all', '--resume', '2'])
+        assert result.exit_code == 2
+        assert "--all can't be used with --resume" in result.output
+
+    @patch("controller.controller.Controller._actual_pipeline_run")
+    @patch("controller.controller.MongoAdapter.update_pipeline_info")
+    @patch("controller.controller.ConfigChecker.validate_config")
+    @patch("controller.controller.YamlParser.parse_yaml_directory")
+    @patch("controller.controller.Controller.handle_repo")
+    def test_success_run_all(
+            self, mock_handle, mock_parse, mock_validate, mock_update, mock_actual_run):
+        """ Test the case where all pipelines are validated once and run concurrently
+
+        Args:
+            mock_handle (MagicMock): mock the Controller.handle_repo function
+            mock_parse (MagicMock): mock the parse_yaml_directory method
+            mock_validate (MagicMock): mock the validate_config method
+            mock_update (MagicMock): mock the MongoAdapter.update_pipeline_info
+            mock_actual_run(MagicMock): mock the actual_run method
+        """
+        mock_handle.return_value = (True, "", self.session_data)
+        mock_parse.return_value = {
+            name: RawPipelineInfo(pipeline_name=name,
+                                  pipeline_file_name=f"{name}.yml",
+                                  pipeline_config=self.mock_pipeline_config)
+            for name in ['pipeline_a', 'pipeline_b']
+        }
+        mock_validate.return_value = self.success_validation_res
+        mock_update.return_value = True
+        mock_actual_run.return_value = (True, "run_number:1")
+        result = self.runner.invoke(cmd_pipeline.pipeline, ['run', '--all', '--job-slots', '3',
+                                                            '--pull', 'always'])
+        assert result.exit_code == 0
+        assert "pipeline:pipeline_a run_number:1" in result.output
+        assert "pipeline:pipeline_b run_number:1" in result.output
+        assert mock_actual_run.call_count == 2
+        # both pipelines share the same job slots
+        job_slots = {call.args[4] for call in mock_actual_run.call_args_list}
+        assert len(job_slots) == 1
+        assert all(call.kwargs['pull_policy'] == c.PULL_ALWAYS
+                   for call in mock_actual_run.call_args_list)
+
+        # one invalid pipeline stop all pipelines from running
+        mock_actual_run.reset_mock()
+        mock_validate.return_value = self.fail_validation
+        result = self.runner.invoke(cmd_pipeline.pipeline, ['run', '--all'])
+        assert result.exit_code == 1
+        mock_actual_run.assert_not_called()
+
+
 class TestPipelineHistory(TestCase):
     """Test class to handle `cid pipeline history` command that
     validates the cli and controller class for report history
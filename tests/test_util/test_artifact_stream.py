@@ -0,0 +1,92 @@
+""" test the artifact streaming helpers
+"""
+import hashlib
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+from util.artifact_stream import (ChunkReader, HashWriter, TeeWriter, format_throughput,
+                                  hash_tar, iter_tar_files)
+
+
+def make_tar(files: dict, chunk_size: int = 7) -> list[bytes]:
+    """ build a tar archive and split it into chunks, like get_archive
+
+    Args:
+        files (dict): file name and content
+        chunk_size (int, optional): size of the chunks. Defaults to 7.
+
+    Returns:
+        list[bytes]: chunks of the archive
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for name, content in files.items():
+            if content is None:
+                info = tarfile.TarInfo(name)
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+                continue
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    data = buffer.getvalue()
+    return [data[idx:idx + chunk_size] for idx in range(0, len(data), chunk_size)]
+
+
+class TestArtifactStream(unittest.TestCase):
+    """ Test suite for the artifact streaming helpers
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+    def test_chunk_reader(self):
+        """ the chunks are read in order across reads of any size
+        """
+        reader = ChunkReader([b"abc", b"", b"defg"])
+        assert reader.read(2) == b"ab"
+        assert reader.read(5) == b"c"
+        assert reader.read() == b"defg"
+        assert reader.read(1) == b""
+
+    def test_hash_tar(self):
+        """ the files of the tar stream are hashed and extracted to the local
+        directory, directories are left out
+        """
+        chunks = make_tar({'dist': None, 'dist/app.whl': b"wheel" * 100,
+                           'htmlcov/index.html': b"<html></html>"})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            files = hash_tar(chunks, extract_dir=tmp_dir)
+            assert [(file.path, file.size) for file in files] == \
+                [('dist/app.whl', 500), ('htmlcov/index.html', 13)]
+            assert files[0].sha256 == hashlib.sha256(b"wheel" * 100).hexdigest()
+            with open(os.path.join(tmp_dir, 'htmlcov', 'index.html'), 'rb') as file:
+                assert file.read() == b"<html></html>"
+
+            # member outside of the extract directory
+            with self.assertRaises(tarfile.TarError):
+                hash_tar(make_tar({'../escape.txt': b"x"}), tmp_dir)
+
+    def test_iter_tar_files_and_tee(self):
+        """ the content of each file is read as a stream and written to all sinks
+        """
+        first = io.BytesIO()
+        digest = hashlib.sha256()
+        out = TeeWriter([first, HashWriter(digest)])
+        names = []
+        for member, source in iter_tar_files(make_tar({'a': b"abc", 'b': None})):
+            names.append(member.name)
+            out.write(source.read())
+        assert names == ['a']
+        assert first.getvalue() == b"abc"
+        assert out.size == 3
+        assert digest.hexdigest() == hashlib.sha256(b"abc").hexdigest()
+
+    def test_format_throughput(self):
+        """ the message give the files uploaded, size and rate in MiB
+        """
+        message = format_throughput("s3://bucket/manifest.json", 10, 2,
+                                    2 * 1024 * 1024, 0.5)
+        assert message == "Artifacts uploaded to s3://bucket/manifest.json: 10 files, " \
+                          "2 uploaded (2.0 MiB), 8 already stored, in 0.5s, 4.0 MiB/s"
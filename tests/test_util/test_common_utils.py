@@ -1,7 +1,11 @@
 """ Test for all common utilities function
 """
 import logging
-from util.common_utils import get_logger
+import os
+from unittest.mock import patch
+from util.common_utils import (get_int_setting, get_logger, match_changes, PipelineReport)
+from util.model import (MetricSummary, ResourceMetrics)
+import util.constant as c
 
 
 def test_get_logger():
@@ -9,3 +13,84 @@ def test_get_logger():
     """
     logger = get_logger(logger_name='tests.test_util.test_common_utils')
     assert isinstance(logger, logging.Logger)
+
+
+@patch.dict(os.environ, {"CICD_TEST_SETTING": "8"})
+def test_get_int_setting():
+    """ test the integer settings are read from the env values, the default is used
+    when not set, invalid or below the minimum
+    """
+    assert get_int_setting("CICD_TEST_SETTING", 4) == 8
+    assert get_int_setting("CICD_TEST_UNSET", 4) == 4
+    os.environ["CICD_TEST_SETTING"] = "0"
+    assert get_int_setting("CICD_TEST_SETTING", 4) == 4
+    assert get_int_setting("CICD_TEST_SETTING", 4, minimum=0) == 0
+    os.environ["CICD_TEST_SETTING"] = "many"
+    assert get_int_setting("CICD_TEST_SETTING", 4) == 4
+
+
+def test_match_changes():
+    """ test the match_changes function with file, directory and glob patterns
+    """
+    changed_files = ['services/api/app.py', 'README.md']
+    assert match_changes(changed_files, ['README.md'])
+    assert match_changes(changed_files, ['services/api/'])
+    assert match_changes(changed_files, ['./services/*'])
+    assert match_changes(changed_files, ['*.md'])
+    assert not match_changes(changed_files, ['services/web/'])
+    assert not match_changes(changed_files, [])
+    assert not match_changes([], ['*'])
+
+
+def test_print_job_summary_matrix():
+    """ test the variants of a matrix job are grouped under the job name
+    """
+    job = {c.FIELD_JOB_STATUS: c.STATUS_SUCCESS, c.FIELD_JOB_ALLOW_FAILURE: False,
+           c.FIELD_START_TIME: "start", c.FIELD_COMPLETION_TIME: "end"}
+    pipeline_data = [{
+        c.FIELD_PIPELINE_NAME: 'cicd_pipeline', c.FIELD_BRANCH: 'main',
+        c.FIELD_RUN_NUMBER: 1, c.FIELD_GIT_COMMIT_HASH: 'abc',
+        c.FIELD_LOGS: [{c.FIELD_STAGE_NAME: 'test', c.FIELD_JOBS: [
+            {**job, c.FIELD_JOB_NAME: 'pytest-3_11', c.FIELD_MATRIX_PARENT: 'pytest',
+             c.FIELD_MATRIX: {'python': '3.11'}},
+            {**job, c.FIELD_JOB_NAME: 'pytest-3_12', c.FIELD_MATRIX_PARENT: 'pytest',
+             c.FIELD_MATRIX: {'python': '3.12'}, c.FIELD_JOB_STATUS: c.STATUS_FAILED,
+             c.FIELD_FAILURE_REASON: c.FAILURE_OOM},
+            {**job, c.FIELD_JOB_NAME: 'pylint'},
+        ]}]
+    }]
+    output = PipelineReport(pipeline_data).print_job_summary()
+    assert output.count("Job Name: pytest\n") == 1
+    assert "Matrix Variants:\n  Variant: pytest-3_11 (python=3.11)\n" \
+           "  Job Status: success\n" in output
+    assert "  Variant: pytest-3_12 (python=3.12)\n  Job Status: failed\n" in output
+    assert "Job Name: pylint\nJob Status: success\n" in output
+    assert "  Completion Time: end\n  Failure Reason: oom\n" in output
+    assert output.count("Failure Reason") == 1
+
+
+def test_print_job_summary_resource_metrics():
+    """ test the resource usage of a job is shown when it was sampled
+    """
+    metrics = ResourceMetrics(samples=4, interval=5,
+                              cpu_percent=MetricSummary(min=1, avg=50.5, peak=99),
+                              memory_bytes=MetricSummary(min=1024 * 1024,
+                                                         avg=2 * 1024 * 1024,
+                                                         peak=3 * 1024 * 1024),
+                              net_rx_bytes=10 * 1024 * 1024, overhead=0.05)
+    job = {c.FIELD_JOB_NAME: 'build', c.FIELD_JOB_STATUS: c.STATUS_SUCCESS,
+           c.FIELD_JOB_ALLOW_FAILURE: False, c.FIELD_START_TIME: "start",
+           c.FIELD_COMPLETION_TIME: "end",
+           c.FIELD_RESOURCE_METRICS: metrics.model_dump()}
+    pipeline_data = [{
+        c.FIELD_PIPELINE_NAME: 'cicd_pipeline', c.FIELD_BRANCH: 'main',
+        c.FIELD_RUN_NUMBER: 1, c.FIELD_GIT_COMMIT_HASH: 'abc',
+        c.FIELD_LOGS: [{c.FIELD_STAGE_NAME: 'build', c.FIELD_JOBS: [
+            job, {**job, c.FIELD_JOB_NAME: 'lint', c.FIELD_RESOURCE_METRICS: None}]}]
+    }]
+    output = PipelineReport(pipeline_data).print_job_summary()
+    assert "CPU (%): min 1.0, avg 50.5, peak 99.0\n" in output
+    assert "Memory (MiB): min 1.0, avg 2.0, peak 3.0\n" in output
+    assert "Network (MiB): rx 10.0, tx 0.0\n" in output
+    assert "Resource Samples: 4 every 5s, overhead 0.05s\n" in output
+    assert output.count("CPU (%)") == 1
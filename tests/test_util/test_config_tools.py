@@ -94,6 +94,32 @@ class TestConfigChecker(unittest.TestCase):
         assert error_msg == expected_error_msg
         assert actual_dict == expected_dict
 
+    def test_check_global_section_max_concurrency(self):
+        """ test the _check_global_section() for the optional max_concurrency key
+        """
+        input_dict = {
+            c.KEY_GLOBAL: {
+                c.KEY_PIPE_NAME: 'test_pipeline',
+                c.KEY_DOCKER:{
+                    c.KEY_DOCKER_IMG:'ubuntu:latest'
+                },
+                c.KEY_ARTIFACT_PATH: 'Github.com',
+                c.KEY_MAX_CONCURRENCY: 4
+            }
+        }
+        passed, error_msg = self.checker._check_global_section(
+            pipeline_config=input_dict, processed_config=self.actual_dict)
+        self.assertTrue(passed)
+        self.assertEqual(error_msg, self.expected_error_msg)
+        self.assertEqual(self.actual_dict[c.KEY_GLOBAL][c.KEY_MAX_CONCURRENCY], 4)
+
+        # Invalid value
+        input_dict[c.KEY_GLOBAL][c.KEY_MAX_CONCURRENCY] = 0
+        passed, error_msg = self.checker._check_global_section(
+            pipeline_config=input_dict, processed_config={})
+        self.assertFalse(passed)
+        self.assertIn(c.KEY_MAX_CONCURRENCY, error_msg)
+
 
 def test_check_stages_section():
     """ test the _check_stages_section() for only the fill in default
@@ -157,6 +183,107 @@ def test_check_stages_section():
     assert error_msg == expected_error_msg
     assert actual_dict == expected_dict
 
+def test_check_stages_section_dag_mode():
+    """ test the _check_stages_section() for cross stage needs in dag mode
+    """
+    checker = config.ConfigChecker()
+    input_dict = {
+        c.KEY_STAGES:['build', 'test', 'doc'],
+        c.KEY_JOBS:{
+            'compile':{
+                c.JOB_SUBKEY_STAGE:'build'
+            },
+            'pytest':{
+                c.JOB_SUBKEY_STAGE:'test',
+                c.JOB_SUBKEY_NEEDS:['compile']
+            },
+            'pylint':{
+                c.JOB_SUBKEY_STAGE:'test',
+                c.JOB_SUBKEY_NEEDS:[]
+            },
+            'pydoc':{
+                c.JOB_SUBKEY_STAGE:'doc'
+            }
+        }
+    }
+    # without dag mode, needs must be within the same stage
+    passed, error_msg = checker._check_stages_section(
+        pipeline_config=input_dict, processed_config={}
+    )
+    assert not passed
+    assert "job:compile outside of this stage" in error_msg
+
+    actual_dict = {c.KEY_GLOBAL:{c.KEY_DAG_MODE: True}}
+    passed, error_msg = checker._check_stages_section(
+        pipeline_config=input_dict, processed_config=actual_dict
+    )
+    assert passed
+    assert error_msg == ""
+    # cross stage needs are not part of the stage graph
+    assert actual_dict[c.KEY_STAGES]['test'][c.KEY_JOB_GRAPH] == {'pylint':[], 'pytest':[]}
+    # pydoc without needs waits for all jobs of the previous stage
+    assert actual_dict[c.KEY_JOB_GRAPH] == {
+        'compile':['pytest'],
+        'pylint':['pydoc'],
+        'pytest':['pydoc'],
+        'pydoc':[]
+    }
+
+    # needs on jobs of later stages are still rejected
+    input_dict[c.KEY_JOBS]['compile'][c.JOB_SUBKEY_NEEDS] = ['pydoc']
+    passed, error_msg = checker._check_stages_section(
+        pipeline_config=input_dict,
+        processed_config={c.KEY_GLOBAL:{c.KEY_DAG_MODE: True}}
+    )
+    assert not passed
+    assert "job:pydoc not defined in this or earlier stages" in error_msg
+
+def test_check_stages_section_changes():
+    """ test the _check_stages_section() for stage entries with changes
+    """
+    checker = config.ConfigChecker()
+    input_dict = {
+        c.KEY_STAGES:[
+            'build',
+            {c.KEY_STAGE_NAME:'test', c.KEY_CHANGES:['src/', 'tests/']}
+        ],
+        c.KEY_JOBS:{
+            'compile':{
+                c.JOB_SUBKEY_STAGE:'build'
+            },
+            'pytest':{
+                c.JOB_SUBKEY_STAGE:'test'
+            }
+        }
+    }
+    actual_dict = {}
+    passed, error_msg = checker._check_stages_section(
+        pipeline_config=input_dict, processed_config=actual_dict
+    )
+    assert passed
+    assert error_msg == ""
+    assert list(actual_dict[c.KEY_STAGES].keys()) == ['build', 'test']
+    assert c.KEY_CHANGES not in actual_dict[c.KEY_STAGES]['build']
+    assert actual_dict[c.KEY_STAGES]['test'][c.KEY_CHANGES] == ['src/', 'tests/']
+
+    # snapshot flag
+    input_dict[c.KEY_STAGES][1] = {c.KEY_STAGE_NAME:'test', c.KEY_SNAPSHOT:True}
+    actual_dict = {}
+    passed, error_msg = checker._check_stages_section(
+        pipeline_config=input_dict, processed_config=actual_dict
+    )
+    assert passed, error_msg
+    assert actual_dict[c.KEY_STAGES]['test'][c.KEY_SNAPSHOT]
+    assert c.KEY_CHANGES not in actual_dict[c.KEY_STAGES]['test']
+
+    # stage mapping without name
+    input_dict[c.KEY_STAGES][1] = {c.KEY_CHANGES:['src/']}
+    passed, error_msg = checker._check_stages_section(
+        pipeline_config=input_dict, processed_config={}
+    )
+    assert not passed
+    assert f"key not found error for subkey:{c.KEY_STAGE_NAME}" in error_msg
+
 def test_check_stages_jobs_relationship():
     """ test the _check_stages_jobs_relationship() for normal success
     """
@@ -371,3 +498,203 @@ def test_check_jobs_section():
     assert passed
     assert error_msg == expected_error_msg
     assert actual_dict == expected_dict
+
+def test_validate_config_matrix():
+    """ test a matrix job is expanded into one job per combination
+    """
+    checker = config.ConfigChecker()
+    input_dict = {
+        c.KEY_GLOBAL: {
+            c.KEY_PIPE_NAME: 'test_pipeline',
+            c.KEY_DOCKER: {
+                c.KEY_DOCKER_REG: c.DEFAULT_DOCKER_REGISTRY,
+                c.KEY_DOCKER_IMG: 'ubuntu:latest'
+            },
+        },
+        c.KEY_STAGES: ['build', 'test'],
+        c.KEY_JOBS: {
+            'checkout': {
+                c.JOB_SUBKEY_STAGE: 'build',
+                c.JOB_SUBKEY_SCRIPTS: ['git clone']
+            },
+            'pytest': {
+                c.JOB_SUBKEY_STAGE: 'test',
+                c.JOB_SUBKEY_MATRIX: {'python': ['3.11', '3.12'], 'os': ['slim']},
+                c.KEY_DOCKER: {c.KEY_DOCKER_IMG: 'python:${{ matrix.python }}-${{matrix.os}}'},
+                c.JOB_SUBKEY_SCRIPTS: ['echo ${{ matrix.python }}', 'pytest']
+            },
+            'report': {
+                c.JOB_SUBKEY_STAGE: 'test',
+                c.JOB_SUBKEY_NEEDS: ['pytest'],
+                c.JOB_SUBKEY_SCRIPTS: ['coverage report']
+            }
+        }
+    }
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert result.valid, result.error_msg
+    jobs = result.pipeline_config.jobs
+    assert list(jobs.keys()) == ['checkout', 'pytest-3_11-slim', 'pytest-3_12-slim', 'report']
+    variant = jobs['pytest-3_12-slim']
+    assert variant[c.KEY_DOCKER][c.KEY_DOCKER_IMG] == 'python:3.12-slim'
+    assert variant[c.JOB_SUBKEY_SCRIPTS] == ['echo 3.12', 'pytest']
+    assert variant[c.JOB_SUBKEY_MATRIX] == {'python': '3.12', 'os': 'slim'}
+    assert variant[c.JOB_SUBKEY_MATRIX_PARENT] == 'pytest'
+    # needs on the matrix job become needs on all variants
+    assert jobs['report'][c.JOB_SUBKEY_NEEDS] == ['pytest-3_11-slim', 'pytest-3_12-slim']
+    assert result.pipeline_config.stages['test'][c.KEY_JOB_GRAPH] == {
+        'pytest-3_11-slim': ['report'], 'pytest-3_12-slim': ['report'], 'report': []}
+    # the given config is not modified
+    assert 'pytest' in input_dict[c.KEY_JOBS]
+
+    # validated config can be validated again, e.g. after override
+    again = checker.validate_config('test_pipeline', {
+        c.KEY_GLOBAL: input_dict[c.KEY_GLOBAL],
+        c.KEY_STAGES: ['build', 'test'],
+        c.KEY_JOBS: result.pipeline_config.jobs})
+    assert again.valid, again.error_msg
+    assert again.pipeline_config.jobs == jobs
+
+    # invalid matrix and undefined variable
+    input_dict[c.KEY_JOBS]['pytest'][c.JOB_SUBKEY_MATRIX] = {'python': '3.12'}
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert not result.valid
+    assert "jobs:pytest matrix must map each variable name" in result.error_msg
+    input_dict[c.KEY_JOBS]['pytest'][c.JOB_SUBKEY_MATRIX] = {'py': ['3.12']}
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert not result.valid
+    assert "undefined matrix variable os, python" in result.error_msg
+
+
+def test_validate_config_timeout():
+    """ test the global and job timeout are validated and recorded
+    """
+    checker = config.ConfigChecker()
+    input_dict = {
+        c.KEY_GLOBAL: {
+            c.KEY_PIPE_NAME: 'test_pipeline',
+            c.KEY_DOCKER: {c.KEY_DOCKER_IMG: 'ubuntu:latest'},
+            c.KEY_TIMEOUT: 600,
+        },
+        c.KEY_STAGES: ['build'],
+        c.KEY_JOBS: {
+            'checkout': {
+                c.JOB_SUBKEY_STAGE: 'build',
+                c.JOB_SUBKEY_SCRIPTS: ['git clone'],
+                c.KEY_TIMEOUT: 60
+            },
+            'compile': {
+                c.JOB_SUBKEY_STAGE: 'build',
+                c.JOB_SUBKEY_SCRIPTS: ['make']
+            }
+        }
+    }
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert result.valid, result.error_msg
+    assert result.pipeline_config.global_.timeout == 600
+    assert result.pipeline_config.jobs['checkout'][c.KEY_TIMEOUT] == 60
+    assert c.KEY_TIMEOUT not in result.pipeline_config.jobs['compile']
+
+    input_dict[c.KEY_JOBS]['checkout'][c.KEY_TIMEOUT] = 0
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert not result.valid
+    assert "jobs:checkout timeout must be at least 1 second" in result.error_msg
+    input_dict[c.KEY_JOBS]['checkout'][c.KEY_TIMEOUT] = 60
+    input_dict[c.KEY_GLOBAL][c.KEY_TIMEOUT] = 'never'
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert not result.valid
+    assert "type error for key:timeout" in result.error_msg
+
+def test_validate_config_executor():
+    """ test the executor is recorded and must be a known executor
+    """
+    checker = config.ConfigChecker()
+    input_dict = {
+        c.KEY_GLOBAL: {
+            c.KEY_PIPE_NAME: 'test_pipeline',
+            c.KEY_DOCKER: {c.KEY_DOCKER_IMG: 'ubuntu:latest'},
+            c.KEY_EXECUTOR: c.EXECUTOR_EXEC,
+        },
+        c.KEY_STAGES: ['build'],
+        c.KEY_JOBS: {
+            'checkout': {
+                c.JOB_SUBKEY_STAGE: 'build',
+                c.JOB_SUBKEY_SCRIPTS: ['git clone']
+            }
+        }
+    }
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert result.valid, result.error_msg
+    assert result.pipeline_config.global_.executor == c.EXECUTOR_EXEC
+
+    input_dict[c.KEY_GLOBAL][c.KEY_EXECUTOR] = 'kubernetes'
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert not result.valid
+    assert "executor must be one of" in result.error_msg
+
+
+def test_validate_config_cache():
+    """ test the dependency cache section of a job is validated and recorded
+    """
+    checker = config.ConfigChecker()
+    input_dict = {
+        c.KEY_GLOBAL: {
+            c.KEY_PIPE_NAME: 'test_pipeline',
+            c.KEY_DOCKER: {c.KEY_DOCKER_IMG: 'python:3.12'},
+        },
+        c.KEY_STAGES: ['build'],
+        c.KEY_JOBS: {
+            'install': {
+                c.JOB_SUBKEY_STAGE: 'build',
+                c.JOB_SUBKEY_SCRIPTS: ['poetry install'],
+                c.JOB_SUBKEY_CACHE: {
+                    c.CACHE_SUBKEY_KEY: "pip-${{ hashFiles('poetry.lock') }}",
+                    c.CACHE_SUBKEY_PATHS: ['~/.cache/pip', '.venv']
+                }
+            }
+        }
+    }
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert result.valid, result.error_msg
+    assert result.pipeline_config.jobs['install'][c.JOB_SUBKEY_CACHE] == {
+        c.CACHE_SUBKEY_KEY: "pip-${{ hashFiles('poetry.lock') }}",
+        c.CACHE_SUBKEY_PATHS: ['~/.cache/pip', '.venv']
+    }
+
+    input_dict[c.KEY_JOBS]['install'][c.JOB_SUBKEY_CACHE][c.CACHE_SUBKEY_PATHS] = []
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert not result.valid
+    assert "jobs:install cache key and paths must not be empty" in result.error_msg
+
+    input_dict[c.KEY_JOBS]['install'][c.JOB_SUBKEY_CACHE] = ['~/.cache/pip']
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert not result.valid
+    assert "jobs:install cache must define key and paths" in result.error_msg
+
+
+def test_validate_config_setup():
+    """ test the setup scripts of a job are validated and recorded
+    """
+    checker = config.ConfigChecker()
+    input_dict = {
+        c.KEY_GLOBAL: {
+            c.KEY_PIPE_NAME: 'test_pipeline',
+            c.KEY_DOCKER: {c.KEY_DOCKER_IMG: 'python:3.12'},
+        },
+        c.KEY_STAGES: ['build'],
+        c.KEY_JOBS: {
+            'install': {
+                c.JOB_SUBKEY_STAGE: 'build',
+                c.JOB_SUBKEY_SETUP: ['apt-get update', 'apt-get install -y git'],
+                c.JOB_SUBKEY_SCRIPTS: ['git --version'],
+            }
+        }
+    }
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert result.valid, result.error_msg
+    assert result.pipeline_config.jobs['install'][c.JOB_SUBKEY_SETUP] == \
+        ['apt-get update', 'apt-get install -y git']
+
+    input_dict[c.KEY_JOBS]['install'][c.JOB_SUBKEY_SETUP] = 5
+    result = checker.validate_config('test_pipeline', input_dict)
+    assert not result.valid
+    assert f"type error for key:{c.JOB_SUBKEY_SETUP}" in result.error_msg
@@ -1,12 +1,24 @@
 """ test the ContainerManager and all subclass
 """
 import copy
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch
+from unittest.mock import (patch, MagicMock)
 from botocore.exceptions import ClientError
-from docker.errors import DockerException
+from docker.errors import (DockerException, ImageNotFound, NotFound)
 import util.constant as c
 from util.container import (DockerManager)
+from util.dep_cache import (DependencyCache)
+from util.job_cache import (JobCache)
+from util.model import (ArtifactFile, ArtifactManifest, JobLog)
+from util.setup_image import (SetupImageCache)
 from util.common_utils import (get_logger)
 
 logger = get_logger("tests.test_util.test_container")
@@ -20,10 +32,32 @@ class MockContainer:
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
+        self.id = kwargs.get('name', 'container')
+        self.name = kwargs.get('name', 'container')
+        self.attrs = {'State': {'OOMKilled': False}}
 
-    def wait(self) -> None:
+    status_code = 0
+
+    def reload(self) -> None:
+        """ Mock the container.reload method
+        """
+
+    def stats(self, *args, **kwargs) -> dict:
+        """ Mock the container.stats method
+
+        Returns:
+            dict: one shot resource usage of the container
+        """
+        return {'memory_stats': {'usage': 8 * 1024 * 1024, 'stats': {'inactive_file': 0}},
+                'cpu_stats': {'cpu_usage': {'total_usage': 1000}}}
+
+    def wait(self) -> dict:
         """ Mock the container.wait() method
+
+        Returns:
+            dict: exit status of the container
         """
+        return {'StatusCode': self.status_code}
 
     def logs(self, *args, **kwargs) -> bytes:
         """ Mock the container.wait() method
@@ -34,7 +68,15 @@ class MockContainer:
         """
         return bytes(TEST_LOG, encoding='utf-8')
 
-    def remove(self) -> None:
+    def attach(self, *args, **kwargs):
+        """ Mock the container.attach method, stream the logs as stderr chunk
+
+        Returns:
+            iterator: tuple of stdout, stderr chunks
+        """
+        return iter([(None, self.logs())])
+
+    def remove(self, *args, **kwargs) -> None:
         """ Mock the container.remove method
 
         Returns:
@@ -60,6 +102,8 @@ class MockContainer:
         return "", ""
 
 class MockFailContainer(MockContainer):
+    status_code = 127
+
     def logs(self, *args, **kwargs) -> bytes:
         """ Mock the container.wait() method
         return a fake logs message
@@ -80,6 +124,18 @@ class MockFailContainer(MockContainer):
         """
         raise DockerException()
 
+class MockEventStream:
+    """ Fake stream of docker events"""
+    def __init__(self, events:list):
+        self.events = iter(events)
+        self.closed = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.closed = True
+
 class MockContainersApi:
     '''A fake Docker API with containers calls.'''
     def __init__(self, success:bool=True, throw:bool=False):
@@ -104,6 +160,8 @@ class MockVolume:
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
+        self.name = args[0] if args else kwargs.get('name')
+        self.attrs = {'Labels': kwargs.get('labels')}
 
     def remove(self):
         return True
@@ -114,6 +172,20 @@ class MockVolumesApi:
         self.volume = MockVolume
     def create(self, *args, **kwargs):
         return self.volume(*args, **kwargs)
+    def get(self, name):
+        raise NotFound(f"volume {name} not found")
+    def list(self, *args, **kwargs):
+        return []
+
+class MockImage:
+    """ Fake Docker Image"""
+    def __init__(self, *args, **kwargs):
+        self.id = "sha256:image"
+
+class MockImagesApi:
+    '''A fake Docker API with images calls.'''
+    def get(self, *args, **kwargs):
+        return MockImage(*args, **kwargs)
 
 class MockDockerApi:
     '''A fake Docker API.'''
@@ -128,6 +200,13 @@ class MockDockerApi:
         """
         self.containers = MockContainersApi(success, throw)
         self.volumes = MockVolumesApi()
+        self.images = MockImagesApi()
+
+    def events(self, *args, **kwargs):
+        """ Mock the events method, the stream end at once so the containers
+        are waited for with wait
+        """
+        return MockEventStream([])
 
 class TestDockerManager(unittest.TestCase):
     """ Test suite for the container
@@ -222,31 +301,14 @@ class TestDockerManager(unittest.TestCase):
         job_log = job_log.model_dump()
         assert job_log[c.REPORT_KEY_JOBSTATUS] == c.STATUS_FAILED
 
-    @patch("util.container.S3Client")
-    @patch("util.container.os.remove")
-    @patch("util.container.tarfile.open")
-    @patch("util.container.open")
-    @patch("util.container.Path")
-    def test_upload_artifact_fail_s3(self, mock_path, mock_open, mock_tar, mock_os, mock_client):
+    @patch("util.container.ArtifactStore")
+    def test_upload_artifact_fail_s3(self, mock_store):
         """ Test the exception handling and status return when upload to s3 fail
 
         Args:
-            mock_path (MagicMock): mock path object and all required method
-            mock_open (MagicMock): mock the open method
-            mock_tar (MagicMock): mock tarfile.open method
-            mock_os (MagicMock): mock the os.remove method
-            mock_client (MagicMock): mock the s3Client
+            mock_store (MagicMock): mock the ArtifactStore
         """
-        mock_path_obj = mock_path.return_value
-        mock_path_obj.is_dir.return_value = False
-        mock_path_obj.cwd.return_value = ""
-        mock_path_obj.joinpath.return_value = ""
-        mock_path_obj.mkdir.return_value = ""
-        mock_open_obj = mock_open.return_value
-        mock_open_obj.write.return_value = ""
-        mock_tar_obj = mock_tar.return_value
-        mock_tar_obj.extractall.return_value = ""
-        mock_client.side_effect = ClientError(
+        mock_store.side_effect = ClientError(
             error_response={
                 'Error':{
                     'Code':'Any'
@@ -265,7 +327,754 @@ class TestDockerManager(unittest.TestCase):
         job_log = job_log.model_dump()
         assert job_log[c.REPORT_KEY_JOBSTATUS] == c.STATUS_FAILED
 
+    @patch("util.container.ArtifactStore")
+    def test_upload_artifact_stream(self, mock_store):
+        """ Test only the files missing from the store are streamed to their blob,
+        the manifest is stored in s3 and in the job cache, with the throughput in
+        the job log
+
+        Args:
+            mock_store (MagicMock): mock the ArtifactStore
+        """
+        tar_buffer = io.BytesIO()
+        with tarfile.open(fileobj=tar_buffer, mode='w') as tar:
+            for name, data in (('dist/app.whl', b"wheel"), ('dist/README', b"readme")):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        wheel_sha = hashlib.sha256(b"wheel").hexdigest()
+        container = MockContainer()
+        container.get_archive = MagicMock(
+            side_effect=lambda path: (iter([tar_buffer.getvalue()]), {}))
+        store = mock_store.return_value
+        store.missing_blobs.side_effect = lambda sha256s: {wheel_sha} & set(sha256s)
+        store.put_manifest.return_value = "Repo-main-pipeline/1/build/sample_job/manifest.json"
+        uploaded = io.BytesIO()
+        writer = store.open_blob.return_value
+        writer.write.side_effect = uploaded.write
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            job_cache = JobCache(cache_dir=tmp_dir, s3_bucket="")
+            docker_manager = DockerManager(client=MockDockerApi(), job_cache=job_cache)
+            docker_manager.pipeline_prefix = "Repo-main-pipeline"
+            docker_manager.run = "1"
+            status, msg = docker_manager._upload_artifact(container, "bucket", ["dist"],
+                                                          "sample_job", "build",
+                                                          cache_key="key")
+            assert status
+            assert msg.startswith("Artifacts uploaded to s3://bucket/"
+                                  "Repo-main-pipeline/1/build/sample_job/manifest.json: "
+                                  "2 files, 1 uploaded")
+            container.get_archive.assert_called_with(f"{c.DEFAULT_DOCKER_DIR}/dist")
+            assert container.get_archive.call_count == 2
+            store.open_blob.assert_called_once_with(wheel_sha)
+            assert uploaded.getvalue() == b"wheel"
+            writer.close.assert_called_once()
+            manifest = store.put_manifest.call_args.args[0]
+            assert (manifest.pipeline, manifest.run, manifest.stage, manifest.job_name) == \
+                ("Repo-main-pipeline", "1", "build", "sample_job")
+            assert [file.path for file in manifest.files] == ['dist/app.whl', 'dist/README']
+            assert {file.parent for file in manifest.files} == {""}
+            with open(os.path.join(tmp_dir, "key", JobCache.ARTIFACT_FILE),
+                      encoding='utf-8') as file:
+                assert json.load(file) == manifest.model_dump()
+
+            # content changed after hashing, the upload is aborted and not cached
+            first = tar_buffer.getvalue()
+            changed = first.replace(b"wheel", b"whelp")
+            container.get_archive.side_effect = [(iter([first]), {}), (iter([changed]), {})]
+            status, msg = docker_manager._upload_artifact(container, "bucket", ["dist"],
+                                                          "sample_job", "build",
+                                                          cache_key="other")
+            assert not status
+            writer.abort.assert_called_once()
+            assert not os.path.exists(os.path.join(tmp_dir, "other"))
+
+    @patch("util.container.ArtifactStore")
+    def test_restore_cached_job_artifact(self, mock_store):
+        """ Test a cache hit write the cached artifact files into the workspace under
+        the directory they were uploaded from, except for a job of a snapshot stage
+
+        Args:
+            mock_store (MagicMock): mock the ArtifactStore
+        """
+        manifest = ArtifactManifest(pipeline="repo-main-pipeline", run="1", stage="build",
+                                    job_name="sample_job", files=[
+            ArtifactFile(path="out/app.jar", sha256="a" * 64, size=3, parent="build"),
+            ArtifactFile(path="dist/app.whl", sha256="b" * 64, size=5)])
+
+        def download(manifest, dest_dir):
+            for file in manifest.files:
+                os.makedirs(os.path.dirname(os.path.join(dest_dir, file.path)), exist_ok=True)
+                with open(os.path.join(dest_dir, file.path), 'wb') as local:
+                    local.write(b"x" * file.size)
+
+        store = mock_store.return_value
+        store.missing_blobs.return_value = set()
+        store.download.side_effect = download
+        store.put_manifest.return_value = "repo-main-pipeline/2/build/sample_job/manifest.json"
+        extracted = []
+        container = MagicMock()
+        container.put_archive.side_effect = lambda path, archive: extracted.append(
+            (path, tarfile.open(fileobj=archive).getmembers())) or True
+        docker_api = MockDockerApi()
+        docker_api.containers.create = MagicMock(return_value=container)
+        docker_manager = DockerManager(client=docker_api, repo="repo", run="2")
+        cached_log = JobLog(job_name="sample_job", allow_failure=False, start_time="start",
+                            job_logs=TEST_LOG)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            artifact_path = os.path.join(tmp_dir, JobCache.ARTIFACT_FILE)
+            with open(artifact_path, 'w', encoding='utf-8') as file:
+                file.write(manifest.model_dump_json())
+
+            def restore():
+                job_log = JobLog(job_name="sample_job", allow_failure=False, start_time="start")
+                return docker_manager._restore_cached_job(
+                    job_log, cached_log, artifact_path, "build", "bucket", "ubuntu:latest")
+
+            job_log = restore()
+            assert job_log.job_status == c.STATUS_SUCCESS
+            assert job_log.artifact_manifest == store.put_manifest.return_value
+            path, members = extracted[0]
+            assert path == c.DEFAULT_DOCKER_DIR
+            assert [(member.name, member.size, member.uid) for member in members] == \
+                [("build/out/app.jar", 3, 0), ("dist/app.whl", 5, 0)]
+            assert docker_api.containers.create.call_args.kwargs['volumes'] == {
+                "repo-main-pipeline-2": {'bind': c.DEFAULT_DOCKER_DIR, 'mode': 'rw'}}
+            container.remove.assert_called_once_with(force=True)
+
+            # the workspace is not written for a job started from the stage snapshot
+            docker_manager.snapshot = MagicMock()
+            assert restore().job_status == c.STATUS_SUCCESS
+            assert len(extracted) == 1
+            docker_manager.snapshot = None
+
+            # the files could not be extracted, the job fails
+            container.put_archive.side_effect = None
+            container.put_archive.return_value = False
+            job_log = restore()
+            assert job_log.job_status == c.STATUS_FAILED
+            assert "Fail to copy the cached artifact" in job_log.job_logs
+
     def test_stop_container(self):
         docker_manager = DockerManager(client=MockDockerApi())
         docker_manager.stop_job("sample_job")
         assert True
+
+    def test_docker_manager_run_job_exit_code(self):
+        """ test the job status come from the exit code, and shell errors in stderr
+        decide the status only in legacy mode"""
+        docker_api = MockDockerApi()
+        docker_api.containers.run = MagicMock(return_value=MockFailContainer())
+        MockFailContainer.status_code = 0
+        try:
+            job_log = DockerManager(client=docker_api).run_job(
+                "sample_job", self.sample_job_config)
+            assert job_log.job_status == c.STATUS_SUCCESS
+            assert job_log.exit_code == 0
+            job_log = DockerManager(client=docker_api, legacy_status_check=True).run_job(
+                "sample_job", self.sample_job_config)
+            assert job_log.job_status == c.STATUS_FAILED
+        finally:
+            MockFailContainer.status_code = 127
+        command = docker_api.containers.run.call_args.kwargs['command']
+        assert command[:2] == ["sh", "-c"]
+        assert "git clone https://github.com/sjchin88/cicd-python\n" in command[2]
+        assert [command.command for command in job_log.commands] == \
+            self.sample_job_config[c.JOB_SUBKEY_SCRIPTS]
+
+    def test_pull_images(self):
+        """ test the images are pulled according to the pull policy, and a job fails
+        without running when its image is not available"""
+        docker_api = MockDockerApi()
+        docker_api.images.get = MagicMock(side_effect=ImageNotFound("not found"))
+        docker_api.images.pull = MagicMock()
+        docker_manager = DockerManager(client=docker_api)
+        docker_manager.pull_images(["ubuntu:latest", "python:3.12", "ubuntu:latest"])
+        job_config = copy.deepcopy(self.sample_job_config)
+        job_config[c.KEY_DOCKER][c.KEY_DOCKER_IMG] = "ubuntu:latest"
+        job_log = docker_manager.run_job("sample_job", job_config)
+        assert job_log.job_status == c.STATUS_SUCCESS
+        docker_manager._pulls["python:3.12"].result()
+        image_pulls = sorted(docker_manager.get_image_pulls(), key=lambda pull: pull.image)
+        assert [(pull.image, pull.status) for pull in image_pulls] == [
+            ("python:3.12", c.PULL_PULLED), ("ubuntu:latest", c.PULL_PULLED)]
+        assert docker_api.images.pull.call_count == 2
+
+        # never pull a missing image, the job is not run
+        docker_api.containers.run = MagicMock()
+        docker_manager = DockerManager(client=docker_api, pull_policy=c.PULL_NEVER)
+        job_log = docker_manager.run_job("sample_job", job_config)
+        assert job_log.job_status == c.STATUS_FAILED
+        assert job_log.job_logs.startswith("Fail to get image ubuntu:latest")
+        docker_api.containers.run.assert_not_called()
+
+        # always pull even if present
+        docker_api.images.get = MagicMock()
+        docker_api.images.pull.reset_mock()
+        docker_manager = DockerManager(client=docker_api, pull_policy=c.PULL_ALWAYS)
+        docker_manager.pull_images(["ubuntu:latest"])
+        docker_manager._pulls["ubuntu:latest"].result()
+        assert docker_manager.get_image_pulls()[0].status == c.PULL_PULLED
+        docker_api.images.pull.assert_called_once_with("ubuntu:latest")
+
+    def test_docker_manager_run_job_stream_logs(self):
+        """ test the job output is passed to the log handler and written to the log dir"""
+        lines = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            docker_manager = DockerManager(
+                client=MockDockerApi(), run="1", log_dir=tmp_dir,
+                log_handler=lambda job_name, line: lines.append((job_name, line)))
+            job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+            assert job_log.job_status == c.STATUS_SUCCESS
+            assert job_log.log_file == f"{tmp_dir}/Repo-main-pipeline-1-sample_job.log"
+            with open(job_log.log_file, encoding='utf-8') as log_file:
+                assert log_file.read() == TEST_LOG
+        assert lines == [("sample_job", TEST_LOG)]
+
+    def test_docker_manager_run_job_timeout(self):
+        """ test the watchdog stop a job running past its timeout, and jobs started
+        after the pipeline deadline are not run"""
+        stopped = threading.Event()
+        container = MockContainer()
+        container.wait = lambda: {'StatusCode': 143 if stopped.wait(5) else 0}
+        container.stop = stopped.set
+        docker_api = MockDockerApi()
+        docker_api.containers.run = MagicMock(return_value=container)
+        docker_api.containers.get = MagicMock(return_value=container)
+        docker_manager = DockerManager(client=docker_api, run="1")
+        job_config = copy.deepcopy(self.sample_job_config)
+        job_config[c.KEY_TIMEOUT] = 1
+        start = time.monotonic()
+        job_log = docker_manager.run_job("sample_job", job_config)
+        assert time.monotonic() - start < 5
+        assert job_log.job_status == c.STATUS_TIMEOUT
+        assert "stopped after timeout of 1 seconds" in job_log.job_logs
+        docker_api.containers.get.assert_called_with("Repo-main-pipeline-1-sample_job")
+
+        # job finished before the timeout is not stopped
+        stopped.clear()
+        container.wait = lambda: {'StatusCode': 0}
+        job_log = docker_manager.run_job("sample_job", job_config)
+        assert job_log.job_status == c.STATUS_SUCCESS
+        assert not stopped.is_set()
+
+        docker_manager = DockerManager(client=docker_api, pipeline_timeout=0)
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_TIMEOUT
+        assert job_log.job_logs == "Job sample_job not run, pipeline timeout reached"
+
+    def test_docker_manager_run_job_exec(self):
+        """ test the exec executor run the jobs of an image in one warm container,
+        removed with the volume"""
+        container = MockContainer()
+        container.id = "warm"
+        container.remove = MagicMock()
+        docker_api = MockDockerApi()
+        docker_api.containers.run = MagicMock(return_value=container)
+        docker_api.api = MagicMock()
+        docker_api.api.exec_create.return_value = {'Id': 'exec-1'}
+        docker_api.api.exec_start.side_effect = \
+            lambda *args, **kwargs: iter([(b"hello\n", None)])
+        docker_api.api.exec_inspect.return_value = {'ExitCode': 0}
+        docker_manager = DockerManager(client=docker_api, run="1",
+                                       executor=c.EXECUTOR_EXEC)
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_SUCCESS
+        assert job_log.exit_code == 0
+        assert "hello" in job_log.job_logs
+        docker_manager.run_job("other_job", self.sample_job_config)
+        docker_api.containers.run.assert_called_once()
+        assert docker_api.containers.run.call_args.kwargs['command'] == \
+            c.POOL_CONTAINER_COMMAND
+        assert docker_api.api.exec_create.call_count == 2
+        assert docker_api.api.exec_create.call_args.args[0] == "warm"
+        container.remove.assert_not_called()
+
+        # a failed command is reported from the exec exit code
+        docker_api.api.exec_inspect.return_value = {'ExitCode': 2}
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_FAILED
+        assert job_log.exit_code == 2
+
+        assert docker_manager._pool_jobs == {}
+
+        docker_manager.remove_vol()
+        container.remove.assert_called_once_with(force=True)
+
+    def test_stop_job_exec(self):
+        """ test a stopped job of the exec executor has its processes killed, the
+        warm container keep running the other jobs"""
+        container = MockContainer()
+        container.id = "warm"
+        container.stop = MagicMock()
+        container.exec_run = MagicMock()
+        docker_api = MockDockerApi()
+        docker_api.containers.run = MagicMock(return_value=container)
+        docker_api.api = MagicMock()
+        docker_api.api.exec_create.return_value = {'Id': 'exec-1'}
+        docker_api.api.exec_inspect.return_value = {'ExitCode': 143}
+        docker_manager = DockerManager(client=docker_api, run="1",
+                                       executor=c.EXECUTOR_EXEC)
+
+        def exec_start(*args, **kwargs):
+            # cancelled while running
+            docker_manager.stop_job("sample_job")
+            return iter([(b"hello\n", None)])
+
+        docker_api.api.exec_start.side_effect = exec_start
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_FAILED
+        assert docker_api.api.exec_create.call_args.kwargs['environment'][
+            c.EXEC_JOB_ENV] == "sample_job"
+        command = container.exec_run.call_args.args[0]
+        assert command[:3] == ["sh", "-c", c.EXEC_KILL_SCRIPT]
+        assert command[4] == f"{c.EXEC_JOB_ENV}=sample_job"
+        container.stop.assert_not_called()
+        assert docker_manager._pool == {docker_manager.get_image_name(
+            self.sample_job_config): container}
+        assert docker_manager._pool_jobs == {}
+
+    def test_seed_vol(self):
+        """ test the archive is streamed into the volume through a created container"""
+        container = MockContainer()
+        container.put_archive = MagicMock(return_value=True)
+        container.remove = MagicMock()
+        docker_api = MockDockerApi()
+        docker_api.containers.create = MagicMock(return_value=container)
+        docker_manager = DockerManager(client=docker_api, repo="repo", run="1")
+        archive = iter([b"chunk"])
+        assert docker_manager.seed_vol(archive, "ubuntu:latest") == (True, "")
+        assert docker_manager.docker_vol.name == "repo-main-pipeline-1"
+        kwargs = docker_api.containers.create.call_args.kwargs
+        assert kwargs['volumes'] == {"repo-main-pipeline-1":
+                                     {'bind': c.DEFAULT_DOCKER_DIR, 'mode': 'rw'}}
+        container.put_archive.assert_called_once_with(c.DEFAULT_DOCKER_DIR, archive)
+        container.remove.assert_called_once_with(force=True)
+
+        container.put_archive.side_effect = DockerException("no space left")
+        status, error_msg = docker_manager.seed_vol(iter([]), "ubuntu:latest")
+        assert not status
+        assert "no space left" in error_msg
+        assert container.remove.call_count == 2
+
+    def test_snapshot_vol(self):
+        """ test the jobs started after snapshot_vol run in a volume restored from
+        the snapshot, removed after the job"""
+        docker_api = MockDockerApi()
+        docker_api.containers.run = MagicMock(side_effect=MockContainer)
+        volumes = {}
+
+        def create_volume(name, **kwargs):
+            volumes[name] = MagicMock()
+            volumes[name].name = name
+            return volumes[name]
+
+        docker_api.volumes.create = create_volume
+        docker_manager = DockerManager(client=docker_api, repo="repo", run="1")
+        assert docker_manager.snapshot_vol("ubuntu:latest") == (True, "")
+        copy_kwargs = docker_api.containers.run.call_args.kwargs
+        assert copy_kwargs['volumes'] == {
+            "repo-main-pipeline-1": {'bind': c.COPY_SRC_DIR, 'mode': 'ro'},
+            "repo-main-pipeline-1-snapshot": {'bind': c.COPY_DST_DIR, 'mode': 'rw'}
+        }
+
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_SUCCESS
+        restore_kwargs, job_kwargs = [call.kwargs for call in
+                                      docker_api.containers.run.call_args_list[1:]]
+        job_vol = "repo-main-pipeline-1-sample_job"
+        assert restore_kwargs['volumes'][job_vol]['bind'] == c.COPY_DST_DIR
+        assert restore_kwargs['volumes']["repo-main-pipeline-1-snapshot"]['bind'] == \
+            c.COPY_SRC_DIR
+        assert list(job_kwargs['volumes']) == [job_vol]
+        volumes[job_vol].remove.assert_called_once()
+
+        docker_manager.drop_snapshot()
+        volumes["repo-main-pipeline-1-snapshot"].remove.assert_called_once()
+        docker_manager.run_job("sample_job", self.sample_job_config)
+        assert list(docker_api.containers.run.call_args.kwargs['volumes']) == \
+            ["repo-main-pipeline-1"]
+
+        # failed copy does not leave the snapshot behind
+        docker_api.containers.run = MagicMock(return_value=MockFailContainer())
+        status, error_msg = docker_manager.snapshot_vol("ubuntu:latest")
+        assert not status
+        assert "exit code 127" in error_msg
+        assert docker_manager.snapshot is None
+
+    def test_retain_and_remove_expired_vols(self):
+        """ test volume retained for resume are removed after the deadline recorded
+        with the finished run, the volumes of the runs not finished are kept"""
+        docker_manager = DockerManager(client=MockDockerApi(), repo="repo", run="2",
+                                       vol_retention=60)
+        docker_manager.run_job("sample_job", self.sample_job_config)
+        volume = docker_manager.docker_vol
+        assert volume.name == "repo-main-pipeline-2"
+        assert volume.attrs['Labels'][c.LABEL_RUN_NUMBER] == "2"
+        assert docker_manager.remove_vol(retain=True)
+        assert docker_manager.docker_vol is None
+
+        # a resumed run use the volume of the earlier run
+        resumed = DockerManager(client=MockDockerApi(), repo="repo", run="3")
+        assert not resumed.attach_vol("2")
+        assert resumed.vol_name == "repo-main-pipeline-3"
+        resumed.client.volumes.get = MagicMock()
+        assert resumed.attach_vol("2")
+        resumed.client.volumes.get.assert_called_once_with("repo-main-pipeline-2")
+        assert resumed.vol_name == "repo-main-pipeline-2"
+
+        now = int(time.time())
+        jobs = {1: {c.FIELD_STATUS: c.STATUS_FAILED, c.FIELD_RETAIN_UNTIL: now - 1},
+                2: {c.FIELD_STATUS: c.STATUS_FAILED, c.FIELD_RETAIN_UNTIL: now + 60},
+                3: {c.FIELD_STATUS: c.STATUS_PENDING},
+                4: {c.FIELD_STATUS: c.STATUS_SUCCESS}}
+        run_job = MagicMock(side_effect=lambda repo, branch, pipeline, run: jobs.get(run))
+        volumes = []
+        for run in (1, 2, 3, 4, 5):
+            volume = MagicMock()
+            volume.attrs = {'Labels': {**docker_manager.labels, c.LABEL_RUN_NUMBER: str(run)}}
+            volumes.append(volume)
+        docker_manager.client.volumes.list = MagicMock(return_value=volumes)
+        assert docker_manager.remove_expired_vols(run_job) == 2
+        volumes[0].remove.assert_called_once()
+        volumes[3].remove.assert_called_once()
+        for volume in (volumes[1], volumes[2], volumes[4]):
+            volume.remove.assert_not_called()
+        run_job.assert_any_call("repo", "main", "pipeline", 1)
+        assert f"{c.LABEL_REPO}=repo" in \
+            docker_manager.client.volumes.list.call_args.kwargs['filters']['label']
+
+    @patch("util.dep_cache.RepoManager.get_tree_hashes",
+           return_value={'poetry.lock': 'abc'})
+    def test_docker_manager_run_job_dep_cache(self, mock_hashes):
+        """ test the cache volumes of a job are restored from the nearest key, kept
+        after a successful job and removed after a failed one
+
+        Args:
+            mock_hashes (MagicMock): mock the hash of the lock file
+        """
+        docker_api = MockDockerApi()
+        docker_api.containers.run = MagicMock(side_effect=MockContainer)
+        volumes = {}
+
+        def get_volume(name):
+            if name not in volumes:
+                raise NotFound(f"volume {name} not found")
+            return volumes[name]
+
+        def create_volume(name, **kwargs):
+            volumes[name] = MagicMock()
+            volumes[name].name = name
+            volumes[name].remove.side_effect = lambda: volumes.pop(name)
+            return volumes[name]
+
+        docker_api.volumes.get = get_volume
+        docker_api.volumes.create = create_volume
+        job_config = copy.deepcopy(self.sample_job_config)
+        job_config[c.JOB_SUBKEY_CACHE] = {
+            c.CACHE_SUBKEY_KEY: "pip-${{ hashFiles('poetry.lock') }}",
+            c.CACHE_SUBKEY_PATHS: ['~/.cache/pip', '.venv']}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            dep_cache = DependencyCache(cache_dir=cache_dir)
+            create_volume("repo-depcache-old")
+            dep_cache.touch("repo-depcache-old", "repo", "pip-old", "~/.cache/pip")
+            docker_manager = DockerManager(client=docker_api, repo="repo", run="1",
+                                           dep_cache=dep_cache)
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.job_status == c.STATUS_SUCCESS
+            # .venv has no earlier key
+            assert job_log.dep_cache.status == c.CACHE_MISS
+            assert job_log.dep_cache.restored_from == "pip-old"
+            assert job_log.dep_cache.key.startswith("pip-")
+            assert job_log.dep_cache.restore_time is not None
+            assert job_log.dep_cache.save_time is not None
+            pip_vol = DependencyCache.volume_name("repo", job_log.dep_cache.key, '~/.cache/pip')
+            venv_vol = DependencyCache.volume_name("repo", job_log.dep_cache.key, '.venv')
+            restore_kwargs, job_kwargs = [call.kwargs for call in
+                                          docker_api.containers.run.call_args_list]
+            assert restore_kwargs['volumes']["repo-depcache-old"]['bind'] == c.COPY_SRC_DIR
+            assert restore_kwargs['volumes'][pip_vol]['bind'] == c.COPY_DST_DIR
+            assert job_kwargs['volumes'][pip_vol]['bind'] == '/root/.cache/pip'
+            assert job_kwargs['volumes'][venv_vol]['bind'] == f"{c.DEFAULT_DOCKER_DIR}/.venv"
+            assert dep_cache.nearest("repo", '.venv', ['pip-']) == \
+                (venv_vol, job_log.dep_cache.key)
+
+            # same key is a hit, without copy
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.dep_cache.status == c.CACHE_HIT
+            assert docker_api.containers.run.call_count == 3
+
+            # new key of a failed job is not saved
+            mock_hashes.return_value = {'poetry.lock': 'def'}
+            docker_api.containers.run = MagicMock(
+                side_effect=lambda **kwargs: MockContainer(**kwargs) if kwargs['name'].endswith(
+                    c.RESTORE_CONTAINER_SUFFIX) else MockFailContainer(**kwargs))
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.job_status == c.STATUS_FAILED
+            assert job_log.dep_cache.status == c.CACHE_RESTORED
+            assert job_log.dep_cache.save_time is None
+            assert sorted(volumes) == sorted(["repo-main-pipeline-1", "repo-depcache-old",
+                                              pip_vol, venv_vol])
+
+    def test_evict_dep_cache(self):
+        """ test the least recently used cache volumes are removed over the budget,
+        the disk usage is not read when the run did not use the cache"""
+        docker_api = MockDockerApi()
+        volumes = {name: MagicMock() for name in ["old", "mid", "new", "in_use"]}
+        volumes["in_use"].remove.side_effect = DockerException("volume is in use")
+        docker_api.volumes.get = volumes.get
+        mib = 1024 * 1024
+        docker_api.df = MagicMock(return_value={'Volumes': [
+            {'Name': name, 'UsageData': {'Size': 4 * mib}} for name in volumes] + [
+            {'Name': "other", 'UsageData': {'Size': 100 * mib}}]})
+        with tempfile.TemporaryDirectory() as cache_dir:
+            dep_cache = DependencyCache(cache_dir=cache_dir, budget_mb=6)
+            docker_manager = DockerManager(client=docker_api, dep_cache=dep_cache)
+            docker_manager._dep_cache_used = True
+            assert docker_manager.evict_dep_cache() == 0
+            for name in ["in_use", "old", "mid", "new", "gone"]:
+                dep_cache.touch(name, "repo", "key", name)
+            docker_manager._dep_cache_used = False
+            assert docker_manager.evict_dep_cache() == 0
+            docker_api.df.assert_not_called()
+            docker_manager._dep_cache_used = True
+            assert docker_manager.evict_dep_cache() == 2
+            volumes["in_use"].remove.assert_called_once()
+            volumes["old"].remove.assert_called_once()
+            volumes["mid"].remove.assert_called_once()
+            volumes["new"].remove.assert_not_called()
+            assert dep_cache.nearest("repo", "new", ["key"]) == ("new", "key")
+            assert dep_cache.nearest("repo", "old", ["key"]) is None
+            assert dep_cache.nearest("repo", "gone", ["key"]) is None
+
+    def test_docker_manager_run_job_setup(self):
+        """ test the setup scripts run once and the job start from the committed image,
+        a failed setup fail the job without running the scripts"""
+        docker_api = MockDockerApi()
+        images = set()
+
+        def get_image(name):
+            if name.startswith(c.SETUP_IMAGE_REPO) and name not in images:
+                raise ImageNotFound(f"image {name} not found")
+            return MockImage()
+
+        setup_exit = {'StatusCode': 0}
+
+        def run_container(**kwargs):
+            if not kwargs['name'].endswith(c.SETUP_CONTAINER_SUFFIX):
+                return MockContainer(**kwargs)
+            container = MagicMock()
+            container.attach.return_value = iter([(b"installed\n", None)])
+            container.wait.return_value = setup_exit
+            container.commit.side_effect = lambda repository, tag: images.add(
+                f"{repository}:{tag}")
+            return container
+
+        docker_api.images.get = get_image
+        docker_api.containers.run = MagicMock(side_effect=run_container)
+        job_config = copy.deepcopy(self.sample_job_config)
+        job_config[c.JOB_SUBKEY_SETUP] = ['apt-get install -y git', 'pip install poetry']
+        with tempfile.TemporaryDirectory() as cache_dir:
+            setup_images = SetupImageCache(cache_dir=cache_dir)
+            docker_manager = DockerManager(client=docker_api, setup_images=setup_images)
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.job_status == c.STATUS_SUCCESS
+            assert job_log.setup_image.status == c.CACHE_MISS
+            assert job_log.setup_image.build_time is not None
+            assert "installed" in job_log.job_logs
+            setup_image = job_log.setup_image.image
+            assert images == {setup_image}
+            setup_kwargs, job_kwargs = [call.kwargs for call in
+                                        docker_api.containers.run.call_args_list]
+            assert setup_kwargs['image'] == "sjchin88/python-git-poetry:latest"
+            assert setup_kwargs['volumes'] == {"Repo-main-pipeline-run": {
+                'bind': c.DEFAULT_DOCKER_DIR, 'mode': 'ro'}}
+            assert "pip install poetry" in setup_kwargs['command'][2]
+            assert job_kwargs['image'] == setup_image
+            assert [command.command for command in job_log.commands] == \
+                job_config[c.JOB_SUBKEY_SCRIPTS]
+
+            # the image is reused
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.setup_image.status == c.CACHE_HIT
+            assert "Setup skipped" in job_log.job_logs
+            assert docker_api.containers.run.call_count == 3
+
+            # changed setup scripts build a new image, the job fail with the setup
+            job_config[c.JOB_SUBKEY_SETUP].append('false')
+            setup_exit['StatusCode'] = 1
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.job_status == c.STATUS_FAILED
+            assert job_log.exit_code == 1
+            assert "Setup of job sample_job failed with exit code 1" in job_log.job_logs
+            assert docker_api.containers.run.call_count == 4
+            assert images == {setup_image}
+
+        # without setup images the setup scripts run with the scripts
+        docker_manager = DockerManager(client=MockDockerApi())
+        job_log = docker_manager.run_job("sample_job", job_config)
+        assert job_log.setup_image is None
+        assert [command.command for command in job_log.commands] == \
+            job_config[c.JOB_SUBKEY_SETUP] + job_config[c.JOB_SUBKEY_SCRIPTS]
+
+    @patch("util.container.DockerClientRegistry.check_health", return_value=False)
+    @patch("util.container.DockerClientRegistry.get_client")
+    def test_docker_manager_shared_client(self, mock_get_client, mock_health):
+        """ test the shared client is checked before each job, the job is not run
+        while the docker engine is not available
+
+        Args:
+            mock_get_client (MagicMock): mock the shared client
+            mock_health (MagicMock): mock the health check
+        """
+        mock_get_client.return_value = MockDockerApi(throw=True)
+        docker_manager = DockerManager()
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_FAILED
+        assert "docker engine not available" in job_log.job_logs
+
+        # engine back, the reconnected client is used
+        mock_health.return_value = True
+        mock_get_client.return_value = MockDockerApi()
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_SUCCESS
+        assert docker_manager.client is mock_get_client.return_value
+
+    def test_docker_manager_run_job_oom(self):
+        """ test the exit of the job container come from the docker events, and an
+        oom kill is recorded as the failure reason"""
+        docker_api = MockDockerApi()
+        container_name = "Repo-main-pipeline-run-sample_job"
+        docker_api.events = MagicMock(return_value=MockEventStream([
+            {'Action': c.EVENT_OOM, 'id': container_name},
+            {'Action': c.EVENT_DIE, 'id': container_name,
+             'Actor': {'Attributes': {'exitCode': '137'}}}]))
+        docker_manager = DockerManager(client=docker_api)
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_FAILED
+        assert job_log.exit_code == 137
+        assert job_log.failure_reason == c.FAILURE_OOM
+        assert "Job sample_job killed, out of memory" in job_log.job_logs
+        assert docker_api.events.call_args.kwargs['filters']['label'] == \
+            f"{c.LABEL_RUN}=Repo-main-pipeline-run"
+
+        # without events the state of the container tell the oom kill
+        docker_manager = DockerManager(client=MockDockerApi())
+        with patch.object(MockContainer, 'reload',
+                          lambda self: self.attrs['State'].update(OOMKilled=True)):
+            job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.failure_reason == c.FAILURE_OOM
+
+    def test_docker_manager_run_job_labels(self):
+        """ test the containers and volumes of the run are labelled with the run,
+        and the job container is removed when the job fail with a docker error"""
+        docker_api = MockDockerApi()
+        containers = []
+
+        def run_container(*args, **kwargs):
+            container = MagicMock(kwargs=kwargs)
+            container.attach.side_effect = DockerException("connection reset")
+            containers.append(container)
+            return container
+
+        docker_api.containers.run = run_container
+        docker_manager = DockerManager(client=docker_api, repo="repo", branch="dev",
+                                       pipeline="pipe", run="3")
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_FAILED
+        labels = containers[0].kwargs['labels']
+        assert labels[c.LABEL_RUN] == "repo-dev-pipe-3"
+        assert labels[c.LABEL_RUN_NUMBER] == "3"
+        assert labels[c.LABEL_OWNER].endswith(f":{os.getpid()}")
+        containers[0].remove.assert_called_once_with(force=True)
+        vol_labels = docker_manager.docker_vol.attrs['Labels']
+        assert vol_labels[c.LABEL_PIPELINE] == "pipe"
+
+    def test_docker_manager_run_job_stats(self):
+        """ test the resource usage of the job container is sampled while the job
+        run, and not sampled when disabled"""
+        sampled = threading.Event()
+
+        class SampledContainer(MockContainer):
+            def stats(self, *args, **kwargs):
+                sampled.set()
+                return super().stats(*args, **kwargs)
+
+            def attach(self, *args, **kwargs):
+                # the output end once the container was sampled
+                sampled.wait(5)
+                yield from super().attach(*args, **kwargs)
+
+        docker_api = MockDockerApi()
+        docker_api.containers.container = SampledContainer
+        docker_manager = DockerManager(client=docker_api, stats_interval=1)
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.job_status == c.STATUS_SUCCESS
+        assert job_log.resource_metrics.samples == 1
+        assert job_log.resource_metrics.memory_bytes.peak == 8 * 1024 * 1024
+
+        docker_manager = DockerManager(client=MockDockerApi(), stats_interval=0)
+        job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+        assert job_log.resource_metrics is None
+
+    def test_evict_setup_images(self):
+        """ test the least recently used setup images are removed over the budget,
+        counting only the size not shared with the base image, the disk usage is not
+        read when the run did not use a setup image"""
+        docker_api = MockDockerApi()
+        mib = 1024 * 1024
+        names = ["cicd-setup:old", "cicd-setup:mid", "cicd-setup:new", "cicd-setup:in_use"]
+        docker_api.df = MagicMock(return_value={'Images': [
+            {'RepoTags': [name], 'Size': 104 * mib, 'SharedSize': 100 * mib}
+            for name in names] + [{'RepoTags': ["python:3.12"], 'Size': 100 * mib,
+                                   'SharedSize': -1}]})
+        docker_api.images.remove = MagicMock(
+            side_effect=lambda name: (_ for _ in ()).throw(DockerException("in use"))
+            if name.endswith("in_use") else None)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            setup_images = SetupImageCache(cache_dir=cache_dir, budget_mb=6)
+            for name in ["cicd-setup:in_use", "cicd-setup:old", "cicd-setup:mid",
+                         "cicd-setup:new", "cicd-setup:gone"]:
+                setup_images.touch(name, "python:3.12")
+            docker_manager = DockerManager(client=docker_api, setup_images=setup_images)
+            assert docker_manager.evict_setup_images() == 0
+            docker_api.df.assert_not_called()
+            docker_manager._setup_images_used = True
+            assert docker_manager.evict_setup_images() == 2
+            assert [call.args[0] for call in docker_api.images.remove.call_args_list] == \
+                ["cicd-setup:in_use", "cicd-setup:old", "cicd-setup:mid"]
+            assert sorted(setup_images.index.entries()) == ["cicd-setup:in_use",
+                                                            "cicd-setup:new"]
+
+    @patch("util.job_cache.RepoManager.get_tree_hashes", return_value={'src': 'abc'})
+    def test_docker_manager_run_job_cache(self, mock_hashes):
+        """ test run_job skip the container when the job result is cached
+
+        Args:
+            mock_hashes (MagicMock): mock the input hashes
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            job_cache = JobCache(cache_dir=cache_dir, s3_bucket="")
+            docker_manager = DockerManager(client=MockDockerApi(), job_cache=job_cache)
+            job_config = copy.deepcopy(self.sample_job_config)
+            job_config[c.JOB_SUBKEY_INPUTS] = ['src']
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.job_status == c.STATUS_SUCCESS
+            assert job_log.cache_status == c.CACHE_MISS
+
+            # Container run would fail now, cached result is used instead
+            docker_manager.client.containers.throw = True
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.job_status == c.STATUS_SUCCESS
+            assert job_log.cache_status == c.CACHE_HIT
+            assert job_log.job_logs == TEST_LOG
+
+            # Changed input force the job to run
+            mock_hashes.return_value = {'src': 'def'}
+            job_log = docker_manager.run_job("sample_job", job_config)
+            assert job_log.job_status == c.STATUS_FAILED
+            assert job_log.cache_status == c.CACHE_MISS
+
+            # Job without inputs is never cached
+            job_log = docker_manager.run_job("sample_job", self.sample_job_config)
+            assert job_log.cache_status is None
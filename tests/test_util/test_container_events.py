@@ -0,0 +1,90 @@
+""" test the ContainerSupervisor
+"""
+import queue
+import threading
+import unittest
+from unittest.mock import MagicMock
+from docker.errors import DockerException
+import util.constant as c
+from util.container_events import (ContainerSupervisor)
+
+
+class QueueEventStream:
+    """ Fake blocking stream of docker events, ended by close"""
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def __iter__(self):
+        while (event := self.queue.get()) is not None:
+            yield event
+
+    def close(self):
+        self.queue.put(None)
+
+
+def die_event(container_id: str, exit_code: int) -> dict:
+    """ docker die event of a container
+
+    Args:
+        container_id (str): container id
+        exit_code (int): exit code
+
+    Returns:
+        dict: the event
+    """
+    return {'Type': 'container', 'Action': c.EVENT_DIE, 'id': container_id,
+            'Actor': {'ID': container_id, 'Attributes': {'exitCode': str(exit_code)}}}
+
+
+class TestContainerSupervisor(unittest.TestCase):
+    """ Test suite for the ContainerSupervisor
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+
+    def test_dispatch(self):
+        """ test the waiting jobs get the exit code of their container, including a
+        container exited before the wait, and the oom kill
+        """
+        stream = QueueEventStream()
+        client = MagicMock()
+        client.events.return_value = stream
+        supervisor = ContainerSupervisor(client, "run-1")
+        assert supervisor.start()
+        assert client.events.call_args.kwargs['filters']['label'] == f"{c.LABEL_RUN}=run-1"
+
+        results = {}
+
+        def wait(container_id):
+            results[container_id] = supervisor.wait(container_id)
+
+        waiters = [threading.Thread(target=wait, args=(name,)) for name in ["a", "b"]]
+        for waiter in waiters:
+            waiter.start()
+        stream.queue.put(die_event("early", 0))
+        stream.queue.put({'Action': c.EVENT_OOM, 'id': "b", 'Actor': {'ID': "b"}})
+        stream.queue.put(die_event("b", 137))
+        stream.queue.put(die_event("a", 2))
+        for waiter in waiters:
+            waiter.join(timeout=5)
+        assert results == {"a": (2, False), "b": (137, True)}
+        assert supervisor.wait("early") == (0, False)
+
+        # jobs still waiting fall back when the subscription end
+        waiter = threading.Thread(target=wait, args=("c",))
+        waiter.start()
+        supervisor.stop()
+        waiter.join(timeout=5)
+        assert results["c"] is None
+        assert not supervisor.alive
+        assert supervisor.wait("d") is None
+
+    def test_start_fail(self):
+        """ test the supervisor is not started if the subscription fail
+        """
+        client = MagicMock()
+        client.events.side_effect = DockerException("events not available")
+        supervisor = ContainerSupervisor(client, "run-1")
+        assert not supervisor.start()
+        assert supervisor.wait("a") is None
@@ -0,0 +1,118 @@
+""" test the sampling of the resource usage of the job containers
+"""
+import os
+import time
+import unittest
+from unittest.mock import (patch, MagicMock)
+from docker.errors import DockerException
+import util.constant as c
+from util.container_stats import (StatsSampler, get_stats_interval)
+
+MIB = 1024 * 1024
+
+
+def stats_sample(cpu_ns: int, memory: int, read: int = 0, rx: int = 0) -> dict:
+    """ answer of the docker stats API with the values used by the sampler
+
+    Args:
+        cpu_ns (int): cpu time of the container in ns
+        memory (int): memory usage in bytes, including 1 MiB of inactive page cache
+        read (int, optional): block bytes read. Defaults to 0.
+        rx (int, optional): network bytes received. Defaults to 0.
+
+    Returns:
+        dict: stats of the container
+    """
+    return {'memory_stats': {'usage': memory, 'stats': {'inactive_file': MIB}},
+            'cpu_stats': {'cpu_usage': {'total_usage': cpu_ns}},
+            'blkio_stats': {'io_service_bytes_recursive': [
+                {'major': 8, 'minor': 0, 'op': 'read', 'value': read},
+                {'major': 8, 'minor': 0, 'op': 'write', 'value': 0}]},
+            'networks': {'eth0': {'rx_bytes': rx, 'tx_bytes': 0}}}
+
+
+class TestStatsSampler(unittest.TestCase):
+    """ Test suite for the StatsSampler
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+
+    def test_summary(self):
+        """ test the cpu is computed between samples, the page cache is not counted
+        in the memory and the I/O are totals
+        """
+        sampler = StatsSampler(MagicMock(), 1)
+        sampler._record(stats_sample(0, 11 * MIB), now=10.0)
+        # half a cpu over one second, then two cpus over two seconds
+        sampler._record(stats_sample(int(0.5e9), 21 * MIB, read=5 * MIB, rx=MIB), now=11.0)
+        sampler._record(stats_sample(int(4.5e9), 31 * MIB, read=7 * MIB, rx=3 * MIB),
+                        now=13.0)
+        # the exited container has no memory usage
+        sampler._record({'memory_stats': {}, 'cpu_stats': {}}, now=14.0)
+        metrics = sampler.stop()
+        assert metrics.samples == 3
+        assert metrics.cpu_percent.min == 50.0
+        assert metrics.cpu_percent.peak == 200.0
+        assert metrics.cpu_percent.avg == 125.0
+        assert metrics.memory_bytes.min == 10 * MIB
+        assert metrics.memory_bytes.peak == 30 * MIB
+        assert metrics.block_read_bytes == 7 * MIB
+        assert metrics.net_rx_bytes == 3 * MIB
+
+    def test_sampling(self):
+        """ test the samples are taken from the thread until stopped, with the time
+        spent sampling measured
+        """
+        container = MagicMock()
+        container.stats.return_value = stats_sample(1000, 2 * MIB)
+        sampler = StatsSampler(container, 0.01)
+        sampler.start()
+        for _ in range(50):
+            if container.stats.call_count >= 2:
+                break
+            time.sleep(0.01)
+        metrics = sampler.stop()
+        assert metrics.samples >= 2
+        assert metrics.overhead >= 0
+        container.stats.assert_called_with(stream=False, one_shot=True)
+
+    def test_sampling_overhead(self):
+        """ test the interval grow while the samples are slow
+        """
+        container = MagicMock()
+
+        def slow_stats(**kwargs):
+            time.sleep(0.005)
+            return stats_sample(1000, 2 * MIB)
+
+        container.stats.side_effect = slow_stats
+        sampler = StatsSampler(container, 0.01)
+        sampler.start()
+        for _ in range(50):
+            if container.stats.call_count >= 2:
+                break
+            time.sleep(0.01)
+        metrics = sampler.stop()
+        assert sampler.interval >= 0.02
+        assert metrics.overhead >= 0.005
+
+    def test_sampling_error(self):
+        """ test the sampling end when the container is gone
+        """
+        container = MagicMock()
+        container.stats.side_effect = DockerException("no such container")
+        sampler = StatsSampler(container, 0.01)
+        sampler.start()
+        sampler._thread.join(1)
+        assert not sampler._thread.is_alive()
+        assert sampler.stop() is None
+
+    @patch.dict(os.environ, {c.ENV_STATS_INTERVAL: "0"})
+    def test_stats_interval(self):
+        """ test the interval come from the caller or the env value
+        """
+        assert get_stats_interval() == 0
+        assert get_stats_interval(2) == 2
+        os.environ[c.ENV_STATS_INTERVAL] = "often"
+        assert get_stats_interval() == c.DEFAULT_STATS_INTERVAL
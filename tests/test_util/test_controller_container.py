@@ -2,10 +2,11 @@
 """
 import os
 import copy
+import time
 import unittest
-from unittest.mock import patch
+from unittest.mock import (patch, MagicMock)
 import json
-from docker.errors import DockerException
+from docker.errors import (DockerException, NotFound)
 import util.constant as c
 from controller.controller import Controller
 from util.model import (SessionDetail, PipelineConfig, ValidationResult)
@@ -27,6 +28,16 @@ def load_pipeline() -> ValidationResult:
     result_dict = result.model_dump(by_alias=True)
     return result
 
+def load_dag_pipeline() -> ValidationResult:
+    """ load the test pipeline in dag mode, with pylint only needs checkout
+    """
+    pipeline_file_path = os.path.join(os.path.dirname(__file__), 'test_data/test_run/pipelines.yml')
+    extracted = parser.parse_yaml_file(pipeline_file_path)
+    extracted[c.KEY_GLOBAL][c.KEY_DAG_MODE] = True
+    extracted[c.KEY_JOBS]['pylint'][c.JOB_SUBKEY_NEEDS] = ['checkout']
+    checker = ConfigChecker()
+    return checker.validate_config("cicd_pipeline", extracted, "pipelines.yml", error_lc=True)
+
 # def insert_pipeline_config():
 #     mongo_adapter = MongoAdapter()
 #     sample_repo_path = os.path.join(os.path.dirname(__file__), 'test_data/test_run/sample_repo.json')
@@ -57,10 +68,40 @@ class MockContainer:
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
+        self.id = kwargs.get('name', 'container')
+        self.name = kwargs.get('name', 'container')
+        self.attrs = {'State': {'OOMKilled': False}}
+
+    status_code = 0
+
+    def reload(self) -> None:
+        """ Mock the container.reload method
+        """
+
+    def stats(self, *args, **kwargs) -> dict:
+        """ Mock the container.stats method
+
+        Returns:
+            dict: one shot resource usage of the container
+        """
+        return {'memory_stats': {'usage': 8 * 1024 * 1024, 'stats': {'inactive_file': 0}},
+                'cpu_stats': {'cpu_usage': {'total_usage': 1000}}}
 
-    def wait(self) -> None:
+    def wait(self) -> dict:
         """ Mock the container.wait() method
+
+        Returns:
+            dict: exit status of the container
         """
+        return {'StatusCode': self.status_code}
+
+    def attach(self, *args, **kwargs):
+        """ Mock the container.attach method, stream the logs as stderr chunk
+
+        Returns:
+            iterator: tuple of stdout, stderr chunks
+        """
+        return iter([(None, self.logs())])
 
     def logs(self, *args, **kwargs) -> bytes:
         """ Mock the container.wait() method
@@ -71,7 +112,15 @@ class MockContainer:
         """
         return bytes(TEST_LOG, encoding='utf-8')
 
-    def remove(self) -> None:
+    def put_archive(self, *args, **kwargs) -> bool:
+        """ Mock the container.put_archive method
+
+        Returns:
+            bool: True, archive extracted
+        """
+        return True
+
+    def remove(self, *args, **kwargs) -> None:
         """ Mock the container.remove method
 
         Returns:
@@ -96,6 +145,8 @@ class MockContainer:
         """
 
 class MockFailContainer(MockContainer):
+    status_code = 127
+
     def logs(self, *args, **kwargs) -> bytes:
         """ Mock the container.wait() method
         return a fake logs message
@@ -135,11 +186,16 @@ class MockContainersApi:
     def get(self, *args, **kwargs):
         return self.container(*args, **kwargs)
 
+    def create(self, *args, **kwargs):
+        return MockContainer(*args, **kwargs)
+
 class MockVolume:
     """ Fake Docker Volume"""
     def __init__(self, *args, **kwargs):
         self.args = args
         self.kwargs = kwargs
+        self.name = args[0] if args else kwargs.get('name')
+        self.attrs = {'Labels': kwargs.get('labels')}
 
     def remove(self):
         return True
@@ -150,6 +206,15 @@ class MockVolumesApi:
         self.volume = MockVolume
     def create(self, *args, **kwargs):
         return self.volume(*args, **kwargs)
+    def get(self, name):
+        raise NotFound(f"volume {name} not found")
+    def list(self, *args, **kwargs):
+        return []
+
+class MockImagesApi:
+    '''A fake Docker API with images calls, all images are present.'''
+    def get(self, *args, **kwargs):
+        return MagicMock(id="sha256:image")
 
 class MockDockerApi:
     '''A fake Docker API.'''
@@ -164,7 +229,14 @@ class MockDockerApi:
         """
         self.containers = MockContainersApi(success, throw)
         self.volumes = MockVolumesApi()
-        
+        self.images = MockImagesApi()
+
+    def events(self, *args, **kwargs):
+        """ Mock the events method, no event so the containers are waited for
+        with wait
+        """
+        return MagicMock(__iter__=lambda _: iter([]))
+
 class TestRunJob(unittest.TestCase):
     """ Class to test the Controller._actual_pipeline_run() and 
     container method 
@@ -256,6 +328,80 @@ class TestRunJob(unittest.TestCase):
         pipeline_status, _ = controller._actual_pipeline_run(repo_data, pipeline_config)
         assert pipeline_status == False
 
+    @patch("util.container.DockerManager.seed_vol", return_value=(False, "no space left"))
+    @patch("controller.controller.DockerManager", return_value=DockerManager(client=MockDockerApi()))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_seed_fail(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_seed_vol
+        ):
+        """ Test the run is not started if the workspace cannot be seeded, the
+        pipeline claimed for the run is released
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_seed_vol (MagicMock): mock seed_vol method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        status, error_msg = controller._actual_pipeline_run(repo_data, pipeline_config)
+        assert not status
+        assert error_msg == "no space left"
+        mock_insert_job.assert_not_called()
+        assert mock_update_pl_info.call_args_list[0].args[4] == {c.FIELD_RUNNING: True}
+        assert mock_update_pl_info.call_args_list[-1].args[4] == {c.FIELD_RUNNING: False}
+        # image of the first job
+        assert mock_seed_vol.call_args.args[1] == "sjchin88/python-git-poetry:latest"
+
+    @patch("util.container.DockerManager.seed_vol")
+    @patch("controller.controller.DockerManager", return_value=DockerManager(client=MockDockerApi()))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=False)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_claim_fail(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_seed_vol
+        ):
+        """ Test the run is not started without a terminal if the pipeline cannot be
+        claimed, before the workspace and the run record are created
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_seed_vol (MagicMock): mock seed_vol method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller(interactive=False)
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        status, error_msg = controller._actual_pipeline_run(repo_data, pipeline_config)
+        assert not status
+        assert error_msg == "Cannot update into db"
+        mock_seed_vol.assert_not_called()
+        mock_insert_job.assert_not_called()
+        assert mock_docker_manager.return_value.docker_vol is None
+
     @patch("controller.controller.MongoAdapter.update_job")
     @patch("controller.controller.MongoAdapter.update_job_logs")
     @patch("util.container.DockerManager.run_job", side_effect=KeyboardInterrupt)
@@ -295,4 +441,503 @@ class TestRunJob(unittest.TestCase):
             pipeline_status, _ = controller._actual_pipeline_run(repo_data, pipeline_config)
             assert False
         except KeyboardInterrupt:
-            assert True
\ No newline at end of file
+            assert True
+
+    @patch("controller.controller.MongoAdapter.update_job")
+    @patch("controller.controller.MongoAdapter.update_job_logs")
+    @patch("util.container.DockerManager._upload_artifact", return_value=(True, ""))
+    @patch("controller.controller.DockerManager", return_value=DockerManager(client=MockDockerApi()))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_concurrent_groups(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_upload_artifact,
+            mock_update_job_logs,
+            mock_update_job,
+        ):
+        """ Test the case where independent job groups are run concurrently
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_upload_artifact (MagicMock): mock _upload_artifact method
+            mock_update_job_logs (MagicMock): mock update_job_logs method
+            mock_update_job (MagicMock): mock_update_job method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        pipeline_status, _ = controller._actual_pipeline_run(
+            repo_data, pipeline_config, max_concurrency=2)
+        assert pipeline_status == True
+        # job logs for both independent test jobs collected into the stage payload
+        test_stage_call = mock_update_job_logs.call_args_list[1]
+        assert set(test_stage_call.args[3].keys()) == {'pytest', 'pylint'}
+
+
+    @patch("controller.controller.MongoAdapter.update_job")
+    @patch("controller.controller.MongoAdapter.update_job_logs")
+    @patch("controller.controller.DockerManager", return_value=DockerManager(client=MockDockerApi(throw=True)))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_skip_dependants(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_update_job_logs,
+            mock_update_job,
+        ):
+        """ Test the case where a failed job cause its dependants to be skipped
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_update_job_logs (MagicMock): mock update_job_logs method
+            mock_update_job (MagicMock): mock_update_job method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        pipeline_status, _ = controller._actual_pipeline_run(repo_data, pipeline_config)
+        assert pipeline_status == False
+        # compile needs checkout, which failed. test stage is never run
+        assert mock_update_job_logs.call_count == 1
+        build_job_logs = mock_update_job_logs.call_args.args[3]
+        assert build_job_logs['checkout'][c.FIELD_JOB_STATUS] == c.STATUS_FAILED
+        assert build_job_logs['compile'][c.FIELD_JOB_STATUS] == c.STATUS_SKIPPED
+
+    @patch("controller.controller.MongoAdapter.update_job")
+    @patch("controller.controller.MongoAdapter.update_job_logs")
+    @patch("controller.controller.DockerManager",
+           return_value=DockerManager(client=MockDockerApi(), pipeline_timeout=0))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_timeout(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_update_job_logs,
+            mock_update_job,
+        ):
+        """ Test the case where the pipeline timeout is reached, the job is recorded
+        with timeout status and fail the stage like a failed job
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_update_job_logs (MagicMock): mock update_job_logs method
+            mock_update_job (MagicMock): mock_update_job method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        pipeline_config.global_.timeout = 30
+        pipeline_status, _ = controller._actual_pipeline_run(repo_data, pipeline_config)
+        assert pipeline_status == False
+        assert mock_docker_manager.call_args.kwargs['pipeline_timeout'] == 30
+        assert mock_update_job_logs.call_count == 1
+        assert mock_update_job_logs.call_args.args[2] == c.STATUS_FAILED
+        build_job_logs = mock_update_job_logs.call_args.args[3]
+        assert build_job_logs['checkout'][c.FIELD_JOB_STATUS] == c.STATUS_TIMEOUT
+        assert build_job_logs['compile'][c.FIELD_JOB_STATUS] == c.STATUS_SKIPPED
+        # image pulls are recorded with the run
+        image_pulls = mock_update_job.call_args.args[1][c.FIELD_IMAGE_PULLS]
+        assert image_pulls[0][c.FIELD_STATUS] == c.PULL_PRESENT
+
+    @patch("controller.controller.MongoAdapter.update_job")
+    @patch("controller.controller.MongoAdapter.update_job_logs")
+    @patch("util.container.DockerManager._upload_artifact", return_value=(True, ""))
+    @patch("controller.controller.DockerManager", return_value=DockerManager(client=MockDockerApi()))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_dag_mode(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_upload_artifact,
+            mock_update_job_logs,
+            mock_update_job,
+        ):
+        """ Test the case where the pipeline is run across stages in dag mode
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_upload_artifact (MagicMock): mock _upload_artifact method
+            mock_update_job_logs (MagicMock): mock update_job_logs method
+            mock_update_job (MagicMock): mock_update_job method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(load_dag_pipeline().pipeline_config)
+        assert pipeline_config.job_graph['checkout'] == ['compile', 'pylint', 'pytest']
+        assert pipeline_config.job_graph['compile'] == ['pytest']
+        pipeline_status, _ = controller._actual_pipeline_run(
+            repo_data, pipeline_config, max_concurrency=2)
+        assert pipeline_status == True
+        # job logs are still recorded per stage
+        assert mock_update_job_logs.call_count == 2
+        stage_calls = {call.args[1]: call.args for call in mock_update_job_logs.call_args_list}
+        assert set(stage_calls['build'][3].keys()) == {'checkout', 'compile'}
+        assert set(stage_calls['test'][3].keys()) == {'pytest', 'pylint'}
+        assert stage_calls['test'][2] == c.STATUS_SUCCESS
+
+    @patch("controller.controller.MongoAdapter.update_job")
+    @patch("controller.controller.MongoAdapter.update_job_logs")
+    @patch("controller.controller.DockerManager", return_value=DockerManager(client=MockDockerApi(throw=True)))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_dag_mode_skip(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_update_job_logs,
+            mock_update_job,
+        ):
+        """ Test the case where a failed job in dag mode skip dependants in later stages
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_update_job_logs (MagicMock): mock update_job_logs method
+            mock_update_job (MagicMock): mock_update_job method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(load_dag_pipeline().pipeline_config)
+        pipeline_status, _ = controller._actual_pipeline_run(repo_data, pipeline_config)
+        assert pipeline_status == False
+        stage_calls = {call.args[1]: call.args for call in mock_update_job_logs.call_args_list}
+        assert stage_calls['build'][2] == c.STATUS_FAILED
+        assert stage_calls['test'][2] == c.STATUS_SKIPPED
+        assert stage_calls['test'][3]['pylint'][c.FIELD_JOB_STATUS] == c.STATUS_SKIPPED
+        mock_update_job.assert_called_once()
+        assert mock_update_job.call_args.args[1][c.FIELD_STATUS] == c.STATUS_FAILED
+
+    @patch("controller.controller.RepoManager.get_changed_files", return_value=['README.md'])
+    @patch("controller.controller.MongoAdapter.update_job")
+    @patch("controller.controller.MongoAdapter.update_job_logs")
+    @patch("util.container.DockerManager._upload_artifact", return_value=(True, ""))
+    @patch("controller.controller.DockerManager", return_value=DockerManager(client=MockDockerApi()))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_skip_unchanged(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_upload_artifact,
+            mock_update_job_logs,
+            mock_update_job,
+            mock_changed_files,
+        ):
+        """ Test the case where jobs are skipped as their paths are not changed
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_upload_artifact (MagicMock): mock _upload_artifact method
+            mock_update_job_logs (MagicMock): mock update_job_logs method
+            mock_update_job (MagicMock): mock_update_job method
+            mock_changed_files (MagicMock): mock get_changed_files method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_history[c.FIELD_LAST_SUCCESS_COMMIT_HASH] = "base"
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        pipeline_config.stages['test'][c.KEY_CHANGES] = ['src/', 'tests/']
+        pipeline_config.jobs['compile'][c.KEY_CHANGES] = ['*.md']
+        pipeline_status, _ = controller._actual_pipeline_run(repo_data, pipeline_config)
+        assert pipeline_status == True
+        mock_changed_files.assert_called_once_with("base")
+        stage_calls = {call.args[1]: call.args for call in mock_update_job_logs.call_args_list}
+        assert stage_calls['build'][2] == c.STATUS_SUCCESS
+        assert stage_calls['build'][3]['compile'][c.FIELD_JOB_STATUS] == c.STATUS_SUCCESS
+        assert stage_calls['test'][2] == c.STATUS_SKIPPED
+        assert "since commit base" in stage_calls['test'][3]['pytest'][c.FIELD_JOB_LOGS]
+        # successful run become the base commit of next run
+        final_updates = mock_update_pl_info.call_args.args[4]
+        assert final_updates[c.FIELD_LAST_SUCCESS_COMMIT_HASH] == self.sample_session[
+            c.FIELD_COMMIT_HASH]
+
+    def _make_original_run(self, test_status: str = c.STATUS_FAILED) -> dict:
+        """ helper to create the job record of a run to resume, build stage succeeded
+
+        Args:
+            test_status (str, optional): status of the test stage. Defaults to STATUS_FAILED.
+
+        Returns:
+            dict: job record
+        """
+        return {
+            c.FIELD_GIT_COMMIT_HASH: "random",
+            c.FIELD_LOGS: [
+                {c.FIELD_STAGE_NAME: 'build', c.FIELD_STAGE_STATUS: c.STATUS_SUCCESS,
+                 c.FIELD_START_TIME: "start", c.FIELD_COMPLETION_TIME: "end",
+                 c.FIELD_JOBS: {'checkout': {}, 'compile': {}}},
+                {c.FIELD_STAGE_NAME: 'test', c.FIELD_STAGE_STATUS: test_status,
+                 c.FIELD_START_TIME: "start", c.FIELD_COMPLETION_TIME: "end",
+                 c.FIELD_JOBS: {'pylint': {}, 'pytest': {}}},
+            ]
+        }
+
+    @patch("util.container.DockerManager.seed_vol")
+    @patch("util.container.DockerManager.attach_vol", autospec=True,
+           side_effect=lambda manager, volume_run=None:
+           setattr(manager, 'docker_vol', MagicMock()) or True)
+    @patch("controller.controller.MongoAdapter.get_job")
+    @patch("controller.controller.MongoAdapter.update_job")
+    @patch("controller.controller.MongoAdapter.update_job_logs")
+    @patch("util.container.DockerManager._upload_artifact", return_value=(True, ""))
+    @patch("controller.controller.DockerManager", return_value=DockerManager(client=MockDockerApi()))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_resume(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_docker_manager,
+            mock_upload_artifact,
+            mock_update_job_logs,
+            mock_update_job,
+            mock_get_job,
+            mock_attach_vol,
+            mock_seed_vol,
+        ):
+        """ Test the case where a failed run is resumed from its failed stage
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_docker_manager (MagicMock): mock DockerManager constructor
+            mock_upload_artifact (MagicMock): mock _upload_artifact method
+            mock_update_job_logs (MagicMock): mock update_job_logs method
+            mock_update_job (MagicMock): mock_update_job method
+            mock_get_job (MagicMock): mock get_job method
+            mock_attach_vol (MagicMock): mock DockerManager.attach_vol method
+            mock_seed_vol (MagicMock): mock DockerManager.seed_vol method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_history[c.FIELD_JOB_RUN_HISTORY] = ['original']
+        mock_get_pl_history.return_value = mock_history
+        mock_get_job.return_value = self._make_original_run()
+        controller = Controller()
+        now = time.time()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        pipeline_status, _ = controller._actual_pipeline_run(repo_data, pipeline_config,
+                                                             resume_run=1)
+        assert pipeline_status == True
+        mock_get_job.assert_called_once_with('original')
+        # continue in the volume of run 1
+        assert mock_attach_vol.call_args.args[1] == '1'
+        mock_seed_vol.assert_not_called()
+        # the workspace of the original run is retained again while it is used
+        original_id, retained = mock_update_job.call_args_list[0].args
+        assert original_id == 'original'
+        assert retained[c.FIELD_RETAIN_UNTIL] >= now + c.DEFAULT_VOL_RETENTION - 1
+        # build stage copied from the original run, only test stage is run
+        stage_calls = [call.args for call in mock_update_job_logs.call_args_list]
+        assert stage_calls[0][1:4] == ('build', c.STATUS_SUCCESS, {'checkout': {}, 'compile': {}})
+        assert [call[1] for call in stage_calls] == ['build', 'test']
+        assert set(stage_calls[1][3].keys()) == {'pylint', 'pytest'}
+        assert mock_update_job.call_args_list[1].args[1] == {c.FIELD_RESUMED_FROM: 'original',
+                                                             c.FIELD_WORKSPACE_RUN: 1}
+        # a successful run does not retain the workspace
+        assert c.FIELD_RETAIN_UNTIL not in mock_update_job.call_args_list[-1].args[1]
+        # the original config is recorded, not the trimmed one
+        assert 'build' in mock_insert_job.call_args.args[1][c.KEY_STAGES]
+
+    @patch("controller.controller.MongoAdapter.get_job")
+    @patch("controller.controller.MongoAdapter.update_job")
+    @patch("controller.controller.MongoAdapter.update_job_logs")
+    @patch("util.container.DockerManager._upload_artifact", return_value=(True, ""))
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job")
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_resume_twice(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_upload_artifact,
+            mock_update_job_logs,
+            mock_update_job,
+            mock_get_job,
+        ):
+        """ Test a resumed run that failed is resumed again in the workspace of the
+        first run, which is retained for both
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_upload_artifact (MagicMock): mock _upload_artifact method
+            mock_update_job_logs (MagicMock): mock update_job_logs method
+            mock_update_job (MagicMock): mock_update_job method
+            mock_get_job (MagicMock): mock get_job method
+        """
+        records = {'run1': self._make_original_run()}
+
+        def update_job(job_id, updates):
+            records.setdefault(job_id, {c.FIELD_GIT_COMMIT_HASH: "random",
+                                        c.FIELD_LOGS: []}).update(updates)
+
+        def update_job_logs(job_id, stage_name, stage_status, job_logs, stage_time):
+            records[job_id][c.FIELD_LOGS].append(
+                {c.FIELD_STAGE_NAME: stage_name, c.FIELD_STAGE_STATUS: stage_status,
+                 c.FIELD_JOBS: job_logs, **stage_time})
+
+        mock_update_job.side_effect = update_job
+        mock_update_job_logs.side_effect = update_job_logs
+        mock_get_job.side_effect = records.get
+        mock_insert_job.side_effect = ['run2', 'run3']
+        # the test stage keep failing
+        docker_api = MockDockerApi(success=False)
+        docker_api.volumes.get = MagicMock()
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        with patch("controller.controller.DockerManager",
+                   side_effect=lambda **kwargs: DockerManager(**{**kwargs,
+                                                                 'client': docker_api})):
+            for run_history in (['run1'], ['run1', 'run2']):
+                mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+                mock_history[c.FIELD_RUNNING] = False
+                mock_history[c.FIELD_JOB_RUN_HISTORY] = run_history
+                mock_get_pl_history.return_value = mock_history
+                status, message = controller._actual_pipeline_run(
+                    repo_data, pipeline_config, resume_run=len(run_history))
+                assert status == False
+                assert "no longer available" not in message
+        # both resumed runs continued in the volume of run 1
+        assert {call.args[0].rsplit('-', 1)[1]
+                for call in docker_api.volumes.get.call_args_list} == {'1'}
+        assert records['run2'][c.FIELD_RESUMED_FROM] == 'run1'
+        assert records['run3'][c.FIELD_RESUMED_FROM] == 'run2'
+        assert records['run3'][c.FIELD_WORKSPACE_RUN] == 1
+        # the first run own the workspace, its deadline follow the last run
+        assert records['run1'][c.FIELD_RETAIN_UNTIL] == records['run3'][c.FIELD_RETAIN_UNTIL]
+        assert mock_update_job.call_args_list[-2].args[0] == 'run1'
+
+    @patch("util.container.DockerManager.attach_vol", return_value=False)
+    @patch("controller.controller.MongoAdapter.get_job")
+    @patch("controller.controller.MongoAdapter.update_pipeline_info", return_value=True)
+    @patch("controller.controller.MongoAdapter.insert_job", return_value=123)
+    @patch("controller.controller.MongoAdapter.get_pipeline_history")
+    def test_actual_pipeline_run_resume_invalid(
+            self,
+            mock_get_pl_history,
+            mock_insert_job,
+            mock_update_pl_info,
+            mock_get_job,
+            mock_attach_vol,
+        ):
+        """ Test the cases where a run cannot be resumed, no new run is recorded
+
+        Args:
+            mock_get_pl_history (MagicMock): mock get_pipeline_history
+            mock_insert_job (MagicMock): mock the insert_job
+            mock_update_pl_info (MagicMock): mock update_pipeline_info
+            mock_get_job (MagicMock): mock get_job method
+            mock_attach_vol (MagicMock): mock DockerManager.attach_vol method
+        """
+        mock_history = copy.deepcopy(self.mock_running_pipeline_history)
+        mock_history[c.FIELD_RUNNING] = False
+        mock_history[c.FIELD_JOB_RUN_HISTORY] = ['original']
+        mock_get_pl_history.return_value = mock_history
+        controller = Controller()
+        repo_data = SessionDetail.model_validate(self.sample_session)
+        pipeline_config = PipelineConfig.model_validate(self.pipeline_config)
+        with patch("controller.controller.DockerManager",
+                   return_value=DockerManager(client=MockDockerApi())):
+            # run number not in history
+            status, message = controller._actual_pipeline_run(
+                repo_data, pipeline_config, resume_run=2)
+            assert status == False
+            assert "Run 2 not found" in message
+            # workspace volume removed after retention
+            mock_get_job.return_value = self._make_original_run()
+            status, message = controller._actual_pipeline_run(
+                repo_data, pipeline_config, resume_run=1)
+            assert status == False
+            assert "no longer available" in message
+            # original run on another commit
+            original_run = self._make_original_run()
+            original_run[c.FIELD_GIT_COMMIT_HASH] = "other"
+            mock_get_job.return_value = original_run
+            status, message = controller._actual_pipeline_run(
+                repo_data, pipeline_config, resume_run=1)
+            assert status == False
+            assert "cannot resume on commit random" in message
+            # every stage succeeded
+            mock_get_job.return_value = self._make_original_run(c.STATUS_SUCCESS)
+            status, message = controller._actual_pipeline_run(
+                repo_data, pipeline_config, resume_run=1)
+            assert status == False
+            assert "nothing to resume" in message
+            # workspace volume removed and no stage to reuse, a new one is seeded
+            original_run = self._make_original_run()
+            original_run[c.FIELD_LOGS][0][c.FIELD_STAGE_STATUS] = c.STATUS_FAILED
+            mock_get_job.return_value = original_run
+            with patch("util.container.DockerManager.seed_vol",
+                       return_value=(False, "no space left")) as mock_seed_vol:
+                status, message = controller._actual_pipeline_run(
+                    repo_data, pipeline_config, resume_run=1)
+            assert status == False
+            assert message == "no space left"
+            mock_seed_vol.assert_called_once()
+        mock_insert_job.assert_not_called()
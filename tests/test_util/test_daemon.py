@@ -0,0 +1,182 @@
+""" test the daemon server, client and run queue
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+import unittest
+import util.constant as c
+from util.daemon import (DaemonClient, DaemonServer, RunQueue)
+
+
+class TestRunQueue(unittest.TestCase):
+    """ Test suite for the RunQueue
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+    def test_priority_and_fairness(self):
+        """ lower priority first, then users with less requests, then arrival order
+        """
+        queue = RunQueue()
+        queue.put('alice-1', 'alice', 1)
+        queue.put('alice-2', 'alice', 1)
+        queue.put('alice-3', 'alice', 1)
+        queue.put('bob-1', 'bob', 1)
+        queue.put('bob-report', 'bob', 0)
+        expected = ['bob-report', 'alice-1', 'bob-1', 'alice-2', 'alice-3']
+        assert queue.snapshot() == expected
+        assert [queue.get() for _ in range(5)] == expected
+        assert queue.get(timeout=0) is None
+
+    def test_max_priority(self):
+        """ a worker limited to a priority only get the items of that priority or lower
+        """
+        queue = RunQueue()
+        queue.put('alice-run', 'alice', 1)
+        assert queue.get(timeout=0, max_priority=0) is None
+        queue.put('bob-report', 'bob', 0)
+        assert queue.get(timeout=0, max_priority=0) == 'bob-report'
+        assert queue.get(timeout=0) == 'alice-run'
+
+    def test_task_done_lower_user_load(self):
+        """ a user with finished requests is not penalized
+        """
+        queue = RunQueue()
+        queue.put('alice-1', 'alice')
+        assert queue.get() == 'alice-1'
+        queue.task_done('alice')
+        queue.put('bob-1', 'bob')
+        queue.put('alice-2', 'alice')
+        assert queue.get() == 'bob-1'
+        assert queue.get() == 'alice-2'
+
+
+class TestDaemonServer(unittest.TestCase):
+    """ Test suite for the DaemonServer and DaemonClient
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.tmp_dir.name, 'cid.sock')
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.cancelled = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.server.shutdown()
+        self.thread.join()
+        self.tmp_dir.cleanup()
+
+    def _handler(self, request, out, err) -> int:
+        self.started.set()
+        if request.args[0] == 'block':
+            self.release.wait(5)
+            if request.cancel_event.wait(1):
+                self.cancelled.set()
+            return 0
+        out.write(f"cwd {request.cwd}\n")
+        err.write("warning\n")
+        return 3
+
+    def _start_server(self, workers: int = 1):
+        self.server = DaemonServer(self._handler, self.socket_path, workers)
+        self.server.poll_interval = 0.05
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        assert self.server.ready.wait(5)
+
+    def test_execute(self):
+        """ the output and exit code of the handler are sent back to the client
+        """
+        self._start_server()
+        out = io.StringIO()
+        err = io.StringIO()
+        exit_code = DaemonClient(self.socket_path).execute(['pipeline', 'run'], out=out, err=err)
+        assert exit_code == 3
+        assert out.getvalue() == f"cwd {os.getcwd()}\n"
+        assert err.getvalue() == "warning\n"
+
+    def test_already_running(self):
+        """ a second daemon on the same socket is refused
+        """
+        self._start_server()
+        with self.assertRaises(RuntimeError):
+            DaemonServer(self._handler, self.socket_path).serve_forever()
+
+    def test_status_and_cancel(self):
+        """ status list the running and queued requests, a report is executed while
+        the only run worker is busy, a request is cancelled when its client disconnect
+        """
+        self._start_server()
+        blocking = DaemonClient(self.socket_path)
+        assert blocking.connect()
+        answers = blocking.request({'command': c.DAEMON_CMD_EXEC, 'args': ['block'],
+                                    'user': 'alice', 'cwd': '/', 'priority': 1})
+        # send the request, reading the answers in the background
+        threading.Thread(target=lambda: list(answers), daemon=True).start()
+        assert self.started.wait(5)
+        queued = DaemonClient(self.socket_path)
+        queued.connect()
+        queued_answers = queued.request({'command': c.DAEMON_CMD_EXEC, 'args': ['queued'],
+                                         'user': 'bob', 'cwd': '/', 'priority': 1})
+        threading.Thread(target=lambda: list(queued_answers), daemon=True).start()
+        status = {}
+        for _ in range(50):
+            status = list(DaemonClient(self.socket_path).request(
+                {'command': c.DAEMON_CMD_STATUS}))[0]
+            if status['queued']:
+                break
+            time.sleep(0.05)
+        assert [request['args'] for request in status['running']] == [['block']]
+        assert status['queued'][0]['user'] == 'bob'
+
+        # the report does not wait behind the runs
+        out = io.StringIO()
+        exit_code = DaemonClient(self.socket_path).execute(
+            ['report'], priority=c.DAEMON_REPORT_PRIORITY, out=out, err=io.StringIO())
+        assert exit_code == 3
+        assert not self.release.is_set()
+
+        # client of the running request disconnect
+        blocking.conn.shutdown(2)
+        self.release.set()
+        assert self.cancelled.wait(5)
+
+    def test_concurrent(self):
+        """ the requests are executed concurrently up to the number of workers
+        """
+        self._start_server(workers=2)
+        clients = []
+        for user in ('alice', 'bob'):
+            client = DaemonClient(self.socket_path)
+            assert client.connect()
+            answers = client.request({'command': c.DAEMON_CMD_EXEC, 'args': ['block'],
+                                      'user': user, 'cwd': '/', 'priority': 1})
+            threading.Thread(target=lambda answers=answers: list(answers),
+                             daemon=True).start()
+            clients.append(client)
+        status = {}
+        for _ in range(50):
+            status = list(DaemonClient(self.socket_path).request(
+                {'command': c.DAEMON_CMD_STATUS}))[0]
+            if len(status['running']) == 2:
+                break
+            time.sleep(0.05)
+        assert sorted(request['user'] for request in status['running']) == ['alice', 'bob']
+        assert status['queued'] == []
+
+    def test_stop(self):
+        """ stop command shutdown the server and remove the socket
+        """
+        self._start_server()
+        answers = list(DaemonClient(self.socket_path).request({'command': c.DAEMON_CMD_STOP}))
+        assert answers[0][c.DAEMON_MSG_EXIT] == 0
+        self.thread.join(5)
+        assert not self.thread.is_alive()
+        assert not os.path.exists(self.socket_path)
+        assert not DaemonClient(self.socket_path).connect()
@@ -1,13 +1,20 @@
+import hashlib
+import io
+import os
+import tempfile
 import unittest
 from botocore.exceptions import ClientError
 from unittest.mock import patch
 from util.common_utils import get_logger
-from util.db_artifact import S3Client
+from util.db_artifact import (ArtifactStore, S3Client, S3ClientRegistry)
+from util.model import (ArtifactFile, ArtifactManifest)
 
 logger = get_logger("tests.test_util.test_db_artifact")
 
 class TestS3Client(unittest.TestCase):
     def setUp(self) -> None:
+        # the client and known buckets are shared by the process
+        S3ClientRegistry.reset()
         self.bucket = "test-cicd-cs6510"
         self.ok_error = ClientError(
             error_response={
@@ -31,6 +38,11 @@ class TestS3Client(unittest.TestCase):
         mock_s3_client.create_bucket.side_effect = self.ok_error
         s3_client = S3Client(self.bucket)
         assert True
+        # bucket known to exist is not created again
+        S3Client(self.bucket)
+        mock_s3_client.create_bucket.assert_called_once()
+        mock_s3.assert_called_once()
+        S3ClientRegistry.reset()
         # when Error Code is others, this should be raised
         mock_s3_client.create_bucket.side_effect = ClientError(
             error_response={
@@ -69,3 +81,146 @@ class TestS3Client(unittest.TestCase):
         mock_s3_client.upload_file.side_effect = self.ok_error
         response = s3_client.upload_file("file")
         assert response == False
+
+    @patch("util.db_artifact.boto3.client")
+    def test_multipart_upload(self, mock_s3):
+        """ Test the stream is uploaded in parts of part_size, and the upload is
+        aborted when it cannot be completed
+
+        Args:
+            mock_s3 (MagicMock): mock s3 creation
+        """
+        mock_s3_client = mock_s3.return_value
+        mock_s3_client.create_multipart_upload.return_value = {'UploadId': 'upload'}
+        mock_s3_client.upload_part.side_effect = \
+            lambda **kwargs: {'ETag': f"etag-{kwargs['PartNumber']}"}
+        writer = S3Client(self.bucket).open_upload("job.zip", part_size=4, threads=2)
+        writer.write(b"abc")
+        mock_s3_client.upload_part.assert_not_called()
+        writer.write(b"defghij")
+        writer.close()
+        bodies = {call.kwargs['PartNumber']: call.kwargs['Body']
+                  for call in mock_s3_client.upload_part.call_args_list}
+        assert bodies == {1: b"abcd", 2: b"efgh", 3: b"ij"}
+        assert writer.size == 10
+        mock_s3_client.complete_multipart_upload.assert_called_once_with(
+            Bucket=self.bucket, Key="job.zip", UploadId='upload',
+            MultipartUpload={'Parts': [{'ETag': f"etag-{idx}", 'PartNumber': idx}
+                                       for idx in (1, 2, 3)]})
+
+        mock_s3_client.complete_multipart_upload.side_effect = self.ok_error
+        writer = S3Client(self.bucket).open_upload("job.zip", part_size=4)
+        writer.write(b"abc")
+        with self.assertRaises(ClientError):
+            writer.close()
+        mock_s3_client.abort_multipart_upload.assert_called_once_with(
+            Bucket=self.bucket, Key="job.zip", UploadId='upload')
+
+    @patch.dict(os.environ, {"CICD_S3_PART_SIZE_MB": "16", "CICD_S3_THREADS": "8"})
+    @patch("util.db_artifact.boto3.client")
+    def test_transfer_config(self, mock_s3):
+        """ Test the part size and threads come from the env values, and are used
+        by the transfers
+
+        Args:
+            mock_s3 (MagicMock): mock s3 creation
+        """
+        transfer_config = S3ClientRegistry.get_transfer_config()
+        assert transfer_config.multipart_chunksize == 16 * 1024 * 1024
+        assert transfer_config.max_concurrency == 8
+        s3_client = S3Client(self.bucket)
+        assert s3_client.upload_file("dist/app.zip")
+        mock_s3.return_value.upload_file.assert_called_once_with(
+            "dist/app.zip", self.bucket, "app.zip", Config=transfer_config)
+        assert mock_s3.call_args.kwargs['config'].max_pool_connections == 16
+        writer = s3_client.open_upload("job.zip")
+        assert (writer.part_size, writer.threads) == (16 * 1024 * 1024, 8)
+
+    @patch("util.db_artifact.boto3.client")
+    def test_artifact_store(self, mock_s3):
+        """ Test the manifest round trip of the ArtifactStore
+
+        Args:
+            mock_s3 (MagicMock): mock s3 creation
+        """
+        mock_s3_client = mock_s3.return_value
+        store = ArtifactStore(self.bucket)
+        manifest = ArtifactManifest(pipeline="Repo-main-pipeline", run="2", stage="build",
+                                    job_name="compile", files=[
+                                        ArtifactFile(path="dist/app.whl", sha256="abc", size=5)])
+        key = store.put_manifest(manifest)
+        assert key == "Repo-main-pipeline/2/build/compile/manifest.json"
+        body = mock_s3_client.put_object.call_args.kwargs['Body']
+        mock_s3_client.get_object.return_value = {'Body': io.BytesIO(body)}
+        assert store.get_manifest(key) == manifest
+        mock_s3_client.get_object.return_value = {'Body': io.BytesIO(b"not json")}
+        assert store.get_manifest(key) is None
+
+    @patch("util.db_artifact.boto3.client")
+    def test_missing_blobs(self, mock_s3):
+        """ Test the blobs are checked with one listing per prefix, from the smallest
+        to the largest hash of the group, and the blobs found are not checked again
+
+        Args:
+            mock_s3 (MagicMock): mock s3 creation
+        """
+        stored = ["aa01", "aa02", "aa05", "aa09", "bb01"]
+        def paginate(Bucket, Prefix, StartAfter):
+            keys = [f"blobs/sha256/{sha256}" for sha256 in stored]
+            return [{'Contents': [{'Key': key} for key in keys
+                                  if key.startswith(Prefix) and key > StartAfter]}]
+        paginator = mock_s3.return_value.get_paginator.return_value
+        paginator.paginate.side_effect = paginate
+        store = ArtifactStore(self.bucket)
+        assert store.missing_blobs(["aa02", "aa03", "aa05", "cc01", "aa02"]) == \
+            {"aa03", "cc01"}
+        assert paginator.paginate.call_count == 2
+        paginator.paginate.assert_any_call(Bucket=self.bucket, Prefix="blobs/sha256/aa",
+                                           StartAfter="blobs/sha256/aa0")
+        # known blobs are not listed again
+        paginator.paginate.reset_mock()
+        store.mark_stored("cc01")
+        assert store.missing_blobs(["aa02", "cc01"]) == set()
+        paginator.paginate.assert_not_called()
+
+    @patch.dict(os.environ, {"CICD_S3_PART_SIZE_MB": "5", "CICD_S3_THREADS": "3"})
+    @patch("util.db_artifact.boto3.client")
+    def test_download(self, mock_s3):
+        """ Test the blobs are downloaded with ranged GETs of the part size, once per
+        blob, and checked against their hash
+
+        Args:
+            mock_s3 (MagicMock): mock s3 creation
+        """
+        part_size = 5 * 1024 * 1024
+        large = os.urandom(2 * part_size + 10)
+        blobs = {hashlib.sha256(data).hexdigest(): data for data in (large, b"same")}
+        def get_object(Bucket, Key, Range):
+            start, end = Range[len("bytes="):].split("-")
+            data = blobs[Key[len("blobs/sha256/"):]]
+            return {'Body': io.BytesIO(data[int(start):int(end) + 1])}
+        mock_s3.return_value.get_object.side_effect = get_object
+        large_sha, small_sha = blobs
+        manifest = ArtifactManifest(pipeline="Repo-main-pipeline", run="2", stage="build",
+                                    job_name="compile", files=[
+            ArtifactFile(path="dist/app.whl", sha256=large_sha, size=len(large)),
+            ArtifactFile(path="a.txt", sha256=small_sha, size=4, mode=0o755),
+            ArtifactFile(path="docs/b.txt", sha256=small_sha, size=4)])
+        store = ArtifactStore(self.bucket)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            assert store.download(manifest, tmp_dir) == len(large) + 4
+            assert mock_s3.return_value.get_object.call_count == 4
+            with open(os.path.join(tmp_dir, "dist", "app.whl"), 'rb') as file:
+                assert file.read() == large
+            with open(os.path.join(tmp_dir, "docs", "b.txt"), 'rb') as file:
+                assert file.read() == b"same"
+            assert os.stat(os.path.join(tmp_dir, "a.txt")).st_mode & 0o777 == 0o755
+
+            # corrupted blob
+            blobs[small_sha] = b"diff"
+            with self.assertRaises(OSError):
+                store.download(manifest, tmp_dir)
+            # path outside of the directory
+            manifest.files = [ArtifactFile(path="../x", sha256=small_sha, size=4)]
+            with self.assertRaises(ValueError):
+                store.download(manifest, tmp_dir)
@@ -239,3 +239,39 @@ class TestMongoDB(unittest.TestCase):
             updates={c.FIELD_PIPELINE_CONFIG:pipeline_config}
         )
         assert result is False
+
+    @patch("util.db_mongo.MongoClient", return_value=_mock_mongo)
+    def test_get_run_status(self, mock_client):
+        """Test the status of a run retrieved from the jobs history."""
+        mongo_adapter = MongoAdapter()
+        his_object = PipelineInfo.model_validate({
+            c.FIELD_PIPELINE_NAME: "status_pipeline",
+            c.FIELD_PIPELINE_FILE_NAME: "status_pipeline.yml",
+            c.FIELD_PIPELINE_CONFIG: self.pipeline_config
+        })
+        job_id = mongo_adapter.insert_job(his_object, self.pipeline_config)
+        mongo_adapter.update_job(job_id, {c.FIELD_STATUS: c.STATUS_FAILED})
+        mongo_adapter.update_pipeline_info(
+            repo_name="status_repo",
+            repo_url="https://github.com/test/status_repo",
+            branch=c.DEFAULT_BRANCH,
+            pipeline_name="status_pipeline",
+            updates={c.FIELD_PIPELINE_NAME: "status_pipeline",
+                     c.FIELD_PIPELINE_FILE_NAME: "status_pipeline.yml",
+                     c.FIELD_PIPELINE_CONFIG: self.pipeline_config,
+                     c.FIELD_JOB_RUN_HISTORY: [job_id]}
+        )
+        assert mongo_adapter.get_run_status(
+            "status_repo", c.DEFAULT_BRANCH, "status_pipeline", 1) == c.STATUS_FAILED
+        run_job = mongo_adapter.get_run_job(
+            "status_repo", c.DEFAULT_BRANCH, "status_pipeline", 1)
+        assert run_job[c.FIELD_STATUS] == c.STATUS_FAILED
+        # run not recorded yet, or pipeline unknown
+        assert mongo_adapter.get_run_status(
+            "status_repo", c.DEFAULT_BRANCH, "status_pipeline", 2) is None
+        assert mongo_adapter.get_run_status(
+            "status_repo", c.DEFAULT_BRANCH, "other_pipeline", 1) is None
+
+        mock_client.side_effect = errors.PyMongoError("Database error")
+        assert mongo_adapter.get_run_status(
+            "status_repo", c.DEFAULT_BRANCH, "status_pipeline", 1) is None
@@ -0,0 +1,81 @@
+""" test the DependencyCache index
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import util.constant as c
+from util.dep_cache import (DependencyCache)
+
+
+class TestDependencyCache(unittest.TestCase):
+    """ Test suite for the dependency cache index
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+
+    @patch("util.dep_cache.RepoManager.get_tree_hashes")
+    def test_resolve_key(self, mock_hashes):
+        """ test the key change only when the hashed files change
+
+        Args:
+            mock_hashes (MagicMock): mock the git hashes of the files
+        """
+        mock_hashes.return_value = {'poetry.lock': 'abc'}
+        dep_cache = DependencyCache(cache_dir="unused")
+        template = "pip-${{ hashFiles('poetry.lock', 'pyproject.toml') }}-py3"
+        key = dep_cache.resolve_key(template)
+        assert key.startswith("pip-") and key.endswith("-py3")
+        assert mock_hashes.call_args.args[0] == ['poetry.lock', 'pyproject.toml']
+        assert dep_cache.resolve_key(template) == key
+        mock_hashes.return_value = {'poetry.lock': 'def'}
+        assert dep_cache.resolve_key(template) != key
+        assert dep_cache.resolve_key("static") == "static"
+
+    def test_restore_prefixes(self):
+        """ test the restore prefixes default to the static part of the template
+        """
+        template = "npm-${{ hashFiles('package-lock.json') }}"
+        assert DependencyCache.restore_prefixes(template) == ["npm-"]
+        assert DependencyCache.restore_prefixes(template, ["npm-main-", "npm-"]) == \
+            ["npm-main-", "npm-"]
+        assert DependencyCache.restore_prefixes("static") == []
+
+    def test_index(self):
+        """ test the nearest volume is the most recent of the first matching prefix,
+        and the least recently used volumes are selected over the budget
+        """
+        with tempfile.TemporaryDirectory() as cache_dir:
+            dep_cache = DependencyCache(cache_dir=cache_dir, budget_mb=1)
+            dep_cache.touch("vol-a", "repo", "pip-main-1", "~/.cache/pip")
+            dep_cache.touch("vol-b", "repo", "pip-dev-1", "~/.cache/pip")
+            dep_cache.touch("vol-c", "other", "pip-main-2", "~/.cache/pip")
+            assert dep_cache.nearest("repo", "~/.cache/pip", ["pip-main-", "pip-"]) == \
+                ("vol-a", "pip-main-1")
+            assert dep_cache.nearest("repo", "~/.cache/pip", ["pip-"]) == \
+                ("vol-b", "pip-dev-1")
+            assert dep_cache.nearest("repo", "~/.cache/pip", ["pip-"], exclude="vol-b") == \
+                ("vol-a", "pip-main-1")
+            assert dep_cache.nearest("repo", ".venv", ["pip-"]) is None
+
+            # the index is shared through the file
+            other = DependencyCache(cache_dir=cache_dir, budget_mb=1)
+            mib = 1024 * 1024
+            # vol-c is no longer present, vol-a is the least recently used
+            assert other.select_evictions({"vol-a": mib, "vol-b": mib // 2}) == ["vol-a"]
+            assert dep_cache.nearest("other", "~/.cache/pip", ["pip-"]) is None
+            other.forget(["vol-a", "vol-b"])
+            assert dep_cache.nearest("repo", "~/.cache/pip", ["pip-"]) is None
+
+            # invalid index is read as empty
+            with open(os.path.join(cache_dir, DependencyCache.INDEX_FILE), 'w',
+                      encoding='utf-8') as file:
+                file.write("{")
+            assert dep_cache.select_evictions({"vol-a": 1}) == []
+
+    @patch.dict(os.environ, {c.ENV_DEP_CACHE_BUDGET: "512"})
+    def test_budget_from_env(self):
+        """ test the budget come from the env value
+        """
+        assert DependencyCache(cache_dir="unused").budget == 512 * 1024 * 1024
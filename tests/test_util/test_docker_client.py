@@ -0,0 +1,82 @@
+""" test the shared docker client
+"""
+import os
+import unittest
+from unittest.mock import (patch, MagicMock)
+from docker.errors import DockerException
+from urllib3.util.retry import Retry
+import util.constant as c
+from util.docker_client import (DockerClientRegistry)
+
+
+def mock_client(healthy: bool = True) -> MagicMock:
+    """ docker client with one adapter, answering ping if healthy
+
+    Args:
+        healthy (bool, optional): if ping succeed. Defaults to True.
+
+    Returns:
+        MagicMock: the client
+    """
+    client = MagicMock()
+    client.api.adapters = {'http+docker://': MagicMock()}
+    if not healthy:
+        client.ping.side_effect = DockerException("connection refused")
+    return client
+
+
+class TestDockerClientRegistry(unittest.TestCase):
+    """ Test suite for the DockerClientRegistry
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+
+    def setUp(self):
+        DockerClientRegistry.reset()
+
+    def tearDown(self):
+        DockerClientRegistry.reset()
+
+    @patch.dict(os.environ, {c.ENV_DOCKER_POOL_SIZE: "64", c.ENV_DOCKER_RETRIES: "2",
+                             c.ENV_DOCKER_TIMEOUT: "invalid"})
+    @patch("util.docker_client.docker.from_env")
+    def test_get_client(self, mock_from_env):
+        """ test the client is created once with the pool size, timeout and retries
+
+        Args:
+            mock_from_env (MagicMock): mock docker.from_env
+        """
+        client = mock_client()
+        mock_from_env.return_value = client
+        assert DockerClientRegistry.get_client() is client
+        assert DockerClientRegistry.get_client() is client
+        mock_from_env.assert_called_once_with(timeout=c.DEFAULT_DOCKER_TIMEOUT,
+                                              max_pool_size=64)
+        retry = client.api.adapters['http+docker://'].max_retries
+        assert isinstance(retry, Retry)
+        assert retry.connect == 2 and retry.read == 2
+        assert 'POST' not in retry.allowed_methods
+        DockerClientRegistry.reset()
+        client.close.assert_called_once()
+
+    @patch("util.docker_client.time.sleep")
+    @patch("util.docker_client.docker.from_env")
+    def test_check_health_reconnect(self, mock_from_env, mock_sleep):
+        """ test the client is replaced until the engine answer again
+
+        Args:
+            mock_from_env (MagicMock): mock docker.from_env
+            mock_sleep (MagicMock): mock time.sleep
+        """
+        stale, healthy = mock_client(healthy=False), mock_client()
+        mock_from_env.side_effect = [stale, DockerException("engine restarting"), healthy]
+        assert DockerClientRegistry.check_health(wait=60)
+        assert DockerClientRegistry.get_client() is healthy
+        stale.close.assert_called_once()
+        assert [call.args[0] for call in mock_sleep.call_args_list] == \
+            [c.DOCKER_RETRY_BACKOFF, c.DOCKER_RETRY_BACKOFF * 2]
+
+        # engine not back in time
+        healthy.ping.side_effect = DockerException("connection refused")
+        assert not DockerClientRegistry.check_health(wait=0)
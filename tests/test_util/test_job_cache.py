@@ -0,0 +1,102 @@
+""" test the JobCache
+"""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import util.constant as c
+from util.job_cache import (JobCache)
+from util.model import (ArtifactManifest, JobLog)
+from util.common_utils import (get_logger)
+
+logger = get_logger("tests.test_util.test_job_cache")
+
+
+class TestJobCache(unittest.TestCase):
+    """ Test suite for the JobCache
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.job_cache = JobCache(cache_dir=self.tmp_dir.name, s3_bucket="")
+        self.job_config = {
+            c.JOB_SUBKEY_STAGE: 'build',
+            c.JOB_SUBKEY_SCRIPTS: ['poetry install'],
+            c.JOB_SUBKEY_INPUTS: ['src', 'poetry.lock'],
+        }
+        self.job_log = JobLog(job_name='compile', job_status=c.STATUS_SUCCESS,
+                              allow_failure=False, start_time='now', job_logs='done')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @patch("util.job_cache.RepoManager.get_tree_hashes")
+    def test_compute_key(self, mock_hashes):
+        """ cache key change with the image, scripts or input hashes
+
+        Args:
+            mock_hashes (MagicMock): mock the input hashes
+        """
+        mock_hashes.return_value = {'src': 'abc', 'poetry.lock': '123'}
+        key = self.job_cache.compute_key('sha256:image', self.job_config)
+        assert key == self.job_cache.compute_key('sha256:image', self.job_config)
+        assert key != self.job_cache.compute_key('sha256:other', self.job_config)
+
+        mock_hashes.return_value = {'src': 'abd', 'poetry.lock': '123'}
+        assert key != self.job_cache.compute_key('sha256:image', self.job_config)
+
+        mock_hashes.return_value = {'src': 'abc', 'poetry.lock': '123'}
+        self.job_config[c.JOB_SUBKEY_SCRIPTS] = ['poetry install --no-root']
+        assert key != self.job_cache.compute_key('sha256:image', self.job_config)
+
+    def test_put_and_get(self):
+        """ an entry is available after put, with its artifact manifest
+        """
+        job_log, artifact_path = self.job_cache.get('key')
+        assert job_log is None
+        assert artifact_path is None
+
+        manifest = ArtifactManifest(pipeline='pipe', run='1', stage='build',
+                                    job_name='compile')
+        self.job_cache.put_manifest('key', manifest)
+        # not visible until the job log is stored
+        assert self.job_cache.get('key') == (None, None)
+        self.job_cache.put('key', self.job_log)
+        job_log, artifact_path = self.job_cache.get('key')
+        assert job_log.job_logs == 'done'
+        assert job_log.job_status == c.STATUS_SUCCESS
+        with open(artifact_path, 'r', encoding='utf-8') as file:
+            assert ArtifactManifest.model_validate_json(file.read()) == manifest
+
+    @patch("util.job_cache.S3Client")
+    def test_s3_tier(self, mock_s3):
+        """ entry is uploaded to s3, and copied from s3 on local miss
+
+        Args:
+            mock_s3 (MagicMock): mock the S3Client
+        """
+        job_cache = JobCache(cache_dir=self.tmp_dir.name, s3_bucket="bucket")
+        job_cache.put('key', self.job_log)
+        mock_s3.return_value.upload_file.assert_called_once()
+        assert mock_s3.return_value.upload_file.call_args.args[1] == 'key/job_log.json'
+
+        stored = os.path.join(self.tmp_dir.name, 'key', JobCache.JOB_LOG_FILE)
+        with open(stored, 'r', encoding='utf-8') as file:
+            content = file.read()
+
+        def download(object_name, file_name):
+            if not object_name.endswith(JobCache.JOB_LOG_FILE):
+                return False
+            with open(file_name, 'w', encoding='utf-8') as file:
+                file.write(content)
+            return True
+
+        mock_s3.return_value.download_file.side_effect = download
+        other_dir = tempfile.TemporaryDirectory()
+        job_cache = JobCache(cache_dir=other_dir.name, s3_bucket="bucket")
+        job_log, artifact_path = job_cache.get('key')
+        assert job_log.job_logs == 'done'
+        assert artifact_path is None
+        other_dir.cleanup()
@@ -0,0 +1,83 @@
+""" test the JobLogStream
+"""
+import os
+import tempfile
+import unittest
+from util.log_stream import (CommandTracker, JobLogStream)
+
+
+class TestJobLogStream(unittest.TestCase):
+    """ Test suite for the JobLogStream
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+    def test_lines_and_filter(self):
+        """ lines split across chunks are echoed once complete, stderr lines can be
+        left out of the log
+        """
+        lines = []
+        log_stream = JobLogStream(on_line=lines.append,
+                                  stderr_filter=lambda line: not line.startswith("::"))
+        log_stream.feed(b"hello wo", b"::marker\nsh: 1: git")
+        log_stream.feed(b"rld\nsecond", None)
+        # multi bytes character split between two chunks
+        log_stream.feed("café\n".encode('utf-8')[:4], None)
+        log_stream.feed("café\n".encode('utf-8')[4:], None)
+        assert lines == ["hello world", "secondcafé"]
+        log_stream.feed(None, b": not found")
+        log_stream.flush()
+        assert lines[-1] == "sh: 1: git: not found"
+        log_stream.write("upload failed")
+        log_stream.close()
+        # complete lines keep the order they are read from both streams
+        assert log_stream.text == "hello world\nsecondcafé\nsh: 1: git: not found" \
+                                  "upload failed"
+
+    def test_bounded_buffer(self):
+        """ only the tail is kept in memory, the complete log is in the log file
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            log_path = os.path.join(tmp_dir, 'logs', 'job.log')
+            log_stream = JobLogStream(buffer_size=10, log_path=log_path)
+            for idx in range(100):
+                log_stream.feed(f"line {idx:02d}\n".encode('utf-8'), None)
+            log_stream.close()
+            assert log_stream.dropped == 800 - 10
+            assert log_stream.text == \
+                f"... 790 characters truncated, full log in {log_path}\n8\nline 99\n"
+            with open(log_path, encoding='utf-8') as log_file:
+                content = log_file.read()
+            assert content.startswith("line 00\nline 01\n")
+            assert len(content) == 800
+
+
+class TestCommandTracker(unittest.TestCase):
+    """ Test suite for the CommandTracker
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+    def test_script_and_parse(self):
+        """ the script report the exit code of each command until one fails
+        """
+        tracker = CommandTracker(["cd src", "pytest", "coverage report"])
+        script = tracker.script()
+        assert script.split("\n")[:5] == [
+            "echo '::cid-command::start:0' >&2",
+            "cd src",
+            "CID_COMMAND_RC=$?",
+            "echo \"::cid-command::end:0:$CID_COMMAND_RC\" >&2",
+            "[ $CID_COMMAND_RC -eq 0 ] || exit $CID_COMMAND_RC",
+        ]
+        for line in ["::cid-command::start:0", "::cid-command::end:0:0",
+                     "::cid-command::start:1"]:
+            assert not tracker.parse(line)
+        assert tracker.parse("E   assert False")
+        assert not tracker.parse("::cid-command::end:1:2")
+        # not a marker of this job
+        assert tracker.parse("::cid-command::end:9:0")
+        commands = tracker.finish()
+        assert [command.exit_code for command in commands] == [0, 2, None]
+        assert commands[1].duration >= 0
+        assert commands[2].duration is None
@@ -1,5 +1,9 @@
+import io
+import os
 import subprocess
+import tarfile
 import tempfile
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 from pathlib import Path
@@ -513,3 +517,71 @@ class TestRepoManager(unittest.TestCase):
         # Assert branch and commit actions
         # mock_instance.git.checkout.assert_called_once_with(c.DEFAULT_BRANCH)
         # mock_instance.git.execute.assert_called_once_with(["git", "reset", "--hard", "123abc"])
+
+    @patch("util.repo_manager.Repo")
+    def test_get_tree_hashes(self, mock_repo):
+        """ Test get_tree_hashes return the object hash of each path,
+        and empty string for path not in the commit
+        """
+        mock_tree = MagicMock()
+        mock_tree.hexsha = "root"
+
+        def lookup(path):
+            if path == "missing":
+                raise KeyError(path)
+            sub_tree = MagicMock()
+            sub_tree.hexsha = f"hash-{path}"
+            return sub_tree
+
+        mock_tree.__truediv__.side_effect = lookup
+        mock_repo.return_value.head.commit.tree = mock_tree
+        repo_manager = RepoManager()
+        hashes = repo_manager.get_tree_hashes(["src/", ".", "missing"])
+        self.assertEqual(hashes, {"src/": "hash-src", ".": "root", "missing": ""})
+
+    @patch("util.repo_manager.Repo")
+    def test_get_changed_files(self, mock_repo):
+        """ Test get_changed_files return the diff file list, or None
+        when the base commit cannot be used
+        """
+        repo_manager = RepoManager()
+        self.assertIsNone(repo_manager.get_changed_files(""))
+
+        mock_repo.return_value.git.diff.return_value = "src/app.py\nREADME.md\n"
+        self.assertEqual(repo_manager.get_changed_files("abc123"),
+                         ["src/app.py", "README.md"])
+        mock_repo.return_value.git.diff.assert_called_with('--name-only', 'abc123', 'HEAD')
+
+        mock_repo.return_value.git.diff.side_effect = GitCommandError("diff")
+        self.assertIsNone(repo_manager.get_changed_files("abc123"))
+
+    def test_stream_archive(self):
+        """ Test stream_archive yield a tar of the commit files, and raise
+        GitCommandError for an unknown commit
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            subprocess.run(["git", "init", "-q", tmp_dir], check=True)
+            Path(tmp_dir, "app.py").write_text("print('hello')\n", encoding='utf-8')
+            subprocess.run(["git", "-C", tmp_dir, "add", "app.py"], check=True)
+            subprocess.run(["git", "-C", tmp_dir, "-c", "user.name=test",
+                            "-c", "user.email=test@test", "commit", "-q", "-m", "init"],
+                           check=True)
+            repo_manager = RepoManager()
+            archive = b"".join(repo_manager.stream_archive("HEAD", Path(tmp_dir)))
+            with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+                self.assertEqual(tar.getnames(), ["app.py"])
+            with self.assertRaises(GitCommandError):
+                list(repo_manager.stream_archive("0" * 40, Path(tmp_dir)))
+
+            # a consumer stopping early does not wait for git writing the rest
+            Path(tmp_dir, "data.bin").write_bytes(os.urandom(4 * c.ARCHIVE_CHUNK_SIZE))
+            subprocess.run(["git", "-C", tmp_dir, "add", "data.bin"], check=True)
+            subprocess.run(["git", "-C", tmp_dir, "-c", "user.name=test",
+                            "-c", "user.email=test@test", "commit", "-q", "-m", "data"],
+                           check=True)
+            archive = repo_manager.stream_archive("HEAD", Path(tmp_dir))
+            next(archive)
+            closer = threading.Thread(target=archive.close, daemon=True)
+            closer.start()
+            closer.join(5)
+            self.assertFalse(closer.is_alive())
@@ -0,0 +1,53 @@
+""" test the context of the commands executed concurrently by the daemon
+"""
+import io
+import os
+import sys
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from util.request_context import (get_context, get_cwd, inherit_context, request_context,
+                                  resolve_path)
+
+
+class TestRequestContext(unittest.TestCase):
+    """ Test suite for the request context
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+
+    def test_cwd(self):
+        """ test the paths are resolved against the directory of the command
+        """
+        assert get_cwd() == os.getcwd()
+        with request_context('/tmp/client', io.StringIO(), io.StringIO()):
+            assert get_cwd() == '/tmp/client'
+            assert resolve_path('pipelines.yml') == '/tmp/client/pipelines.yml'
+            assert resolve_path('/etc/cid.yml') == '/etc/cid.yml'
+        assert get_cwd() == os.getcwd()
+
+    def test_streams(self):
+        """ test the output of concurrent commands go to their own stream, and the
+        threads of a command inherit its context
+        """
+        outs = [io.StringIO(), io.StringIO()]
+        barrier = threading.Barrier(2)
+
+        def command(idx: int):
+            with request_context(f'/tmp/{idx}', outs[idx], io.StringIO()):
+                barrier.wait(5)
+                print(f"command {idx}")
+                with ThreadPoolExecutor(max_workers=1, initializer=inherit_context,
+                                        initargs=(get_context(),)) as executor:
+                    executor.submit(lambda: print(f"job of {get_cwd()}")).result()
+
+        threads = [threading.Thread(target=command, args=(idx,)) for idx in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        assert outs[0].getvalue() == "command 0\njob of /tmp/0\n"
+        assert outs[1].getvalue() == "command 1\njob of /tmp/1\n"
+        # outside of a command the process streams are used
+        assert sys.stdout.target is sys.stdout.default
@@ -0,0 +1,139 @@
+""" test the garbage collection of the run resources
+"""
+import os
+import socket
+import time
+import unittest
+from unittest.mock import MagicMock
+from docker.errors import APIError
+import util.constant as c
+from util.resource_gc import (ResourceCollector, is_retained)
+
+LIVE_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_labels(run_number: int, owner: str = LIVE_OWNER, **extra) -> dict:
+    """ labels set by the DockerManager on the resources of a run
+
+    Args:
+        run_number (int): run number of the pipeline
+        owner (str, optional): owner of the run. Defaults to this process.
+        **extra: other labels
+
+    Returns:
+        dict: the labels
+    """
+    return {c.LABEL_RUN: f"repo-main-pipe-{run_number}", c.LABEL_REPO: 'repo',
+            c.LABEL_BRANCH: 'main', c.LABEL_PIPELINE: 'pipe',
+            c.LABEL_RUN_NUMBER: str(run_number), c.LABEL_OWNER: owner, **extra}
+
+
+def mock_container(name: str, labels: dict) -> MagicMock:
+    """ container with a name and labels """
+    container = MagicMock()
+    container.name = name
+    container.labels = labels
+    return container
+
+
+def mock_volume(name: str, labels: dict) -> MagicMock:
+    """ volume with a name and labels """
+    volume = MagicMock()
+    volume.name = name
+    volume.attrs = {'Labels': labels}
+    return volume
+
+
+class TestResourceCollector(unittest.TestCase):
+    """ Test suite for the ResourceCollector
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+
+    def setUp(self):
+        future = int(time.time()) + 3600
+        # run 1 succeeded, run 2 failed and is retained, run 3 is running in this
+        # process, run 4 is not recorded and its process died
+        self.containers = [mock_container('c1', run_labels(1)),
+                           mock_container('c2', run_labels(2)),
+                           mock_container('c3', run_labels(3)),
+                           mock_container('c4', run_labels(4, owner="host:-1"))]
+        self.volumes = [mock_volume('v1', run_labels(1)),
+                        mock_volume('v2', run_labels(2)),
+                        mock_volume('v3', run_labels(3)),
+                        mock_volume('v4', run_labels(4, owner="host:-1"))]
+        self.client = MagicMock()
+        self.client.containers.list.return_value = self.containers
+        self.client.volumes.list.return_value = self.volumes
+        jobs = {1: {c.FIELD_STATUS: c.STATUS_SUCCESS, c.FIELD_RETAIN_UNTIL: future},
+                2: {c.FIELD_STATUS: c.STATUS_FAILED, c.FIELD_RETAIN_UNTIL: future},
+                3: {c.FIELD_STATUS: c.STATUS_PENDING}}
+        self.run_job = MagicMock(
+            side_effect=lambda repo, branch, pipeline, run: jobs.get(run))
+
+    def test_collect(self):
+        """ test the resources of the finished and dead runs are removed, the
+        volume of the failed run and the running run are kept
+        """
+        collector = ResourceCollector(self.client, self.run_job)
+        # run 4 is owned by a process of this host which is gone
+        collector._owner_alive = lambda owner: False if owner == "host:-1" else True
+        report = collector.collect()
+        assert sorted(report.stale_runs) == ['repo-main-pipe-1', 'repo-main-pipe-2',
+                                             'repo-main-pipe-4']
+        assert sorted(report.containers) == ['c1', 'c2', 'c4']
+        assert sorted(report.volumes) == ['v1', 'v4']
+        assert report.kept == 3
+        assert not report.errors
+        self.containers[0].remove.assert_called_once_with(force=True)
+        self.containers[2].remove.assert_not_called()
+        self.volumes[0].remove.assert_called_once()
+        self.volumes[1].remove.assert_not_called()
+        self.client.containers.list.assert_called_once_with(
+            all=True, filters={'label': c.LABEL_RUN})
+        self.run_job.assert_any_call('repo', 'main', 'pipe', 1)
+
+    def test_collect_dry_run(self):
+        """ test the dry run list the resources without removing them
+        """
+        collector = ResourceCollector(self.client, self.run_job)
+        report = collector.collect(dry_run=True)
+        assert sorted(report.containers) == ['c1', 'c2']
+        assert report.volumes == ['v1']
+        for resource in self.containers + self.volumes:
+            resource.remove.assert_not_called()
+
+    def test_collect_errors(self):
+        """ test the resources failing to be removed are reported
+        """
+        self.volumes[0].remove.side_effect = APIError("volume is in use")
+        report = ResourceCollector(self.client, self.run_job).collect()
+        assert report.volumes == []
+        assert len(report.errors) == 1
+        self.client.volumes.list.side_effect = APIError("engine down")
+        report = ResourceCollector(self.client, self.run_job).collect()
+        assert report.stale_runs == []
+        assert len(report.errors) == 1
+
+    def test_is_retained(self):
+        """ test only the failed runs are retained, until the deadline recorded with
+        the run
+        """
+        now = int(time.time())
+        assert is_retained({c.FIELD_STATUS: c.STATUS_TIMEOUT, c.FIELD_RETAIN_UNTIL: now}, now)
+        assert not is_retained({c.FIELD_STATUS: c.STATUS_FAILED,
+                                c.FIELD_RETAIN_UNTIL: now - 1}, now)
+        assert not is_retained({c.FIELD_STATUS: c.STATUS_FAILED}, now)
+        assert not is_retained({c.FIELD_STATUS: c.STATUS_SUCCESS,
+                                c.FIELD_RETAIN_UNTIL: now + 1}, now)
+        assert not is_retained(None, now)
+
+    def test_owner_alive(self):
+        """ test the owner process of a run is checked on this host only
+        """
+        assert ResourceCollector._owner_alive(LIVE_OWNER) is True
+        assert ResourceCollector._owner_alive("other-host:1") is None
+        assert ResourceCollector._owner_alive(None) is None
+        # pid above the maximum pid of linux
+        assert ResourceCollector._owner_alive(f"{socket.gethostname()}:99999999") is False
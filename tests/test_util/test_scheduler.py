@@ -0,0 +1,197 @@
+""" test the JobScheduler
+"""
+import threading
+import time
+import unittest
+import util.constant as c
+from util.model import (JobLog)
+from util.scheduler import (JobScheduler)
+from util.common_utils import (get_logger)
+
+logger = get_logger("tests.test_util.test_scheduler")
+
+
+def make_job_log(job_name: str, status: str = c.STATUS_SUCCESS,
+                 allow_failure: bool = False) -> JobLog:
+    """ helper to create a JobLog for the fake run_job function
+
+    Args:
+        job_name (str): name of the job
+        status (str, optional): job status. Defaults to STATUS_SUCCESS.
+        allow_failure (bool, optional): allow_failure flag. Defaults to False.
+
+    Returns:
+        JobLog: job log
+    """
+    return JobLog(job_name=job_name, job_status=status,
+                  allow_failure=allow_failure, start_time=time.asctime())
+
+
+class TestJobScheduler(unittest.TestCase):
+    """ Test suite for the JobScheduler
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+    def setUp(self):
+        # checkout is needed by compile and lint, compile is needed by package
+        self.job_graph = {
+            'checkout': ['compile', 'lint'],
+            'compile': ['package'],
+            'lint': [],
+            'package': [],
+            'docs': [],
+        }
+        self.order = []
+        self.lock = threading.Lock()
+
+    def _record_run(self, job_name: str) -> JobLog:
+        with self.lock:
+            self.order.append(job_name)
+        return make_job_log(job_name)
+
+    def test_run_respect_dependencies(self):
+        """ every job should run after the jobs it needs
+        """
+        scheduler = JobScheduler(self.job_graph, max_concurrency=3)
+        results = scheduler.run(self._record_run)
+        assert set(results.keys()) == set(self.job_graph.keys())
+        assert self.order.index('checkout') < self.order.index('compile')
+        assert self.order.index('checkout') < self.order.index('lint')
+        assert self.order.index('compile') < self.order.index('package')
+        assert not scheduler.skipped
+        assert not scheduler.early_break
+
+    def test_run_sequential_follow_job_order(self):
+        """ with max_concurrency 1 the preferred job order is followed
+        """
+        job_order = ['docs', 'checkout', 'lint', 'compile', 'package']
+        scheduler = JobScheduler(self.job_graph, max_concurrency=1, job_order=job_order)
+        scheduler.run(self._record_run)
+        assert self.order == job_order
+
+    def test_run_concurrency_limit(self):
+        """ number of running jobs should never exceed max_concurrency
+        """
+        job_graph = {f"job{idx}": [] for idx in range(6)}
+        running = [0]
+        peak = [0]
+
+        def run_job(job_name):
+            with self.lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with self.lock:
+                running[0] -= 1
+            return make_job_log(job_name)
+
+        JobScheduler(job_graph, max_concurrency=2).run(run_job)
+        assert peak[0] == 2
+
+    def test_run_skip_dependants_of_failed_job(self):
+        """ dependants of a failed job are skipped, independent jobs continue
+        """
+        def run_job(job_name):
+            self._record_run(job_name)
+            if job_name == 'compile':
+                return make_job_log(job_name, c.STATUS_FAILED)
+            return make_job_log(job_name)
+
+        scheduler = JobScheduler(self.job_graph, max_concurrency=2)
+        results = scheduler.run(run_job)
+        assert scheduler.skipped == ['package']
+        assert 'package' not in results
+        assert results['lint'].job_status == c.STATUS_SUCCESS
+        assert results['docs'].job_status == c.STATUS_SUCCESS
+        assert scheduler.early_break
+
+    def test_run_job_error(self):
+        """ an error raised by run_job fails the job, its dependants are skipped and
+        the other jobs run to the end
+        """
+        def run_job(job_name):
+            self._record_run(job_name)
+            if job_name == 'compile':
+                raise OSError("cannot open the log file")
+            return make_job_log(job_name)
+
+        scheduler = JobScheduler(self.job_graph, max_concurrency=2)
+        results = scheduler.run(run_job)
+        assert results['compile'].job_status == c.STATUS_FAILED
+        assert "cannot open the log file" in results['compile'].job_logs
+        assert scheduler.skipped == ['package']
+        assert results['lint'].job_status == c.STATUS_SUCCESS
+        assert results['docs'].job_status == c.STATUS_SUCCESS
+        assert scheduler.early_break
+
+    def test_run_allow_failure_continue(self):
+        """ dependants of a failed job that allow failure still run
+        """
+        def run_job(job_name):
+            if job_name == 'compile':
+                return make_job_log(job_name, c.STATUS_FAILED, allow_failure=True)
+            return make_job_log(job_name)
+
+        scheduler = JobScheduler(self.job_graph)
+        results = scheduler.run(run_job)
+        assert 'package' in results
+        assert not scheduler.skipped
+        assert not scheduler.early_break
+
+    def test_run_keyboard_interrupt(self):
+        """ KeyboardInterrupt from a job is propagated, started job is recorded
+        """
+        def run_job(job_name):
+            raise KeyboardInterrupt
+
+        scheduler = JobScheduler(self.job_graph)
+        with self.assertRaises(KeyboardInterrupt):
+            scheduler.run(run_job)
+        assert scheduler.started == ['checkout']
+        assert not scheduler.results
+
+    def test_run_shared_job_slots(self):
+        """ schedulers sharing job slots never exceed the slot count together
+        """
+        job_slots = threading.BoundedSemaphore(2)
+        running = [0]
+        peak = [0]
+
+        def run_job(job_name):
+            with self.lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with self.lock:
+                running[0] -= 1
+            return make_job_log(job_name)
+
+        schedulers = [
+            JobScheduler({f"job{idx}": [] for idx in range(4)}, max_concurrency=2,
+                         job_slots=job_slots)
+            for _ in range(2)
+        ]
+        threads = [threading.Thread(target=scheduler.run, args=(run_job,))
+                   for scheduler in schedulers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert peak[0] == 2
+        assert all(len(scheduler.results) == 4 for scheduler in schedulers)
+
+    def test_run_cancel_event(self):
+        """ setting the cancel event stop the scheduler like a KeyboardInterrupt
+        """
+        cancel_event = threading.Event()
+
+        def run_job(job_name):
+            cancel_event.set()
+            return make_job_log(job_name)
+
+        scheduler = JobScheduler(self.job_graph, cancel_event=cancel_event)
+        scheduler.poll_interval = 0.01
+        with self.assertRaises(KeyboardInterrupt):
+            scheduler.run(run_job)
+        assert scheduler.started == ['checkout']
@@ -0,0 +1,35 @@
+""" test the SetupImageCache index
+"""
+import os
+import unittest
+from unittest.mock import patch
+import util.constant as c
+from util.setup_image import (SetupImageCache)
+
+
+class TestSetupImageCache(unittest.TestCase):
+    """ Test suite for the setup image index
+
+    Args:
+        unittest.TestCase (class): base class
+    """
+
+    def test_image_tag(self):
+        """ test the tag change with the base image, the setup scripts and the env
+        """
+        setup = ['apt-get install -y git']
+        tag = SetupImageCache.image_tag("sha256:base", setup, {})
+        assert tag.startswith(c.SETUP_IMAGE_REPO + ":")
+        assert SetupImageCache.image_tag("sha256:base", list(setup), {}) == tag
+        assert SetupImageCache.image_tag("sha256:other", setup, {}) != tag
+        assert SetupImageCache.image_tag("sha256:base", setup + ['ls'], {}) != tag
+        assert SetupImageCache.image_tag("sha256:base", setup, {'MATRIX_PY': '3.12'}) != tag
+
+    @patch.dict(os.environ, {c.ENV_SETUP_IMAGE_BUDGET: "2048"})
+    def test_budget_from_env(self):
+        """ test the budget come from the env value, or the default if invalid
+        """
+        assert SetupImageCache(cache_dir="unused").budget == 2048 * 1024 * 1024
+        os.environ[c.ENV_SETUP_IMAGE_BUDGET] = "lots"
+        assert SetupImageCache(cache_dir="unused").budget == \
+            c.DEFAULT_SETUP_IMAGE_BUDGET_MB * 1024 * 1024